@@ -7,15 +7,44 @@ Hub de cybersécurité SPARTA
 import os
 import sys
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from flask_socketio import SocketIO, emit
+
+from config import SocketConfig
+
+# Rendre threading/socket coopératifs avant tout autre import (pool DB, SocketIO)
+if SocketConfig.ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, stream_with_context
+from flask_socketio import SocketIO, emit, join_room
 import logging
-from datetime import datetime
-import argon2
+import json
+import math
+from datetime import datetime, timedelta, timezone
 
 # Import configuration
 from config import get_config, validate_environment
 from core.database.models import DatabaseManager
+from core.database.pagination import decode_cursor, next_cursor
+from core.database.search import SORT_RANK, SORT_TIME, next_offset
+from core.database.retention import RetentionWorker, build_policies
+from core.database.checkpoint import CheckpointScheduler
+from core.security.passwords import PasswordService
+from core.security.login_limiter import LoginLimiter
+from core.sockets.status_broadcaster import StatusBroadcaster, STATUS_ROOM
+from core.sockets.message_bus import create_client_manager, bus_endpoints, user_room
+from core.sockets.log_stream import LogBus, LogStreamer
+from core.cluster.leader import LeaderElection
+from core.cluster.balancer import ProxyProtocolListener
+from core.monitoring.host_metrics import HostMetricsCollector
+from core.agents.registry import AgentRegistry
+from core.agents.transport import AgentTransport
+from core.agents.auth import load_agent_keys
+from core.agents.gateway_pool import GatewayPool
+from core.agents.scheduler import CommandScheduler
+from core.agents.registry import STATUS_OFFLINE
+from core.modules.prolitage import CorrelationEngine
+from core.modules.omega import OmegaRunner
 
 # Configuration logging
 logging.basicConfig(
@@ -31,6 +60,19 @@ class MiftahApp:
         self.app = None
         self.socketio = None
         self.db = None
+        self.status_broadcaster = None
+        self.metrics = None
+        self.retention = None
+        self.checkpoints = None
+        self.agent_registry = None
+        self.agent_transport = None
+        self.command_scheduler = None
+        self.leader = None
+        self.login_limiter = None
+        self.prolitage = None
+        self.omega = None
+        self.log_bus = LogBus()
+        self.log_streamer = None
         self.config = get_config()
         self.setup_app()
         self.setup_database()
@@ -45,14 +87,51 @@ class MiftahApp:
             DEBUG=self.config['app'].DEBUG
         )
         
-        # Initialize Argon2 hasher
-        self.ph = argon2.PasswordHasher()
-        
-        # SocketIO
+        # SocketIO ; en multi-processus, émissions relayées aux autres workers par le bus
+        cluster = self.config['cluster']
+        options = {}
+        client_manager = create_client_manager(
+            cluster.MESSAGE_QUEUE,
+            bus_endpoints(cluster.BUS_ENDPOINT, cluster.WORKERS),
+            cluster.WORKER_INDEX
+        )
+        if client_manager is not None:
+            options['client_manager'] = client_manager
+            # Logs écrits par les autres workers republiés localement
+            self.log_bus.relay = lambda entry: client_manager.relay('logs', entry)
+            client_manager.on_relay('logs', lambda entry: self.log_bus.publish(entry, relay=False))
         self.socketio = SocketIO(
             self.app,
             async_mode=self.config['socket'].ASYNC_MODE,
-            cors_allowed_origins=self.config['socket'].CORS_ALLOWED_ORIGINS
+            cors_allowed_origins=self.config['socket'].CORS_ALLOWED_ORIGINS,
+            **options
+        )
+        
+        # Métriques de l'hôte échantillonnées en tâche de fond
+        self.metrics = HostMetricsCollector(
+            interval=self.config['metrics'].SAMPLE_INTERVAL,
+            history_size=self.config['metrics'].HISTORY_SIZE,
+            network_capacity=self.config['metrics'].NETWORK_CAPACITY,
+            storage_path=str(self.config['database'].DB_PATH.parent)
+        )
+        
+        # Flux des logs : filtres et tampons par client
+        socket_config = self.config['socket']
+        self.log_streamer = LogStreamer(
+            self.socketio,
+            self.log_bus,
+            max_buffer=socket_config.LOG_STREAM_BUFFER,
+            max_batch=socket_config.LOG_STREAM_BATCH,
+            flush_interval=socket_config.LOG_STREAM_INTERVAL,
+            ack_timeout=socket_config.LOG_STREAM_ACK_TIMEOUT
+        )
+        
+        # Statut système calculé une fois par intervalle pour tous les clients
+        self.status_broadcaster = StatusBroadcaster(
+            self.socketio,
+            self.build_system_status,
+            interval=self.config['socket'].STATUS_BROADCAST_INTERVAL,
+            shared=cluster.WORKERS > 1
         )
         
         # Routes
@@ -65,10 +144,167 @@ class MiftahApp:
     def setup_database(self):
         """Configuration base de données SQLCipher"""
         try:
+            security = self.config['security']
+            password_service = PasswordService(
+                max_concurrency=security.HASH_MAX_CONCURRENCY,
+                time_cost=security.ARGON2_TIME_COST,
+                memory_cost=security.ARGON2_MEMORY_COST,
+                parallelism=security.ARGON2_PARALLELISM
+            )
             self.db = DatabaseManager(
                 db_path=str(self.config['database'].DB_PATH),
-                db_key=self.config['database'].DB_KEY
+                db_key=self.config['database'].DB_KEY,
+                pool_size=self.config['database'].POOL_SIZE,
+                pool_timeout=self.config['database'].POOL_TIMEOUT,
+                pool_recycle=self.config['database'].POOL_RECYCLE,
+                password_service=password_service,
+                max_page_size=self.config['logs'].MAX_PAGE_SIZE,
+                partition_dir=self.config['database'].PARTITION_DIR,
+                partition_hot_months=self.config['database'].PARTITION_HOT_MONTHS,
+                journal_mode=self.config['database'].JOURNAL_MODE,
+                synchronous=self.config['database'].SYNCHRONOUS,
+                busy_timeout=self.config['database'].BUSY_TIMEOUT,
+                cache_size=self.config['database'].CACHE_SIZE,
+                mmap_size=self.config['database'].MMAP_SIZE,
+                journal_size_limit=self.config['database'].JOURNAL_SIZE_LIMIT,
+                cache_ttl=self.config['database'].QUERY_CACHE_TTL,
+                max_login_attempts=security.MAX_LOGIN_ATTEMPTS,
+                lockout_duration=security.LOCKOUT_DURATION,
+                rollup_horizons=self.config['database'].ROLLUP_HORIZONS,
+                stats_max_points=self.config['logs'].STATS_MAX_POINTS
+            )
+            self.db.log_bus = self.log_bus
+            self.db.start_log_writer(
+                max_queue=self.config['database'].LOG_QUEUE_SIZE,
+                batch_size=self.config['database'].LOG_BATCH_SIZE,
+                flush_interval=self.config['database'].LOG_FLUSH_INTERVAL,
+                overflow_policy=self.config['database'].LOG_OVERFLOW_POLICY
+            )
+            self.retention = RetentionWorker(
+                self.db.get_connection,
+                build_policies(
+                    self.config['database'].RETENTION_DAYS,
+                    self.config['database'].LOG_LEVEL_RETENTION_DAYS
+                ),
+                batch_size=self.config['database'].RETENTION_BATCH_SIZE,
+                interval=self.config['database'].RETENTION_INTERVAL,
+                archive_dir=(self.config['database'].RETENTION_ARCHIVE_DIR
+                             if self.config['database'].RETENTION_ARCHIVE else None),
+                partitions=self.db.partitions,
+                rollups=self.db.rollups,
+                write_transaction=self.db.write_transaction
             )
+            # Tentatives de connexion : refus en mémoire avant Argon2 et base
+            self.login_limiter = LoginLimiter(
+                self.db,
+                max_attempts=security.MAX_LOGIN_ATTEMPTS,
+                lockout_duration=security.LOCKOUT_DURATION,
+                ip_rate=security.LOGIN_IP_RATE,
+                ip_burst=security.LOGIN_IP_BURST,
+                max_entries=security.LOGIN_LIMITER_MAX_ENTRIES,
+                sync_interval=security.LOGIN_SYNC_INTERVAL,
+                summary_interval=security.LOGIN_SUMMARY_INTERVAL
+            )
+            self.login_limiter.load()
+            self.checkpoints = CheckpointScheduler(
+                self.db.get_connection,
+                self.config['database'].DB_PATH,
+                interval=self.config['database'].CHECKPOINT_INTERVAL,
+                max_wal_bytes=self.config['database'].WAL_MAX_BYTES
+            )
+            
+            # Vivacité des agents : battements en mémoire, écriture groupée
+            agents = self.config['agents']
+            self.agent_registry = AgentRegistry(
+                self.db,
+                timeout=agents.AGENT_TIMEOUT,
+                flush_interval=agents.REGISTRY_FLUSH_INTERVAL,
+                tick=agents.REGISTRY_TICK,
+                on_transition=self.emit_agent_transition
+            )
+            self.agent_registry.load()
+            
+            # Canal de commandes : passerelles externes si configurées, sinon socket ROUTER local
+            if agents.GATEWAY_UPLINKS:
+                self.agent_transport = GatewayPool(
+                    self.db,
+                    self.agent_registry,
+                    agents.GATEWAY_UPLINKS,
+                    max_pending=agents.MAX_PENDING_COMMANDS,
+                    command_timeout=agents.COMMAND_TIMEOUT,
+                    max_agents=agents.MAX_AGENTS,
+                    auto_register=agents.AUTO_REGISTER,
+                    gateway_timeout=agents.GATEWAY_TIMEOUT
+                )
+            else:
+                self.agent_transport = AgentTransport(
+                    self.db,
+                    self.agent_registry,
+                    endpoint=agents.TRANSPORT_ENDPOINT,
+                    sndhwm=agents.TRANSPORT_SNDHWM,
+                    rcvhwm=agents.TRANSPORT_RCVHWM,
+                    max_pending=agents.MAX_PENDING_COMMANDS,
+                    command_timeout=agents.COMMAND_TIMEOUT,
+                    heartbeat_interval=agents.HEARTBEAT_INTERVAL,
+                    max_agents=agents.MAX_AGENTS,
+                    auto_register=agents.AUTO_REGISTER,
+                    secret_key=agents.GATEWAY_SECRET_KEY if agents.ENCRYPTION_ENABLED else None,
+                    agent_keys=load_agent_keys(agents.AGENT_KEYS_FILE)
+                )
+            
+            # File de commandes persistante : seule à écrire les résultats dans command_history
+            self.command_scheduler = CommandScheduler(
+                self.db,
+                self.agent_registry,
+                self.agent_transport,
+                max_in_flight=agents.MAX_INFLIGHT_PER_AGENT,
+                max_attempts=agents.COMMAND_MAX_ATTEMPTS,
+                attempt_timeout=agents.COMMAND_ATTEMPT_TIMEOUT,
+                retry_backoff=agents.COMMAND_RETRY_BACKOFF,
+                pending_ttl=agents.COMMAND_PENDING_TTL,
+                max_fanout=agents.MAX_AGENTS,
+                tick=agents.SCHEDULER_TICK,
+                on_status=self.emit_command_status,
+                shared=self.config['cluster'].WORKERS > 1,
+                reply_room=user_room
+            )
+            self.agent_transport.on_results = self.command_scheduler.handle_results
+            
+            # PROLITAGE : règles de corrélation évaluées sur le flux des logs
+            prolitage = self.config['modules'].PROLITAGE_CONFIG
+            if prolitage['enabled']:
+                self.prolitage = CorrelationEngine(
+                    self.db,
+                    self.log_bus,
+                    prolitage['rules'],
+                    window_slots=prolitage['window_slots'],
+                    hll_precision=prolitage['hll_precision'],
+                    max_keys=prolitage['max_keys'],
+                    cooldown=prolitage['alert_cooldown'],
+                    max_pending=prolitage['max_pending_alerts'],
+                    tick=prolitage['tick'],
+                    metrics=self.metrics.latest,
+                    resource_limits=prolitage['resource_limits'],
+                    on_alert=self.emit_security_alert
+                )
+            
+            # OMEGA : scans exécutés par le worker qui les reçoit (sessions collantes)
+            omega = self.config['modules'].OMEGA_CONFIG
+            if omega['enabled']:
+                self.omega = OmegaRunner(
+                    self.db,
+                    omega['output_dir'],
+                    max_threads=omega['max_threads'],
+                    scan_timeout=omega['scan_timeout'],
+                    connect_timeout=omega['connect_timeout'],
+                    banner_timeout=omega['banner_timeout'],
+                    allowed_networks=omega['allowed_networks'],
+                    max_probes=omega['max_probes'],
+                    max_queued=omega['max_queued_jobs'],
+                    history_size=omega['history_size'],
+                    progress_interval=omega['progress_interval'],
+                    on_update=self.emit_scan_update
+                )
             logger.info("Base de données SQLCipher connectée")
         except Exception as e:
             logger.error(f"Erreur connexion base de données: {e}")
@@ -89,12 +325,23 @@ class MiftahApp:
             """Authentification"""
             if request.method == 'POST':
                 data = request.get_json()
-                username = data.get('username')
+                username = data.get('username') or ''
                 password = data.get('password')
+                ip_address = request.remote_addr
+                
+                # Refus en mémoire (IP trop active, compte verrouillé) : ni Argon2 ni base
+                allowed, reason, retry_after = self.login_limiter.check(ip_address, username)
+                if not allowed:
+                    retry_after = max(1, math.ceil(retry_after))
+                    response = jsonify({'success': False, 'error': 'Trop de tentatives, réessayez plus tard',
+                                        'retry_after': retry_after})
+                    response.headers['Retry-After'] = str(retry_after)
+                    return response, 429
                 
                 # Authentification via base de données
-                user = self.db.authenticate_user(username, password)
+                user = self.db.authenticate_user(username, password, record_failure=False)
                 if user:
+                    self.login_limiter.record_success(ip_address, username)
                     session['authenticated'] = True
                     session['username'] = username
                     session['user_id'] = user['id']
@@ -109,22 +356,24 @@ class MiftahApp:
                         message=f'Connexion utilisateur: {username}',
                         user_id=user['id'],
                         ip_address=request.remote_addr,
-                        session_id=session.get('session_id')
+                        session_id=session.get('session_id'),
+                        persist=True
                     )
                     
                     logger.info(f"Connexion réussie: {username}")
                     return jsonify({'success': True, 'redirect': '/dashboard'})
                 else:
-                    # Log de tentative échouée
-                    self.db.log_security_event(
-                        level='WARNING',
-                        module='AUTH',
-                        event_type='login_failed',
-                        message=f'Tentative connexion échouée: {username}',
-                        ip_address=request.remote_addr
-                    )
-                    
-                    logger.warning(f"Tentative connexion échouée: {username}")
+                    # Échecs journalisés en résumés périodiques par le limiteur
+                    if self.login_limiter.record_failure(ip_address, username):
+                        self.db.log_security_event(
+                            level='WARNING',
+                            module='AUTH',
+                            event_type='account_locked',
+                            message=f'Compte verrouillé après échecs répétés: {username}',
+                            details={'lockout_duration': self.config['security'].LOCKOUT_DURATION},
+                            ip_address=ip_address
+                        )
+                        logger.warning(f"Compte verrouillé: {username}")
                     return jsonify({'success': False, 'error': 'Identifiants invalides'})
             
             if session.get('authenticated'):
@@ -171,11 +420,34 @@ class MiftahApp:
                 'enabled': module['is_enabled']
             } for module in modules_status}
             
-            return jsonify({
+            # Public : statut grossier seulement
+            status = {
                 'status': 'online',
                 'timestamp': datetime.now().isoformat(),
                 'modules': modules_dict
-            })
+            }
+            if session.get('authenticated'):
+                # Seuils des règles, comptes verrouillés, files : jamais exposés sans session
+                status.update({
+                    'database': self.db.get_pool_stats(),
+                    'log_writer': self.db.get_log_writer_stats(),
+                    'auth': self.db.passwords.get_stats(),
+                    'login_limiter': self.login_limiter.get_stats(),
+                    'log_stream': self.log_streamer.get_stats(),
+                    'retention': self.retention.get_stats(),
+                    'partitions': self.db.get_partition_stats(),
+                    'log_rollups': self.db.rollups.get_stats(),
+                    'locks': self.db.get_lock_stats(),
+                    'cache': self.db.get_cache_stats(),
+                    'agent_registry': self.agent_registry.get_stats(),
+                    'agent_transport': self.agent_transport.get_stats(),
+                    'command_scheduler': self.command_scheduler.get_stats(),
+                    'checkpoint': self.checkpoints.get_stats(),
+                    'prolitage': self.prolitage.get_stats() if self.prolitage else None,
+                    'omega': self.omega.get_stats() if self.omega else None,
+                    'cluster': self.cluster_status()
+                })
+            return jsonify(status)
         
         @self.app.route('/api/agents')
         def api_agents():
@@ -189,17 +461,188 @@ class MiftahApp:
         
         @self.app.route('/api/logs')
         def api_logs():
-            """API - Logs de sécurité"""
+            """API - Logs de sécurité (pagination par curseur)"""
             limit = request.args.get('limit', 50, type=int)
             level = request.args.get('level')
             module = request.args.get('module')
+            since = request.args.get('since')
+            until = request.args.get('until')
             
-            logs = self.db.get_security_logs(limit=limit, level=level, module=module)
+            try:
+                before = decode_cursor(request.args.get('cursor'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            limit = max(1, min(limit, self.config['logs'].MAX_PAGE_SIZE))
+            # Détails déchiffrés uniquement sur demande (?include=details), session requise
+            include_details = 'details' in request.args.get('include', '').split(',')
+            if include_details and not session.get('authenticated'):
+                return jsonify({'error': 'Non authentifié'}), 401
+            logs = self.db.get_security_logs(limit=limit, level=level, module=module, before=before,
+                                             since=since, until=until, include_details=include_details)
             return jsonify({
                 'logs': logs,
-                'total': len(logs)
+                'total': len(logs),
+                'next_cursor': next_cursor(logs, limit)
             })
         
+        @self.app.route('/api/logs/search')
+        def api_logs_search():
+            """API - Recherche plein texte (pertinence ou ordre chronologique inverse)"""
+            if not session.get('authenticated'):
+                return jsonify({'error': 'Non authentifié'}), 401
+            
+            logs_config = self.config['logs']
+            limit = max(1, min(request.args.get('limit', 50, type=int), logs_config.MAX_PAGE_SIZE))
+            sort = request.args.get('sort', SORT_RANK)
+            if sort not in (SORT_RANK, SORT_TIME):
+                return jsonify({'error': f"Tri inconnu: {sort}"}), 400
+            offset = max(0, request.args.get('offset', 0, type=int))
+            if offset > logs_config.SEARCH_MAX_OFFSET:
+                return jsonify({'error': f"Décalage maximal: {logs_config.SEARCH_MAX_OFFSET} "
+                                         f"(affiner la requête ou trier par date)"}), 400
+            
+            try:
+                before = decode_cursor(request.args.get('cursor'))
+                logs = self.db.search_security_logs(
+                    request.args.get('q', ''),
+                    limit=limit,
+                    sort=sort,
+                    offset=offset,
+                    before_id=before[1] if before else None,
+                    since=request.args.get('since'),
+                    until=request.args.get('until'),
+                    level=request.args.get('level'),
+                    module=request.args.get('module'),
+                    raw=request.args.get('syntax') == 'fts'
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            result = {'logs': logs, 'total': len(logs), 'sort': sort}
+            if sort == SORT_TIME:
+                result['next_cursor'] = next_cursor(logs, limit)
+            else:
+                result['next_offset'] = next_offset(logs, offset, limit, logs_config.SEARCH_MAX_OFFSET)
+            return jsonify(result)
+        
+        @self.app.route('/api/logs/stats')
+        def api_logs_stats():
+            """API - Histogramme des événements (compteurs pré-agrégés, UTC)"""
+            if not session.get('authenticated'):
+                return jsonify({'error': 'Non authentifié'}), 401
+            
+            now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+            try:
+                stats = self.db.get_log_stats(
+                    since=request.args.get('since') or (now - timedelta(hours=24)).isoformat(' '),
+                    until=request.args.get('until') or (now + timedelta(seconds=1)).isoformat(' '),
+                    resolution=request.args.get('resolution'),
+                    level=request.args.get('level'),
+                    module=request.args.get('module'),
+                    event_type=request.args.get('event_type'),
+                    group_by=request.args.get('group_by')
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            if stats is None:
+                return jsonify({'error': 'Compteurs indisponibles'}), 500
+            return jsonify(stats)
+        
+        @self.app.route('/api/logs/<int:log_id>/details')
+        def api_log_details(log_id):
+            """API - Détails déchiffrés d'un log de sécurité"""
+            if not session.get('authenticated'):
+                return jsonify({'error': 'Non authentifié'}), 401
+            
+            log = self.db.get_security_log_details(log_id)
+            if log is None:
+                return jsonify({'error': 'Log introuvable'}), 404
+            return jsonify(log)
+        
+        @self.app.route('/api/commands/batches/<batch_id>')
+        def api_command_batch(batch_id):
+            """API - Avancement d'un lot de commandes (une action opérateur)"""
+            if not session.get('authenticated'):
+                return jsonify({'error': 'Non authentifié'}), 401
+            
+            batch = self.command_scheduler.get_batch(batch_id)
+            if batch is None:
+                return jsonify({'error': 'Lot introuvable'}), 404
+            return jsonify(batch)
+        
+        @self.app.route('/api/logs/export')
+        def api_logs_export():
+            """API - Export NDJSON des logs de sécurité en flux"""
+            if not session.get('authenticated'):
+                return jsonify({'error': 'Non authentifié'}), 401
+            
+            level = request.args.get('level')
+            module = request.args.get('module')
+            logs = self.db.iter_security_logs(
+                level=level,
+                module=module,
+                chunk_size=self.config['logs'].EXPORT_CHUNK_SIZE,
+                since=request.args.get('since'),
+                until=request.args.get('until')
+            )
+            
+            def generate():
+                for log in logs:
+                    yield json.dumps(log, default=str) + '\n'
+            
+            return Response(
+                stream_with_context(generate()),
+                mimetype='application/x-ndjson',
+                headers={'Content-Disposition': 'attachment; filename=miftah-logs.ndjson'}
+            )
+        
+        @self.app.route('/api/metrics/history')
+        def api_metrics_history():
+            """API - Historique des métriques système"""
+            limit = request.args.get('limit', 150, type=int)
+            return jsonify({
+                'current': self.metrics.latest(),
+                'history': self.metrics.history(limit=max(1, limit)),
+                'summary': self.metrics.summary(),
+                'interval': self.metrics.interval
+            })
+        
+        @self.app.route('/api/omega/jobs', methods=['GET', 'POST'])
+        def api_omega_jobs():
+            """API - Scans OMEGA : liste (GET) ou soumission (POST {targets, ports, timeout})"""
+            if not session.get('authenticated'):
+                return jsonify({'error': 'Non authentifié'}), 401
+            if self.omega is None:
+                return jsonify({'error': 'Module OMEGA désactivé'}), 404
+            
+            if request.method == 'GET':
+                return jsonify({'jobs': self.omega.list_jobs()})
+            
+            data = request.get_json(silent=True) or {}
+            try:
+                timeout = float(data['timeout']) if data.get('timeout') else None
+                job = self.omega.submit(data.get('targets'), data.get('ports'), timeout=timeout,
+                                        user_id=session.get('user_id'))
+            except (TypeError, ValueError) as e:
+                return jsonify({'error': str(e)}), 400
+            if job is None:
+                return jsonify({'error': 'File de scans pleine'}), 503
+            return jsonify(job), 202
+        
+        @self.app.route('/api/omega/jobs/<job_id>', methods=['GET', 'DELETE'])
+        def api_omega_job(job_id):
+            """API - Avancement d'un scan (GET) ou annulation (DELETE)"""
+            if not session.get('authenticated'):
+                return jsonify({'error': 'Non authentifié'}), 401
+            if self.omega is None:
+                return jsonify({'error': 'Module OMEGA désactivé'}), 404
+            
+            job = self.omega.cancel(job_id) if request.method == 'DELETE' else self.omega.get_job(job_id)
+            if job is None:
+                return jsonify({'error': 'Scan introuvable'}), 404
+            return jsonify(job)
+        
         @self.app.route('/api/modules')
         def api_modules():
             """API - Statut des modules"""
@@ -223,37 +666,43 @@ class MiftahApp:
         def handle_connect():
             """Connexion WebSocket"""
             logger.info(f"Client connecté: {request.sid}")
+            if session.get('user_id'):
+                # Suivi des commandes de l'opérateur, émis par le worker qui les distribue
+                join_room(user_room(session['user_id']))
             emit('status', {'message': 'Connexion établie'})
         
         @self.socketio.on('disconnect')
         def handle_disconnect():
             """Déconnexion WebSocket"""
+            self.status_broadcaster.unsubscribe(request.sid)
+            self.log_streamer.unsubscribe(request.sid)
             logger.info(f"Client déconnecté: {request.sid}")
         
         @self.socketio.on('system_status')
         def handle_system_status():
-            """Demande statut système"""
-            # Récupérer les métriques réelles
-            agents = self.db.get_agents()
-            active_agents = len([a for a in agents if a['status'] == 'active'])
-            
-            modules = self.db.get_module_status()
-            modules_status = {module['module_name'].lower(): module['status'] for module in modules}
-            
-            emit('system_status', {
-                'agents': {
-                    'total': len(agents),
-                    'active': active_agents,
-                    'offline': len(agents) - active_agents
-                },
-                'modules': modules_status,
-                'timestamp': datetime.now().isoformat(),
-                'system': {
-                    'cpu': 23,  # TODO: Métriques système réelles
-                    'memory': 45,
-                    'network': 12
-                }
-            })
+            """Demande statut système : premier affichage puis abonnement aux mises à jour"""
+            join_room(STATUS_ROOM)
+            self.status_broadcaster.subscribe(request.sid)
+            emit('system_status', self.status_broadcaster.get_snapshot())
+        
+        @self.socketio.on('subscribe_logs')
+        def handle_subscribe_logs(data=None):
+            """Abonnement au flux des logs : {levels, modules, agent_ids}, filtrés côté serveur"""
+            if not session.get('authenticated'):
+                emit('error', {'message': 'Non authentifié'})
+                return
+            data = data or {}
+            filters = self.log_streamer.subscribe(
+                request.sid,
+                levels=data.get('levels') or data.get('level'),
+                modules=data.get('modules') or data.get('module'),
+                agent_ids=data.get('agent_ids') or data.get('agent_id')
+            )
+            emit('logs_subscribed', filters)
+        
+        @self.socketio.on('unsubscribe_logs')
+        def handle_unsubscribe_logs():
+            self.log_streamer.unsubscribe(request.sid)
         
         @self.socketio.on('module_changed')
         def handle_module_changed(data):
@@ -281,31 +730,116 @@ class MiftahApp:
                 emit('error', {'message': 'Non authentifié'})
                 return
             
-            agent_id = data.get('agent_id')
             command = data.get('command')
-            parameters = data.get('parameters', {})
+            if not command:
+                emit('error', {'message': 'Commande manquante'})
+                return
             
-            # Enregistrer la commande
-            command_id = self.db.log_command(
-                user_id=user_id,
-                module='AGENT',
-                command=command,
-                parameters=parameters,
-                agent_id=agent_id,
-                session_id=session.get('session_id')
+            # Cible : agent_id, liste agent_ids, ou filtre target {type, status, location, all}
+            target = data.get('target') or {}
+            agent_ids = self.command_scheduler.resolve_targets(
+                agent_id=data.get('agent_id'),
+                agent_ids=data.get('agent_ids'),
+                agent_type=target.get('type'),
+                status=target.get('status'),
+                location=target.get('location'),
+                all_agents=bool(target.get('all'))
             )
+            if not agent_ids:
+                emit('error', {'message': 'Aucun agent ciblé'})
+                return
+            
+            try:
+                priority = int(data.get('priority', 0))
+                max_attempts = int(data['max_attempts']) if data.get('max_attempts') else None
+                timeout = float(data['timeout']) if data.get('timeout') else None
+            except (TypeError, ValueError):
+                emit('error', {'message': 'Paramètres de commande invalides'})
+                return
+            
+            # Une action opérateur = un lot, inséré en une transaction
+            batch = self.command_scheduler.submit(
+                user_id,
+                command,
+                data.get('parameters', {}),
+                targets=agent_ids,
+                priority=priority,
+                max_attempts=max_attempts,
+                timeout=timeout,
+                session_id=session.get('session_id'),
+                sid=request.sid
+            )
+            if batch is None:
+                emit('error', {'message': 'Commande non enregistrée'})
+                return
             
             # Log de sécurité
+            target_label = agent_ids[0] if batch['count'] == 1 else f"{batch['count']} agents"
             self.db.log_security_event(
                 level='INFO',
                 module='AGENT',
                 event_type='command_sent',
-                message=f'Commande envoyée à {agent_id}: {command}',
+                message=f'Commande envoyée à {target_label}: {command}',
+                details={'batch_id': batch['batch_id'], 'count': batch['count'], 'priority': priority},
                 user_id=user_id,
-                agent_id=agent_id
+                agent_id=agent_ids[0] if batch['count'] == 1 else None
             )
             
-            emit('command_logged', {'command_id': command_id})
+            emit('command_logged', batch)
+    
+    def emit_agent_transition(self, agent_id: str, status: str, info: dict):
+        """Pousse un passage en ligne / hors ligne aux clients du statut système"""
+        self.socketio.emit('agent_status', info, to=STATUS_ROOM)
+        if self.prolitage is not None:
+            self.prolitage.observe_agent(agent_id, status, STATUS_OFFLINE)
+    
+    def emit_security_alert(self, alert: dict):
+        """Pousse une alerte PROLITAGE aux clients du statut système"""
+        self.socketio.emit('security_alert', alert, to=STATUS_ROOM)
+    
+    def emit_scan_update(self, job: dict):
+        """Pousse l'avancement d'un scan OMEGA à l'opérateur qui l'a lancé"""
+        if job.get('user_id'):
+            self.socketio.emit('omega_job', job, to=user_room(job['user_id']))
+    
+    def emit_command_status(self, sid: str, event: str, payload: dict):
+        """Pousse l'avancement d'une commande ou d'un lot au client qui l'a émis"""
+        self.socketio.emit(event, payload, to=sid)
+    
+    def cluster_status(self) -> dict:
+        """Worker courant et chef élu (mode multi-processus)"""
+        cluster = self.config['cluster']
+        status = {'workers': cluster.WORKERS, 'worker': cluster.WORKER_INDEX,
+                  'message_queue': cluster.MESSAGE_QUEUE or None}
+        if self.leader is not None:
+            status['leader'] = self.leader.get_stats()
+        return status
+    
+    def build_system_status(self) -> dict:
+        """Snapshot du statut système (agents, modules, ressources)"""
+        # Comptes tenus en mémoire par le registre : aucune lecture de la table agents
+        agents = self.agent_registry.get_counts()
+        
+        modules = self.db.get_module_status()
+        modules_status = {module['module_name'].lower(): module['status'] for module in modules}
+        
+        return {
+            'agents': agents,
+            'modules': modules_status,
+            'timestamp': datetime.now().isoformat(),
+            'system': self.system_metrics()
+        }
+    
+    def system_metrics(self) -> dict:
+        """Dernières métriques de l'hôte, arrondies pour l'affichage"""
+        sample = self.metrics.latest()
+        if not sample:
+            return {'cpu': None, 'memory': None, 'network': None}
+        return {
+            'cpu': round(sample['cpu']),
+            'memory': round(sample['memory']),
+            'network': round(sample['network'])
+        }
     
     def setup_security_headers(self):
         """Configuration headers sécurisés"""
@@ -328,13 +862,96 @@ class MiftahApp:
         logger.info("🛡️  MIFTAH Hub - Démarrage")
         logger.info(f"Mode: {'DEBUG' if self.config['app'].DEBUG else 'PRODUCTION'}")
         
+        # État propre à chaque worker (sessions collantes : une IP reste sur le même worker)
+        self.login_limiter.start(self.socketio.start_background_task, self.socketio.sleep)
+        # Lecture de /proc, propre à l'hôte : chaque worker sert /api/metrics/history depuis son tampon
+        self.metrics.start(self.socketio.start_background_task, self.socketio.sleep)
+        self.log_streamer.start(self.socketio.start_background_task, self.socketio.sleep)
+        if self.omega is not None:
+            self.omega.start(self.socketio.start_background_task, self.socketio.sleep)
+        
+        # Tâches de fond : directement en processus unique, sinon par le seul worker élu
+        cluster = self.config['cluster']
+        if cluster.WORKERS > 1:
+            logger.info(f"Worker {cluster.WORKER_INDEX + 1}/{cluster.WORKERS}")
+            self.leader = LeaderElection(
+                cluster.LEADER_LOCK,
+                identity=f"worker-{cluster.WORKER_INDEX}",
+                retry_interval=cluster.LEADER_RETRY_INTERVAL,
+                follow_interval=cluster.FOLLOWER_SYNC_INTERVAL,
+                on_elected=self.start_background_jobs,
+                on_follow=self.agent_registry.refresh
+            )
+            self.leader.start(self.socketio.start_background_task, self.socketio.sleep)
+        else:
+            self.start_background_jobs()
+        
         # Lancement serveur
-        self.socketio.run(
-            self.app,
-            host=self.config['app'].HOST,
-            port=self.config['app'].PORT,
-            debug=self.config['app'].DEBUG
-        )
+        try:
+            if cluster.WORKERS > 1:
+                self.serve_worker(self.config['app'].HOST, self.config['app'].PORT)
+            else:
+                self.socketio.run(
+                    self.app,
+                    host=self.config['app'].HOST,
+                    port=self.config['app'].PORT,
+                    debug=self.config['app'].DEBUG
+                )
+        finally:
+            self.shutdown()
+    
+    def start_background_jobs(self):
+        """Tâches à exécuter une seule fois : processus unique ou worker élu chef"""
+        if self.leader is not None:
+            # Relève d'un ancien chef : repartir de l'état qu'il a écrit
+            self.agent_registry.load()
+        self.command_scheduler.recover()
+        
+        self.status_broadcaster.start()
+        self.retention.start(self.socketio.start_background_task, self.socketio.sleep)
+        self.checkpoints.start(self.socketio.start_background_task, self.socketio.sleep)
+        self.agent_registry.start(self.socketio.start_background_task, self.socketio.sleep)
+        self.agent_transport.start(self.socketio.start_background_task, self.socketio.sleep)
+        self.command_scheduler.start(self.socketio.start_background_task, self.socketio.sleep)
+        if self.prolitage is not None:
+            self.prolitage.start(self.socketio.start_background_task, self.socketio.sleep)
+    
+    def serve_worker(self, host: str, port: int):
+        """Worker derrière le répartiteur : adresse du client lue dans l'en-tête PROXY"""
+        import eventlet
+        import eventlet.wsgi
+        listener = ProxyProtocolListener(eventlet.listen((host, port)))
+        eventlet.wsgi.server(listener, self.app, log_output=self.config['app'].DEBUG)
+    
+    def shutdown(self):
+        """Arrêt propre : vidage des logs en file et fermeture de la base"""
+        if self.status_broadcaster:
+            self.status_broadcaster.stop()
+        if self.metrics:
+            self.metrics.stop()
+        if self.retention:
+            self.retention.stop()
+        if self.checkpoints:
+            self.checkpoints.stop()
+        if self.omega:
+            self.omega.stop()
+        if self.prolitage:
+            self.prolitage.stop()
+        if self.command_scheduler:
+            self.command_scheduler.stop()
+        if self.agent_transport:
+            self.agent_transport.stop()
+        if self.agent_registry:
+            self.agent_registry.stop()
+        if self.log_streamer:
+            self.log_streamer.stop()
+        if self.login_limiter:
+            self.login_limiter.stop()
+        if self.leader:
+            self.leader.stop()
+        if self.db:
+            self.db.close()
+            logger.info("Base de données fermée")
 
 def main():
     """Point d'entrée principal"""
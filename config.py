@@ -29,11 +29,24 @@ class SecurityConfig:
     ENCRYPTION_KEY = os.environ.get('MIFTAH_ENCRYPTION_KEY')
     HASH_ROUNDS = 12
     
+    # Argon2 (un changement de paramètres est appliqué au prochain login)
+    ARGON2_TIME_COST = int(os.environ.get('MIFTAH_ARGON2_TIME_COST', 3))
+    ARGON2_MEMORY_COST = int(os.environ.get('MIFTAH_ARGON2_MEMORY_COST', 65536))  # KiB
+    ARGON2_PARALLELISM = int(os.environ.get('MIFTAH_ARGON2_PARALLELISM', 4))
+    HASH_MAX_CONCURRENCY = int(os.environ.get('MIFTAH_HASH_MAX_CONCURRENCY', 2))
+    
     # Sessions
     SESSION_TIMEOUT = 3600  # 1 heure
     MAX_LOGIN_ATTEMPTS = 3
     LOCKOUT_DURATION = 900  # 15 minutes
     
+    # Limiteur de connexion (mémoire, avant tout hachage)
+    LOGIN_IP_RATE = 0.2  # tentatives par seconde et par IP (12/min) ...
+    LOGIN_IP_BURST = 10  # ... après une rafale de 10
+    LOGIN_LIMITER_MAX_ENTRIES = 100000  # IP et comptes suivis (éviction LRU)
+    LOGIN_SYNC_INTERVAL = 5  # secondes entre deux écritures des verrouillages dans users
+    LOGIN_SUMMARY_INTERVAL = 60  # secondes par résumé d'échecs journalisé
+    
     # Headers sécurisés
     SECURITY_HEADERS = {
         'X-Content-Type-Options': 'nosniff',
@@ -49,6 +62,56 @@ class DatabaseConfig:
     DB_KEY = os.environ.get('MIFTAH_DB_KEY') or 'change-this-key'
     BACKUP_INTERVAL = 3600  # 1 heure
     
+    # Pool de connexions
+    POOL_SIZE = int(os.environ.get('MIFTAH_DB_POOL_SIZE', 5))
+    POOL_TIMEOUT = 10  # secondes d'attente max pour une connexion
+    POOL_RECYCLE = 3600  # durée de vie max d'une connexion
+    
+    # Journal WAL et réglages par connexion
+    JOURNAL_MODE = 'WAL'
+    SYNCHRONOUS = 'NORMAL'  # FULL pour synchroniser chaque commit
+    BUSY_TIMEOUT = int(os.environ.get('MIFTAH_DB_BUSY_TIMEOUT', 5000))  # ms
+    CACHE_SIZE = -16000  # négatif : en Kio par connexion
+    MMAP_SIZE = 0  # ignoré par SQLCipher (pages chiffrées)
+    JOURNAL_SIZE_LIMIT = 64 * 1024 * 1024
+    CHECKPOINT_INTERVAL = 60  # secondes entre deux checkpoints PASSIVE
+    WAL_MAX_BYTES = 64 * 1024 * 1024  # au-delà : checkpoint TRUNCATE
+    
+    # Cache de lecture module_status / agents (0 pour désactiver)
+    QUERY_CACHE_TTL = 5  # secondes
+    
+    # Écriture asynchrone des logs de sécurité
+    LOG_QUEUE_SIZE = 10000
+    LOG_BATCH_SIZE = 200
+    LOG_FLUSH_INTERVAL = 0.5  # secondes
+    LOG_OVERFLOW_POLICY = 'block'  # block | drop_new | drop_oldest
+    
+    # Rétention des données (jours), purge incrémentale par lots
+    RETENTION_DAYS = {
+        'security_logs': 30,
+        'command_history': 30
+    }
+    LOG_LEVEL_RETENTION_DAYS = {  # exceptions par niveau pour security_logs
+        'DEBUG': 7,
+        'WARNING': 90,
+        'ERROR': 180
+    }
+    RETENTION_INTERVAL = 3600  # secondes entre deux purges
+    RETENTION_BATCH_SIZE = 1000
+    RETENTION_ARCHIVE = True  # archivage compressé avant suppression
+    RETENTION_ARCHIVE_DIR = LOGS_DIR / "archive"
+    
+    # Partitions mensuelles des logs de sécurité (None pour désactiver)
+    PARTITION_DIR = DB_PATH.parent / "partitions"
+    PARTITION_HOT_MONTHS = 2  # mois conservés dans la table principale, mois courant inclus
+    
+    # Compteurs des logs par résolution : jours conservés (None = sans limite), compactés avec la rétention
+    ROLLUP_HORIZONS = {
+        'minute': 2,
+        'hour': 90,
+        'day': None
+    }
+    
 # Configuration Modules
 class ModulesConfig:
     """Configuration des modules SPARTA"""
@@ -56,9 +119,17 @@ class ModulesConfig:
     # OMEGA - Reconnaissance
     OMEGA_CONFIG = {
         'enabled': True,
-        'scan_timeout': 300,
-        'max_threads': 10,
-        'output_dir': LOGS_DIR / "omega"
+        'scan_timeout': 300,  # secondes par scan (délai maximal accepté à la soumission)
+        'max_threads': 10,  # sondes simultanées, tous scans confondus
+        'output_dir': LOGS_DIR / "omega",  # <job_id>.ndjson : ports ouverts puis résumé
+        
+        'connect_timeout': 1.0,  # secondes par tentative de connexion TCP
+        'banner_timeout': 0.5,  # secondes d'attente d'une bannière sur un port ouvert (0 : sans lecture)
+        'allowed_networks': ['127.0.0.0/8', '::1/128'],  # périmètre autorisé des cibles
+        'max_probes': 65536,  # adresses x ports par scan
+        'max_queued_jobs': 20,  # scans en file ou en cours
+        'history_size': 100,  # scans terminés consultables
+        'progress_interval': 2  # secondes entre deux publications de l'avancement
     }
     
     # ATLAS - Cartographie
@@ -74,16 +145,96 @@ class ModulesConfig:
         'enabled': True,
         'analysis_depth': 'deep',
         'report_format': 'json',
-        'output_dir': LOGS_DIR / "prolitage"
+        'output_dir': LOGS_DIR / "prolitage",
+        
+        # Corrélation au fil du flux des logs (core/modules/prolitage.py)
+        'window_slots': 6,  # tranches par fenêtre glissante (précision : fenêtre / tranches)
+        'hll_precision': 6,  # 2^n registres HyperLogLog par tranche pour les comptes distincts
+        'max_keys': 10000,  # clés suivies par règle (IP, utilisateur, agent), éviction LRU
+        'alert_cooldown': 300,  # secondes avant une nouvelle alerte pour la même règle et clé
+        'max_pending_alerts': 1000,
+        'tick': 1,  # secondes entre deux traitements des alertes en file
+        'resource_limits': {'cpu': 90, 'memory': 90, 'storage': 95},  # % au-delà duquel un échantillon compte
+        
+        # Règles : filtre (events, levels, modules), clé de regroupement, `distinct` pour
+        # compter les valeurs distinctes d'un champ, seuil atteint sur `window` secondes
+        'rules': {
+            # Connexions suspectes
+            'login_attack_ip': {
+                'events': ['login_failed_summary', 'account_locked'], 'levels': ['WARNING'],
+                'key': 'ip_address', 'threshold': 3, 'window': 900, 'severity': 'CRITICAL',
+                'message': "Attaque de mots de passe depuis {key}: {value} verrouillages ou refus en {minutes} min"
+            },
+            'user_many_ips': {
+                'events': ['login_success'], 'key': 'user_id', 'distinct': 'ip_address',
+                'threshold': 3, 'window': 3600, 'severity': 'WARNING',
+                'message': "Utilisateur {key} connecté depuis {value} adresses en {minutes} min"
+            },
+            'ip_many_users': {
+                'events': ['login_success'], 'key': 'ip_address', 'distinct': 'user_id',
+                'threshold': 5, 'window': 900, 'severity': 'WARNING',
+                'message': "{value} comptes connectés depuis {key} en {minutes} min"
+            },
+            # Erreurs système
+            'error_burst': {
+                'levels': ['ERROR', 'CRITICAL'], 'key': 'module',
+                'threshold': 10, 'window': 300, 'severity': 'ERROR',
+                'message': "{value} erreurs du module {key} en {minutes} min"
+            },
+            # Agents déconnectés
+            'agents_disconnected': {
+                'events': ['agent_offline'], 'distinct': 'agent_id',
+                'threshold': 10, 'window': 300, 'severity': 'CRITICAL',
+                'message': "{value} agents passés hors ligne en {minutes} min"
+            },
+            'agent_flapping': {
+                'events': ['agent_offline'], 'key': 'agent_id',
+                'threshold': 5, 'window': 3600, 'severity': 'WARNING',
+                'message': "Agent {key} instable: {value} déconnexions en {minutes} min"
+            },
+            # Surcharge ressources (échantillons de MetricsConfig, toutes les 2 s)
+            'resource_overload': {
+                'events': ['resource_high'], 'key': 'resource',
+                'threshold': 20, 'window': 60, 'severity': 'WARNING',
+                'message': "Surcharge {key}: {value} relevés au-delà de la limite en {minutes} min"
+            }
+        }
     }
 
 # Configuration Agents
 class AgentsConfig:
     """Gestion des agents"""
-    MAX_AGENTS = 50
+    MAX_AGENTS = int(os.environ.get('MIFTAH_MAX_AGENTS', 10000))
     HEARTBEAT_INTERVAL = 30
     AGENT_TIMEOUT = 300
-    ENCRYPTION_ENABLED = True
+    REGISTRY_FLUSH_INTERVAL = 10  # secondes entre deux écritures groupées de last_seen/status
+    REGISTRY_TICK = 1  # secondes entre deux balayages des expirations
+    
+    # Transport ZeroMQ (socket ROUTER, une identité par agent_id)
+    TRANSPORT_ENDPOINT = os.environ.get('MIFTAH_AGENT_ENDPOINT', 'tcp://127.0.0.1:5555')
+    TRANSPORT_SNDHWM = 1000  # messages en attente par agent avant contre-pression
+    TRANSPORT_RCVHWM = 1000
+    MAX_PENDING_COMMANDS = 10000  # file d'envoi bornée : refus au-delà
+    COMMAND_TIMEOUT = 300  # secondes sans résultat avant statut 'timeout'
+    AUTO_REGISTER = False  # accepter un agent inconnu qui s'annonce (dans la limite MAX_AGENTS)
+    
+    # File de commandes (command_history)
+    MAX_INFLIGHT_PER_AGENT = 4  # commandes envoyées sans résultat, par agent
+    COMMAND_MAX_ATTEMPTS = 3  # essais pour une commande non livrée ou sans réponse
+    COMMAND_ATTEMPT_TIMEOUT = 60  # secondes d'attente du résultat d'un essai
+    COMMAND_RETRY_BACKOFF = 5  # secondes avant le 2e essai, doublées ensuite
+    COMMAND_PENDING_TTL = 3600  # secondes en file (agent hors ligne) avant échec 'expired'
+    SCHEDULER_TICK = 0.1  # secondes entre deux passages de distribution
+    
+    # Passerelles (python -m core.agents.gateway) : si définies, le hub ne lie aucun socket agents
+    # et s'attache aux canaux internes listés (ex: ipc://.../gateway-0.ipc,ipc://.../gateway-1.ipc)
+    GATEWAY_UPLINKS = [u for u in os.environ.get('MIFTAH_AGENT_GATEWAYS', '').split(',') if u]
+    GATEWAY_BASE_PORT = 5556  # passerelle i : port agents GATEWAY_BASE_PORT + i
+    GATEWAY_TIMEOUT = 5  # secondes sans PING avant de considérer une passerelle perdue
+    GATEWAY_SECRET_KEY = os.environ.get('MIFTAH_GATEWAY_SECRET_KEY')  # clé CURVE (Z85) des connexions agents
+    ENCRYPTION_ENABLED = True  # CURVE + contrôle ZAP des clés agents (hub et passerelles)
+    # Clés publiques CURVE autorisées : JSON {agent_id: clé Z85}, vérifiées par ZAP
+    AGENT_KEYS_FILE = Path(os.environ.get('MIFTAH_AGENT_KEYS') or AGENTS_DIR / 'agent_keys.json')
 
 # Configuration Logs
 class LogsConfig:
@@ -94,6 +245,19 @@ class LogsConfig:
     MAX_LOG_SIZE = 10 * 1024 * 1024  # 10MB
     BACKUP_COUNT = 5
     ENCRYPT_LOGS = True
+    
+    # API /api/logs
+    MAX_PAGE_SIZE = 500  # taille de page maximale imposée par le serveur
+    EXPORT_CHUNK_SIZE = 1000  # lignes lues par tranche lors d'un export NDJSON
+    SEARCH_MAX_OFFSET = 1000  # /api/logs/search : au-delà, trier par date (curseur)
+    STATS_MAX_POINTS = 1500  # /api/logs/stats : intervalles par série au plus
+
+# Configuration Métriques système
+class MetricsConfig:
+    """Échantillonnage des ressources de l'hôte"""
+    SAMPLE_INTERVAL = 2  # secondes
+    HISTORY_SIZE = 900  # échantillons conservés (30 min à 2s)
+    NETWORK_CAPACITY = 125_000_000  # octets/s considérés comme 100% (1 Gbit/s)
 
 # Configuration SocketIO
 class SocketConfig:
@@ -102,6 +266,30 @@ class SocketConfig:
     CORS_ALLOWED_ORIGINS = ["http://localhost:3000", "http://127.0.0.1:3000"]
     PING_TIMEOUT = 60
     PING_INTERVAL = 25
+    STATUS_BROADCAST_INTERVAL = 5  # secondes entre deux snapshots du statut système
+    
+    # Flux temps réel des logs ('subscribe_logs')
+    LOG_STREAM_BUFFER = 200  # événements en attente par client avant omission des plus anciens
+    LOG_STREAM_BATCH = 100  # événements par envoi 'log_entries'
+    LOG_STREAM_INTERVAL = 0.25  # secondes entre deux envois
+    LOG_STREAM_ACK_TIMEOUT = 10  # secondes d'attente de l'accusé d'un lot
+
+class ClusterConfig:
+    """Mode multi-processus (python -m core.cluster.supervisor)"""
+    WORKERS = int(os.environ.get('MIFTAH_WORKERS', 1))
+    WORKER_INDEX = int(os.environ.get('MIFTAH_WORKER_INDEX', 0))
+    WORKER_BASE_PORT = int(os.environ.get('MIFTAH_WORKER_BASE_PORT', 5100))  # worker i : port de base + i
+    RUN_DIR = Path(os.environ.get('MIFTAH_RUN_DIR', BASE_DIR / "run"))
+    
+    # Bus Socket.IO entre workers : 'zmq' (sans courtier), 'local' (tests), '' (processus unique)
+    MESSAGE_QUEUE = os.environ.get('MIFTAH_MESSAGE_QUEUE', 'zmq' if WORKERS > 1 else '')
+    BUS_ENDPOINT = os.environ.get('MIFTAH_BUS_ENDPOINT', f"ipc://{RUN_DIR}/bus-{{}}.ipc")  # {} : index du worker
+    
+    # Élection du chef (tâches de fond exécutées une seule fois)
+    LEADER_LOCK = RUN_DIR / "leader.lock"
+    LEADER_RETRY_INTERVAL = 2  # secondes entre deux tentatives d'un suiveur
+    FOLLOWER_SYNC_INTERVAL = 10  # secondes entre deux relectures des agents par un suiveur
+    RESTART_DELAY = 1  # secondes avant de relancer un worker mort (doublé à chaque rechute)
 
 # Validation environnement
 def validate_environment():
@@ -121,6 +309,12 @@ def validate_environment():
     if Config.SECRET_KEY == 'dev-key-change-in-production' and not Config.DEBUG:
         errors.append("SECRET_KEY par défaut en production")
     
+    # Socket agents hors boucle locale : CURVE obligatoire
+    from core.agents.auth import is_local_endpoint
+    curve = AgentsConfig.ENCRYPTION_ENABLED and AgentsConfig.GATEWAY_SECRET_KEY
+    if not AgentsConfig.GATEWAY_UPLINKS and not curve and not is_local_endpoint(AgentsConfig.TRANSPORT_ENDPOINT):
+        errors.append(f"MIFTAH_AGENT_ENDPOINT {AgentsConfig.TRANSPORT_ENDPOINT} hors boucle locale sans CURVE")
+    
     return errors
 
 # Export configuration
@@ -133,5 +327,7 @@ def get_config():
         'modules': ModulesConfig,
         'agents': AgentsConfig,
         'logs': LogsConfig,
-        'socket': SocketConfig
+        'metrics': MetricsConfig,
+        'socket': SocketConfig,
+        'cluster': ClusterConfig
     }
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+MIFTAH - Authentification des agents (CURVE + ZAP)
+Une clé publique CURVE autorisée par agent ; l'agent_id porté par la clé
+est vérifié sur chaque message reçu
+"""
+
+import ipaddress
+import json
+import logging
+from typing import Dict, Any, List, Optional
+
+from zmq.utils import z85
+
+from core.security.passwords import _eventlet_patched
+
+if _eventlet_patched():
+    from eventlet.green import zmq
+else:
+    import zmq
+
+logger = logging.getLogger(__name__)
+
+ZAP_ENDPOINT = 'inproc://zeromq.zap.01'
+ZAP_DOMAIN = 'miftah-agents'
+_ZAP_VERSION = b'1.0'
+
+
+def load_agent_keys(path) -> Dict[str, str]:
+    """Fichier JSON {agent_id: clé publique Z85} ; vide si absent ou illisible"""
+    if not path:
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            keys = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.error(f"Erreur lecture des clés agents {path}: {e}")
+        return {}
+    if not isinstance(keys, dict):
+        logger.error(f"Clés agents {path}: objet {{agent_id: clé}} attendu")
+        return {}
+    return {str(agent_id): str(key) for agent_id, key in keys.items()}
+
+
+def is_local_endpoint(endpoint: str) -> bool:
+    """ipc://, inproc:// ou tcp:// sur une adresse de boucle locale"""
+    transport, _, address = endpoint.partition('://')
+    if transport in ('ipc', 'inproc'):
+        return True
+    host = address.rsplit(':', 1)[0].strip('[]')
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        # '*', 0.0.0.0 résolu plus loin, nom d'interface ou d'hôte : pas la boucle locale
+        return False
+
+
+class AgentAuthenticator:
+    """Gestionnaire ZAP du socket agents, servi par la boucle d'E/S du propriétaire
+
+    Seules les clés publiques CURVE listées sont acceptées ; la réponse
+    ZAP porte l'agent_id de la clé en User-Id, que libzmq attache à chaque
+    message de la connexion. `verify` refuse un message dont l'identité de
+    routage n'est pas cet agent_id : une clé ne parle que pour son agent.
+    Un seul gestionnaire par contexte ZeroMQ.
+    """
+
+    def __init__(self, agent_keys: Dict[str, str], context=None):
+        self._context = context or zmq.Context.instance()
+        self._socket = None
+        self._agents: Dict[bytes, str] = {}
+        self._stats = {'accepted': 0, 'refused': 0, 'mismatched': 0}
+        self.load(agent_keys)
+
+    def load(self, agent_keys: Dict[str, str]):
+        """Remplace les clés autorisées (clés invalides ignorées)"""
+        agents = {}
+        for agent_id, key in agent_keys.items():
+            try:
+                agents[z85.decode(key.encode())] = agent_id
+            except (ValueError, TypeError):
+                logger.error(f"Clé CURVE invalide pour l'agent {agent_id}")
+        self._agents = agents
+        if not agents:
+            logger.warning("Aucune clé agent autorisée : toute connexion agent sera refusée")
+
+    @property
+    def socket(self):
+        return self._socket
+
+    def bind(self):
+        """Lie le point ZAP ; à faire avant la liaison du socket CURVE"""
+        socket = self._context.socket(zmq.REP)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.bind(ZAP_ENDPOINT)
+        self._socket = socket
+
+    def secure(self, socket, secret_key: str):
+        """Passe un socket en serveur CURVE authentifié par ce gestionnaire"""
+        if self._socket is None:
+            self.bind()
+        socket.curve_secretkey = secret_key.encode()
+        socket.curve_publickey = zmq.curve_public(secret_key.encode())
+        socket.curve_server = True
+        socket.zap_domain = ZAP_DOMAIN.encode()
+
+    def handle(self) -> int:
+        """Répond aux demandes ZAP en attente ; retourne leur nombre"""
+        handled = 0
+        while True:
+            try:
+                request = self._socket.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return handled
+            handled += 1
+            self._socket.send_multipart(self._answer(request))
+
+    def _answer(self, request: List[bytes]) -> List[bytes]:
+        # version, request_id, domaine, adresse, identité, mécanisme, identifiants...
+        if len(request) < 6 or request[0] != _ZAP_VERSION:
+            return [_ZAP_VERSION, request[1] if len(request) > 1 else b'', b'500', b'Bad request', b'', b'']
+        request_id, domain, address, mechanism = request[1], request[2], request[3], request[5]
+        agent_id = None
+        if domain == ZAP_DOMAIN.encode() and mechanism == b'CURVE' and len(request) > 6:
+            agent_id = self._agents.get(request[6])
+        if agent_id is None:
+            self._stats['refused'] += 1
+            logger.warning(f"Connexion agent refusée (clé inconnue) depuis {address.decode(errors='replace')}")
+            return [_ZAP_VERSION, request_id, b'400', b'Unknown key', b'', b'']
+        self._stats['accepted'] += 1
+        return [_ZAP_VERSION, request_id, b'200', b'OK', agent_id.encode(), b'']
+
+    def verify(self, frames: list) -> Optional[str]:
+        """Identité de routage d'un message reçu (copy=False) si elle est celle de sa clé"""
+        try:
+            agent_id = frames[0].bytes.decode()
+            user_id = frames[1].get('User-Id') if len(frames) > 1 else None
+        except (UnicodeDecodeError, zmq.ZMQError):
+            return None
+        if user_id != agent_id:
+            self._stats['mismatched'] += 1
+            return None
+        return agent_id
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close(0)
+            self._socket = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['keys'] = len(self._agents)
+        return stats
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+MIFTAH - Passerelle agents
+Processus dédié aux connexions agents : sockets, battements et chiffrement
+
+Usage : python -m core.agents.gateway [--listen tcp://0.0.0.0:5556] [--uplink ipc://...]
+        python -m core.agents.gateway --workers 4 [--base-port 5556]
+
+La passerelle termine les connexions agents (socket ROUTER, CURVE et
+contrôle ZAP des clés agents si une clé secrète est configurée ; sans
+clé, boucle locale uniquement) et absorbe les battements. Seuls les
+changements d'état et les résultats de commandes remontent au hub, par
+lots, sur un canal interne (DEALER, ipc:// par défaut) auquel le hub
+s'attache. Plusieurs passerelles, une par cœur, servent un même hub.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import signal
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+# Ajouter le répertoire parent au path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from core.security.passwords import _eventlet_patched
+from core.agents.registry import AgentRegistry, STATUS_ONLINE
+from core.agents.auth import AgentAuthenticator, is_local_endpoint, load_agent_keys
+from core.agents.transport import (MSG_HELLO, MSG_WELCOME, MSG_REJECT, MSG_HEARTBEAT,
+                                   MSG_COMMAND, MSG_RESULT, PEER_HEARTBEAT_IVL,
+                                   PEER_HEARTBEAT_TIMEOUT, encode, decode)
+
+if _eventlet_patched():
+    from eventlet.green import zmq
+else:
+    import zmq
+
+logger = logging.getLogger(__name__)
+
+# Canal passerelle -> hub
+UP_JOIN = b'JOIN'           # agent inconnu de la passerelle : {agent_id, name, type, location}
+UP_STATE = b'STATE'         # transitions : {agents: [{agent_id, status, location, at}]}
+UP_RESULTS = b'RESULTS'     # résultats : {results: [{id, agent_id, status, result, execution_time}]}
+UP_PING = b'PING'           # présence de la passerelle : {name, online, stats}
+
+# Canal hub -> passerelle
+DOWN_ADMIT = b'ADMIT'       # {agent_id}
+DOWN_DENY = b'DENY'         # {agent_id, reason}
+DOWN_COMMAND = b'CMD'       # {id, agent_id, command, parameters}
+DOWN_SYNC = b'SYNC'         # renvoyer l'état complet des agents en ligne
+
+
+def default_uplink(index: int = 0) -> str:
+    """Canal interne par défaut d'une passerelle du pool"""
+    from config import AGENTS_DIR
+    return f"ipc://{AGENTS_DIR / f'gateway-{index}.ipc'}"
+
+
+class AgentGateway:
+    """Terminaison des connexions agents pour un hub
+
+    Les battements ne quittent pas la passerelle : le registre local les
+    absorbe et seules les transitions en ligne / hors ligne sont remontées,
+    fusionnées par agent entre deux envois. Un agent inconnu est soumis au
+    hub (JOIN), qui décide de son admission ; les agents admis sont gardés
+    en mémoire pour les reconnexions.
+
+    Avec `secret_key`, seuls les agents dont la clé publique figure dans
+    `agent_keys` sont admis au niveau ZAP, chacun sous son propre agent_id.
+    """
+
+    def __init__(self, agent_endpoint: str, uplink_endpoint: str, name: str = None,
+                 sndhwm: int = 1000, rcvhwm: int = 1000, uplink_hwm: int = 100000,
+                 timeout: float = 300, heartbeat_interval: float = 30, command_timeout: float = 300,
+                 secret_key: str = None, agent_keys: Dict[str, str] = None,
+                 max_buffered_results: int = 100000, deny_ttl: float = 30,
+                 flush_interval: float = 0.05, ping_interval: float = 1.0,
+                 poll_timeout: float = 0.01, context=None):
+        self.agent_endpoint = agent_endpoint
+        self.uplink_endpoint = uplink_endpoint
+        self.name = name or agent_endpoint
+        self.sndhwm = sndhwm
+        self.rcvhwm = rcvhwm
+        self.uplink_hwm = uplink_hwm
+        self.heartbeat_interval = heartbeat_interval
+        self.command_timeout = command_timeout
+        self.secret_key = secret_key
+        self.agent_keys = agent_keys or {}
+        self.max_buffered_results = max_buffered_results
+        self.deny_ttl = deny_ttl
+        self.flush_interval = flush_interval
+        self.ping_interval = ping_interval
+        self.poll_timeout = poll_timeout
+
+        # Registre sans base : balayé par la boucle, jamais écrit
+        self.registry = AgentRegistry(None, timeout=timeout, on_transition=self._on_transition)
+
+        self._context = context or zmq.Context.instance()
+        self._agents = None
+        self._uplink = None
+        self._auth = None
+        self._running = False
+        self._joining: Dict[str, Dict[str, Any]] = {}
+        self._denied: Dict[str, float] = {}  # agent_id -> fin du refus mémorisé
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._results: List[Dict[str, Any]] = []
+        self._outbox = deque()
+        self._in_flight: Dict[int, tuple] = {}
+        self._stalled = False
+        self._last_flush = 0.0
+        self._last_ping = 0.0
+        self._last_tick = 0.0
+        self._stats = {
+            'commands_sent': 0,
+            'results': 0,
+            'undeliverable': 0,
+            'timeouts': 0,
+            'hwm_stalls': 0,
+            'joins': 0,
+            'denied': 0,
+            'state_batches': 0,
+            'uplink_stalls': 0,
+            'results_dropped': 0,
+            'unauthenticated': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    def bind(self):
+        """Ouvre le socket agents (ROUTER) et le canal hub (DEALER)
+
+        ValueError pour une adresse agents hors boucle locale sans clé CURVE.
+        """
+        if not self.secret_key and not is_local_endpoint(self.agent_endpoint):
+            raise ValueError(f"Passerelle {self.name} sur {self.agent_endpoint} sans CURVE : "
+                             f"définir MIFTAH_GATEWAY_SECRET_KEY ou écouter sur la boucle locale")
+        agents = self._context.socket(zmq.ROUTER)
+        agents.setsockopt(zmq.SNDHWM, self.sndhwm)
+        agents.setsockopt(zmq.RCVHWM, self.rcvhwm)
+        agents.setsockopt(zmq.LINGER, 0)
+        agents.setsockopt(zmq.ROUTER_MANDATORY, 1)
+        # Pas de ROUTER_HANDOVER : une seconde connexion sous un agent_id déjà
+        # connecté est refusée, la route en place est conservée
+        agents.setsockopt(zmq.HEARTBEAT_IVL, PEER_HEARTBEAT_IVL)
+        agents.setsockopt(zmq.HEARTBEAT_TIMEOUT, PEER_HEARTBEAT_TIMEOUT)
+        if self.secret_key:
+            # Chiffrement CURVE, clés agents vérifiées par ZAP
+            self._auth = AgentAuthenticator(self.agent_keys, self._context)
+            self._auth.secure(agents, self.secret_key)
+        if self.agent_endpoint.endswith(':0'):
+            port = agents.bind_to_random_port(self.agent_endpoint[:-2])
+            self.agent_endpoint = f"{self.agent_endpoint[:-2]}:{port}"
+        else:
+            agents.bind(self.agent_endpoint)
+
+        if self.uplink_endpoint.startswith('ipc://'):
+            Path(self.uplink_endpoint[len('ipc://'):]).parent.mkdir(parents=True, exist_ok=True)
+        uplink = self._context.socket(zmq.DEALER)
+        uplink.setsockopt(zmq.SNDHWM, self.uplink_hwm)
+        uplink.setsockopt(zmq.RCVHWM, self.uplink_hwm)
+        uplink.setsockopt(zmq.LINGER, 0)
+        uplink.bind(self.uplink_endpoint)
+
+        self._agents = agents
+        self._uplink = uplink
+        logger.info(f"Passerelle {self.name}: agents sur {self.agent_endpoint}, hub sur {self.uplink_endpoint}"
+                    f"{' (CURVE)' if self.secret_key else ''}")
+
+    def serve_forever(self):
+        if self._agents is None:
+            self.bind()
+        poller = zmq.Poller()
+        poller.register(self._agents, zmq.POLLIN)
+        poller.register(self._uplink, zmq.POLLIN)
+        if self._auth is not None:
+            poller.register(self._auth.socket, zmq.POLLIN)
+        self._running = True
+        try:
+            while self._running:
+                self.run_once(poller)
+        finally:
+            self.close()
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        self._running = False
+        for socket in (self._agents, self._uplink):
+            if socket is not None:
+                socket.close(0)
+        self._agents = self._uplink = None
+        if self._auth is not None:
+            self._auth.close()
+            self._auth = None
+
+    def run_once(self, poller) -> int:
+        """Un tour : réception agents et hub, envoi des commandes, remontées groupées"""
+        handled = 0
+        busy = self._outbox and not self._stalled
+        events = dict(poller.poll(0 if busy else self.poll_timeout * 1000))
+        if self._auth is not None and self._auth.socket in events:
+            self._auth.handle()
+        for socket, handler in ((self._agents, self._on_agent), (self._uplink, self._on_hub)):
+            if socket not in events:
+                continue
+            verify = self._auth is not None and socket is self._agents
+            for _ in range(1000):
+                try:
+                    frames = socket.recv_multipart(zmq.NOBLOCK, copy=not verify)
+                except zmq.Again:
+                    break
+                handled += 1
+                if verify:
+                    if self._auth.verify(frames) is None:
+                        # Identité de routage différente de l'agent de la clé
+                        self._stats['unauthenticated'] += 1
+                        continue
+                    frames = [frame.bytes for frame in frames]
+                handler(frames)
+
+        self._drain_outbox()
+
+        now = time.monotonic()
+        if now - self._last_tick >= 1.0:
+            self._last_tick = now
+            self.registry.sweep()
+            self._expire(now)
+            for agent_id in [a for a, until in self._denied.items() if until <= now]:
+                del self._denied[agent_id]
+        if now - self._last_flush >= self.flush_interval:
+            self._last_flush = now
+            self._flush_uplink()
+        if now - self._last_ping >= self.ping_interval:
+            self._last_ping = now
+            self._send_up(UP_PING, {'name': self.name, 'endpoint': self.agent_endpoint,
+                                    'online': self.registry.get_counts()['active'],
+                                    'stats': self.get_stats()})
+        return handled
+
+    # ------------------------------------------------------------------
+    # Côté agents
+    # ------------------------------------------------------------------
+
+    def _on_agent(self, frames: list):
+        if len(frames) < 2:
+            return
+        try:
+            agent_id = frames[0].decode()
+        except UnicodeDecodeError:
+            return
+        kind = frames[1]
+        payload = decode(frames[2]) if len(frames) > 2 else {}
+
+        if kind == MSG_HEARTBEAT:
+            # Battement d'un agent inconnu (ex: passerelle redémarrée) : nouvelle admission
+            if not self.registry.heartbeat(agent_id, payload.get('location')):
+                self._join(agent_id, payload)
+        elif kind == MSG_RESULT:
+            self._on_result(agent_id, payload)
+        elif kind == MSG_HELLO:
+            if self.registry.is_known(agent_id):
+                self.registry.heartbeat(agent_id, payload.get('location'))
+                self._reply(agent_id, MSG_WELCOME, {'heartbeat_interval': self.heartbeat_interval})
+            else:
+                self._join(agent_id, payload)
+
+    def _join(self, agent_id: str, payload: Dict[str, Any]):
+        if agent_id in self._joining:
+            return
+        if self._denied.get(agent_id, 0) > time.monotonic():
+            # Refus récent : ne pas resolliciter le hub à chaque battement
+            self._reply(agent_id, MSG_REJECT, {'reason': 'unknown_agent'})
+            return
+        self._stats['joins'] += 1
+        self._joining[agent_id] = payload
+        if not self._send_up(UP_JOIN, {'agent_id': agent_id, 'name': payload.get('name'),
+                                       'type': payload.get('type'), 'location': payload.get('location')}):
+            del self._joining[agent_id]
+            self._reply(agent_id, MSG_REJECT, {'reason': 'hub_unavailable'})
+
+    def _on_result(self, agent_id: str, payload: Dict[str, Any]):
+        command_id = payload.get('id')
+        entry = self._in_flight.get(command_id)
+        if entry is None or entry[0] != agent_id:
+            return
+        del self._in_flight[command_id]
+        rtt = time.monotonic() - entry[1]
+        self._stats['results'] += 1
+        self.registry.heartbeat(agent_id)
+
+        execution_time = payload.get('execution_time')
+        if not isinstance(execution_time, (int, float)):
+            execution_time = rtt
+        result = payload.get('result')
+        if result is not None and not isinstance(result, str):
+            result = json.dumps(result)
+        self._add_result(command_id, agent_id, str(payload.get('status') or 'completed'),
+                         result, execution_time)
+
+    def _reply(self, agent_id: str, kind: bytes, payload: Dict[str, Any] = None):
+        try:
+            self._agents.send_multipart([agent_id.encode()] + encode(kind, payload), zmq.NOBLOCK)
+        except zmq.ZMQError:
+            pass
+
+    def _drain_outbox(self):
+        """Envoie les commandes du hub ; un agent au HWM ne bloque pas les autres"""
+        if not self._outbox:
+            self._stalled = False
+            return
+        batch = list(self._outbox)
+        self._outbox.clear()
+        stalled = set()
+        kept = []
+        sent = 0
+        for command in batch:
+            agent_id = command['agent_id']
+            if agent_id in stalled:
+                kept.append(command)
+                continue
+            try:
+                self._agents.send_multipart([agent_id.encode()] + encode(MSG_COMMAND, {
+                    'id': command['id'], 'command': command['command'],
+                    'parameters': command.get('parameters') or {}
+                }), zmq.NOBLOCK)
+            except zmq.Again:
+                stalled.add(agent_id)
+                kept.append(command)
+                continue
+            except zmq.ZMQError as e:
+                if e.errno != zmq.EHOSTUNREACH:
+                    raise
+                self._stats['undeliverable'] += 1
+                self._add_result(command['id'], agent_id, 'undeliverable', None, None)
+                continue
+            sent += 1
+            self._in_flight[command['id']] = (agent_id, time.monotonic())
+
+        self._stats['commands_sent'] += sent
+        self._stats['hwm_stalls'] += len(stalled)
+        self._outbox.extendleft(reversed(kept))
+        self._stalled = sent == 0 and bool(kept)
+
+    def _expire(self, now: float):
+        expired = [(command_id, agent_id) for command_id, (agent_id, sent) in self._in_flight.items()
+                   if now - sent > self.command_timeout]
+        for command_id, agent_id in expired:
+            del self._in_flight[command_id]
+            self._add_result(command_id, agent_id, 'timeout', None, self.command_timeout)
+        self._stats['timeouts'] += len(expired)
+
+    # ------------------------------------------------------------------
+    # Côté hub
+    # ------------------------------------------------------------------
+
+    def _on_hub(self, frames: list):
+        if not frames:
+            return
+        kind = frames[0]
+        payload = decode(frames[1]) if len(frames) > 1 else {}
+
+        if kind == DOWN_COMMAND:
+            if self.registry.is_online(payload.get('agent_id')):
+                self._outbox.append(payload)
+            else:
+                self._stats['undeliverable'] += 1
+                self._add_result(payload.get('id'), payload.get('agent_id'), 'undeliverable', None, None)
+        elif kind == DOWN_ADMIT:
+            agent_id = payload.get('agent_id')
+            hello = self._joining.pop(agent_id, None)
+            if hello is None:
+                return
+            self.registry.track(agent_id, hello.get('location'))
+            self.registry.heartbeat(agent_id, hello.get('location'))
+            self._reply(agent_id, MSG_WELCOME, {'heartbeat_interval': self.heartbeat_interval})
+        elif kind == DOWN_DENY:
+            agent_id = payload.get('agent_id')
+            joining = self._joining.pop(agent_id, None) is not None
+            if not joining and not self.registry.is_known(agent_id):
+                return
+            if not joining:
+                # Agent déjà admis, détenu par une autre passerelle selon le hub
+                self.registry.forget(agent_id)
+                self._state.pop(agent_id, None)
+            self._stats['denied'] += 1
+            self._denied[agent_id] = time.monotonic() + self.deny_ttl
+            self._reply(agent_id, MSG_REJECT, {'reason': payload.get('reason') or 'unknown_agent'})
+        elif kind == DOWN_SYNC:
+            # Hub (ré)attaché : état complet des agents en ligne
+            now = time.time()
+            for agent_id in self.registry.online_agents():
+                self._state[agent_id] = {'agent_id': agent_id, 'status': STATUS_ONLINE, 'at': now,
+                                         'location': None}
+
+    def _on_transition(self, agent_id: str, status: str, info: Dict[str, Any]):
+        # Fusion par agent : seul le dernier état de la fenêtre est remonté
+        self._state[agent_id] = {'agent_id': agent_id, 'status': status,
+                                 'location': info.get('location'), 'at': time.time()}
+
+    def _add_result(self, command_id, agent_id, status, result, execution_time):
+        if len(self._results) >= self.max_buffered_results:
+            # Hub absent trop longtemps : les plus anciens résultats sont perdus
+            self._results.pop(0)
+            self._stats['results_dropped'] += 1
+        self._results.append({'id': command_id, 'agent_id': agent_id, 'status': status,
+                              'result': result, 'execution_time': execution_time})
+
+    def _flush_uplink(self):
+        """Remonte transitions et résultats en attente ; conservés si le hub est absent"""
+        if self._state and self._send_up(UP_STATE, {'agents': list(self._state.values())}):
+            self._state.clear()
+            self._stats['state_batches'] += 1
+        if self._results and self._send_up(UP_RESULTS, {'results': self._results}):
+            self._results = []
+
+    def _send_up(self, kind: bytes, payload: Dict[str, Any]) -> bool:
+        try:
+            self._uplink.send_multipart(encode(kind, payload), zmq.NOBLOCK)
+            return True
+        except zmq.Again:
+            # Aucun hub attaché ou HWM atteint
+            self._stats['uplink_stalls'] += 1
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats.update(self.registry.get_counts())
+        stats['pending'] = len(self._outbox)
+        stats['in_flight'] = len(self._in_flight)
+        stats['buffered_results'] = len(self._results)
+        stats['auth'] = self._auth.get_stats() if self._auth is not None else None
+        return stats
+
+
+def _serve(agent_endpoint: str, uplink_endpoint: str, name: str, secret_key: Optional[str],
+           agent_keys: Dict[str, str]):
+    """Point d'entrée d'un processus passerelle"""
+    from config import AgentsConfig
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    gateway = AgentGateway(
+        agent_endpoint, uplink_endpoint, name=name,
+        sndhwm=AgentsConfig.TRANSPORT_SNDHWM,
+        rcvhwm=AgentsConfig.TRANSPORT_RCVHWM,
+        timeout=AgentsConfig.AGENT_TIMEOUT,
+        heartbeat_interval=AgentsConfig.HEARTBEAT_INTERVAL,
+        command_timeout=AgentsConfig.COMMAND_TIMEOUT,
+        secret_key=secret_key,
+        agent_keys=agent_keys
+    )
+    signal.signal(signal.SIGTERM, lambda *_: gateway.stop())
+    try:
+        gateway.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    from config import AgentsConfig
+
+    parser = argparse.ArgumentParser(description="Passerelle de connexions agents MIFTAH")
+    parser.add_argument('--listen', default=None, help="endpoint agents (une passerelle)")
+    parser.add_argument('--uplink', default=None, help="canal interne vers le hub (une passerelle)")
+    parser.add_argument('--workers', type=int, default=1, help="nombre de processus passerelle")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--base-port', type=int, default=AgentsConfig.GATEWAY_BASE_PORT)
+    args = parser.parse_args()
+
+    secret_key = AgentsConfig.GATEWAY_SECRET_KEY if AgentsConfig.ENCRYPTION_ENABLED else None
+    agent_keys = load_agent_keys(AgentsConfig.AGENT_KEYS_FILE)
+    if secret_key:
+        print(f"Clé publique CURVE des passerelles: {zmq.curve_public(secret_key.encode()).decode()}")
+        print(f"{len(agent_keys)} clé(s) agent autorisée(s) ({AgentsConfig.AGENT_KEYS_FILE})")
+    elif not is_local_endpoint(args.listen or f"tcp://{args.host}:0"):
+        print("❌ MIFTAH_GATEWAY_SECRET_KEY non définie : écoute hors boucle locale refusée (--host 127.0.0.1)")
+        sys.exit(1)
+    else:
+        print("⚠️  MIFTAH_GATEWAY_SECRET_KEY non définie : connexions agents non chiffrées (boucle locale)")
+
+    if args.workers == 1 and (args.listen or args.uplink):
+        _serve(args.listen or f"tcp://{args.host}:{args.base_port}",
+               args.uplink or default_uplink(0), 'gateway-0', secret_key, agent_keys)
+        return
+
+    # Pool : un port agents et un canal interne par processus
+    processes = []
+    for index in range(args.workers):
+        agent_endpoint = f"tcp://{args.host}:{args.base_port + index}"
+        uplink_endpoint = default_uplink(index)
+        print(f"gateway-{index}: agents {agent_endpoint}, hub {uplink_endpoint}")
+        process = multiprocessing.Process(target=_serve, name=f"gateway-{index}",
+                                          args=(agent_endpoint, uplink_endpoint, f"gateway-{index}",
+                                                secret_key, agent_keys))
+        process.start()
+        processes.append(process)
+
+    def terminate(*_):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == '__main__':
+    main()
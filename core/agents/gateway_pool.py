@@ -0,0 +1,415 @@
+"""
+MIFTAH - Rattachement du hub aux passerelles agents
+Un socket DEALER par passerelle : admissions, transitions, commandes et résultats
+"""
+
+import time
+import threading
+import logging
+from collections import deque
+from typing import Callable, Dict, Any, List, Tuple
+
+from core.security.passwords import _eventlet_patched
+from core.agents.registry import STATUS_ONLINE, STATUS_OFFLINE
+from core.agents.transport import encode, decode
+from core.agents.gateway import (UP_JOIN, UP_STATE, UP_RESULTS, UP_PING,
+                                 DOWN_ADMIT, DOWN_DENY, DOWN_COMMAND, DOWN_SYNC)
+
+if _eventlet_patched():
+    from eventlet.green import zmq
+else:
+    import zmq
+
+logger = logging.getLogger(__name__)
+
+
+class _Link:
+    """État du hub pour une passerelle"""
+
+    __slots__ = ('index', 'endpoint', 'socket', 'alive', 'last_ping', 'info', 'agents')
+
+    def __init__(self, index: int, endpoint: str):
+        self.index = index
+        self.endpoint = endpoint
+        self.socket = None
+        self.alive = False
+        self.last_ping = 0.0
+        self.info: Dict[str, Any] = {}
+        self.agents = set()
+
+
+class GatewayPool:
+    """Hub attaché à une ou plusieurs passerelles (même interface qu'AgentTransport)
+
+    Les passerelles détiennent les connexions et les battements ; le hub
+    garde l'autorité sur l'admission (table agents, MAX_AGENTS), route
+    chaque commande vers la passerelle qui détient l'agent et écrit les
+    résultats par lots. Une passerelle muette au-delà de `gateway_timeout`
+    est considérée perdue : ses agents passent hors ligne et ses commandes
+    en vol sont closes. Un agent détenu par une passerelle vivante qui le
+    voit en ligne n'est pas cédé à une autre : celle-ci reçoit un refus.
+    """
+
+    def __init__(self, db, registry, uplinks: List[str], hwm: int = 100000,
+                 max_pending: int = 10000, command_timeout: float = 300, max_agents: int = 10000,
+                 auto_register: bool = False, gateway_timeout: float = 5.0, poll_timeout: float = 0.01,
+                 on_result: Callable[[int, Dict[str, Any]], None] = None,
+                 on_results: Callable[[List[Dict[str, Any]]], None] = None, context=None):
+        self.db = db
+        self.registry = registry
+        self.hwm = hwm
+        self.max_pending = max_pending
+        self.command_timeout = command_timeout
+        self.max_agents = max_agents
+        self.auto_register = auto_register
+        self.gateway_timeout = gateway_timeout
+        self.poll_timeout = poll_timeout
+        self.on_result = on_result
+        self.on_results = on_results
+
+        self._context = context or zmq.Context.instance()
+        self._links = [_Link(index, endpoint) for index, endpoint in enumerate(uplinks)]
+        self._owner: Dict[str, int] = {}
+        self._outbox = deque()
+        self._in_flight: Dict[int, Tuple[int, str, float]] = {}
+        self._stalled = False
+        self._lock = threading.Lock()
+        self._running = False
+        self._sleep = time.sleep
+        self._last_tick = 0.0
+        self._stats = {
+            'commands_sent': 0,
+            'commands_rejected': 0,
+            'results': 0,
+            'unknown_results': 0,
+            'timeouts': 0,
+            'hwm_stalls': 0,
+            'admitted': 0,
+            'denied': 0,
+            'state_updates': 0,
+            'gateways_lost': 0,
+            'ownership_conflicts': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    def attach(self):
+        """Se connecte au canal interne de chaque passerelle"""
+        for link in self._links:
+            socket = self._context.socket(zmq.DEALER)
+            socket.setsockopt(zmq.SNDHWM, self.hwm)
+            socket.setsockopt(zmq.RCVHWM, self.hwm)
+            socket.setsockopt(zmq.LINGER, 0)
+            socket.connect(link.endpoint)
+            link.socket = socket
+        logger.info(f"Hub rattaché à {len(self._links)} passerelle(s) agents")
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Lance la boucle d'E/S via les primitives du serveur (ex: SocketIO)"""
+        if self._running:
+            return
+        if not self._links or self._links[0].socket is None:
+            self.attach()
+        self._running = True
+        self._sleep = sleep
+        spawn(self._run)
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        self._running = False
+        for link in self._links:
+            if link.socket is not None:
+                link.socket.close(0)
+                link.socket = None
+
+    def _run(self):
+        poller = zmq.Poller()
+        for link in self._links:
+            poller.register(link.socket, zmq.POLLIN)
+        try:
+            while self._running:
+                self.run_once(poller)
+                self._sleep(0)
+        finally:
+            self.close()
+
+    def run_once(self, poller) -> int:
+        """Un tour : messages des passerelles, envoi des commandes, surveillance"""
+        handled = 0
+        results = []
+        busy = self._outbox and not self._stalled
+        events = dict(poller.poll(0 if busy else self.poll_timeout * 1000))
+        for link in self._links:
+            if link.socket not in events:
+                continue
+            for _ in range(1000):
+                try:
+                    frames = link.socket.recv_multipart(zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                self._handle(link, frames, results)
+                handled += 1
+
+        self._drain_outbox()
+
+        now = time.monotonic()
+        if now - self._last_tick >= 1.0:
+            self._last_tick = now
+            self._check_gateways(now, results)
+            self._expire(now, results)
+        self._write_results(results)
+        return handled
+
+    # ------------------------------------------------------------------
+    # Commandes
+    # ------------------------------------------------------------------
+
+    def send_command(self, agent_id: str, command_id: int, command: str,
+                     parameters: Dict[str, Any] = None) -> bool:
+        """Route une commande vers la passerelle de l'agent ; False si hors ligne ou file pleine"""
+        with self._lock:
+            index = self._owner.get(agent_id)
+            if index is None or not self.registry.is_online(agent_id) or len(self._outbox) >= self.max_pending:
+                self._stats['commands_rejected'] += 1
+                return False
+            self._outbox.append((index, {'id': command_id, 'agent_id': agent_id,
+                                         'command': command, 'parameters': parameters or {}}))
+        return True
+
+    def _drain_outbox(self):
+        with self._lock:
+            batch = list(self._outbox)
+            self._outbox.clear()
+        if not batch:
+            self._stalled = False
+            return
+
+        stalled = set()
+        kept = []
+        sent = 0
+        for item in batch:
+            index, command = item
+            if index in stalled:
+                kept.append(item)
+                continue
+            try:
+                self._links[index].socket.send_multipart(encode(DOWN_COMMAND, command), zmq.NOBLOCK)
+            except zmq.Again:
+                stalled.add(index)
+                kept.append(item)
+                continue
+            sent += 1
+            with self._lock:
+                self._in_flight[command['id']] = (index, command['agent_id'], time.monotonic())
+
+        with self._lock:
+            self._stats['commands_sent'] += sent
+            self._stats['hwm_stalls'] += len(stalled)
+            if kept:
+                self._outbox.extendleft(reversed(kept))
+        self._stalled = sent == 0 and bool(kept)
+
+    # ------------------------------------------------------------------
+    # Messages des passerelles
+    # ------------------------------------------------------------------
+
+    def _handle(self, link: _Link, frames: list, results: list):
+        if not frames:
+            return
+        kind = frames[0]
+        payload = decode(frames[1]) if len(frames) > 1 else {}
+
+        if kind == UP_PING:
+            link.last_ping = time.monotonic()
+            link.info = payload
+            if not link.alive:
+                # Passerelle (re)jointe : demander l'état complet
+                link.alive = True
+                self._send(link, DOWN_SYNC)
+                logger.info(f"Passerelle attachée: {payload.get('name')} ({payload.get('endpoint')})")
+        elif kind == UP_STATE:
+            self._on_state(link, payload.get('agents') or [])
+        elif kind == UP_RESULTS:
+            for entry in payload.get('results') or []:
+                with self._lock:
+                    flight = self._in_flight.pop(entry.get('id'), None)
+                    if flight is None:
+                        self._stats['unknown_results'] += 1
+                        continue
+                    self._stats['results'] += 1
+                results.append((entry['id'], entry.get('agent_id'), entry.get('status') or 'completed',
+                                entry.get('result'), entry.get('execution_time')))
+        elif kind == UP_JOIN:
+            self._on_join(link, payload)
+
+    def _on_join(self, link: _Link, payload: Dict[str, Any]):
+        """Admission décidée par le hub : agent connu, ou auto-enregistrement sous MAX_AGENTS"""
+        agent_id = payload.get('agent_id')
+        if not agent_id:
+            return
+        if self._held_elsewhere(link, agent_id):
+            self._refuse_takeover(link, agent_id)
+            return
+        admitted = self.registry.is_known(agent_id)
+        if not admitted and self.auto_register and self.registry.get_counts()['total'] < self.max_agents:
+            admitted = self.db.register_agent(agent_id, payload.get('name') or agent_id,
+                                              payload.get('type') or 'generic', payload.get('location'))
+            if admitted:
+                self.registry.track(agent_id, payload.get('location'))
+
+        with self._lock:
+            self._stats['admitted' if admitted else 'denied'] += 1
+        if admitted:
+            self._send(link, DOWN_ADMIT, {'agent_id': agent_id})
+        else:
+            logger.warning(f"Agent refusé: {agent_id} (via {link.info.get('name', link.endpoint)})")
+            self._send(link, DOWN_DENY, {'agent_id': agent_id, 'reason': 'unknown_agent'})
+
+    def _on_state(self, link: _Link, agents: List[Dict[str, Any]]):
+        for entry in agents:
+            agent_id = entry.get('agent_id')
+            status = entry.get('status')
+            if not agent_id or status not in (STATUS_ONLINE, STATUS_OFFLINE):
+                continue
+            if status == STATUS_ONLINE and self._held_elsewhere(link, agent_id):
+                self._refuse_takeover(link, agent_id)
+                continue
+            with self._lock:
+                owner = self._owner.get(agent_id)
+                if status == STATUS_ONLINE:
+                    if owner is not None and owner != link.index:
+                        # Agent passé d'une passerelle perdue ou qui ne le détient plus
+                        self._links[owner].agents.discard(agent_id)
+                    self._owner[agent_id] = link.index
+                    link.agents.add(agent_id)
+                elif owner == link.index:
+                    del self._owner[agent_id]
+                    link.agents.discard(agent_id)
+                else:
+                    # Hors ligne sur une passerelle qui ne le détient plus
+                    continue
+                self._stats['state_updates'] += 1
+            self.registry.apply(agent_id, status, entry.get('location'), entry.get('at'))
+
+    def _held_elsewhere(self, link: _Link, agent_id: str) -> bool:
+        """Agent en ligne sur une autre passerelle encore vivante"""
+        with self._lock:
+            owner = self._owner.get(agent_id)
+            if owner is None or owner == link.index:
+                return False
+            holder = self._links[owner]
+            return holder.alive and agent_id in holder.agents
+
+    def _refuse_takeover(self, link: _Link, agent_id: str):
+        with self._lock:
+            self._stats['ownership_conflicts'] += 1
+        logger.warning(f"Agent {agent_id} déjà connecté à une autre passerelle: "
+                       f"refusé sur {link.info.get('name', link.endpoint)}")
+        self._send(link, DOWN_DENY, {'agent_id': agent_id, 'reason': 'already_connected'})
+
+    def _send(self, link: _Link, kind: bytes, payload: Dict[str, Any] = None):
+        try:
+            link.socket.send_multipart(encode(kind, payload), zmq.NOBLOCK)
+        except zmq.Again:
+            logger.warning(f"Passerelle {link.endpoint} saturée: message {kind.decode()} perdu")
+
+    # ------------------------------------------------------------------
+    # Surveillance
+    # ------------------------------------------------------------------
+
+    def _check_gateways(self, now: float, results: list):
+        """Passerelle muette : agents hors ligne, commandes en vol closes"""
+        for link in self._links:
+            if not link.alive or now - link.last_ping <= self.gateway_timeout:
+                continue
+            link.alive = False
+            with self._lock:
+                self._stats['gateways_lost'] += 1
+                agents = list(link.agents)
+                link.agents.clear()
+                for agent_id in agents:
+                    if self._owner.get(agent_id) == link.index:
+                        del self._owner[agent_id]
+                lost = [(command_id, agent_id) for command_id, (index, agent_id, _) in self._in_flight.items()
+                        if index == link.index]
+                for command_id, _ in lost:
+                    del self._in_flight[command_id]
+            logger.error(f"Passerelle perdue: {link.endpoint} ({len(agents)} agents, {len(lost)} commandes)")
+            for agent_id in agents:
+                self.registry.apply(agent_id, STATUS_OFFLINE)
+            results.extend((command_id, agent_id, 'undeliverable', None, None) for command_id, agent_id in lost)
+
+    def _expire(self, now: float, results: list):
+        """Filet de sécurité : la passerelle clôt normalement les commandes expirées"""
+        with self._lock:
+            expired = [(command_id, agent_id) for command_id, (_, agent_id, sent) in self._in_flight.items()
+                       if now - sent > self.command_timeout + self.gateway_timeout]
+            for command_id, _ in expired:
+                del self._in_flight[command_id]
+            self._stats['timeouts'] += len(expired)
+        results.extend((command_id, agent_id, 'timeout', None, self.command_timeout)
+                       for command_id, agent_id in expired)
+
+    def _write_results(self, results: list):
+        """Écrit les résultats du tour en une transaction, puis les notifie"""
+        if not results:
+            return
+        if self.on_results is not None:
+            self._hand_over(results)
+            return
+        self.db.update_command_results([
+            (status, result, execution_time, command_id)
+            for command_id, _, status, result, execution_time in results
+        ])
+        if self.on_result is None:
+            return
+        for command_id, agent_id, status, result, execution_time in results:
+            try:
+                self.on_result(command_id, {
+                    'command_id': command_id,
+                    'agent_id': agent_id,
+                    'status': status,
+                    'result': result,
+                    'execution_time': execution_time,
+                })
+            except Exception as e:
+                logger.error(f"Erreur notification résultat {command_id}: {e}")
+
+    def _hand_over(self, results: list):
+        """Transmet le lot à l'ordonnanceur, qui tient lui-même command_history"""
+        try:
+            self.on_results([{
+                'command_id': command_id,
+                'agent_id': agent_id,
+                'status': status,
+                'result': result,
+                'execution_time': execution_time,
+            } for command_id, agent_id, status, result, execution_time in results])
+        except Exception as e:
+            logger.error(f"Erreur traitement lot de résultats: {e}")
+
+    # ------------------------------------------------------------------
+    # Consultation
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Compteurs du hub et dernier état remonté par chaque passerelle"""
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._outbox)
+            stats['in_flight'] = len(self._in_flight)
+            stats['gateways'] = [{
+                'endpoint': link.endpoint,
+                'name': link.info.get('name'),
+                'agent_endpoint': link.info.get('endpoint'),
+                'alive': link.alive,
+                'agents': len(link.agents),
+                'last_ping_age': round(now - link.last_ping, 1) if link.last_ping else None,
+                'stats': link.info.get('stats'),
+            } for link in self._links]
+        return stats
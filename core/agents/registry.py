@@ -0,0 +1,301 @@
+"""
+MIFTAH - Registre des agents en mémoire
+Battements de cœur absorbés en mémoire, expiration par tas, écriture par lots
+"""
+
+import heapq
+import time
+import threading
+import logging
+from typing import Callable, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATUS_ONLINE = 'active'
+STATUS_OFFLINE = 'offline'
+
+
+class _AgentState:
+    """État compact d'un agent"""
+
+    __slots__ = ('agent_id', 'status', 'last_seen', 'deadline', 'location', 'dirty', 'scheduled')
+
+    def __init__(self, agent_id: str, status: str = STATUS_OFFLINE, last_seen: float = 0.0):
+        self.agent_id = agent_id
+        self.status = status
+        self.last_seen = last_seen       # horloge murale, pour la colonne last_seen
+        self.deadline = 0.0              # horloge monotone, expiration du battement
+        self.location = None
+        self.dirty = False
+        self.scheduled = False           # une entrée au plus dans le tas
+
+
+class AgentRegistry:
+    """Suivi de vivacité des agents
+
+    Un battement ne touche que la mémoire. Chaque agent a au plus une
+    entrée dans le tas d'expiration : à l'échéance, l'entrée est replanifiée
+    si un battement plus récent a repoussé l'expiration, sinon l'agent passe
+    hors ligne. Les changements sont écrits dans `agents` par lots toutes
+    les `flush_interval` secondes ; les transitions en ligne / hors ligne
+    sont transmises à `on_transition(agent_id, status, info)`.
+    """
+
+    def __init__(self, db, timeout: float = 300, flush_interval: float = 10,
+                 tick: float = 1.0, on_transition: Callable[[str, str, Dict[str, Any]], None] = None,
+                 clock: Callable[[], float] = time.monotonic, wall_clock: Callable[[], float] = time.time):
+        self.db = db
+        self.timeout = timeout
+        self.flush_interval = flush_interval
+        self.tick = tick
+        self.on_transition = on_transition
+        self._clock = clock
+        self._wall_clock = wall_clock
+
+        self._agents: Dict[str, _AgentState] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._sleep = time.sleep
+        self._stats = {
+            'heartbeats': 0,
+            'rejected': 0,
+            'transitions_online': 0,
+            'transitions_offline': 0,
+            'flushes': 0,
+            'rows_flushed': 0,
+            'flush_errors': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Charge les agents connus ; ceux marqués actifs reçoivent un délai complet"""
+        self.refresh()
+        logger.info(f"Registre des agents: {len(self._agents)} agents chargés")
+
+    def refresh(self):
+        """Relit statuts et positions depuis `agents` (worker suiveur : état écrit par le chef)"""
+        # Lecture hors verrou : battements et balayage ne l'attendent pas
+        agents = self.db.get_agents()
+        now = self._clock()
+        with self._lock:
+            for agent in agents:
+                state = self._agents.get(agent['agent_id'])
+                if state is None:
+                    state = self._agents[agent['agent_id']] = _AgentState(agent['agent_id'])
+                state.status = agent['status'] or STATUS_OFFLINE
+                state.location = agent.get('location')
+                if state.status == STATUS_ONLINE:
+                    state.deadline = now + self.timeout
+                    self._schedule(state)
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Lance le balayage des expirations via les primitives du serveur (ex: SocketIO)"""
+        if self._running:
+            return
+        self._running = True
+        self._sleep = sleep
+        spawn(self._run)
+
+    def stop(self):
+        """Arrête le balayage et écrit les derniers changements"""
+        self._running = False
+        self.flush()
+
+    def _run(self):
+        last_flush = self._clock()
+        while self._running:
+            self._sleep(self.tick)
+            try:
+                self.sweep()
+                if self._clock() - last_flush >= self.flush_interval:
+                    last_flush = self._clock()
+                    self.flush()
+            except Exception as e:
+                logger.error(f"Erreur registre des agents: {e}")
+
+    # ------------------------------------------------------------------
+    # Battements et expiration
+    # ------------------------------------------------------------------
+
+    def track(self, agent_id: str, location: str = None):
+        """Ajoute un agent (hors ligne) au registre, ex: après register_agent"""
+        with self._lock:
+            if agent_id not in self._agents:
+                state = self._agents[agent_id] = _AgentState(agent_id)
+                state.location = location
+
+    def forget(self, agent_id: str):
+        with self._lock:
+            self._agents.pop(agent_id, None)
+
+    def heartbeat(self, agent_id: str, location: str = None) -> bool:
+        """Enregistre un battement ; False pour un agent inconnu"""
+        now = self._clock()
+        with self._lock:
+            state = self._agents.get(agent_id)
+            if state is None:
+                self._stats['rejected'] += 1
+                return False
+
+            self._stats['heartbeats'] += 1
+            state.last_seen = self._wall_clock()
+            state.deadline = now + self.timeout
+            state.dirty = True
+            if location is not None:
+                state.location = location
+            self._schedule(state)
+
+            came_online = state.status != STATUS_ONLINE
+            if came_online:
+                state.status = STATUS_ONLINE
+                self._stats['transitions_online'] += 1
+                info = self._info(state)
+
+        if came_online:
+            self._notify(agent_id, STATUS_ONLINE, info)
+        return True
+
+    def apply(self, agent_id: str, status: str, location: str = None, last_seen: float = None) -> bool:
+        """Applique un état décidé ailleurs (passerelle) : pas d'expiration locale
+
+        La passerelle qui détient la connexion surveille les battements et
+        ne remonte que les transitions ; l'agent n'est donc pas planifié ici.
+        """
+        with self._lock:
+            state = self._agents.get(agent_id)
+            if state is None:
+                self._stats['rejected'] += 1
+                return False
+
+            state.deadline = float('inf')
+            state.last_seen = last_seen or self._wall_clock()
+            state.dirty = True
+            if location is not None:
+                state.location = location
+
+            changed = state.status != status
+            if changed:
+                state.status = status
+                key = 'transitions_online' if status == STATUS_ONLINE else 'transitions_offline'
+                self._stats[key] += 1
+                info = self._info(state)
+
+        if changed:
+            self._notify(agent_id, status, info)
+        return True
+
+    def _schedule(self, state: _AgentState):
+        if not state.scheduled:
+            heapq.heappush(self._heap, (state.deadline, state.agent_id))
+            state.scheduled = True
+
+    def sweep(self) -> List[str]:
+        """Passe hors ligne les agents dont le délai est écoulé"""
+        now = self._clock()
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, agent_id = heapq.heappop(self._heap)
+                state = self._agents.get(agent_id)
+                if state is None:
+                    continue
+                state.scheduled = False
+                if state.deadline > now:
+                    # Battement reçu depuis la planification : replanifier
+                    self._schedule(state)
+                    continue
+                if state.status == STATUS_ONLINE:
+                    state.status = STATUS_OFFLINE
+                    state.dirty = True
+                    self._stats['transitions_offline'] += 1
+                    expired.append((agent_id, self._info(state)))
+
+        for agent_id, info in expired:
+            self._notify(agent_id, STATUS_OFFLINE, info)
+        return [agent_id for agent_id, _ in expired]
+
+    def _info(self, state: _AgentState) -> Dict[str, Any]:
+        return {
+            'agent_id': state.agent_id,
+            'status': state.status,
+            'location': state.location,
+            'last_seen': self._format(state.last_seen) if state.last_seen else None,
+        }
+
+    @staticmethod
+    def _format(wall: float) -> str:
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(wall))
+
+    def _notify(self, agent_id: str, status: str, info: Dict[str, Any]):
+        if self.on_transition is None:
+            return
+        try:
+            self.on_transition(agent_id, status, info)
+        except Exception as e:
+            logger.error(f"Erreur notification agent {agent_id}: {e}")
+
+    # ------------------------------------------------------------------
+    # Écriture par lots
+    # ------------------------------------------------------------------
+
+    def flush(self) -> int:
+        """Écrit statut, last_seen et position des agents modifiés en une transaction"""
+        with self._lock:
+            dirty = [state for state in self._agents.values() if state.dirty]
+            rows = [(state.status, self._format(state.last_seen) if state.last_seen else None,
+                     state.location, state.agent_id) for state in dirty]
+            for state in dirty:
+                state.dirty = False
+        if not rows:
+            return 0
+
+        if not self.db.update_agents_batch(rows):
+            # Réessayer au prochain passage
+            with self._lock:
+                for state in dirty:
+                    state.dirty = True
+                self._stats['flush_errors'] += 1
+            return 0
+
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats['rows_flushed'] += len(rows)
+        return len(rows)
+
+    # ------------------------------------------------------------------
+    # Consultation
+    # ------------------------------------------------------------------
+
+    def is_known(self, agent_id: str) -> bool:
+        with self._lock:
+            return agent_id in self._agents
+
+    def is_online(self, agent_id: str) -> bool:
+        with self._lock:
+            state = self._agents.get(agent_id)
+            return state is not None and state.status == STATUS_ONLINE
+
+    def online_agents(self) -> List[str]:
+        with self._lock:
+            return [agent_id for agent_id, state in self._agents.items() if state.status == STATUS_ONLINE]
+
+    def get_counts(self) -> Dict[str, int]:
+        with self._lock:
+            online = sum(1 for state in self._agents.values() if state.status == STATUS_ONLINE)
+            total = len(self._agents)
+        return {'total': total, 'active': online, 'offline': total - online}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Compteurs de battements, transitions et écritures"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tracked'] = len(self._agents)
+            stats['online'] = sum(1 for state in self._agents.values() if state.status == STATUS_ONLINE)
+            stats['pending_writes'] = sum(1 for state in self._agents.values() if state.dirty)
+            stats['heap_size'] = len(self._heap)
+        stats['timeout'] = self.timeout
+        return stats
@@ -0,0 +1,564 @@
+"""
+MIFTAH - Ordonnanceur des commandes agents
+File persistante sur command_history : priorités, limite en vol par agent, lots et reprises
+"""
+
+import heapq
+import json
+import time
+import uuid
+import threading
+import logging
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+from core.agents.registry import STATUS_ONLINE
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_SENT = 'sent'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Statuts de résultat (agent ou transport)
+_SUCCESS = {'completed', 'done', 'success', 'ok'}
+_RETRYABLE = {'timeout', 'undeliverable', 'rejected', 'lost'}
+
+
+class _Command:
+    """Commande ordonnancée (une ligne de command_history)"""
+
+    __slots__ = ('id', 'agent_id', 'command', 'parameters', 'priority', 'attempts', 'max_attempts',
+                 'timeout', 'batch_id', 'created', 'deadline', 'not_before')
+
+    def __init__(self, command_id: int, agent_id: str, command: str, parameters: Dict[str, Any],
+                 priority: int, attempts: int, max_attempts: int, timeout: float, batch_id: str,
+                 created: float):
+        self.id = command_id
+        self.agent_id = agent_id
+        self.command = command
+        self.parameters = parameters
+        self.priority = priority
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.batch_id = batch_id
+        self.created = created          # horloge monotone : expiration en file
+        self.deadline = 0.0             # horloge monotone : expiration de l'essai en cours
+        self.not_before = 0.0           # horloge monotone : attente avant nouvel essai
+
+    def key(self) -> Tuple[int, int]:
+        # Priorité haute d'abord, puis ordre d'arrivée
+        return (-self.priority, self.id)
+
+
+class _Batch:
+    """Compteurs d'une action opérateur (un lot de commandes)"""
+
+    __slots__ = ('batch_id', 'sid', 'command', 'total', 'counts', 'changed')
+
+    def __init__(self, batch_id: str, sid: Optional[str], command: str, total: int):
+        self.batch_id = batch_id
+        self.sid = sid
+        self.command = command
+        self.total = total
+        self.counts = {STATUS_PENDING: total, STATUS_SENT: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        self.changed = True
+
+    def move(self, old: str, new: str, count: int = 1):
+        self.counts[old] -= count
+        self.counts[new] += count
+        self.changed = True
+
+    @property
+    def finished(self) -> bool:
+        return self.counts[STATUS_DONE] + self.counts[STATUS_FAILED] >= self.total
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'batch_id': self.batch_id, 'command': self.command, 'total': self.total,
+                'counts': dict(self.counts), 'finished': self.finished}
+
+
+class CommandScheduler:
+    """File de commandes persistante au-dessus de command_history
+
+    Une action opérateur (un agent ou un ensemble filtré) devient un lot :
+    les lignes sont insérées en une transaction au statut pending, puis
+    distribuées par priorité dans la limite de `max_in_flight` commandes
+    en vol par agent, aux seuls agents en ligne. Un essai sans résultat
+    au-delà de son délai, ou non livrable, est rejoué avec attente
+    exponentielle jusqu'à `max_attempts`. Les transitions pending → sent →
+    done/failed sont écrites par lots et poussées à l'opérateur via
+    `on_status(sid, event, payload)` : par commande pour un lot d'une
+    commande, en compteurs agrégés pour un envoi groupé.
+
+    En mode `shared` (plusieurs workers sur la même base), `submit` ne fait
+    qu'insérer : seul le worker qui a démarré l'ordonnanceur distribue, et
+    reprend à chaque passage les lignes pending apparues depuis sa dernière
+    lecture. Les lots ainsi repris répondent à la room `reply_room(user_id)`.
+    """
+
+    def __init__(self, db, registry, transport, max_in_flight: int = 4, max_attempts: int = 3,
+                 attempt_timeout: float = 60, retry_backoff: float = 5, pending_ttl: float = 3600,
+                 max_fanout: int = 10000, tick: float = 0.1,
+                 on_status: Callable[[str, str, Dict[str, Any]], None] = None,
+                 shared: bool = False, reply_room: Callable[[int], Optional[str]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.db = db
+        self.registry = registry
+        self.transport = transport
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.attempt_timeout = attempt_timeout
+        self.retry_backoff = retry_backoff
+        self.pending_ttl = pending_ttl
+        self.max_fanout = max_fanout
+        self.tick = tick
+        self.on_status = on_status
+        self.shared = shared
+        self.reply_room = reply_room
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._queues: Dict[str, List[Tuple[Tuple[int, int], _Command]]] = {}
+        self._retries: List[Tuple[float, int, _Command]] = []
+        self._in_flight: Dict[int, _Command] = {}
+        self._in_flight_count: Dict[str, int] = {}
+        self._batches: Dict[str, _Batch] = {}
+        self._running = False
+        self._sleep = time.sleep
+        self._last_expiry = 0.0
+        self._adopted_id = 0
+        self._stats = {
+            'submitted': 0,
+            'sent': 0,
+            'done': 0,
+            'failed': 0,
+            'retries': 0,
+            'attempt_timeouts': 0,
+            'expired': 0,
+            'send_refused': 0,
+            'recovered': 0,
+            'adopted': 0,
+            'write_errors': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    def recover(self) -> int:
+        """Recharge les commandes ouvertes ; un essai en cours avant l'arrêt compte comme perdu"""
+        now = self._clock()
+        requeued = []
+        finished = []
+        loaded = 0
+        with self._lock:
+            for row in self.db.get_open_commands():
+                try:
+                    parameters = json.loads(row['parameters']) if row['parameters'] else {}
+                except ValueError:
+                    parameters = {}
+                command = _Command(row['id'], row['agent_id'], row['command'], parameters,
+                                   row['priority'] or 0, row['attempts'] or 0, row['max_attempts'] or 1,
+                                   row['timeout'] or self.attempt_timeout, row['batch_id'], now)
+                if row['status'] == STATUS_SENT:
+                    if command.attempts >= command.max_attempts:
+                        finished.append((STATUS_FAILED, 'lost', None, self._timestamp(), command.id))
+                        continue
+                    requeued.append(('lost', command.id))
+                self._push(command)
+                loaded += 1
+                self._adopted_id = max(self._adopted_id, command.id)
+            self._stats['recovered'] += loaded
+
+        if requeued or finished:
+            self.db.update_command_transitions(finished=finished, requeued=requeued)
+        if loaded:
+            logger.info(f"File de commandes: {loaded} commandes reprises")
+        return loaded
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Lance la distribution via les primitives du serveur (ex: SocketIO)"""
+        if self._running:
+            return
+        self._running = True
+        self._sleep = sleep
+        spawn(self._run)
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            self._sleep(self.tick)
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Erreur ordonnanceur de commandes: {e}")
+
+    def run_once(self):
+        """Un passage : délais d'essai, expiration en file, distribution, compteurs des lots"""
+        if self.shared:
+            self.adopt()
+        now = self._clock()
+        if now - self._last_expiry >= 1.0:
+            self._last_expiry = now
+            self._expire(now)
+        self.dispatch()
+        self._push_batches()
+
+    # ------------------------------------------------------------------
+    # Soumission
+    # ------------------------------------------------------------------
+
+    def resolve_targets(self, agent_id: str = None, agent_ids: Iterable[str] = None,
+                        agent_type: str = None, status: str = None, location: str = None,
+                        all_agents: bool = False) -> List[str]:
+        """Agents visés : un identifiant, une liste, ou un filtre type/statut/position
+
+        Sans aucun critère, rien n'est visé : diffuser à tous les agents
+        doit être demandé explicitement (`all_agents`).
+        """
+        if agent_id:
+            return [agent_id]
+        if agent_ids:
+            return list(dict.fromkeys(agent_ids))
+        if not (agent_type or status or location or all_agents):
+            return []
+
+        targets = []
+        for agent in self.db.get_agents():
+            if agent_type and agent['type'] != agent_type:
+                continue
+            if location and agent['location'] != location:
+                continue
+            if status:
+                # Statut vivant du registre, plus frais que la table agents
+                online = self.registry.is_online(agent['agent_id'])
+                if (status == STATUS_ONLINE) != online:
+                    continue
+            targets.append(agent['agent_id'])
+        return targets
+
+    def submit(self, user_id: int, command: str, parameters: Dict[str, Any] = None,
+               targets: List[str] = None, priority: int = 0, max_attempts: int = None,
+               timeout: float = None, module: str = 'AGENT', session_id: str = None,
+               sid: str = None) -> Optional[Dict[str, Any]]:
+        """Met en file une action opérateur ; None si aucun agent visé ou écriture impossible"""
+        targets = list(targets or [])[:self.max_fanout]
+        if not targets:
+            return None
+        max_attempts = max(1, int(max_attempts or self.max_attempts))
+        timeout = float(timeout or self.attempt_timeout)
+        batch_id = uuid.uuid4().hex
+
+        ids = self.db.enqueue_commands(user_id, module, command, parameters or {}, targets, batch_id,
+                                       priority=priority, max_attempts=max_attempts, timeout=timeout,
+                                       session_id=session_id)
+        if not ids:
+            return None
+
+        if self.shared:
+            # Distribution par le worker actif : immédiate s'il s'agit de celui-ci
+            if self._running:
+                self.adopt()
+                self.dispatch()
+            return {'batch_id': batch_id, 'count': len(ids),
+                    'command_id': ids[0] if len(ids) == 1 else None,
+                    'counts': _Batch(batch_id, None, command, len(ids)).counts}
+
+        now = self._clock()
+        with self._lock:
+            for command_id, agent_id in zip(ids, targets):
+                self._push(_Command(command_id, agent_id, command, parameters or {}, priority, 0,
+                                    max_attempts, timeout, batch_id, now))
+            batch = self._batches[batch_id] = _Batch(batch_id, sid, command, len(ids))
+            self._stats['submitted'] += len(ids)
+
+        # Première distribution sans attendre le prochain passage
+        self.dispatch()
+        return {'batch_id': batch_id, 'count': len(ids),
+                'command_id': ids[0] if len(ids) == 1 else None,
+                'counts': dict(batch.counts)}
+
+    def adopt(self) -> int:
+        """Met en file les commandes pending insérées par les autres workers
+
+        Les écritures SQLite étant sérialisées, un identifiant visible
+        garantit que tous les précédents le sont : un curseur suffit.
+        """
+        rows = self.db.get_open_commands(after_id=self._adopted_id, pending_only=True)
+        if not rows:
+            return 0
+        now = self._clock()
+        adopted = 0
+        with self._lock:
+            # Un passage concurrent (soumission locale) a pu reprendre ces lignes
+            rows = [row for row in rows if row['id'] > self._adopted_id]
+            for row in rows:
+                batch = self._batches.get(row['batch_id'])
+                if batch is None:
+                    sid = self.reply_room(row['user_id']) if self.reply_room else None
+                    batch = self._batches[row['batch_id']] = _Batch(row['batch_id'], sid, row['command'], 0)
+                batch.total += 1
+                batch.counts[STATUS_PENDING] += 1
+                try:
+                    parameters = json.loads(row['parameters']) if row['parameters'] else {}
+                except ValueError:
+                    parameters = {}
+                self._push(_Command(row['id'], row['agent_id'], row['command'], parameters,
+                                    row['priority'] or 0, row['attempts'] or 0, row['max_attempts'] or 1,
+                                    row['timeout'] or self.attempt_timeout, row['batch_id'], now))
+                adopted += 1
+            if rows:
+                self._adopted_id = max(row['id'] for row in rows)
+            self._stats['adopted'] += adopted
+            self._stats['submitted'] += adopted
+        return adopted
+
+    def _push(self, command: _Command):
+        heapq.heappush(self._queues.setdefault(command.agent_id, []), (command.key(), command))
+
+    # ------------------------------------------------------------------
+    # Distribution
+    # ------------------------------------------------------------------
+
+    def dispatch(self) -> int:
+        """Envoie les commandes prêtes, par priorité, aux agents en ligne ayant de la place"""
+        now = self._clock()
+        with self._lock:
+            while self._retries and self._retries[0][0] <= now:
+                _, _, command = heapq.heappop(self._retries)
+                self._push(command)
+
+            selected = []
+            for agent_id in list(self._queues):
+                if not self.registry.is_online(agent_id):
+                    continue
+                queue = self._queues[agent_id]
+                free = self.max_in_flight - self._in_flight_count.get(agent_id, 0)
+                while free > 0 and queue:
+                    _, command = heapq.heappop(queue)
+                    selected.append(command)
+                    free -= 1
+                if not queue:
+                    del self._queues[agent_id]
+
+            # Réserver avant l'envoi : un résultat peut revenir avant la fin de la boucle
+            selected.sort(key=_Command.key)
+            for command in selected:
+                command.attempts += 1
+                command.deadline = now + command.timeout
+                self._in_flight[command.id] = command
+                self._in_flight_count[command.agent_id] = self._in_flight_count.get(command.agent_id, 0) + 1
+                self._move(command, STATUS_PENDING, STATUS_SENT)
+
+        sent = []
+        refused = []
+        for command in selected:
+            if self.transport.send_command(command.agent_id, command.id, command.command, command.parameters):
+                sent.append(command)
+            else:
+                refused.append(command)
+
+        events = []
+        with self._lock:
+            for command in refused:
+                # File du transport pleine ou agent tombé : l'essai n'a pas eu lieu
+                if self._in_flight.pop(command.id, None) is not None:
+                    self._release(command)
+                    self._move(command, STATUS_SENT, STATUS_PENDING)
+                command.attempts -= 1
+                self._push(command)
+            self._stats['send_refused'] += len(refused)
+            self._stats['sent'] += len(sent)
+            for command in sent:
+                events.append(self._event(command, STATUS_SENT))
+
+        if sent:
+            timestamp = self._timestamp()
+            self._write(sent=[(command.attempts, timestamp, command.id) for command in sent])
+        self._emit(events)
+        return len(sent)
+
+    def _release(self, command: _Command):
+        count = self._in_flight_count.get(command.agent_id, 0) - 1
+        if count > 0:
+            self._in_flight_count[command.agent_id] = count
+        else:
+            self._in_flight_count.pop(command.agent_id, None)
+
+    # ------------------------------------------------------------------
+    # Résultats, délais, reprises
+    # ------------------------------------------------------------------
+
+    def handle_results(self, results: List[Dict[str, Any]]):
+        """Résultats remontés par le transport (un lot par tour de sa boucle)"""
+        now = self._clock()
+        finished = []
+        requeued = []
+        events = []
+        with self._lock:
+            for entry in results:
+                command = self._in_flight.pop(entry['command_id'], None)
+                if command is None:
+                    # Essai déjà expiré côté ordonnanceur : résultat tardif ignoré
+                    continue
+                self._release(command)
+                self._conclude(command, str(entry.get('status') or 'completed'), entry.get('result'),
+                               entry.get('execution_time'), now, finished, requeued, events)
+
+        self._write(finished=finished, requeued=requeued)
+        self._emit(events)
+
+    def _conclude(self, command: _Command, outcome: str, result: Optional[str], execution_time: Optional[float],
+                  now: float, finished: list, requeued: list, events: list):
+        """Décide done / failed / nouvel essai pour un essai terminé (verrou tenu)"""
+        if result is None and outcome not in _SUCCESS:
+            result = outcome
+
+        if outcome in _SUCCESS:
+            status = STATUS_DONE
+            finished.append((status, result, execution_time, self._timestamp(), command.id))
+        elif outcome in _RETRYABLE and command.attempts < command.max_attempts:
+            status = STATUS_PENDING
+            self._stats['retries'] += 1
+            command.not_before = now + self.retry_backoff * 2 ** (command.attempts - 1)
+            heapq.heappush(self._retries, (command.not_before, command.id, command))
+            requeued.append((result, command.id))
+        else:
+            status = STATUS_FAILED
+            finished.append((status, result, execution_time, self._timestamp(), command.id))
+        if status != STATUS_PENDING:
+            self._stats[status] += 1
+        self._move(command, STATUS_SENT, status)
+        events.append(self._event(command, status, result, execution_time))
+
+    def _expire(self, now: float):
+        """Essais sans résultat dans leur délai, commandes restées trop longtemps en file"""
+        finished = []
+        requeued = []
+        events = []
+        with self._lock:
+            overdue = [command for command in self._in_flight.values() if command.deadline <= now]
+            for command in overdue:
+                del self._in_flight[command.id]
+                self._release(command)
+                self._stats['attempt_timeouts'] += 1
+                self._conclude(command, 'timeout', None, command.timeout, now, finished, requeued, events)
+
+            for agent_id in list(self._queues):
+                queue = self._queues[agent_id]
+                kept = [item for item in queue if now - item[1].created < self.pending_ttl]
+                if len(kept) == len(queue):
+                    continue
+                for _, command in queue:
+                    if now - command.created >= self.pending_ttl:
+                        self._stats['expired'] += 1
+                        finished.append((STATUS_FAILED, 'expired', None, self._timestamp(), command.id))
+                        self._move(command, STATUS_PENDING, STATUS_FAILED)
+                        events.append(self._event(command, STATUS_FAILED, 'expired'))
+                if kept:
+                    heapq.heapify(kept)
+                    self._queues[agent_id] = kept
+                else:
+                    del self._queues[agent_id]
+
+        self._write(finished=finished, requeued=requeued)
+        self._emit(events)
+
+    # ------------------------------------------------------------------
+    # Écriture et notifications
+    # ------------------------------------------------------------------
+
+    def _write(self, sent: list = (), finished: list = (), requeued: list = ()):
+        if not (sent or finished or requeued):
+            return
+        if not self.db.update_command_transitions(sent=sent, finished=finished, requeued=requeued):
+            with self._lock:
+                self._stats['write_errors'] += 1
+
+    def _move(self, command: _Command, old: str, new: str):
+        """Compteurs du lot (verrou tenu) ; un lot repris après redémarrage n'en a pas"""
+        batch = self._batches.get(command.batch_id)
+        if batch is not None:
+            batch.move(old, new)
+
+    def _event(self, command: _Command, status: str, result: str = None,
+               execution_time: float = None) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Événement individuel, pour un lot d'une seule commande (verrou tenu)"""
+        batch = self._batches.get(command.batch_id)
+        if batch is None or batch.total != 1 or not batch.sid:
+            return None
+        return batch.sid, {
+            'command_id': command.id,
+            'batch_id': command.batch_id,
+            'agent_id': command.agent_id,
+            'status': status,
+            'attempts': command.attempts,
+            'result': result,
+            'execution_time': execution_time,
+        }
+
+    def _emit(self, events: list):
+        if self.on_status is None:
+            return
+        for event in events:
+            if event is None:
+                continue
+            sid, payload = event
+            try:
+                self.on_status(sid, 'command_status', payload)
+            except Exception as e:
+                logger.error(f"Erreur notification commande {payload['command_id']}: {e}")
+
+    def _push_batches(self):
+        """Compteurs agrégés des envois groupés, au plus un message par lot et par passage"""
+        with self._lock:
+            updates = []
+            for batch_id, batch in list(self._batches.items()):
+                if batch.changed and batch.total > 1 and batch.sid:
+                    updates.append((batch.sid, batch.as_dict()))
+                batch.changed = False
+                if batch.finished:
+                    del self._batches[batch_id]
+        if self.on_status is None:
+            return
+        for sid, payload in updates:
+            try:
+                self.on_status(sid, 'command_batch', payload)
+            except Exception as e:
+                logger.error(f"Erreur notification lot {payload['batch_id']}: {e}")
+
+    @staticmethod
+    def _timestamp() -> str:
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+    # ------------------------------------------------------------------
+    # Consultation
+    # ------------------------------------------------------------------
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Compteurs d'un lot : mémoire s'il est actif, sinon command_history"""
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is not None:
+                return batch.as_dict()
+        counts = self.db.get_command_batch(batch_id)
+        if not counts:
+            return None
+        return {'batch_id': batch_id, 'total': sum(counts.values()), 'counts': counts,
+                'finished': not (counts.get(STATUS_PENDING) or counts.get(STATUS_SENT))}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profondeur de file, commandes en vol et compteurs de transitions"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queued'] = sum(len(queue) for queue in self._queues.values()) + len(self._retries)
+            stats['waiting_retry'] = len(self._retries)
+            stats['in_flight'] = len(self._in_flight)
+            stats['agents_waiting'] = len(self._queues)
+            stats['active_batches'] = len(self._batches)
+        stats['max_in_flight'] = self.max_in_flight
+        return stats
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+MIFTAH - Banc d'essai du transport agents
+Simule des centaines d'agents DEALER sur la boucle locale face au hub ROUTER
+
+Usage : python -m core.agents.simulator [--agents 300] [--commands 3000] [--hwm 1000]
+        python -m core.agents.simulator --gateways 4 --agents 2000
+        python -m core.agents.simulator --drop 0.05 --attempt-timeout 1
+
+Le hub (DatabaseManager temporaire, AgentRegistry, AgentTransport,
+CommandScheduler) tourne dans des threads ; les agents partagent un seul
+thread et un seul Poller. Avec --gateways N, les connexions sont terminées
+par N processus passerelle et le hub s'y attache via GatewayPool.
+Les commandes sont soumises comme des actions opérateur diffusées à tous
+les agents (un lot par action). Chaque agent répond avec un execution_time
+déterministe, que le banc retrouve ensuite dans command_history ; --drop
+fait ignorer une part des premiers envois pour exercer les reprises.
+Code de sortie 1 si un résultat manque ou diffère.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import socket as pysocket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import zmq
+
+# Ajouter le répertoire parent au path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from core.database.models import DatabaseManager
+from core.agents.registry import AgentRegistry
+from core.agents.gateway import AgentGateway
+from core.agents.gateway_pool import GatewayPool
+from core.agents.scheduler import CommandScheduler
+from core.agents.transport import (AgentTransport, MSG_HELLO, MSG_WELCOME, MSG_HEARTBEAT,
+                                   MSG_COMMAND, MSG_RESULT, encode, decode)
+
+
+def _execution_time(command_id: int) -> float:
+    """Durée annoncée par l'agent simulé, vérifiable côté base"""
+    return round((command_id % 97) / 1000 + 0.001, 3)
+
+
+class AgentSwarm:
+    """Essaim d'agents DEALER (identité = agent_id) servis par un thread"""
+
+    def __init__(self, endpoints: List[str], count: int, heartbeat_interval: float = 1.0, drop: float = 0.0):
+        self.endpoints = endpoints
+        self.drop = drop
+        self.dropped = 0
+        self._seen = set()
+        self.heartbeat_interval = heartbeat_interval
+        self.agent_ids = [f"sim-{i:04d}" for i in range(count)]
+        self.welcomed = 0
+        self.executed = 0
+        self._context = zmq.Context()
+        self._context.set(zmq.MAX_SOCKETS, count + 16)  # 1023 par défaut
+        self._sockets: Dict[zmq.Socket, str] = {}
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        for i, agent_id in enumerate(self.agent_ids):
+            socket = self._context.socket(zmq.DEALER)
+            socket.setsockopt(zmq.ROUTING_ID, agent_id.encode())
+            socket.setsockopt(zmq.LINGER, 0)
+            socket.connect(self.endpoints[i % len(self.endpoints)])
+            socket.send_multipart(encode(MSG_HELLO, {'name': agent_id, 'type': 'simulator',
+                                                     'location': 'loopback'}))
+            self._sockets[socket] = agent_id
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+        for socket in self._sockets:
+            socket.close(0)
+        self._context.term()
+
+    def _run(self):
+        poller = zmq.Poller()
+        for socket in self._sockets:
+            poller.register(socket, zmq.POLLIN)
+        last_beat = time.monotonic()
+
+        while self._running:
+            for socket, _ in poller.poll(10):
+                while True:
+                    try:
+                        kind, payload = socket.recv_multipart(zmq.NOBLOCK)[:2]
+                    except zmq.Again:
+                        break
+                    if kind == MSG_WELCOME:
+                        self.welcomed += 1
+                    elif kind == MSG_COMMAND:
+                        command = decode(payload)
+                        if command['id'] not in self._seen:
+                            self._seen.add(command['id'])
+                            if random.random() < self.drop:
+                                # Premier envoi perdu : l'ordonnanceur doit rejouer
+                                self.dropped += 1
+                                continue
+                        socket.send_multipart(encode(MSG_RESULT, {
+                            'id': command['id'],
+                            'status': 'completed',
+                            'result': {'echo': command['command']},
+                            'execution_time': _execution_time(command['id']),
+                        }))
+                        self.executed += 1
+
+            if time.monotonic() - last_beat >= self.heartbeat_interval:
+                last_beat = time.monotonic()
+                for socket in self._sockets:
+                    socket.send_multipart(encode(MSG_HEARTBEAT))
+
+
+def _free_port() -> int:
+    with pysocket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def _run_gateway(agent_endpoint: str, uplink_endpoint: str, command_timeout: float, hwm: int):
+    AgentGateway(agent_endpoint, uplink_endpoint, timeout=30, command_timeout=command_timeout,
+                 sndhwm=hwm, rcvhwm=hwm).serve_forever()
+
+
+def _percentile(values: List[float], ratio: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+def _wait(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation d'agents sur le transport ZeroMQ")
+    parser.add_argument('--agents', type=int, default=300)
+    parser.add_argument('--commands', type=int, default=3000, help="arrondi à un multiple de --agents")
+    parser.add_argument('--in-flight', type=int, default=4, help="commandes en vol par agent")
+    parser.add_argument('--attempt-timeout', type=float, default=10)
+    parser.add_argument('--drop', type=float, default=0.0, help="part des premiers envois ignorés")
+    parser.add_argument('--hwm', type=int, default=1000, help="SNDHWM/RCVHWM du socket ROUTER")
+    parser.add_argument('--max-pending', type=int, default=1000, help="taille de la file d'envoi")
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--gateways', type=int, default=0, help="processus passerelle (0 : transport local)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='miftah-sim-')
+    db = DatabaseManager(os.path.join(workdir, 'miftah.db'), 'simulator-key')
+    registry = AgentRegistry(db, timeout=30)
+    finished_at: Dict[str, float] = {}
+
+    def on_status(sid, event, payload):
+        if event == 'command_batch' and payload['finished']:
+            finished_at[payload['batch_id']] = time.monotonic()
+
+    gateways = []
+    if args.gateways:
+        endpoints = [f"tcp://127.0.0.1:{_free_port()}" for _ in range(args.gateways)]
+        uplinks = [f"ipc://{workdir}/gateway-{i}.ipc" for i in range(args.gateways)]
+        for endpoint, uplink in zip(endpoints, uplinks):
+            process = multiprocessing.Process(target=_run_gateway, daemon=True,
+                                              args=(endpoint, uplink, args.timeout, args.hwm))
+            process.start()
+            gateways.append(process)
+        transport = GatewayPool(db, registry, uplinks, max_pending=args.max_pending,
+                                command_timeout=args.timeout, max_agents=args.agents,
+                                auto_register=True, context=zmq.Context())
+        transport.attach()
+        # Attendre les passerelles avant de connecter les agents
+        _wait(lambda: all(g['alive'] for g in transport.get_stats()['gateways']), args.timeout)
+    else:
+        transport = AgentTransport(db, registry, endpoint='tcp://127.0.0.1:0',
+                                   sndhwm=args.hwm, rcvhwm=args.hwm, max_pending=args.max_pending,
+                                   command_timeout=args.timeout, max_agents=args.agents,
+                                   auto_register=True, context=zmq.Context())
+        endpoints = [transport.bind()]
+    spawn = lambda fn: threading.Thread(target=fn, daemon=True).start()
+    scheduler = CommandScheduler(db, registry, transport, max_in_flight=args.in_flight,
+                                 attempt_timeout=args.attempt_timeout, retry_backoff=0.1,
+                                 tick=0.01, on_status=on_status)
+    transport.on_results = scheduler.handle_results
+    transport.start(spawn, time.sleep)
+    scheduler.start(spawn, time.sleep)
+
+    swarm = AgentSwarm(endpoints, args.agents, drop=args.drop)
+    failures = []
+    try:
+        started = time.monotonic()
+        swarm.start()
+        if not _wait(lambda: registry.get_counts()['active'] == args.agents, args.timeout):
+            failures.append(f"agents en ligne: {registry.get_counts()['active']}/{args.agents}")
+        print(f"{args.agents} agents en ligne en {time.monotonic() - started:.2f} s sur {', '.join(endpoints)}")
+
+        db.create_user('simulator', 'simulator-password')
+        with db.get_connection() as conn:
+            user_id = conn.execute("SELECT id FROM users WHERE username = 'simulator'").fetchone()[0]
+        # Une action opérateur par lot, diffusée à tous les agents
+        actions = max(1, math.ceil(args.commands / args.agents))
+        submitted_at = {}
+        started = time.monotonic()
+        for action in range(actions):
+            batch = scheduler.submit(user_id, f"ping {action}", {'seq': action},
+                                     targets=swarm.agent_ids, sid='simulator')
+            submitted_at[batch['batch_id']] = (time.monotonic(), action)
+        total = actions * args.agents
+        _wait(lambda: len(finished_at) >= actions, args.timeout * 4)
+        elapsed = time.monotonic() - started
+
+        stats = scheduler.get_stats()
+        print(f"{actions} actions x {args.agents} agents: {stats['done']}/{total} commandes en {elapsed:.2f} s "
+              f"({stats['done'] / elapsed:.0f} commandes/s), {stats['retries']} reprises "
+              f"({swarm.dropped} envois ignorés), {stats['send_refused']} refus de file")
+        latencies = [finished_at[b] - t for b, (t, _) in submitted_at.items() if b in finished_at]
+        print(f"  durée d'un lot p50 {_percentile(latencies, 0.5) * 1000:.0f} ms  "
+              f"max {max(latencies, default=0) * 1000:.0f} ms")
+        if len(finished_at) < actions:
+            failures.append(f"lots terminés: {len(finished_at)}/{actions}")
+
+        # Vérification de command_history
+        with db.get_connection() as conn:
+            rows = conn.execute(
+                "SELECT id, batch_id, status, result, execution_time, attempts FROM command_history "
+                "WHERE batch_id IS NOT NULL"
+            ).fetchall()
+        if len(rows) != total:
+            failures.append(f"lignes command_history: {len(rows)}/{total}")
+        for row in rows:
+            action = submitted_at[row['batch_id']][1]
+            if row['status'] != 'done':
+                failures.append(f"commande {row['id']}: {dict(row)}")
+            elif row['execution_time'] != _execution_time(row['id']):
+                failures.append(f"commande {row['id']}: execution_time {row['execution_time']}")
+            elif json.loads(row['result']) != {'echo': f"ping {action}"}:
+                failures.append(f"commande {row['id']}: résultat {row['result']}")
+
+        stats = transport.get_stats()
+        print(f"  transport: {stats['commands_sent']} envoyées, {stats['hwm_stalls']} blocages HWM, "
+              f"{stats['timeouts']} délais dépassés")
+        for gateway in stats.get('gateways', []):
+            print(f"  {gateway['name']}: {gateway['agents']} agents, "
+                  f"{(gateway['stats'] or {}).get('state_batches', 0)} lots d'état remontés")
+    finally:
+        scheduler.stop()
+        transport.stop()
+        swarm.stop()
+        for process in gateways:
+            process.terminate()
+            process.join()
+        time.sleep(0.05)
+        db.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print(f"ÉCHEC: {len(failures)} anomalies")
+        for failure in failures[:20]:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("OK: command_history conforme")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,430 @@
+"""
+MIFTAH - Transport ZeroMQ des agents
+Socket ROUTER unique : identité par agent, commandes multiplexées et corrélées
+"""
+
+import json
+import time
+import threading
+import logging
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from core.security.passwords import _eventlet_patched
+from core.agents.auth import AgentAuthenticator, is_local_endpoint
+
+if _eventlet_patched():
+    from eventlet.green import zmq
+else:
+    import zmq
+
+logger = logging.getLogger(__name__)
+
+# Trames : [identité, type, charge JSON]
+MSG_HELLO = b'HELLO'        # agent -> hub : annonce (name, type, location)
+MSG_WELCOME = b'WELCOME'    # hub -> agent : annonce acceptée (intervalle de battement)
+MSG_REJECT = b'REJECT'      # hub -> agent : agent inconnu ou limite atteinte
+MSG_HEARTBEAT = b'HB'       # agent -> hub : battement (location optionnelle)
+MSG_COMMAND = b'CMD'        # hub -> agent : {id, command, parameters}
+MSG_RESULT = b'RESULT'      # agent -> hub : {id, status, result, execution_time}
+
+# Battements ZMTP (ms) : une connexion morte libère son identité de routage
+PEER_HEARTBEAT_IVL = 5000
+PEER_HEARTBEAT_TIMEOUT = 15000
+
+
+def encode(kind: bytes, payload: Dict[str, Any] = None) -> list:
+    return [kind, json.dumps(payload or {}, separators=(',', ':')).encode()]
+
+
+def decode(frame: bytes) -> Dict[str, Any]:
+    try:
+        payload = json.loads(frame)
+    except (ValueError, UnicodeDecodeError):
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+class AgentTransport:
+    """Canal hub <-> agents sur un socket ROUTER
+
+    Chaque agent se connecte avec un socket DEALER dont l'identité de
+    routage est son agent_id. Les commandes sont pipelinées : plusieurs
+    peuvent être en vol pour un même agent, corrélées par l'id de la ligne
+    command_history. Le socket n'est manipulé que par la boucle d'E/S ;
+    `send_command` dépose dans une file bornée (contre-pression : refus
+    quand elle est pleine), que la boucle vide tant que le HWM d'envoi
+    le permet.
+
+    Avec `secret_key`, le socket est serveur CURVE et seuls les agents
+    dont la clé publique figure dans `agent_keys` sont admis, chacun sous
+    son propre agent_id (voir AgentAuthenticator). Sans clé, la liaison
+    est refusée hors de la boucle locale.
+    """
+
+    def __init__(self, db, registry, endpoint: str = 'tcp://127.0.0.1:5555',
+                 sndhwm: int = 1000, rcvhwm: int = 1000, max_pending: int = 10000,
+                 command_timeout: float = 300, heartbeat_interval: float = 30,
+                 max_agents: int = 50, auto_register: bool = False, poll_timeout: float = 0.01,
+                 on_result: Callable[[int, Dict[str, Any]], None] = None,
+                 on_results: Callable[[List[Dict[str, Any]]], None] = None,
+                 secret_key: str = None, agent_keys: Dict[str, str] = None, context=None):
+        self.db = db
+        self.registry = registry
+        self.endpoint = endpoint
+        self.sndhwm = sndhwm
+        self.rcvhwm = rcvhwm
+        self.max_pending = max_pending
+        self.command_timeout = command_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.max_agents = max_agents
+        self.auto_register = auto_register
+        self.poll_timeout = poll_timeout
+        self.on_result = on_result
+        self.on_results = on_results
+        self.secret_key = secret_key
+        self.agent_keys = agent_keys or {}
+
+        self._context = context or zmq.Context.instance()
+        self._socket = None
+        self._auth = None
+        self._outbox = deque()
+        self._in_flight: Dict[int, Tuple[str, float]] = {}
+        self._results = []
+        self._stalled = False
+        self._lock = threading.Lock()
+        self._running = False
+        self._sleep = time.sleep
+        self._last_expiry = 0.0
+        self._stats = {
+            'commands_sent': 0,
+            'commands_rejected': 0,
+            'results': 0,
+            'unknown_results': 0,
+            'undeliverable': 0,
+            'timeouts': 0,
+            'hwm_stalls': 0,
+            'hello': 0,
+            'hello_rejected': 0,
+            'unauthenticated': 0,
+            'rtt_total': 0.0,
+            'rtt_max': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    def bind(self) -> str:
+        """Ouvre le socket ROUTER ; retourne l'adresse effective (port 0 -> port choisi)
+
+        ValueError pour une adresse hors boucle locale sans clé CURVE.
+        """
+        if not self.secret_key and not is_local_endpoint(self.endpoint):
+            raise ValueError(f"Transport agents sur {self.endpoint} sans CURVE : "
+                             f"définir MIFTAH_GATEWAY_SECRET_KEY ou écouter sur la boucle locale")
+        socket = self._context.socket(zmq.ROUTER)
+        socket.setsockopt(zmq.SNDHWM, self.sndhwm)
+        socket.setsockopt(zmq.RCVHWM, self.rcvhwm)
+        socket.setsockopt(zmq.LINGER, 0)
+        # Identité inconnue : erreur au lieu d'un abandon silencieux
+        socket.setsockopt(zmq.ROUTER_MANDATORY, 1)
+        # Pas de ROUTER_HANDOVER : une seconde connexion sous un agent_id déjà
+        # connecté est refusée par libzmq, la route en place est conservée
+        socket.setsockopt(zmq.HEARTBEAT_IVL, PEER_HEARTBEAT_IVL)
+        socket.setsockopt(zmq.HEARTBEAT_TIMEOUT, PEER_HEARTBEAT_TIMEOUT)
+        if self.secret_key:
+            self._auth = AgentAuthenticator(self.agent_keys, self._context)
+            self._auth.secure(socket, self.secret_key)
+        if self.endpoint.endswith(':0'):
+            port = socket.bind_to_random_port(self.endpoint[:-2])
+            self.endpoint = f"{self.endpoint[:-2]}:{port}"
+        else:
+            socket.bind(self.endpoint)
+        self._socket = socket
+        logger.info(f"Transport agents en écoute sur {self.endpoint}{' (CURVE)' if self._auth else ''}")
+        return self.endpoint
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Lance la boucle d'E/S via les primitives du serveur (ex: SocketIO)"""
+        if self._running:
+            return
+        if self._socket is None:
+            self.bind()
+        self._running = True
+        self._sleep = sleep
+        spawn(self._run)
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        self._running = False
+        if self._socket is not None:
+            self._socket.close(0)
+            self._socket = None
+        if self._auth is not None:
+            self._auth.close()
+            self._auth = None
+
+    def _poller(self):
+        poller = zmq.Poller()
+        poller.register(self._socket, zmq.POLLIN)
+        if self._auth is not None:
+            poller.register(self._auth.socket, zmq.POLLIN)
+        return poller
+
+    def _run(self):
+        poller = self._poller()
+        try:
+            while self._running:
+                self.run_once(poller)
+                # Céder la main aux autres greenlets même sous charge continue
+                self._sleep(0)
+        finally:
+            self.close()
+
+    def run_once(self, poller=None) -> int:
+        """Un tour de boucle : réception, envoi de la file, expiration ; retourne les messages traités"""
+        if poller is None:
+            poller = self._poller()
+
+        handled = 0
+        busy = self._outbox and not self._stalled
+        events = dict(poller.poll(0 if busy else self.poll_timeout * 1000))
+        if self._auth is not None and self._auth.socket in events:
+            self._auth.handle()
+        if self._socket in events:
+            # Vider ce qui est disponible, par paquets pour ne pas affamer l'envoi
+            while handled < 1000:
+                try:
+                    frames = self._socket.recv_multipart(zmq.NOBLOCK, copy=self._auth is None)
+                except zmq.Again:
+                    break
+                handled += 1
+                if self._auth is not None:
+                    if self._auth.verify(frames) is None:
+                        # Identité de routage différente de l'agent de la clé
+                        with self._lock:
+                            self._stats['unauthenticated'] += 1
+                        continue
+                    frames = [frame.bytes for frame in frames]
+                self._handle(frames)
+
+        self._drain_outbox()
+
+        now = time.monotonic()
+        if now - self._last_expiry >= 1.0:
+            self._last_expiry = now
+            self._expire(now)
+        self._flush_results()
+        return handled
+
+    # ------------------------------------------------------------------
+    # Envoi
+    # ------------------------------------------------------------------
+
+    def send_command(self, agent_id: str, command_id: int, command: str,
+                     parameters: Dict[str, Any] = None) -> bool:
+        """Dépose une commande pour un agent ; False si l'agent est hors ligne ou la file pleine"""
+        if not self.registry.is_online(agent_id):
+            with self._lock:
+                self._stats['commands_rejected'] += 1
+            return False
+        with self._lock:
+            if len(self._outbox) >= self.max_pending:
+                self._stats['commands_rejected'] += 1
+                return False
+            self._outbox.append((agent_id, command_id, command, parameters or {}))
+        return True
+
+    def _drain_outbox(self):
+        """Envoie la file ; un agent dont le HWM est atteint ne bloque pas les autres"""
+        with self._lock:
+            batch = list(self._outbox)
+            self._outbox.clear()
+        if not batch:
+            self._stalled = False
+            return
+
+        stalled = set()
+        kept = []
+        sent = 0
+        for item in batch:
+            agent_id, command_id, command, parameters = item
+            if agent_id in stalled:
+                kept.append(item)
+                continue
+
+            frames = [agent_id.encode()] + encode(MSG_COMMAND, {
+                'id': command_id, 'command': command, 'parameters': parameters
+            })
+            try:
+                self._socket.send_multipart(frames, zmq.NOBLOCK)
+            except zmq.Again:
+                # HWM atteint pour ce pair : ses commandes restent en file, dans l'ordre
+                stalled.add(agent_id)
+                kept.append(item)
+                continue
+            except zmq.ZMQError as e:
+                if e.errno != zmq.EHOSTUNREACH:
+                    raise
+                with self._lock:
+                    self._stats['undeliverable'] += 1
+                self._finish(command_id, agent_id, {'status': 'undeliverable'}, None)
+                continue
+
+            sent += 1
+            with self._lock:
+                self._in_flight[command_id] = (agent_id, time.monotonic())
+
+        with self._lock:
+            self._stats['commands_sent'] += sent
+            self._stats['hwm_stalls'] += len(stalled)
+            if kept:
+                self._outbox.extendleft(reversed(kept))
+        self._stalled = sent == 0 and bool(kept)
+
+    def _reply(self, agent_id: str, kind: bytes, payload: Dict[str, Any] = None):
+        try:
+            self._socket.send_multipart([agent_id.encode()] + encode(kind, payload), zmq.NOBLOCK)
+        except zmq.ZMQError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Réception
+    # ------------------------------------------------------------------
+
+    def _handle(self, frames: list):
+        if len(frames) < 2:
+            return
+        try:
+            agent_id = frames[0].decode()
+        except UnicodeDecodeError:
+            return
+        kind = frames[1]
+        payload = decode(frames[2]) if len(frames) > 2 else {}
+
+        if kind == MSG_HEARTBEAT:
+            self.registry.heartbeat(agent_id, payload.get('location'))
+        elif kind == MSG_RESULT:
+            self._on_result(agent_id, payload)
+        elif kind == MSG_HELLO:
+            self._on_hello(agent_id, payload)
+
+    def _on_hello(self, agent_id: str, payload: Dict[str, Any]):
+        with self._lock:
+            self._stats['hello'] += 1
+
+        if not self.registry.is_known(agent_id):
+            counts = self.registry.get_counts()
+            if not self.auto_register or counts['total'] >= self.max_agents:
+                with self._lock:
+                    self._stats['hello_rejected'] += 1
+                self._reply(agent_id, MSG_REJECT, {'reason': 'unknown_agent'})
+                logger.warning(f"Agent refusé: {agent_id}")
+                return
+            if not self.db.register_agent(agent_id, payload.get('name') or agent_id,
+                                          payload.get('type') or 'generic',
+                                          payload.get('location')):
+                self._reply(agent_id, MSG_REJECT, {'reason': 'registration_failed'})
+                return
+            self.registry.track(agent_id, payload.get('location'))
+
+        self.registry.heartbeat(agent_id, payload.get('location'))
+        self._reply(agent_id, MSG_WELCOME, {'heartbeat_interval': self.heartbeat_interval})
+
+    def _on_result(self, agent_id: str, payload: Dict[str, Any]):
+        command_id = payload.get('id')
+        with self._lock:
+            entry = self._in_flight.get(command_id)
+            if entry is None or entry[0] != agent_id:
+                # Résultat tardif (délai dépassé) ou d'un autre agent
+                self._stats['unknown_results'] += 1
+                return
+            del self._in_flight[command_id]
+            rtt = time.monotonic() - entry[1]
+            self._stats['results'] += 1
+            self._stats['rtt_total'] += rtt
+            self._stats['rtt_max'] = max(self._stats['rtt_max'], rtt)
+
+        # Un résultat vaut battement
+        self.registry.heartbeat(agent_id)
+        execution_time = payload.get('execution_time')
+        if not isinstance(execution_time, (int, float)):
+            execution_time = rtt
+        self._finish(command_id, agent_id, payload, execution_time)
+
+    def _finish(self, command_id: int, agent_id: str, payload: Dict[str, Any],
+                execution_time: Optional[float]):
+        """Met le résultat en attente d'écriture (un lot par tour de boucle)"""
+        status = str(payload.get('status') or 'completed')
+        result = payload.get('result')
+        if result is not None and not isinstance(result, str):
+            result = json.dumps(result)
+        self._results.append((command_id, agent_id, status, result, execution_time))
+
+    def _flush_results(self):
+        """Écrit les résultats du tour en une transaction, puis les notifie"""
+        if not self._results:
+            return
+        results, self._results = self._results, []
+        if self.on_results is not None:
+            self._hand_over(results)
+            return
+        self.db.update_command_results([
+            (status, result, execution_time, command_id)
+            for command_id, _, status, result, execution_time in results
+        ])
+        if self.on_result is None:
+            return
+        for command_id, agent_id, status, result, execution_time in results:
+            try:
+                self.on_result(command_id, {
+                    'command_id': command_id,
+                    'agent_id': agent_id,
+                    'status': status,
+                    'result': result,
+                    'execution_time': execution_time,
+                })
+            except Exception as e:
+                logger.error(f"Erreur notification résultat {command_id}: {e}")
+
+    def _hand_over(self, results: list):
+        """Transmet le lot à l'ordonnanceur, qui tient lui-même command_history"""
+        try:
+            self.on_results([{
+                'command_id': command_id,
+                'agent_id': agent_id,
+                'status': status,
+                'result': result,
+                'execution_time': execution_time,
+            } for command_id, agent_id, status, result, execution_time in results])
+        except Exception as e:
+            logger.error(f"Erreur traitement lot de résultats: {e}")
+
+    def _expire(self, now: float):
+        """Clôt les commandes restées sans résultat au-delà du délai"""
+        with self._lock:
+            expired = [(command_id, agent_id) for command_id, (agent_id, sent) in self._in_flight.items()
+                       if now - sent > self.command_timeout]
+            for command_id, _ in expired:
+                del self._in_flight[command_id]
+            self._stats['timeouts'] += len(expired)
+        for command_id, agent_id in expired:
+            self._finish(command_id, agent_id, {'status': 'timeout'}, self.command_timeout)
+
+    # ------------------------------------------------------------------
+    # Consultation
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Commandes en file / en vol, blocages HWM et temps d'aller-retour"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._outbox)
+            stats['in_flight'] = len(self._in_flight)
+        stats['rtt_avg'] = stats['rtt_total'] / stats['results'] if stats['results'] else 0.0
+        stats['endpoint'] = self.endpoint
+        stats['auth'] = self._auth.get_stats() if self._auth is not None else None
+        return stats
@@ -0,0 +1,175 @@
+"""
+MIFTAH - Répartiteur TCP à sessions collantes
+Un client (adresse IP) reste sur le même worker ; son adresse réelle est
+transmise au worker par un en-tête PROXY v1
+"""
+
+import asyncio
+import socket
+import time
+import zlib
+import logging
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# En-tête PROXY v1 : "PROXY TCP4 src dst sport dport\r\n", 107 octets au plus
+_PROXY_PREFIX = b'PROXY '
+_PROXY_MAX = 107
+_CHUNK = 64 * 1024
+
+
+def proxy_header(source: Tuple, destination: Tuple) -> bytes:
+    """En-tête PROXY v1 décrivant la connexion d'origine"""
+    family = 'TCP6' if ':' in source[0] else 'TCP4'
+    return f"PROXY {family} {source[0]} {destination[0]} {source[1]} {destination[1]}\r\n".encode()
+
+
+def read_proxy_header(conn, timeout: float = 2.0) -> Optional[Tuple[str, int]]:
+    """Consomme l'en-tête PROXY v1 d'une connexion acceptée ; None s'il est absent
+
+    Lecture en MSG_PEEK : sans en-tête, aucun octet de la requête n'est
+    consommé.
+    """
+    previous = conn.gettimeout()
+    conn.settimeout(timeout)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            data = conn.recv(_PROXY_MAX, socket.MSG_PEEK)
+            if not data or not _PROXY_PREFIX.startswith(data[:len(_PROXY_PREFIX)]):
+                return None
+            end = data.find(b'\r\n')
+            if end >= 0:
+                break
+            if len(data) >= _PROXY_MAX or time.monotonic() > deadline:
+                return None
+            time.sleep(0.001)
+
+        conn.recv(end + 2)
+        fields = data[:end].decode('ascii', 'replace').split(' ')
+        if len(fields) != 6 or fields[1] not in ('TCP4', 'TCP6'):
+            return None  # "PROXY UNKNOWN" : adresse de la connexion conservée
+        return fields[2], int(fields[4])
+    except (OSError, ValueError):
+        return None
+    finally:
+        conn.settimeout(previous)
+
+
+class ProxyProtocolListener:
+    """Socket d'écoute dont accept() retourne l'adresse annoncée par le répartiteur
+
+    S'enveloppe autour du socket passé à eventlet.wsgi.server : REMOTE_ADDR
+    (journaux de sécurité, limites par IP) reste l'adresse du client.
+    """
+
+    def __init__(self, sock, timeout: float = 2.0):
+        self._sock = sock
+        self.timeout = timeout
+
+    def accept(self):
+        conn, address = self._sock.accept()
+        source = read_proxy_header(conn, self.timeout)
+        return conn, source or address
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class StickyBalancer:
+    """Répartiteur TCP : hachage de l'adresse IP du client sur les workers
+
+    Le même client retombe sur le même worker (sessions Socket.IO en
+    long-polling comprises). Si ce worker ne répond pas, les suivants sont
+    essayés dans l'ordre de l'anneau. `backends()` retourne la liste
+    courante des (hôte, port, disponible).
+    """
+
+    def __init__(self, host: str, port: int, backends: Callable[[], List[Tuple[str, int, bool]]],
+                 connect_timeout: float = 2.0):
+        self.host = host
+        self.port = port
+        self.backends = backends
+        self.connect_timeout = connect_timeout
+        self._server = None
+        self._stats = {
+            'connections': 0,
+            'active': 0,
+            'failovers': 0,
+            'refused': 0,
+        }
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Répartiteur à l'écoute sur {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    @staticmethod
+    def pick(address: str, count: int) -> int:
+        """Worker attitré d'une adresse IP"""
+        return zlib.crc32(address.encode()) % count
+
+    async def _connect(self, address: str):
+        backends = self.backends()
+        if not backends:
+            return None
+        first = self.pick(address, len(backends))
+        for offset in range(len(backends)):
+            host, port, available = backends[(first + offset) % len(backends)]
+            if not available:
+                continue
+            try:
+                stream = await asyncio.wait_for(asyncio.open_connection(host, port), self.connect_timeout)
+            except (OSError, asyncio.TimeoutError):
+                continue
+            if offset:
+                self._stats['failovers'] += 1
+            return stream
+        return None
+
+    async def _handle(self, reader, writer):
+        source = writer.get_extra_info('peername')
+        destination = writer.get_extra_info('sockname')
+        self._stats['connections'] += 1
+        upstream = await self._connect(source[0])
+        if upstream is None:
+            self._stats['refused'] += 1
+            writer.close()
+            return
+
+        up_reader, up_writer = upstream
+        self._stats['active'] += 1
+        try:
+            up_writer.write(proxy_header(source, destination))
+            await asyncio.gather(self._pump(reader, up_writer), self._pump(up_reader, writer))
+        finally:
+            self._stats['active'] -= 1
+            for stream in (writer, up_writer):
+                stream.close()
+
+    @staticmethod
+    async def _pump(reader, writer):
+        try:
+            while True:
+                data = await reader.read(_CHUNK)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            # Demi-fermeture : l'autre sens finit de s'écouler
+            try:
+                if writer.can_write_eof():
+                    writer.write_eof()
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
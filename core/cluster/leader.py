@@ -0,0 +1,134 @@
+"""
+MIFTAH - Élection du worker chef
+Verrou flock sur un fichier partagé : les tâches de fond ne tournent qu'une fois
+"""
+
+import fcntl
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """Désigne un chef parmi les workers d'un même hôte
+
+    Le chef garde un verrou exclusif (flock) sur `lock_path` jusqu'à sa
+    mort ; le noyau le libère quelle qu'en soit la cause (arrêt, crash,
+    SIGKILL). Les suiveurs retentent toutes les `retry_interval` secondes :
+    le premier qui obtient le verrou appelle `on_elected()`. En attendant,
+    `on_follow()` est appelé toutes les `follow_interval` secondes pour
+    relire l'état que le chef écrit en base.
+    """
+
+    def __init__(self, lock_path, identity: str, retry_interval: float = 2.0,
+                 follow_interval: float = 10.0, on_elected: Callable[[], None] = None,
+                 on_follow: Callable[[], None] = None, clock: Callable[[], float] = time.monotonic):
+        self.lock_path = Path(lock_path)
+        self.identity = identity
+        self.retry_interval = retry_interval
+        self.follow_interval = follow_interval
+        self.on_elected = on_elected
+        self.on_follow = on_follow
+        self._clock = clock
+
+        self._fd: Optional[int] = None
+        self._running = False
+        self._sleep = time.sleep
+        self._stats = {
+            'attempts': 0,
+            'elected_at': None,
+            'follows': 0,
+            'follow_errors': 0,
+        }
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """Tente de prendre le verrou sans attendre ; True si ce worker est chef"""
+        if self._fd is not None:
+            return True
+        self._stats['attempts'] += 1
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.lock_path), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        # Identité du chef lisible par les suiveurs (/api/status)
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{self.identity} {os.getpid()}\n".encode())
+        self._fd = fd
+        self._stats['elected_at'] = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        return True
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Prend la tête si possible (synchrone), sinon surveille le verrou en tâche de fond"""
+        if self._running:
+            return
+        self._running = True
+        self._sleep = sleep
+        if self.try_acquire():
+            self._elected()
+            return
+        logger.info(f"{self.identity}: suiveur, chef actuel {self.current_leader()}")
+        spawn(self._run)
+
+    def stop(self):
+        """Relâche le verrou ; un suiveur prend la relève au prochain essai"""
+        self._running = False
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+
+    def _run(self):
+        last_follow = self._clock()
+        while self._running:
+            self._sleep(self.retry_interval)
+            if not self._running:
+                break
+            try:
+                if self.try_acquire():
+                    self._elected()
+                    break
+                if self.on_follow is not None and self._clock() - last_follow >= self.follow_interval:
+                    last_follow = self._clock()
+                    self.on_follow()
+                    self._stats['follows'] += 1
+            except Exception as e:
+                self._stats['follow_errors'] += 1
+                logger.error(f"Erreur élection du chef: {e}")
+
+    def _elected(self):
+        logger.info(f"{self.identity}: élu chef, démarrage des tâches de fond")
+        if self.on_elected is None:
+            return
+        try:
+            self.on_elected()
+        except Exception as e:
+            logger.error(f"Erreur démarrage des tâches du chef: {e}")
+
+    def current_leader(self) -> Optional[str]:
+        """Identité inscrite par le chef dans le fichier de verrou"""
+        try:
+            content = self.lock_path.read_text().strip()
+        except OSError:
+            return None
+        return content.split(' ')[0] if content else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['identity'] = self.identity
+        stats['leader'] = self.is_leader
+        stats['current_leader'] = self.identity if self.is_leader else self.current_leader()
+        return stats
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+MIFTAH - Superviseur multi-processus
+Lance N workers app.py derrière le répartiteur à sessions collantes
+
+Usage : python -m core.cluster.supervisor --workers 4 [--host 127.0.0.1] [--port 5000]
+        kill -HUP <pid>    redémarrage progressif, un worker à la fois
+
+Chaque worker écoute sur 127.0.0.1:(--base-port + index) ; les émissions
+Socket.IO passent par le bus ZeroMQ entre workers et un seul d'entre eux
+(élu par verrou) exécute les tâches de fond. Un worker mort est relancé ;
+SIGHUP les redémarre l'un après l'autre sans couper les clients des autres.
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+import logging
+from pathlib import Path
+from typing import Optional
+
+# Ajouter le répertoire parent au path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from config import BASE_DIR, Config, ClusterConfig
+from core.cluster.balancer import StickyBalancer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class _Worker:
+    """Processus app.py supervisé"""
+
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.process: Optional[subprocess.Popen] = None
+        self.ready = False
+        self.restarts = 0
+        self.restart_at = 0.0
+
+
+class Supervisor:
+    """Démarre, surveille et redémarre les workers"""
+
+    def __init__(self, workers: int, host: str, port: int, base_port: int,
+                 restart_delay: float = ClusterConfig.RESTART_DELAY, stop_timeout: float = 10.0):
+        self.workers = [_Worker(index, base_port + index) for index in range(workers)]
+        self.restart_delay = restart_delay
+        self.stop_timeout = stop_timeout
+        self.balancer = StickyBalancer(host, port, self.backends)
+        self._stopping = False
+        self._rolling = False
+
+    def backends(self):
+        return [('127.0.0.1', worker.port, worker.ready) for worker in self.workers]
+
+    def spawn(self, worker: _Worker):
+        env = dict(os.environ)
+        env.update({
+            'MIFTAH_WORKERS': str(len(self.workers)),
+            'MIFTAH_WORKER_INDEX': str(worker.index),
+            'MIFTAH_HOST': '127.0.0.1',
+            'MIFTAH_PORT': str(worker.port),
+        })
+        worker.process = subprocess.Popen([sys.executable, str(BASE_DIR / 'app.py')], env=env)
+        worker.ready = False
+        logger.info(f"Worker {worker.index} lancé (pid {worker.process.pid}, port {worker.port})")
+
+    async def wait_ready(self, worker: _Worker, timeout: float = 30.0) -> bool:
+        """Attend que le worker accepte des connexions"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if worker.process.poll() is not None:
+                return False
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', worker.port), 0.5)
+            except (OSError, asyncio.TimeoutError):
+                await asyncio.sleep(0.2)
+                continue
+            writer.close()
+            worker.ready = True
+            return True
+        return False
+
+    async def terminate(self, worker: _Worker):
+        worker.ready = False
+        process = worker.process
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        deadline = time.monotonic() + self.stop_timeout
+        while process.poll() is None and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    async def rolling_restart(self):
+        """Redémarre les workers un par un ; les autres continuent de servir"""
+        if self._rolling:
+            return
+        self._rolling = True
+        try:
+            for worker in self.workers:
+                if self._stopping:
+                    break
+                logger.info(f"Redémarrage du worker {worker.index}")
+                await self.terminate(worker)
+                self.spawn(worker)
+                if not await self.wait_ready(worker):
+                    logger.error(f"Worker {worker.index} non prêt après redémarrage, arrêt du cycle")
+                    break
+        finally:
+            self._rolling = False
+
+    async def monitor(self):
+        """Relance les workers morts, avec une attente croissante s'ils retombent"""
+        while not self._stopping:
+            await asyncio.sleep(0.5)
+            if self._rolling:
+                continue
+            now = time.monotonic()
+            for worker in self.workers:
+                code = worker.process.poll()
+                if code is None:
+                    if not worker.ready:
+                        await self.wait_ready(worker, timeout=0.5)
+                    continue
+                if worker.ready or not worker.restart_at:
+                    worker.ready = False
+                    worker.restarts += 1
+                    delay = min(30.0, self.restart_delay * 2 ** min(worker.restarts - 1, 5))
+                    worker.restart_at = now + delay
+                    logger.error(f"Worker {worker.index} arrêté (code {code}), relance dans {delay:.0f}s")
+                elif now >= worker.restart_at:
+                    worker.restart_at = 0.0
+                    self.spawn(worker)
+                    if await self.wait_ready(worker):
+                        worker.restarts = 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+        loop.add_signal_handler(signal.SIGHUP, lambda: loop.create_task(self.rolling_restart()))
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stopped.set)
+
+        for worker in self.workers:
+            self.spawn(worker)
+        await asyncio.gather(*(self.wait_ready(worker) for worker in self.workers))
+        await self.balancer.start()
+        monitor = loop.create_task(self.monitor())
+
+        await stopped.wait()
+        logger.info("Arrêt des workers")
+        self._stopping = True
+        monitor.cancel()
+        await self.balancer.stop()
+        await asyncio.gather(*(self.terminate(worker) for worker in self.workers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MIFTAH multi-processus derrière un répartiteur collant")
+    parser.add_argument('--workers', type=int, default=max(2, ClusterConfig.WORKERS))
+    parser.add_argument('--host', default=Config.HOST)
+    parser.add_argument('--port', type=int, default=Config.PORT)
+    parser.add_argument('--base-port', type=int, default=ClusterConfig.WORKER_BASE_PORT)
+    args = parser.parse_args()
+
+    supervisor = Supervisor(args.workers, args.host, args.port, args.base_port)
+    asyncio.run(supervisor.run())
+
+
+if __name__ == '__main__':
+    main()
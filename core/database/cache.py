@@ -0,0 +1,76 @@
+"""
+MIFTAH - Cache de lecture des tables peu modifiées
+Entrées à durée de vie limitée, invalidées par espace de noms à l'écriture
+"""
+
+import copy
+import time
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class QueryCache:
+    """Cache read-through pour module_status et agents
+
+    Les clés sont (espace, paramètres). Une écriture invalide tout son
+    espace ; un compteur de génération empêche une lecture commencée avant
+    l'écriture de réinsérer une valeur périmée. Les valeurs sont copiées
+    à la sortie : un appelant peut modifier le résultat sans altérer le cache.
+    """
+
+    def __init__(self, ttl: float = 5.0, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, Hashable], Tuple[float, Any]] = {}
+        self._generations: Dict[str, int] = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+        }
+
+    def get_or_load(self, namespace: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Valeur en cache, sinon `loader()` (mise en cache si la génération n'a pas changé)"""
+        if self.ttl <= 0:
+            return loader()
+
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[0] > now:
+                self._stats['hits'] += 1
+                return copy.deepcopy(entry[1])
+            self._stats['misses'] += 1
+            generation = self._generations.get(namespace, 0)
+
+        value = loader()
+
+        with self._lock:
+            if self._generations.get(namespace, 0) == generation:
+                self._entries[(namespace, key)] = (self._clock() + self.ttl, value)
+        return copy.deepcopy(value)
+
+    def invalidate(self, namespace: str):
+        """Oublie toutes les entrées d'un espace de noms"""
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for cache_key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[cache_key]
+            self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            for namespace in {k[0] for k in self._entries}:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Compteurs hit/miss et taux de succès"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['ttl'] = self.ttl
+        return stats
@@ -0,0 +1,111 @@
+"""
+MIFTAH - Checkpoints du journal WAL
+Checkpoint PASSIF périodique, troncature lorsque le WAL dépasse sa borne
+"""
+
+import os
+import time
+import threading
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointScheduler:
+    """Maintient le fichier -wal de miftah.db borné
+
+    Un checkpoint PASSIVE ne bloque ni lecteurs ni écrivains : il recopie
+    ce qu'il peut et laisse le reste (le retard, en trames) au passage
+    suivant. Au-delà de `max_wal_bytes`, un checkpoint TRUNCATE remet le
+    fichier à zéro dès qu'aucun lecteur ne le retient.
+    """
+
+    def __init__(self, get_connection: Callable, db_path: Path, interval: float = 60,
+                 max_wal_bytes: int = 64 * 1024 * 1024):
+        self.get_connection = get_connection
+        self.wal_path = Path(f"{db_path}-wal")
+        self.interval = interval
+        self.max_wal_bytes = max_wal_bytes
+
+        self._sleep = time.sleep
+        self._running = False
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            'runs': 0,
+            'truncates': 0,
+            'busy': 0,
+            'wal_frames': 0,
+            'checkpointed_frames': 0,
+            'lag_frames': 0,
+            'lag_frames_max': 0,
+            'wal_bytes': 0,
+            'wal_bytes_max': 0,
+            'duration_max': 0.0,
+            'last_run': None,
+        }
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Lance les checkpoints périodiques via les primitives du serveur (ex: SocketIO)"""
+        if self._running:
+            return
+        self._running = True
+        self._sleep = sleep
+        spawn(self._run)
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            self._sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Erreur checkpoint WAL: {e}")
+
+    def _wal_size(self) -> int:
+        try:
+            return os.path.getsize(self.wal_path)
+        except OSError:
+            return 0
+
+    def run_once(self) -> Dict[str, Any]:
+        """Un passage : PASSIVE, puis TRUNCATE si le WAL est trop gros"""
+        started = time.monotonic()
+        wal_bytes = self._wal_size()
+        mode = 'TRUNCATE' if wal_bytes > self.max_wal_bytes else 'PASSIVE'
+
+        with self.get_connection() as conn:
+            busy, wal_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+
+        duration = time.monotonic() - started
+        # -1 : base hors mode WAL
+        lag = max(0, wal_frames - checkpointed) if wal_frames >= 0 else 0
+
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['busy'] += 1 if busy else 0
+            self._stats['truncates'] += 1 if mode == 'TRUNCATE' and not busy else 0
+            self._stats['wal_frames'] = max(0, wal_frames)
+            self._stats['checkpointed_frames'] = max(0, checkpointed)
+            self._stats['lag_frames'] = lag
+            self._stats['lag_frames_max'] = max(self._stats['lag_frames_max'], lag)
+            self._stats['wal_bytes'] = self._wal_size()
+            self._stats['wal_bytes_max'] = max(self._stats['wal_bytes_max'], wal_bytes)
+            self._stats['duration_max'] = max(self._stats['duration_max'], duration)
+            self._stats['last_run'] = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+            result = dict(self._stats)
+
+        if busy and mode == 'TRUNCATE':
+            logger.warning(f"Checkpoint WAL incomplet ({lag} trames en retard, {wal_bytes} octets)")
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retard de checkpoint et taille du WAL"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['interval'] = self.interval
+        stats['max_wal_bytes'] = self.max_wal_bytes
+        return stats
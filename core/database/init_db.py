@@ -27,7 +27,10 @@ def init_database():
     # Créer le gestionnaire de base de données
     db = DatabaseManager(
         db_path=str(db_config.DB_PATH),
-        db_key=db_config.DB_KEY
+        db_key=db_config.DB_KEY,
+        pool_size=db_config.POOL_SIZE,
+        pool_timeout=db_config.POOL_TIMEOUT,
+        pool_recycle=db_config.POOL_RECYCLE
     )
     
     logger.info("🔐 Initialisation base de données SQLCipher")
@@ -115,10 +118,11 @@ def main():
         db = init_database()
         
         # Afficher quelques statistiques
-        users = db.get_connection().execute("SELECT COUNT(*) as count FROM users").fetchone()
-        agents = db.get_connection().execute("SELECT COUNT(*) as count FROM agents").fetchone()
-        modules = db.get_connection().execute("SELECT COUNT(*) as count FROM module_status").fetchone()
-        logs = db.get_connection().execute("SELECT COUNT(*) as count FROM security_logs").fetchone()
+        with db.get_connection() as conn:
+            users = conn.execute("SELECT COUNT(*) as count FROM users").fetchone()
+            agents = conn.execute("SELECT COUNT(*) as count FROM agents").fetchone()
+            modules = conn.execute("SELECT COUNT(*) as count FROM module_status").fetchone()
+            logs = conn.execute("SELECT COUNT(*) as count FROM security_logs").fetchone()
         
         print("\n📊 Statistiques base de données:")
         print(f"   👥 Utilisateurs: {users['count']}")
@@ -0,0 +1,216 @@
+"""
+MIFTAH - Écriture asynchrone des logs de sécurité
+File bornée vidée par lots dans des transactions multi-lignes
+"""
+
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Politiques de débordement de la file
+OVERFLOW_BLOCK = 'block'              # attendre une place (au plus put_timeout), puis rejeter
+OVERFLOW_DROP_NEW = 'drop_new'        # rejeter l'événement entrant
+OVERFLOW_DROP_OLDEST = 'drop_oldest'  # évincer l'événement le plus ancien
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_NEW, OVERFLOW_DROP_OLDEST)
+
+
+class _Waiter:
+    """Attente d'un appelant qui exige la persistance de son événement"""
+
+    __slots__ = ('event', 'success')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.success = False
+
+
+class SecurityLogWriter:
+    """Écrivain en arrière-plan pour la table security_logs
+
+    `write_batch` reçoit une liste de tuples et doit les insérer dans une
+    seule transaction ; il est appelé uniquement depuis le thread écrivain.
+    """
+
+    def __init__(self, write_batch: Callable[[List[Tuple]], None], max_queue: int = 10000,
+                 batch_size: int = 200, flush_interval: float = 0.5,
+                 overflow_policy: str = OVERFLOW_BLOCK, put_timeout: float = 1.0):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Politique de débordement inconnue: {overflow_policy}")
+
+        self._write_batch = write_batch
+        self.max_queue = max(1, max_queue)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.put_timeout = put_timeout
+
+        self._queue = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._urgent = False
+        self._running = False
+        self._thread = None
+
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+            'blocked': 0,
+            'flush_time_total': 0.0,
+            'flush_time_max': 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self):
+        """Démarre le thread écrivain"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='miftah-log-writer', daemon=True)
+        self._thread.start()
+        logger.info("Écrivain de logs asynchrone démarré")
+
+    def submit(self, row: Tuple, wait: bool = False, timeout: float = 5.0) -> bool:
+        """Met un événement en file
+
+        Avec `wait=True`, l'appel ne retourne qu'une fois le lot contenant
+        l'événement validé sur disque (ou après `timeout`).
+        """
+        waiter = _Waiter() if wait else None
+
+        with self._cond:
+            if not self._running:
+                return False
+
+            if len(self._queue) >= self.max_queue:
+                if waiter is None and self.overflow_policy == OVERFLOW_DROP_NEW:
+                    self._stats['dropped'] += 1
+                    return False
+                if waiter is None and self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                    self._evict_oldest()
+                else:
+                    # Contre-pression : l'appelant patiente jusqu'à libération d'une place
+                    self._stats['blocked'] += 1
+                    deadline = time.monotonic() + (timeout if waiter else self.put_timeout)
+                    while len(self._queue) >= self.max_queue and self._running:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats['dropped'] += 1
+                            return False
+                        self._cond.wait(remaining)
+                    if not self._running:
+                        return False
+
+            self._queue.append((row, waiter))
+            self._stats['enqueued'] += 1
+            if waiter is not None:
+                self._urgent = True
+            if waiter is not None or len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+        if waiter is None:
+            return True
+        if not waiter.event.wait(timeout):
+            logger.warning("Délai dépassé en attente de persistance d'un log")
+            return False
+        return waiter.success
+
+    def _evict_oldest(self):
+        """Évince le plus ancien événement sans attente associée"""
+        for index, (_, waiter) in enumerate(self._queue):
+            if waiter is None:
+                del self._queue[index]
+                self._stats['dropped'] += 1
+                return
+
+    def _take_batch(self) -> List[Tuple[Tuple, Optional[_Waiter]]]:
+        """Attend un lot complet, une échéance ou un événement urgent"""
+        with self._cond:
+            deadline = None
+            while self._running:
+                if len(self._queue) >= self.batch_size or self._urgent:
+                    break
+                if self._queue:
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    deadline = None
+                    self._cond.wait()
+
+            count = min(len(self._queue), self.batch_size)
+            batch = [self._queue.popleft() for _ in range(count)]
+            self._urgent = any(waiter is not None for _, waiter in self._queue)
+            self._cond.notify_all()
+            return batch
+
+    def _flush(self, batch: List[Tuple[Tuple, Optional[_Waiter]]]):
+        """Écrit un lot dans une seule transaction"""
+        if not batch:
+            return
+
+        started = time.monotonic()
+        success = False
+        try:
+            self._write_batch([row for row, _ in batch])
+            success = True
+        except Exception as e:
+            logger.error(f"Erreur écriture lot de logs ({len(batch)} événements): {e}")
+
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._stats['batches'] += 1
+            self._stats['flush_time_total'] += elapsed
+            self._stats['flush_time_max'] = max(self._stats['flush_time_max'], elapsed)
+            self._stats['written' if success else 'failed'] += len(batch)
+
+        for _, waiter in batch:
+            if waiter is not None:
+                waiter.success = success
+                waiter.event.set()
+
+    def _run(self):
+        """Boucle du thread écrivain"""
+        while True:
+            batch = self._take_batch()
+            self._flush(batch)
+            with self._cond:
+                if not self._running and not self._queue:
+                    return
+
+    def stop(self, timeout: float = 10.0):
+        """Arrête l'écrivain après avoir vidé la file sur disque"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            pending = len(self._queue)
+            self._cond.notify_all()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.error("Écrivain de logs non arrêté dans le délai imparti")
+        logger.info(f"Écrivain de logs arrêté ({pending} événements vidés)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métriques de l'écrivain (file, lots, pertes)"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._queue)
+            stats['max_queue'] = self.max_queue
+            stats['overflow_policy'] = self.overflow_policy
+        stats['flush_time_avg'] = stats['flush_time_total'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
@@ -0,0 +1,463 @@
+"""
+MIFTAH - Migrations de schéma versionnées
+Versions suivies par PRAGMA user_version, étapes ordonnées et reprises
+"""
+
+import time
+import logging
+from typing import Callable, List, Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class Migration:
+    """Étape de migration de schéma
+
+    `statements` est exécuté dans une seule transaction. `step`, pour les
+    migrations longues (remplissage de données), traite un lot par appel :
+    il reçoit la connexion et le curseur de progression (0 au départ) et
+    retourne le nouveau curseur, ou None une fois terminé. Chaque lot est
+    validé séparément, la progression est persistée et reprise au
+    redémarrage.
+    """
+
+    def __init__(self, version: int, description: str, statements: List[str] = None,
+                 step: Callable = None):
+        self.version = version
+        self.description = description
+        self.statements = statements or []
+        self.step = step
+
+    @property
+    def batched(self) -> bool:
+        return self.step is not None
+
+
+class MigrationEngine:
+    """Applique les migrations en attente, dans l'ordre des versions"""
+
+    def __init__(self, get_connection: Callable, migrations: List[Migration],
+                 batch_pause: float = 0.05, sleep: Callable[[float], None] = time.sleep):
+        self.get_connection = get_connection
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+        self.batch_pause = batch_pause
+        self.sleep = sleep
+
+    @property
+    def latest_version(self) -> int:
+        return self.migrations[-1].version if self.migrations else 0
+
+    def current_version(self) -> int:
+        with self.get_connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def pending(self, current: int = None) -> List[Migration]:
+        if current is None:
+            current = self.current_version()
+        return [m for m in self.migrations if m.version > current]
+
+    def migrate(self) -> int:
+        """Met le schéma à jour ; retourne le nombre de migrations appliquées
+
+        Chemin rapide : une seule lecture de PRAGMA user_version et aucun
+        DDL lorsque le schéma est déjà à la dernière version.
+        """
+        current = self.current_version()
+        if current >= self.latest_version:
+            return 0
+
+        self._ensure_journal()
+        applied = 0
+        for migration in self.pending(current):
+            started = time.monotonic()
+            if migration.batched:
+                done_here = self._apply_batched(migration)
+            else:
+                done_here = self._apply(migration)
+            if not done_here:
+                # Appliquée entre-temps par un autre worker
+                continue
+            duration = time.monotonic() - started
+            self._record(migration, duration)
+            applied += 1
+            logger.info(f"Migration schéma v{migration.version} appliquée en {duration:.2f}s: "
+                        f"{migration.description}")
+        return applied
+
+    def _ensure_journal(self):
+        """Table de suivi des migrations (progression des migrations par lots)"""
+        with self.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    cursor INTEGER,
+                    applied_at TIMESTAMP,
+                    duration REAL
+                )
+            """)
+            conn.commit()
+
+    @staticmethod
+    def _claim(conn, migration: Migration) -> bool:
+        """Prend le verrou d'écriture et relit la version (False : déjà appliquée ailleurs)
+
+        La lecture de `migrate` précède tout verrou : plusieurs workers
+        démarrés ensemble y voient la même version. Relue sous BEGIN
+        IMMEDIATE, elle n'autorise qu'un seul d'entre eux à appliquer l'étape.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= migration.version:
+            conn.rollback()
+            return False
+        return True
+
+    def _apply(self, migration: Migration) -> bool:
+        """Migration simple : DDL et version dans la même transaction"""
+        with self.get_connection() as conn:
+            if not self._claim(conn, migration):
+                return False
+            for statement in migration.statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+            conn.commit()
+        return True
+
+    def _apply_batched(self, migration: Migration) -> bool:
+        """Migration par lots : verrou d'écriture relâché entre chaque lot"""
+        with self.get_connection() as conn:
+            if not self._claim(conn, migration):
+                return False
+            for statement in migration.statements:
+                conn.execute(statement)
+            row = conn.execute(
+                "SELECT cursor FROM schema_migrations WHERE version = ?", (migration.version,)
+            ).fetchone()
+            if row is None:
+                # OR IGNORE : plusieurs workers peuvent démarrer la même migration
+                conn.execute(
+                    "INSERT OR IGNORE INTO schema_migrations (version, description, cursor) VALUES (?, ?, 0)",
+                    (migration.version, migration.description)
+                )
+            conn.commit()
+        cursor = row['cursor'] if row and row['cursor'] is not None else 0
+        if cursor:
+            logger.info(f"Reprise migration v{migration.version} au curseur {cursor}")
+
+        batches = 0
+        while cursor is not None:
+            with self.get_connection() as conn:
+                cursor = migration.step(conn, cursor)
+                conn.execute(
+                    "UPDATE schema_migrations SET cursor = ? WHERE version = ?",
+                    (cursor, migration.version)
+                )
+                # Jamais de retour en arrière si un autre worker est déjà plus loin
+                if cursor is None and conn.execute("PRAGMA user_version").fetchone()[0] < migration.version:
+                    conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+                conn.commit()
+            batches += 1
+            if cursor is not None:
+                self.sleep(self.batch_pause)
+        logger.info(f"Migration v{migration.version}: {batches} lots traités")
+        return True
+
+    def _record(self, migration: Migration, duration: float):
+        with self.get_connection() as conn:
+            conn.execute("""
+                INSERT INTO schema_migrations (version, description, applied_at, duration)
+                VALUES (?, ?, CURRENT_TIMESTAMP, ?)
+                ON CONFLICT(version) DO UPDATE SET applied_at = CURRENT_TIMESTAMP, duration = excluded.duration
+            """, (migration.version, migration.description, duration))
+            conn.commit()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Version courante, dernière version connue et migrations en attente"""
+        current = self.current_version()
+        return {
+            'current_version': current,
+            'latest_version': self.latest_version,
+            'pending': [m.version for m in self.pending(current)],
+        }
+
+
+def claim_cursor(conn, version: int, cursor: int) -> Optional[int]:
+    """Prend le verrou d'écriture et relit le curseur validé d'une migration par lots
+
+    Plusieurs workers peuvent exécuter la même migration au démarrage :
+    relu sous BEGIN IMMEDIATE, le curseur reflète les lots déjà traités par
+    les autres (None : migration terminée ailleurs).
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    row = conn.execute("SELECT cursor FROM schema_migrations WHERE version = ?", (version,)).fetchone()
+    return cursor if row is None else row['cursor']
+
+
+# ---------------------------------------------------------------------------
+# Migrations MIFTAH
+# ---------------------------------------------------------------------------
+
+# v1 : schéma initial (idempotent pour les bases créées avant le suivi de
+# version) et index composites reprenant la forme exacte des requêtes
+# (égalités puis tri) ; le rowid implicite de chaque index départage les
+# timestamps égaux.
+_SCHEMA_V1 = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        email TEXT,
+        role TEXT DEFAULT 'operator',
+        is_active BOOLEAN DEFAULT 1,
+        last_login TIMESTAMP,
+        failed_attempts INTEGER DEFAULT 0,
+        locked_until TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        agent_id TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        type TEXT NOT NULL,
+        status TEXT DEFAULT 'offline',
+        location TEXT,
+        ip_address TEXT,
+        last_seen TIMESTAMP,
+        heartbeat_interval INTEGER DEFAULT 30,
+        config TEXT,
+        encrypted_data TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS security_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        level TEXT NOT NULL,
+        module TEXT NOT NULL,
+        event_type TEXT NOT NULL,
+        message TEXT NOT NULL,
+        encrypted_details TEXT,
+        user_id INTEGER,
+        agent_id TEXT,
+        ip_address TEXT,
+        session_id TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS module_status (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        module_name TEXT UNIQUE NOT NULL,
+        status TEXT NOT NULL,
+        version TEXT,
+        config TEXT,
+        last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        error_count INTEGER DEFAULT 0,
+        last_error TEXT,
+        metrics TEXT,
+        is_enabled BOOLEAN DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS command_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        user_id INTEGER NOT NULL,
+        module TEXT NOT NULL,
+        command TEXT NOT NULL,
+        parameters TEXT,
+        status TEXT DEFAULT 'pending',
+        result TEXT,
+        encrypted_payload TEXT,
+        execution_time REAL,
+        agent_id TEXT,
+        session_id TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_security_logs_timestamp ON security_logs(timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_command_history_timestamp ON command_history(timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_security_logs_level_ts ON security_logs(level, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_security_logs_module_ts ON security_logs(module, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_security_logs_level_module_ts ON security_logs(level, module, timestamp)",
+    "DROP INDEX IF EXISTS idx_security_logs_module",
+    "CREATE INDEX IF NOT EXISTS idx_agents_status_seen ON agents(status, last_seen)",
+    "CREATE INDEX IF NOT EXISTS idx_agents_last_seen ON agents(last_seen)",
+    "DROP INDEX IF EXISTS idx_agents_status",
+    "CREATE INDEX IF NOT EXISTS idx_command_history_user_ts ON command_history(user_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_command_history_module_ts ON command_history(module, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_command_history_user_module_ts ON command_history(user_id, module, timestamp)",
+    "DROP INDEX IF EXISTS idx_command_history_user",
+]
+
+# v2 : file de commandes persistante sur command_history. Une commande
+# ordonnancée appartient toujours à un lot (batch_id, une action opérateur) ;
+# les lignes historiques sans lot ne sont jamais reprises par l'ordonnanceur.
+_SCHEMA_V2 = [
+    "ALTER TABLE command_history ADD COLUMN priority INTEGER DEFAULT 0",
+    "ALTER TABLE command_history ADD COLUMN attempts INTEGER DEFAULT 0",
+    "ALTER TABLE command_history ADD COLUMN max_attempts INTEGER DEFAULT 1",
+    "ALTER TABLE command_history ADD COLUMN timeout REAL",
+    "ALTER TABLE command_history ADD COLUMN batch_id TEXT",
+    "ALTER TABLE command_history ADD COLUMN sent_at TIMESTAMP",
+    "ALTER TABLE command_history ADD COLUMN completed_at TIMESTAMP",
+    # Reprise au démarrage : commandes ouvertes seulement
+    "CREATE INDEX IF NOT EXISTS idx_command_history_open ON command_history(status) WHERE batch_id IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_command_history_batch ON command_history(batch_id, status) WHERE batch_id IS NOT NULL",
+]
+
+# v3 : index plein texte des logs (message, event_type, agent_id). Table
+# FTS5 à contenu externe : seuls les termes sont stockés, les colonnes sont
+# relues dans security_logs. Les triggers tiennent l'index à jour à chaque
+# insertion ; l'existant est indexé par lots, du plus récent au plus ancien.
+LOG_SEARCH_TABLE = 'security_logs_fts'
+
+_SCHEMA_V3 = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {LOG_SEARCH_TABLE} USING fts5(
+        message, event_type, agent_id,
+        content='security_logs', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+]
+
+_LOG_SEARCH_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {LOG_SEARCH_TABLE}_insert AFTER INSERT ON security_logs BEGIN
+        INSERT INTO {LOG_SEARCH_TABLE} (rowid, message, event_type, agent_id)
+        VALUES (new.id, new.message, new.event_type, new.agent_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {LOG_SEARCH_TABLE}_delete AFTER DELETE ON security_logs BEGIN
+        INSERT INTO {LOG_SEARCH_TABLE} ({LOG_SEARCH_TABLE}, rowid, message, event_type, agent_id)
+        VALUES ('delete', old.id, old.message, old.event_type, old.agent_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {LOG_SEARCH_TABLE}_update
+    AFTER UPDATE OF message, event_type, agent_id ON security_logs BEGIN
+        INSERT INTO {LOG_SEARCH_TABLE} ({LOG_SEARCH_TABLE}, rowid, message, event_type, agent_id)
+        VALUES ('delete', old.id, old.message, old.event_type, old.agent_id);
+        INSERT INTO {LOG_SEARCH_TABLE} (rowid, message, event_type, agent_id)
+        VALUES (new.id, new.message, new.event_type, new.agent_id);
+    END
+    """,
+]
+
+_LOG_SEARCH_BATCH = 5000
+
+
+def _backfill_log_search(conn, cursor: int) -> Optional[int]:
+    """Indexe un lot de logs existants ; curseur = plus petit id déjà indexé
+
+    Le premier lot crée les triggers et lit MAX(id) dans la même
+    transaction : les lignes plus récentes sont indexées par les triggers,
+    les autres par ce remplissage, aucune deux fois.
+    """
+    cursor = claim_cursor(conn, 3, cursor)
+    if cursor is None:
+        return None
+
+    if cursor == 0:
+        for statement in _LOG_SEARCH_TRIGGERS:
+            conn.execute(statement)
+        high = conn.execute("SELECT MAX(id) FROM security_logs").fetchone()[0]
+        if high is None:
+            return None
+        cursor = high + 1
+
+    low = conn.execute(
+        "SELECT MIN(id) FROM (SELECT id FROM security_logs WHERE id < ? ORDER BY id DESC LIMIT ?)",
+        (cursor, _LOG_SEARCH_BATCH)
+    ).fetchone()[0]
+    if low is None:
+        # Fusion des segments laissés par le remplissage : les insertions
+        # suivantes n'ont pas à payer ces fusions
+        conn.execute(f"INSERT INTO {LOG_SEARCH_TABLE} ({LOG_SEARCH_TABLE}) VALUES ('optimize')")
+        return None
+    conn.execute(f"""
+        INSERT INTO {LOG_SEARCH_TABLE} (rowid, message, event_type, agent_id)
+        SELECT id, message, event_type, agent_id FROM security_logs WHERE id >= ? AND id < ?
+    """, (low, cursor))
+    return low
+
+
+# v4 : compteurs pré-agrégés des logs par minute, heure et jour, clé
+# (niveau, module, type d'événement). Tenus à jour par l'écrivain de logs
+# (voir core.database.rollups) ; l'existant est agrégé par lots.
+_SCHEMA_V4 = [
+    """
+    CREATE TABLE IF NOT EXISTS security_log_rollups (
+        resolution TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        level TEXT NOT NULL,
+        module TEXT NOT NULL,
+        event_type TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (resolution, bucket, level, module, event_type)
+    ) WITHOUT ROWID
+    """,
+]
+
+_ROLLUP_BATCH = 20000
+
+# Début de l'intervalle d'un timestamp 'YYYY-MM-DD HH:MM:SS', par résolution
+_ROLLUP_BUCKETS = {
+    'minute': "substr(timestamp, 1, 16) || ':00'",
+    'hour': "substr(timestamp, 1, 13) || ':00:00'",
+    'day': "substr(timestamp, 1, 10) || ' 00:00:00'",
+}
+
+
+def _backfill_log_rollups(conn, cursor: int) -> Optional[int]:
+    """Agrège un lot de logs existants dans les trois résolutions
+
+    Les workers à jour ne journalisent qu'une fois la migration terminée :
+    toute ligne plus ancienne passe par ce remplissage, qui va jusqu'au
+    dernier id (écritures d'un worker pas encore mis à jour comprises).
+    """
+    cursor = claim_cursor(conn, 4, cursor)
+    if cursor is None:
+        return None
+    high = conn.execute(
+        "SELECT MAX(id) FROM (SELECT id FROM security_logs WHERE id > ? ORDER BY id LIMIT ?)",
+        (cursor, _ROLLUP_BATCH)
+    ).fetchone()[0]
+    if high is None:
+        return None
+    for resolution, bucket in _ROLLUP_BUCKETS.items():
+        conn.execute(f"""
+            INSERT INTO security_log_rollups (resolution, bucket, level, module, event_type, count)
+            SELECT ?, {bucket}, level, module, event_type, COUNT(*) FROM security_logs
+            WHERE id > ? AND id <= ? AND timestamp IS NOT NULL GROUP BY 2, 3, 4, 5
+            ON CONFLICT (resolution, bucket, level, module, event_type)
+            DO UPDATE SET count = count + excluded.count
+        """, (resolution, cursor, high))
+    return high
+
+
+# v5 : verrouillages en cours relus au démarrage par le limiteur de
+# connexion ; index partiel, seuls les comptes verrouillés y figurent.
+_SCHEMA_V5 = [
+    """
+    CREATE INDEX IF NOT EXISTS idx_users_locked_until
+    ON users(locked_until) WHERE locked_until IS NOT NULL
+    """,
+]
+
+
+SCHEMA_MIGRATIONS = [
+    Migration(1, "Schéma initial et index composites logs/agents/historique", _SCHEMA_V1),
+    Migration(2, "File de commandes : priorité, tentatives, délais et lots", _SCHEMA_V2),
+    Migration(3, "Index plein texte des logs de sécurité (FTS5)", _SCHEMA_V3, step=_backfill_log_search),
+    Migration(4, "Compteurs des logs par minute, heure et jour", _SCHEMA_V4, step=_backfill_log_rollups),
+    Migration(5, "Index partiel des comptes verrouillés", _SCHEMA_V5),
+]
@@ -5,33 +5,106 @@ Structures de données chiffrées pour le hub SPARTA
 
 import sqlite3
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator, Tuple
 import json
 import logging
-from argon2 import PasswordHasher
-from Crypto.Cipher import AES
-from Crypto.Random import get_random_bytes
-from Crypto.Util.Padding import pad, unpad
-import base64
+import threading
+from contextlib import contextmanager
+
+from core.database.pool import ConnectionPool
+from core.database.log_writer import SecurityLogWriter
+from core.database.migrations import MigrationEngine, SCHEMA_MIGRATIONS
+from core.database.retention import RetentionWorker, RETENTION_TABLES, build_policies
+from core.database.partitions import LogPartitionManager
+from core.database.cache import QueryCache
+from core.database.rollups import LogRollups
+from core.database.search import (SORT_RANK, SORT_TIME, match_expression, search_query,
+                                  is_syntax_error, merge_ranked)
+from core.security.passwords import PasswordService
+from core.security.payload_cipher import PayloadCipher
 
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
     """Gestionnaire de base de données SQLCipher"""
     
-    def __init__(self, db_path: str, db_key: str):
+    # Colonnes des listes de logs sans détails : seul un indicateur remplace le chiffré
+    _LOG_SUMMARY_COLUMNS = ("id, timestamp, level, module, event_type, message, user_id, agent_id, "
+                            "ip_address, session_id, encrypted_details IS NOT NULL AS has_details")
+    
+    def __init__(self, db_path: str, db_key: str, pool_size: int = 5, pool_timeout: float = 10.0,
+                 pool_recycle: float = 3600.0, password_service: PasswordService = None,
+                 max_page_size: int = 500, partition_dir: str = None, partition_hot_months: int = 2,
+                 crypto_workers: int = 1, journal_mode: str = 'WAL', synchronous: str = 'NORMAL',
+                 busy_timeout: int = 5000, cache_size: int = -16000, mmap_size: int = 0,
+                 journal_size_limit: int = 64 * 1024 * 1024, cache_ttl: float = 5.0,
+                 max_login_attempts: int = 3, lockout_duration: float = 900,
+                 rollup_horizons: Dict[str, Optional[int]] = None, stats_max_points: int = 1500):
         self.db_path = Path(db_path)
         self.db_key = db_key
-        self.ph = PasswordHasher()
+        self.max_page_size = max_page_size
+        self.max_login_attempts = max_login_attempts
+        self.lockout_duration = lockout_duration
+        self.passwords = password_service or PasswordService()
         self.encryption_key = self._derive_encryption_key()
+        self.cipher = PayloadCipher(self.encryption_key, max_workers=crypto_workers)
+        
+        # Réglages appliqués à chaque connexion ouverte
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.journal_size_limit = journal_size_limit
+        
+        # Attente du verrou d'écriture (voir write_transaction)
+        self._lock_stats_lock = threading.Lock()
+        self._lock_stats = {
+            'write_locks': 0,
+            'busy_errors': 0,
+            'slow_waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
         
         # Créer le répertoire si nécessaire
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         
+        # Pool de connexions : la clé SQLCipher n'est dérivée qu'à l'ouverture
+        self.pool = ConnectionPool(
+            self._open_connection,
+            size=pool_size,
+            timeout=pool_timeout,
+            recycle=pool_recycle
+        )
+        
+        # Écrivain asynchrone des logs (voir start_log_writer)
+        self.log_writer = None
+        
+        # Bus du flux temps réel des logs (LogBus), branché par l'application
+        self.log_bus = None
+        
+        # Cache de lecture de module_status et agents
+        self.cache = QueryCache(ttl=cache_ttl)
+        
+        # Compteurs des logs par minute/heure/jour, tenus à jour à l'insertion
+        self.rollups = LogRollups(self.get_connection, horizons=rollup_horizons, max_points=stats_max_points)
+        
         # Initialiser la base de données
         self._init_database()
+        
+        # Partitions mensuelles des logs (désactivées sans répertoire)
+        self.partitions = None
+        if partition_dir:
+            self.partitions = LogPartitionManager(
+                Path(partition_dir),
+                self.get_connection,
+                self._open_connection,
+                hot_months=partition_hot_months
+            )
     
     def _derive_encryption_key(self) -> bytes:
         """Dérive une clé de chiffrement à partir de la clé DB"""
@@ -40,159 +113,146 @@ class DatabaseManager:
     
     def _encrypt_data(self, data: str) -> str:
         """Chiffre les données sensibles"""
-        if not data:
-            return data
-        
         try:
-            cipher = AES.new(self.encryption_key, AES.MODE_CBC)
-            padded_data = pad(data.encode(), AES.block_size)
-            encrypted = cipher.encrypt(padded_data)
-            
-            # Combiner IV + données chiffrées et encoder en base64
-            result = base64.b64encode(cipher.iv + encrypted).decode()
-            return result
+            return self.cipher.encrypt(data)
         except Exception as e:
             logger.error(f"Erreur chiffrement: {e}")
             return data
     
     def _decrypt_data(self, encrypted_data: str) -> str:
         """Déchiffre les données"""
-        if not encrypted_data:
-            return encrypted_data
-        
         try:
-            data = base64.b64decode(encrypted_data.encode())
-            iv = data[:16]  # AES block size
-            encrypted = data[16:]
-            
-            cipher = AES.new(self.encryption_key, AES.MODE_CBC, iv)
-            decrypted = unpad(cipher.decrypt(encrypted), AES.block_size)
-            return decrypted.decode()
+            return self.cipher.decrypt(encrypted_data)
         except Exception as e:
             logger.error(f"Erreur déchiffrement: {e}")
             return encrypted_data
     
-    def get_connection(self):
-        """Obtient une connexion SQLCipher"""
+    def encrypt_many(self, values: List[Optional[str]]) -> List[Optional[str]]:
+        """Chiffre un lot de valeurs en un appel (même format que `_encrypt_data`)"""
+        return self.cipher.encrypt_many(values)
+    
+    def decrypt_many(self, values: List[Optional[str]]) -> List[Optional[str]]:
+        """Déchiffre un lot de valeurs en un appel (valeurs invalides retournées telles quelles)"""
+        return self.cipher.decrypt_many(values)
+    
+    def _decrypt_json_many(self, values: List[Optional[str]]) -> List[Any]:
+        """Déchiffre puis décode un lot de JSON (None pour une valeur absente ou invalide)"""
+        result = []
+        for value in self.decrypt_many(values):
+            try:
+                result.append(json.loads(value) if value else None)
+            except ValueError:
+                result.append(None)
+        return result
+    
+    def _open_connection(self, path: Path = None, read_only: bool = False) -> sqlite3.Connection:
+        """Ouvre et clé une nouvelle connexion SQLCipher (base principale par défaut)"""
         try:
-            conn = sqlite3.connect(str(self.db_path))
+            path = Path(path) if path else self.db_path
+            if read_only:
+                conn = sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(str(path), check_same_thread=False)
             conn.row_factory = sqlite3.Row
             
             # Activer SQLCipher avec la clé
             conn.execute(f"PRAGMA key = '{self.db_key}'")
             conn.execute("PRAGMA cipher_compatibility = 4")
             
+            # Attente du verrou (ms) et caches propres à la connexion. SQLCipher
+            # ignore mmap_size : les pages doivent être déchiffrées en mémoire.
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+            conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            
+            # Une nouvelle base libère ses pages par incremental_vacuum. Écrire ce
+            # réglage demande le verrou : ne le faire que sur une base vide.
+            if not read_only and conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            
+            # WAL pour la base principale seulement : lecteurs et écrivain ne se
+            # bloquent plus, et NORMAL ne synchronise le disque qu'aux checkpoints.
+            # Les partitions restent en journal classique (ouvertes en lecture seule).
+            if path == self.db_path and not read_only:
+                # Mode persistant : ne le changer (verrou requis) que s'il diffère
+                current = conn.execute("PRAGMA journal_mode").fetchone()[0]
+                if current.lower() != self.journal_mode.lower():
+                    conn.execute(f"PRAGMA journal_mode = {self.journal_mode}").fetchone()
+                conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+                conn.execute(f"PRAGMA journal_size_limit = {int(self.journal_size_limit)}")
+            
             return conn
         except Exception as e:
             logger.error(f"Erreur connexion DB: {e}")
             raise
     
-    def _init_database(self):
-        """Initialise les tables de la base de données"""
+    def get_connection(self):
+        """Emprunte une connexion SQLCipher au pool (à utiliser avec `with`)"""
+        return self.pool.connection()
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Métriques du pool de connexions"""
+        return self.pool.get_stats()
+    
+    @contextmanager
+    def write_transaction(self):
+        """Emprunte une connexion et prend d'emblée le verrou d'écriture
+        
+        BEGIN IMMEDIATE évite l'échec d'une lecture promue en écriture sous
+        WAL ; l'attente du verrou (bornée par busy_timeout) est mesurée.
+        """
         with self.get_connection() as conn:
-            # Table Utilisateurs
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    email TEXT,
-                    role TEXT DEFAULT 'operator',
-                    is_active BOOLEAN DEFAULT 1,
-                    last_login TIMESTAMP,
-                    failed_attempts INTEGER DEFAULT 0,
-                    locked_until TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Table Agents
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS agents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    agent_id TEXT UNIQUE NOT NULL,
-                    name TEXT NOT NULL,
-                    type TEXT NOT NULL,
-                    status TEXT DEFAULT 'offline',
-                    location TEXT,
-                    ip_address TEXT,
-                    last_seen TIMESTAMP,
-                    heartbeat_interval INTEGER DEFAULT 30,
-                    config TEXT,
-                    encrypted_data TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Table Logs Sécurité
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS security_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    level TEXT NOT NULL,
-                    module TEXT NOT NULL,
-                    event_type TEXT NOT NULL,
-                    message TEXT NOT NULL,
-                    encrypted_details TEXT,
-                    user_id INTEGER,
-                    agent_id TEXT,
-                    ip_address TEXT,
-                    session_id TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Table Status Modules
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS module_status (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    module_name TEXT UNIQUE NOT NULL,
-                    status TEXT NOT NULL,
-                    version TEXT,
-                    config TEXT,
-                    last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    error_count INTEGER DEFAULT 0,
-                    last_error TEXT,
-                    metrics TEXT,
-                    is_enabled BOOLEAN DEFAULT 1
-                )
-            """)
-            
-            # Table Historique Ordres
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS command_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    user_id INTEGER NOT NULL,
-                    module TEXT NOT NULL,
-                    command TEXT NOT NULL,
-                    parameters TEXT,
-                    status TEXT DEFAULT 'pending',
-                    result TEXT,
-                    encrypted_payload TEXT,
-                    execution_time REAL,
-                    agent_id TEXT,
-                    session_id TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Index pour performance
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_security_logs_timestamp ON security_logs(timestamp)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_security_logs_module ON security_logs(module)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_agents_status ON agents(status)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_command_history_user ON command_history(user_id)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_command_history_timestamp ON command_history(timestamp)")
-            
-            conn.commit()
-            logger.info("Base de données SQLCipher initialisée")
+            started = time.monotonic()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                self._record_lock_wait(time.monotonic() - started, busy=True)
+                raise
+            self._record_lock_wait(time.monotonic() - started)
+            yield conn
+    
+    def _record_lock_wait(self, waited: float, busy: bool = False):
+        with self._lock_stats_lock:
+            self._lock_stats['write_locks'] += 1
+            self._lock_stats['busy_errors'] += 1 if busy else 0
+            self._lock_stats['slow_waits'] += 1 if waited > 0.1 else 0
+            self._lock_stats['wait_time_total'] += waited
+            self._lock_stats['wait_time_max'] = max(self._lock_stats['wait_time_max'], waited)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Compteurs du cache de lecture (hits, misses, invalidations)"""
+        return self.cache.get_stats()
+    
+    def get_lock_stats(self) -> Dict[str, Any]:
+        """Attentes du verrou d'écriture (nombre, durées, échecs busy)"""
+        with self._lock_stats_lock:
+            stats = dict(self._lock_stats)
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['write_locks'] if stats['write_locks'] else 0.0
+        stats['busy_timeout'] = self.busy_timeout
+        stats['journal_mode'] = self.journal_mode
+        return stats
+    
+    def close(self):
+        """Vide la file de logs puis ferme les connexions du pool"""
+        if self.log_writer is not None:
+            self.log_writer.stop()
+        if self.partitions is not None:
+            self.partitions.close()
+        self.pool.close()
+        self.passwords.shutdown()
+        self.cipher.shutdown()
+    
+    def _init_database(self):
+        """Met le schéma à jour (aucun DDL si la version est déjà courante)"""
+        self.migrations = MigrationEngine(self.get_connection, SCHEMA_MIGRATIONS)
+        applied = self.migrations.migrate()
+        if applied:
+            logger.info(f"Base de données SQLCipher initialisée ({applied} migrations appliquées)")
     
     def create_user(self, username: str, password: str, email: str = None, role: str = 'operator') -> bool:
         """Crée un nouvel utilisateur"""
         try:
-            password_hash = self.ph.hash(password)
+            password_hash = self.passwords.hash(password)
             
             with self.get_connection() as conn:
                 conn.execute("""
@@ -207,58 +267,101 @@ class DatabaseManager:
             logger.error(f"Erreur création utilisateur: {e}")
             return False
     
-    def authenticate_user(self, username: str, password: str) -> Optional[Dict]:
-        """Authentifie un utilisateur"""
+    def authenticate_user(self, username: str, password: str, record_failure: bool = True) -> Optional[Dict]:
+        """Authentifie un utilisateur
+
+        Aucune connexion n'est retenue pendant le calcul Argon2, effectué
+        hors de la boucle d'événements par le PasswordService.
+        `record_failure=False` : échecs comptés par le LoginLimiter, qui
+        écrit le verrouillage plus tard par lots.
+        """
         try:
             with self.get_connection() as conn:
                 user = conn.execute("""
                     SELECT * FROM users 
                     WHERE username = ? AND is_active = 1
                 """, (username,)).fetchone()
+            
+            if not user:
+                return None
+            
+            # Vérifier si le compte est verrouillé
+            if user['locked_until'] and datetime.fromisoformat(user['locked_until']) > datetime.now():
+                return None
+            
+            # Vérifier le mot de passe
+            if self.passwords.verify(user['password_hash'], password):
+                # Re-hachage transparent si les paramètres Argon2 ont changé
+                new_hash = None
+                if self.passwords.needs_rehash(user['password_hash']):
+                    new_hash = self.passwords.rehash(password)
                 
-                if not user:
-                    return None
-                
-                # Vérifier si le compte est verrouillé
-                if user['locked_until'] and datetime.fromisoformat(user['locked_until']) > datetime.now():
-                    return None
-                
-                # Vérifier le mot de passe
-                try:
-                    self.ph.verify(user['password_hash'], password)
-                    
-                    # Réinitialiser les tentatives échouées
+                # Réinitialiser les tentatives échouées
+                with self.get_connection() as conn:
                     conn.execute("""
                         UPDATE users 
-                        SET failed_attempts = 0, locked_until = NULL, last_login = CURRENT_TIMESTAMP
+                        SET failed_attempts = 0, locked_until = NULL, last_login = CURRENT_TIMESTAMP,
+                            password_hash = COALESCE(?, password_hash)
                         WHERE id = ?
-                    """, (user['id'],))
+                    """, (new_hash, user['id']))
                     conn.commit()
-                    
-                    return dict(user)
-                    
-                except Exception:
-                    # Incrémenter les tentatives échouées
-                    failed_attempts = user['failed_attempts'] + 1
-                    locked_until = None
-                    
-                    if failed_attempts >= 3:
-                        from datetime import timedelta
-                        locked_until = (datetime.now() + timedelta(minutes=15)).isoformat()
-                    
-                    conn.execute("""
-                        UPDATE users 
-                        SET failed_attempts = ?, locked_until = ?
-                        WHERE id = ?
-                    """, (failed_attempts, locked_until, user['id']))
-                    conn.commit()
-                    
-                    return None
+                
+                if new_hash:
+                    logger.info(f"Hash mot de passe mis à jour: {username}")
+                
+                return dict(user)
+            
+            if not record_failure:
+                return None
+            
+            # Incrémenter les tentatives échouées
+            failed_attempts = user['failed_attempts'] + 1
+            locked_until = None
+            
+            if failed_attempts >= self.max_login_attempts:
+                locked_until = (datetime.now() + timedelta(seconds=self.lockout_duration)).isoformat()
+            
+            with self.get_connection() as conn:
+                conn.execute("""
+                    UPDATE users 
+                    SET failed_attempts = ?, locked_until = ?
+                    WHERE id = ?
+                """, (failed_attempts, locked_until, user['id']))
+                conn.commit()
+            
+            return None
                     
         except Exception as e:
             logger.error(f"Erreur authentification: {e}")
             return None
     
+    def sync_login_lockouts(self, rows: List[Tuple[int, Optional[str], str]]) -> bool:
+        """Écrit (failed_attempts, locked_until, username) d'un lot de comptes en une transaction"""
+        try:
+            with self.write_transaction() as conn:
+                conn.executemany("""
+                    UPDATE users SET failed_attempts = ?, locked_until = ?
+                    WHERE username = ?
+                """, rows)
+            return True
+        except Exception as e:
+            logger.error(f"Erreur synchronisation des verrouillages: {e}")
+            return False
+    
+    def get_locked_users(self) -> List[Dict]:
+        """Comptes encore verrouillés (reprise au démarrage, index partiel idx_users_locked_until)"""
+        try:
+            with self.get_connection() as conn:
+                # locked_until : datetime.isoformat() local, comparable comme chaîne
+                rows = conn.execute("""
+                    SELECT username, failed_attempts, locked_until FROM users
+                    WHERE locked_until IS NOT NULL AND locked_until > ?
+                """, (datetime.now().isoformat(),)).fetchall()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Erreur lecture des verrouillages: {e}")
+            return []
+    
     def register_agent(self, agent_id: str, name: str, agent_type: str, location: str = None, ip_address: str = None) -> bool:
         """Enregistre un nouvel agent"""
         try:
@@ -268,13 +371,14 @@ class DatabaseManager:
                 'auto_update': True
             })
             
-            with self.get_connection() as conn:
+            with self.write_transaction() as conn:
                 conn.execute("""
                     INSERT OR REPLACE INTO agents 
                     (agent_id, name, type, location, ip_address, config, status)
                     VALUES (?, ?, ?, ?, ?, ?, 'offline')
                 """, (agent_id, name, agent_type, location, ip_address, config))
                 conn.commit()
+            self.cache.invalidate('agents')
                 
             logger.info(f"Agent enregistré: {agent_id}")
             return True
@@ -285,101 +389,336 @@ class DatabaseManager:
     def update_agent_status(self, agent_id: str, status: str, location: str = None) -> bool:
         """Met à jour le statut d'un agent"""
         try:
-            with self.get_connection() as conn:
+            with self.write_transaction() as conn:
                 conn.execute("""
                     UPDATE agents 
                     SET status = ?, last_seen = CURRENT_TIMESTAMP, location = COALESCE(?, location)
                     WHERE agent_id = ?
                 """, (status, location, agent_id))
                 conn.commit()
+            self.cache.invalidate('agents')
                 
             return True
         except Exception as e:
             logger.error(f"Erreur mise à jour agent: {e}")
             return False
     
+    def update_agents_batch(self, rows: List[Tuple[str, Optional[str], Optional[str], str]]) -> bool:
+        """Met à jour (status, last_seen, location, agent_id) d'un lot d'agents en une transaction"""
+        try:
+            with self.write_transaction() as conn:
+                conn.executemany("""
+                    UPDATE agents 
+                    SET status = ?, last_seen = COALESCE(?, last_seen), location = COALESCE(?, location)
+                    WHERE agent_id = ?
+                """, rows)
+            self.cache.invalidate('agents')
+            return True
+        except Exception as e:
+            logger.error(f"Erreur mise à jour lot d'agents: {e}")
+            return False
+    
+    def _agents_query(self, status: str = None) -> Tuple[str, List]:
+        """Construit la requête de liste des agents"""
+        if status:
+            return "SELECT * FROM agents WHERE status = ? ORDER BY last_seen DESC", [status]
+        return "SELECT * FROM agents ORDER BY last_seen DESC", []
+    
     def get_agents(self, status: str = None) -> List[Dict]:
-        """Récupère la liste des agents"""
+        """Récupère la liste des agents (cache invalidé à chaque écriture d'agent)"""
         try:
-            with self.get_connection() as conn:
-                if status:
-                    agents = conn.execute("""
-                        SELECT * FROM agents WHERE status = ?
-                        ORDER BY last_seen DESC
-                    """, (status,)).fetchall()
-                else:
-                    agents = conn.execute("""
-                        SELECT * FROM agents
-                        ORDER BY last_seen DESC
-                    """).fetchall()
-                
-                return [dict(agent) for agent in agents]
+            return self.cache.get_or_load('agents', status, lambda: self._load_agents(status))
         except Exception as e:
             logger.error(f"Erreur récupération agents: {e}")
             return []
     
+    def _load_agents(self, status: str = None) -> List[Dict]:
+        query, params = self._agents_query(status)
+        with self.get_connection() as conn:
+            agents = conn.execute(query, params).fetchall()
+        return [dict(agent) for agent in agents]
+    
+    def start_log_writer(self, max_queue: int = 10000, batch_size: int = 200,
+                         flush_interval: float = 0.5, overflow_policy: str = 'block') -> SecurityLogWriter:
+        """Active l'écriture asynchrone par lots des logs de sécurité"""
+        if self.log_writer is None:
+            self.log_writer = SecurityLogWriter(
+                self._insert_security_logs,
+                max_queue=max_queue,
+                batch_size=batch_size,
+                flush_interval=flush_interval,
+                overflow_policy=overflow_policy
+            )
+            self.log_writer.start()
+        return self.log_writer
+    
+    def get_log_writer_stats(self) -> Optional[Dict[str, Any]]:
+        """Métriques de l'écrivain de logs (None si écriture synchrone)"""
+        return self.log_writer.get_stats() if self.log_writer else None
+    
+    def _insert_security_logs(self, rows: List[tuple]):
+        """Insère un lot de logs et met à jour leurs compteurs dans une seule transaction"""
+        with self.write_transaction() as conn:
+            conn.executemany("""
+                INSERT INTO security_logs 
+                (timestamp, level, module, event_type, message, encrypted_details, user_id, agent_id, ip_address, session_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            self.rollups.record(conn, rows)
+            conn.commit()
+    
     def log_security_event(self, level: str, module: str, event_type: str, message: str, 
                           details: Dict = None, user_id: int = None, agent_id: str = None, 
-                          ip_address: str = None, session_id: str = None) -> bool:
-        """Enregistre un événement de sécurité"""
+                          ip_address: str = None, session_id: str = None, persist: bool = False) -> bool:
+        """Enregistre un événement de sécurité
+
+        Si l'écrivain asynchrone est actif, l'événement est mis en file ;
+        `persist=True` attend que son lot soit validé sur disque. Un
+        événement accepté est aussi publié sur `log_bus` (flux temps réel).
+        """
         try:
             encrypted_details = None
             if details:
                 encrypted_details = self._encrypt_data(json.dumps(details))
             
-            with self.get_connection() as conn:
-                conn.execute("""
-                    INSERT INTO security_logs 
-                    (level, module, event_type, message, encrypted_details, user_id, agent_id, ip_address, session_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (level, module, event_type, message, encrypted_details, user_id, agent_id, ip_address, session_id))
-                conn.commit()
-                
-            return True
+            # Horodatage à l'émission (même format que CURRENT_TIMESTAMP), pas à l'écriture du lot
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+            row = (timestamp, level, module, event_type, message, encrypted_details,
+                   user_id, agent_id, ip_address, session_id)
+            
+            if self.log_writer is not None and self.log_writer.running:
+                accepted = self.log_writer.submit(row, wait=persist)
+            else:
+                self._insert_security_logs([row])
+                accepted = True
+            
+            if accepted and self.log_bus is not None:
+                self.log_bus.publish({
+                    'timestamp': timestamp,
+                    'level': level,
+                    'module': module,
+                    'event_type': event_type,
+                    'message': message,
+                    'has_details': bool(details),
+                    'user_id': user_id,
+                    'agent_id': agent_id,
+                    'ip_address': ip_address,
+                })
+            return accepted
         except Exception as e:
             logger.error(f"Erreur log sécurité: {e}")
             return False
     
-    def get_security_logs(self, limit: int = 100, level: str = None, module: str = None) -> List[Dict]:
-        """Récupère les logs de sécurité"""
+    def _security_logs_query(self, level: str = None, module: str = None,
+                             before: Tuple[str, int] = None, since: str = None,
+                             until: str = None, details: bool = True) -> Tuple[str, List]:
+        """Construit la requête paginée (timestamp, id) sur security_logs"""
+        columns = "*" if details else self._LOG_SUMMARY_COLUMNS
+        query = f"SELECT {columns} FROM security_logs"
+        params = []
+        
+        conditions = []
+        if level:
+            conditions.append("level = ?")
+            params.append(level)
+        if module:
+            conditions.append("module = ?")
+            params.append(module)
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        if before:
+            conditions.append("(timestamp, id) < (?, ?)")
+            params.extend(before)
+        
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        return query, params
+    
+    def _decode_logs(self, logs) -> List[Dict]:
+        """Convertit des lignes de log et déchiffre leurs détails en un seul lot"""
+        result = [dict(log) for log in logs]
+        if result and 'encrypted_details' not in result[0]:
+            # Liste sans détails : indicateur seulement, rien à déchiffrer
+            for log_dict in result:
+                log_dict['has_details'] = bool(log_dict['has_details'])
+            return result
+        
+        encrypted = [log['encrypted_details'] for log in result]
+        for log_dict in result:
+            log_dict['has_details'] = bool(log_dict['encrypted_details'])
+        if any(encrypted):
+            for log_dict, details in zip(result, self._decrypt_json_many(encrypted)):
+                if log_dict['encrypted_details']:
+                    log_dict['details'] = details
+        return result
+    
+    def _fetch_security_logs(self, limit: int, level: str = None, module: str = None,
+                             before: Tuple[str, int] = None, since: str = None,
+                             until: str = None, details: bool = True) -> List:
+        """Lit une page dans la table chaude puis, si besoin, dans les partitions
+        
+        Les partitions sont parcourues de la plus récente à la plus ancienne
+        et seulement si la page n'est pas complète ; celles hors de
+        l'intervalle [since, min(until, before)[ ne sont jamais ouvertes.
+        """
+        query, params = self._security_logs_query(level, module, before, since, until, details)
+        
+        with self.get_connection() as conn:
+            rows = conn.execute(query, params + [limit]).fetchall()
+        
+        if len(rows) >= limit or self.partitions is None:
+            return rows
+        
+        upper = min(filter(None, (until, before[0] if before else None)), default=None)
+        for month in self.partitions.partitions_for_range(since, upper):
+            rows += self.partitions.fetch(month, query, params + [limit - len(rows)])
+            if len(rows) >= limit:
+                break
+        return rows
+    
+    def get_security_logs(self, limit: int = 100, level: str = None, module: str = None,
+                          before: Tuple[str, int] = None, since: str = None,
+                          until: str = None, include_details: bool = True) -> List[Dict]:
+        """Récupère une page de logs de sécurité
+
+        `before` est la position (timestamp, id) du dernier log de la page
+        précédente ; la taille de page est bornée par `max_page_size`.
+        `since` / `until` bornent l'intervalle de temps et limitent les
+        partitions consultées. Avec `include_details=False`, les détails ne
+        sont ni lus ni déchiffrés : chaque log porte seulement `has_details`
+        (voir `get_security_log_details`).
+        """
         try:
-            with self.get_connection() as conn:
-                query = "SELECT * FROM security_logs"
-                params = []
-                
-                conditions = []
-                if level:
-                    conditions.append("level = ?")
-                    params.append(level)
-                if module:
-                    conditions.append("module = ?")
-                    params.append(module)
-                
-                if conditions:
-                    query += " WHERE " + " AND ".join(conditions)
-                
-                query += " ORDER BY timestamp DESC LIMIT ?"
-                params.append(limit)
-                
-                logs = conn.execute(query, params).fetchall()
-                
-                # Déchiffrer les détails
-                result = []
-                for log in logs:
-                    log_dict = dict(log)
-                    if log_dict['encrypted_details']:
-                        try:
-                            decrypted = self._decrypt_data(log_dict['encrypted_details'])
-                            log_dict['details'] = json.loads(decrypted)
-                        except:
-                            log_dict['details'] = None
-                    result.append(log_dict)
-                
-                return result
+            limit = max(1, min(limit, self.max_page_size))
+            logs = self._fetch_security_logs(limit, level, module, before, since, until,
+                                             details=include_details)
+            
+            # Déchiffrer les détails
+            return self._decode_logs(logs)
         except Exception as e:
             logger.error(f"Erreur récupération logs: {e}")
             return []
     
+    def iter_security_logs(self, level: str = None, module: str = None,
+                           chunk_size: int = 1000, since: str = None,
+                           until: str = None) -> Iterator[Dict]:
+        """Parcourt tous les logs par tranches pour l'export en flux
+
+        Chaque tranche est lue sur une connexion empruntée puis rendue au
+        pool avant d'être transmise : un client lent ne bloque ni
+        connexion ni transaction de lecture. Les détails sont déchiffrés
+        au fil de l'itération.
+        """
+        before = None
+        while True:
+            rows = self._fetch_security_logs(chunk_size, level, module, before, since, until)
+            
+            yield from self._decode_logs(rows)
+            
+            if len(rows) < chunk_size:
+                return
+            before = (rows[-1]['timestamp'], rows[-1]['id'])
+    
+    def get_security_log_details(self, log_id: int) -> Optional[Dict]:
+        """Déchiffre les détails d'un seul log (None si le log n'existe pas)"""
+        try:
+            query = "SELECT id, encrypted_details FROM security_logs WHERE id = ?"
+            with self.get_connection() as conn:
+                row = conn.execute(query, (log_id,)).fetchone()
+            
+            # Log déjà déplacé dans une partition : recherche par clé primaire
+            if row is None and self.partitions is not None:
+                for month in self.partitions.list_partitions():
+                    rows = self.partitions.fetch(month, query, [log_id])
+                    if rows:
+                        row = rows[0]
+                        break
+            
+            if row is None:
+                return None
+            return {'id': row['id'], 'details': self._decrypt_json_many([row['encrypted_details']])[0]}
+        except Exception as e:
+            logger.error(f"Erreur récupération détails log: {e}")
+            return None
+    
+    def search_security_logs(self, text: str, limit: int = 50, sort: str = SORT_RANK, offset: int = 0,
+                             before_id: int = None, since: str = None, until: str = None,
+                             level: str = None, module: str = None, raw: bool = False) -> List[Dict]:
+        """Recherche plein texte dans message, event_type et agent_id
+
+        Tri `rank` (pertinence bm25, pagination par `offset`) ou `time` (du
+        plus récent au plus ancien, pagination par `before_id`). La table
+        chaude est lue d'abord puis les partitions recoupant [since, until[ ;
+        en tri `time` elles ne sont ouvertes que si la page n'est pas
+        complète. Chaque log porte `has_details` (et `rank` en tri par
+        pertinence), sans détails déchiffrés. ValueError si l'expression
+        est vide ou invalide.
+        """
+        limit = max(1, min(limit, self.max_page_size))
+        match = match_expression(text, raw)
+        if sort == SORT_TIME:
+            offset, wanted = 0, limit
+        else:
+            before_id, wanted = None, max(0, offset) + limit
+        query, params = search_query(level, module, since, until, before_id, sort)
+        
+        try:
+            with self.get_connection() as conn:
+                pages = [conn.execute(query, [match] + params + [wanted]).fetchall()]
+            
+            if self.partitions is not None:
+                found = len(pages[0])
+                for month in self.partitions.partitions_for_range(since, until):
+                    if sort == SORT_TIME and found >= wanted:
+                        break
+                    # Partition antérieure à l'index : indexée à la prochaine rotation
+                    if not self.partitions.has_search_index(month):
+                        continue
+                    rows = self.partitions.fetch(
+                        month, query, [match] + params + [wanted - found if sort == SORT_TIME else wanted]
+                    )
+                    pages.append(rows)
+                    found += len(rows)
+            
+            if sort == SORT_TIME:
+                rows = [row for page in pages for row in page][:limit]
+            else:
+                rows = merge_ranked(pages, max(0, offset), limit)
+            return self._decode_logs(rows)
+        except sqlite3.OperationalError as e:
+            if is_syntax_error(e):
+                raise ValueError(f"Requête de recherche invalide: {e}")
+            logger.error(f"Erreur recherche logs: {e}")
+            return []
+        except Exception as e:
+            logger.error(f"Erreur recherche logs: {e}")
+            return []
+    
+    def get_log_stats(self, since: str, until: str, resolution: str = None, level: str = None,
+                      module: str = None, event_type: str = None, group_by: str = None) -> Optional[Dict[str, Any]]:
+        """Histogramme des événements lu dans les compteurs pré-agrégés
+
+        Voir `LogRollups.series` ; ValueError si les paramètres sont
+        invalides, None en cas d'erreur de lecture.
+        """
+        try:
+            return self.rollups.series(since, until, resolution, level, module, event_type, group_by)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Erreur lecture des compteurs de logs: {e}")
+            return None
+    
+    def get_partition_stats(self) -> Optional[Dict[str, Any]]:
+        """Partitions de logs présentes (None si le partitionnement est désactivé)"""
+        return self.partitions.get_stats() if self.partitions is not None else None
+    
     def update_module_status(self, module_name: str, status: str, version: str = None, 
                            config: Dict = None, metrics: Dict = None, error: str = None) -> bool:
         """Met à jour le statut d'un module"""
@@ -387,7 +726,7 @@ class DatabaseManager:
             config_json = json.dumps(config) if config else None
             metrics_json = json.dumps(metrics) if metrics else None
             
-            with self.get_connection() as conn:
+            with self.write_transaction() as conn:
                 # Vérifier si le module existe
                 existing = conn.execute("""
                     SELECT id FROM module_status WHERE module_name = ?
@@ -410,44 +749,49 @@ class DatabaseManager:
                     """, (module_name, status, version, config_json, metrics_json, error, 1 if error else 0))
                 
                 conn.commit()
+            self.cache.invalidate('modules')
             return True
         except Exception as e:
             logger.error(f"Erreur mise à jour module: {e}")
             return False
     
     def get_module_status(self, module_name: str = None) -> List[Dict]:
-        """Récupère le statut des modules"""
+        """Récupère le statut des modules (cache invalidé par update_module_status)"""
         try:
-            with self.get_connection() as conn:
-                if module_name:
-                    modules = conn.execute("""
-                        SELECT * FROM module_status WHERE module_name = ?
-                    """, (module_name,)).fetchall()
-                else:
-                    modules = conn.execute("""
-                        SELECT * FROM module_status ORDER BY module_name
-                    """).fetchall()
-                
-                result = []
-                for module in modules:
-                    module_dict = dict(module)
-                    if module_dict['config']:
-                        try:
-                            module_dict['config'] = json.loads(module_dict['config'])
-                        except:
-                            pass
-                    if module_dict['metrics']:
-                        try:
-                            module_dict['metrics'] = json.loads(module_dict['metrics'])
-                        except:
-                            pass
-                    result.append(module_dict)
-                
-                return result
+            return self.cache.get_or_load('modules', module_name,
+                                          lambda: self._load_module_status(module_name))
         except Exception as e:
             logger.error(f"Erreur récupération statut modules: {e}")
             return []
     
+    def _load_module_status(self, module_name: str = None) -> List[Dict]:
+        with self.get_connection() as conn:
+            if module_name:
+                modules = conn.execute("""
+                    SELECT * FROM module_status WHERE module_name = ?
+                """, (module_name,)).fetchall()
+            else:
+                modules = conn.execute("""
+                    SELECT * FROM module_status ORDER BY module_name
+                """).fetchall()
+        
+        result = []
+        for module in modules:
+            module_dict = dict(module)
+            if module_dict['config']:
+                try:
+                    module_dict['config'] = json.loads(module_dict['config'])
+                except:
+                    pass
+            if module_dict['metrics']:
+                try:
+                    module_dict['metrics'] = json.loads(module_dict['metrics'])
+                except:
+                    pass
+            result.append(module_dict)
+        
+        return result
+    
     def log_command(self, user_id: int, module: str, command: str, parameters: Dict = None, 
                    agent_id: str = None, session_id: str = None) -> int:
         """Enregistre une commande dans l'historique"""
@@ -458,7 +802,7 @@ class DatabaseManager:
             if parameters:
                 encrypted_payload = self._encrypt_data(parameters_json)
             
-            with self.get_connection() as conn:
+            with self.write_transaction() as conn:
                 cursor = conn.execute("""
                     INSERT INTO command_history 
                     (user_id, module, command, parameters, encrypted_payload, agent_id, session_id)
@@ -474,7 +818,7 @@ class DatabaseManager:
     def update_command_result(self, command_id: int, status: str, result: str = None, execution_time: float = None) -> bool:
         """Met à jour le résultat d'une commande"""
         try:
-            with self.get_connection() as conn:
+            with self.write_transaction() as conn:
                 conn.execute("""
                     UPDATE command_history 
                     SET status = ?, result = ?, execution_time = ?
@@ -487,70 +831,164 @@ class DatabaseManager:
             logger.error(f"Erreur mise à jour commande: {e}")
             return False
     
+    def update_command_results(self, rows: List[Tuple[str, Optional[str], Optional[float], int]]) -> bool:
+        """Applique un lot de résultats (status, result, execution_time, id) en une transaction"""
+        try:
+            with self.write_transaction() as conn:
+                conn.executemany("""
+                    UPDATE command_history 
+                    SET status = ?, result = ?, execution_time = ?
+                    WHERE id = ?
+                """, rows)
+            return True
+        except Exception as e:
+            logger.error(f"Erreur mise à jour lot de commandes: {e}")
+            return False
+    
+    def enqueue_commands(self, user_id: int, module: str, command: str, parameters: Dict,
+                         agent_ids: List[str], batch_id: str, priority: int = 0, max_attempts: int = 1,
+                         timeout: float = None, session_id: str = None) -> List[int]:
+        """Met en file une commande par agent (statut pending) en une transaction ; retourne les ids"""
+        try:
+            parameters_json = json.dumps(parameters) if parameters else None
+            encrypted_payload = self._encrypt_data(parameters_json) if parameters else None
+            
+            ids = []
+            with self.write_transaction() as conn:
+                for agent_id in agent_ids:
+                    cursor = conn.execute("""
+                        INSERT INTO command_history 
+                        (user_id, module, command, parameters, encrypted_payload, agent_id, session_id,
+                         status, priority, max_attempts, timeout, batch_id)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?)
+                    """, (user_id, module, command, parameters_json, encrypted_payload, agent_id, session_id,
+                          priority, max_attempts, timeout, batch_id))
+                    ids.append(cursor.lastrowid)
+            return ids
+        except Exception as e:
+            logger.error(f"Erreur mise en file de commandes: {e}")
+            return []
+    
+    def update_command_transitions(self, sent: List[tuple] = (), finished: List[tuple] = (),
+                                   requeued: List[tuple] = ()) -> bool:
+        """Applique les transitions de la file en une transaction
+        
+        sent : (attempts, sent_at, id) ; finished : (status, result, execution_time,
+        completed_at, id) ; requeued : (result, id), retour à pending avant nouvel essai.
+        """
+        try:
+            with self.write_transaction() as conn:
+                if sent:
+                    conn.executemany("""
+                        UPDATE command_history SET status = 'sent', attempts = ?, sent_at = ?
+                        WHERE id = ? AND status = 'pending'
+                    """, sent)
+                if finished:
+                    conn.executemany("""
+                        UPDATE command_history 
+                        SET status = ?, result = ?, execution_time = ?, completed_at = ?
+                        WHERE id = ?
+                    """, finished)
+                if requeued:
+                    conn.executemany("""
+                        UPDATE command_history SET status = 'pending', result = ?
+                        WHERE id = ?
+                    """, requeued)
+            return True
+        except Exception as e:
+            logger.error(f"Erreur transitions de commandes: {e}")
+            return False
+    
+    def get_open_commands(self, after_id: int = 0, pending_only: bool = False) -> List[Dict]:
+        """Commandes ordonnancées non terminées (reprise au démarrage)
+
+        `after_id` / `pending_only` : nouvelles commandes insérées par un
+        autre worker depuis la dernière lecture.
+        """
+        statuses = "('pending')" if pending_only else "('pending', 'sent')"
+        try:
+            with self.get_connection() as conn:
+                rows = conn.execute(f"""
+                    SELECT id, timestamp, user_id, command, parameters, status, agent_id, priority,
+                           attempts, max_attempts, timeout, batch_id
+                    FROM command_history
+                    WHERE batch_id IS NOT NULL AND status IN {statuses} AND id > ?
+                """, (after_id,)).fetchall()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Erreur lecture file de commandes: {e}")
+            return []
+    
+    def get_command_batch(self, batch_id: str) -> Dict[str, int]:
+        """Nombre de commandes d'un lot par statut"""
+        try:
+            with self.get_connection() as conn:
+                rows = conn.execute("""
+                    SELECT status, COUNT(*) AS count FROM command_history
+                    WHERE batch_id = ? GROUP BY status
+                """, (batch_id,)).fetchall()
+            return {row['status']: row['count'] for row in rows}
+        except Exception as e:
+            logger.error(f"Erreur lecture lot de commandes: {e}")
+            return {}
+    
+    def _command_history_query(self, user_id: int = None, module: str = None) -> Tuple[str, List]:
+        """Construit la requête d'historique des commandes"""
+        query = """
+            SELECT ch.*, u.username 
+            FROM command_history ch
+            LEFT JOIN users u ON ch.user_id = u.id
+        """
+        params = []
+        
+        conditions = []
+        if user_id:
+            conditions.append("ch.user_id = ?")
+            params.append(user_id)
+        if module:
+            conditions.append("ch.module = ?")
+            params.append(module)
+        
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        
+        query += " ORDER BY ch.timestamp DESC LIMIT ?"
+        return query, params
+    
     def get_command_history(self, user_id: int = None, module: str = None, limit: int = 100) -> List[Dict]:
         """Récupère l'historique des commandes"""
         try:
+            query, params = self._command_history_query(user_id, module)
+            params.append(limit)
+            
             with self.get_connection() as conn:
-                query = """
-                    SELECT ch.*, u.username 
-                    FROM command_history ch
-                    LEFT JOIN users u ON ch.user_id = u.id
-                """
-                params = []
-                
-                conditions = []
-                if user_id:
-                    conditions.append("ch.user_id = ?")
-                    params.append(user_id)
-                if module:
-                    conditions.append("ch.module = ?")
-                    params.append(module)
-                
-                if conditions:
-                    query += " WHERE " + " AND ".join(conditions)
-                
-                query += " ORDER BY ch.timestamp DESC LIMIT ?"
-                params.append(limit)
-                
                 commands = conn.execute(query, params).fetchall()
-                
-                # Déchiffrer les payloads
-                result = []
-                for cmd in commands:
-                    cmd_dict = dict(cmd)
+            
+            # Déchiffrer les payloads en un seul lot
+            result = [dict(cmd) for cmd in commands]
+            payloads = [cmd['encrypted_payload'] for cmd in result]
+            if any(payloads):
+                for cmd_dict, parameters in zip(result, self._decrypt_json_many(payloads)):
                     if cmd_dict['encrypted_payload']:
-                        try:
-                            decrypted = self._decrypt_data(cmd_dict['encrypted_payload'])
-                            cmd_dict['decrypted_parameters'] = json.loads(decrypted)
-                        except:
-                            cmd_dict['decrypted_parameters'] = None
-                    result.append(cmd_dict)
-                
-                return result
+                        cmd_dict['decrypted_parameters'] = parameters
+            
+            return result
         except Exception as e:
             logger.error(f"Erreur récupération historique: {e}")
             return []
     
     def cleanup_old_data(self, days: int = 30) -> bool:
-        """Nettoie les anciennes données"""
+        """Nettoie les anciennes données (purge par lots, même rétention pour toutes les tables)"""
         try:
-            with self.get_connection() as conn:
-                # Nettoyer les anciens logs
-                conn.execute("""
-                    DELETE FROM security_logs 
-                    WHERE timestamp < datetime('now', '-{} days')
-                """.format(days))
-                
-                # Nettoyer l'ancien historique de commandes
-                conn.execute("""
-                    DELETE FROM command_history 
-                    WHERE timestamp < datetime('now', '-{} days')
-                """.format(days))
+            worker = RetentionWorker(
+                self.get_connection,
+                build_policies({table: days for table in RETENTION_TABLES}),
+                write_transaction=self.write_transaction
+            )
+            deleted = worker.run_once()
                 
-                conn.commit()
-                
-            logger.info(f"Nettoyage des données > {days} jours effectué")
+            logger.info(f"Nettoyage des données > {days} jours effectué ({sum(deleted.values())} lignes)")
             return True
         except Exception as e:
             logger.error(f"Erreur nettoyage: {e}")
-            return False
\ No newline at end of file
+            return False
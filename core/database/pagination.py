@@ -0,0 +1,36 @@
+"""
+MIFTAH - Pagination par curseur (keyset)
+Jetons opaques encodant la position (timestamp, id) du dernier élément lu
+"""
+
+import base64
+import json
+from typing import Optional, Tuple, Dict, Any
+
+
+def encode_cursor(timestamp: str, row_id: int) -> str:
+    """Encode une position de pagination en jeton URL-safe"""
+    raw = json.dumps([timestamp, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Décode un jeton de pagination (ValueError si invalide)"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        timestamp, row_id = json.loads(raw)
+        if not isinstance(timestamp, str) or not isinstance(row_id, int):
+            raise ValueError
+        return timestamp, row_id
+    except Exception:
+        raise ValueError("Curseur de pagination invalide")
+
+
+def next_cursor(rows: list, limit: int) -> Optional[str]:
+    """Jeton de la page suivante, ou None si la page est la dernière"""
+    if len(rows) < limit or not rows:
+        return None
+    last: Dict[str, Any] = rows[-1]
+    return encode_cursor(last['timestamp'], last['id'])
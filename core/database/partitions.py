@@ -0,0 +1,360 @@
+"""
+MIFTAH - Partitionnement mensuel des logs de sécurité
+Mois clos déplacés dans des bases SQLCipher dédiées, en lecture seule
+"""
+
+import os
+import re
+import time
+import shutil
+import threading
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from core.database.pool import ConnectionPool
+from core.database.migrations import LOG_SEARCH_TABLE
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = 'security_logs'
+_PARTITION_FILE = re.compile(r'^security_logs_(\d{6})\.db$')
+
+
+def month_of(timestamp: str) -> str:
+    """'YYYY-MM-DD HH:MM:SS' -> 'YYYYMM'"""
+    return timestamp[:4] + timestamp[5:7]
+
+
+def month_bounds(month: str) -> Tuple[str, str]:
+    """Bornes [début, fin[ d'un mois 'YYYYMM' au format des timestamps stockés"""
+    year, mon = int(month[:4]), int(month[4:])
+    next_year, next_mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    return f"{year:04d}-{mon:02d}-01 00:00:00", f"{next_year:04d}-{next_mon:02d}-01 00:00:00"
+
+
+def shift_month(month: str, delta: int) -> str:
+    """Décale un mois 'YYYYMM' de `delta` mois"""
+    index = int(month[:4]) * 12 + int(month[4:]) - 1 + delta
+    return f"{index // 12:04d}{index % 12 + 1:02d}"
+
+
+class LogPartitionManager:
+    """Partitions mensuelles de security_logs
+
+    La table de la base principale ne conserve que les `hot_months`
+    derniers mois (mois courant inclus). Les mois clos sont déplacés par
+    lots vers `security_logs_YYYYMM.db`, chiffré avec la même clé et
+    doté du même schéma ; le fichier passe ensuite en lecture seule. Une
+    partition se détache ou se supprime en déplaçant son fichier, sans
+    DELETE ni VACUUM sur la base principale.
+
+    Les identifiants sont conservés : l'ordre (timestamp, id) reste
+    cohérent entre la table chaude et les partitions, toutes plus anciennes.
+    Chaque partition porte son propre index plein texte, rempli au fil du
+    déplacement (voir `has_search_index`).
+    """
+
+    def __init__(self, directory: Path, get_connection: Callable,
+                 open_connection: Callable[..., Any], hot_months: int = 2,
+                 batch_size: int = 5000, pause: float = 0.05, read_pool_size: int = 2):
+        self.directory = Path(directory)
+        self.get_connection = get_connection
+        self.open_connection = open_connection
+        self.hot_months = max(1, hot_months)
+        self.batch_size = max(1, batch_size)
+        self.pause = pause
+        self.read_pool_size = read_pool_size
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._sleep = time.sleep
+        self._lock = threading.Lock()
+        self._readers: Dict[str, ConnectionPool] = {}
+        self._indexed: set = set()
+        self._stats: Dict[str, Any] = {
+            'rows_moved': 0,
+            'partitions_created': 0,
+            'partitions_dropped': 0,
+            'partition_reads': 0,
+            'partitions_indexed': 0,
+            'last_rotation': None,
+        }
+
+    def path_for(self, month: str) -> Path:
+        return self.directory / f"{PARTITIONED_TABLE}_{month}.db"
+
+    def list_partitions(self) -> List[str]:
+        """Mois disposant d'une partition, du plus récent au plus ancien"""
+        months = []
+        for entry in self.directory.iterdir():
+            match = _PARTITION_FILE.match(entry.name)
+            if match:
+                months.append(match.group(1))
+        return sorted(months, reverse=True)
+
+    def partitions_for_range(self, since: str = None, until: str = None) -> List[str]:
+        """Élagage : partitions dont le mois recoupe [since, until["""
+        selected = []
+        for month in self.list_partitions():
+            start, end = month_bounds(month)
+            if until and start >= until:
+                continue
+            if since and end <= since:
+                continue
+            selected.append(month)
+        return selected
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def _reader(self, month: str) -> ConnectionPool:
+        with self._lock:
+            pool = self._readers.get(month)
+            if pool is None:
+                path = self.path_for(month)
+                pool = ConnectionPool(
+                    lambda: self.open_connection(path, read_only=True),
+                    size=self.read_pool_size
+                )
+                self._readers[month] = pool
+            return pool
+
+    def fetch(self, month: str, query: str, params: List) -> List:
+        """Exécute une requête de lecture sur une partition"""
+        with self._reader(month).connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        with self._lock:
+            self._stats['partition_reads'] += 1
+        return rows
+
+    def has_search_index(self, month: str) -> bool:
+        """La partition a-t-elle un index plein texte ? (partitions antérieures à la v3)"""
+        if month in self._indexed:
+            return True
+        rows = self.fetch(month, "SELECT 1 FROM sqlite_master WHERE name = ?", [LOG_SEARCH_TABLE])
+        if rows:
+            with self._lock:
+                self._indexed.add(month)
+        return bool(rows)
+
+    def _close_reader(self, month: str):
+        with self._lock:
+            pool = self._readers.pop(month, None)
+            self._indexed.discard(month)
+        if pool is not None:
+            pool.close()
+
+    # ------------------------------------------------------------------
+    # Rotation
+    # ------------------------------------------------------------------
+
+    def rotate(self, now: float = None) -> Dict[str, int]:
+        """Déplace les mois clos hors de la table chaude ; retourne les lignes par mois"""
+        now = now if now is not None else time.time()
+        cutoff_month = shift_month(time.strftime('%Y%m', time.gmtime(now)), -(self.hot_months - 1))
+        cutoff, _ = month_bounds(cutoff_month)
+
+        # Mois par mois à partir du plus ancien : aucune partition vide n'est créée
+        moved = {}
+        while True:
+            with self.get_connection() as conn:
+                row = conn.execute(
+                    f"SELECT MIN(timestamp) FROM {PARTITIONED_TABLE} WHERE timestamp < ?", (cutoff,)
+                ).fetchone()
+            if row[0] is None:
+                break
+            month = month_of(row[0])
+            moved[month] = moved.get(month, 0) + self._move_month(month)
+
+        for month in self.list_partitions():
+            if not self.has_search_index(month):
+                self._index_partition(month)
+
+        with self._lock:
+            self._stats['last_rotation'] = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now))
+        if moved:
+            logger.info(f"Partitions de logs: {sum(moved.values())} lignes déplacées "
+                        f"({', '.join(sorted(moved))})")
+        return moved
+
+    def _create_partition(self, path: Path):
+        """Crée le fichier de partition avec le schéma courant de la table et son index plein texte"""
+        with self.get_connection() as conn:
+            schema = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE ((tbl_name = ? AND type IN ('table', 'index')) "
+                "OR name = ?) AND sql IS NOT NULL ORDER BY type = 'index'",
+                (PARTITIONED_TABLE, LOG_SEARCH_TABLE)
+            ).fetchall()
+
+        conn = self.open_connection(path)
+        try:
+            for (statement,) in schema:
+                conn.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+        os.chmod(path, 0o600)
+        with self._lock:
+            self._stats['partitions_created'] += 1
+
+    def _index_partition(self, month: str):
+        """Construit l'index plein texte d'une partition créée avant lui"""
+        self._close_reader(month)
+        path = self.path_for(month)
+        with self.get_connection() as conn:
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (LOG_SEARCH_TABLE,)).fetchone()
+        if row is None:
+            return
+        os.chmod(path, 0o600)
+        conn = self.open_connection(path)
+        try:
+            conn.execute(row[0])
+            conn.execute(f"INSERT INTO {LOG_SEARCH_TABLE} ({LOG_SEARCH_TABLE}) VALUES ('rebuild')")
+            conn.commit()
+        finally:
+            conn.close()
+            os.chmod(path, 0o400)
+        with self._lock:
+            self._stats['partitions_indexed'] += 1
+        logger.info(f"Partition de logs {month}: index plein texte construit")
+
+    def _move_month(self, month: str) -> int:
+        """Copie puis supprime les lignes d'un mois, lot par lot
+
+        La copie (via ATTACH) est validée avant la suppression : la base
+        principale en WAL ne garantit pas l'atomicité entre fichiers. Un
+        lot interrompu entre les deux est rejoué sans doublon : les ids
+        déjà présents dans la partition ne sont ni recopiés ni réindexés.
+        """
+        path = self.path_for(month)
+        if not path.exists():
+            self._create_partition(path)
+        else:
+            os.chmod(path, 0o600)
+        start, end = month_bounds(month)
+
+        total = 0
+        conn = self.open_connection()
+        try:
+            conn.execute("ATTACH DATABASE ? AS partition", (str(path),))
+            columns = ", ".join(
+                row[1] for row in conn.execute(f"PRAGMA partition.table_info({PARTITIONED_TABLE})")
+            )
+            indexed = conn.execute(
+                "SELECT 1 FROM partition.sqlite_master WHERE name = ?", (LOG_SEARCH_TABLE,)
+            ).fetchone() is not None
+            while True:
+                ids = [row[0] for row in conn.execute(
+                    f"SELECT id FROM main.{PARTITIONED_TABLE} WHERE timestamp >= ? AND timestamp < ? "
+                    f"ORDER BY timestamp LIMIT ?",
+                    (start, end, self.batch_size)
+                )]
+                if not ids:
+                    break
+
+                placeholders = ", ".join("?" for _ in ids)
+                copied = {row[0] for row in conn.execute(
+                    f"SELECT id FROM partition.{PARTITIONED_TABLE} WHERE id IN ({placeholders})", ids
+                )}
+                fresh = [row_id for row_id in ids if row_id not in copied]
+                if fresh:
+                    fresh_placeholders = ", ".join("?" for _ in fresh)
+                    conn.execute(
+                        f"INSERT INTO partition.{PARTITIONED_TABLE} ({columns}) "
+                        f"SELECT {columns} FROM main.{PARTITIONED_TABLE} WHERE id IN ({fresh_placeholders})",
+                        fresh
+                    )
+                    if indexed:
+                        # Même fichier, même transaction : ligne et entrée d'index vont ensemble
+                        conn.execute(
+                            f"INSERT INTO partition.{LOG_SEARCH_TABLE} (rowid, message, event_type, agent_id) "
+                            f"SELECT id, message, event_type, agent_id FROM main.{PARTITIONED_TABLE} "
+                            f"WHERE id IN ({fresh_placeholders})",
+                            fresh
+                        )
+                conn.commit()
+                conn.execute(f"DELETE FROM main.{PARTITIONED_TABLE} WHERE id IN ({placeholders})", ids)
+                conn.commit()
+
+                total += len(ids)
+                with self._lock:
+                    self._stats['rows_moved'] += len(ids)
+                if len(ids) < self.batch_size:
+                    break
+                self._sleep(self.pause)
+            conn.execute("DETACH DATABASE partition")
+        finally:
+            conn.close()
+            # Une partition close n'est plus modifiée que par la rotation
+            os.chmod(path, 0o400)
+        return total
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    def drop_partition(self, month: str) -> bool:
+        """Supprime une partition (suppression du fichier)"""
+        self._close_reader(month)
+        path = self.path_for(month)
+        if not path.exists():
+            return False
+        path.unlink()
+        with self._lock:
+            self._stats['partitions_dropped'] += 1
+        logger.info(f"Partition de logs {month} supprimée")
+        return True
+
+    def drop_expired(self, days: int, now: float = None) -> List[str]:
+        """Supprime les partitions entièrement antérieures à la rétention"""
+        now = now if now is not None else time.time()
+        cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now - days * 86400))
+        dropped = []
+        for month in self.list_partitions():
+            if month_bounds(month)[1] <= cutoff and self.drop_partition(month):
+                dropped.append(month)
+        return dropped
+
+    def detach_partition(self, month: str, destination: Path) -> Optional[Path]:
+        """Sort une partition du jeu interrogé (ex: stockage à froid)"""
+        self._close_reader(month)
+        path = self.path_for(month)
+        if not path.exists():
+            return None
+        destination = Path(destination)
+        destination.mkdir(parents=True, exist_ok=True)
+        target = destination / path.name
+        shutil.move(str(path), str(target))
+        logger.info(f"Partition de logs {month} détachée vers {target}")
+        return target
+
+    def attach_partition(self, source: Path) -> str:
+        """Réintègre un fichier de partition détaché"""
+        source = Path(source)
+        match = _PARTITION_FILE.match(source.name)
+        if not match:
+            raise ValueError(f"Nom de partition invalide: {source.name}")
+        month = match.group(1)
+        if self.path_for(month).exists():
+            raise ValueError(f"Partition {month} déjà présente")
+        shutil.move(str(source), str(self.path_for(month)))
+        os.chmod(self.path_for(month), 0o400)
+        return month
+
+    def close(self):
+        with self._lock:
+            readers = list(self._readers.values())
+            self._readers.clear()
+        for pool in readers:
+            pool.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Partitions présentes et compteurs de rotation"""
+        partitions = self.list_partitions()
+        with self._lock:
+            stats = dict(self._stats)
+        stats['partitions'] = partitions
+        stats['hot_months'] = self.hot_months
+        stats['size_bytes'] = sum(self.path_for(m).stat().st_size for m in partitions)
+        return stats
@@ -0,0 +1,216 @@
+"""
+MIFTAH - Pool de connexions SQLCipher
+Connexions chiffrées ouvertes et clés une seule fois, puis réutilisées
+"""
+
+import sqlite3
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Aucune connexion disponible dans le délai imparti"""
+
+
+class _PooledConnection:
+    """Connexion SQLite et ses métadonnées de cycle de vie"""
+
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn: sqlite3.Connection):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """Pool borné de connexions SQLCipher
+
+    Les primitives `threading` sont utilisées pour l'attente : une fois
+    eventlet monkey-patché (voir app.py) elles deviennent coopératives,
+    le pool est donc sûr pour les threads comme pour les greenlets.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], size: int = 5,
+                 timeout: float = 10.0, recycle: float = 3600.0, pre_ping_idle: float = 30.0):
+        self._connect = connect
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping_idle = pre_ping_idle
+
+        self._idle = deque()
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._opened = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'invalidated': 0,
+        }
+
+    def _open(self) -> _PooledConnection:
+        """Ouvre une nouvelle connexion (hors verrou)"""
+        try:
+            entry = _PooledConnection(self._connect())
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return entry
+
+    def _discard(self, entry: _PooledConnection, reason: str):
+        """Ferme une connexion et libère sa place dans le pool"""
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._opened -= 1
+            self._stats[reason] += 1
+            self._cond.notify()
+
+    def _is_healthy(self, entry: _PooledConnection, now: float) -> bool:
+        """Vérifie qu'une connexion inactive est toujours utilisable"""
+        if now - entry.last_used < self.pre_ping_idle:
+            return True
+        try:
+            entry.conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> sqlite3.Connection:
+        """Emprunte une connexion, en attendant au plus `timeout` secondes"""
+        while True:
+            started = time.monotonic()
+            waited = False
+            entry = None
+
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeoutError("Pool de connexions fermé")
+
+                while not self._idle and self._opened >= self.size:
+                    waited = True
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Aucune connexion disponible après {self.timeout}s (taille pool: {self.size})"
+                        )
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    self._opened += 1
+
+                wait_time = time.monotonic() - started
+                self._stats['checkouts'] += 1
+                if waited:
+                    self._stats['waits'] += 1
+                    self._stats['wait_time_total'] += wait_time
+                    self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+
+            if entry is None:
+                entry = self._open()
+
+            now = time.monotonic()
+            if self.recycle and now - entry.created_at > self.recycle:
+                self._discard(entry, 'recycled')
+                continue
+            if not self._is_healthy(entry, now):
+                logger.warning("Connexion DB invalide retirée du pool")
+                self._discard(entry, 'invalidated')
+                continue
+
+            self._checked_out(entry)
+            return entry.conn
+
+    def _checked_out(self, entry: _PooledConnection):
+        """Mémorise l'entrée associée à une connexion empruntée"""
+        with self._cond:
+            self._in_use[id(entry.conn)] = entry
+
+    def release(self, conn: sqlite3.Connection, broken: bool = False):
+        """Rend une connexion au pool"""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            return
+
+        if not broken and conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+
+        if broken or self._closed:
+            self._discard(entry, 'invalidated' if broken else 'recycled')
+            return
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Contexte d'emprunt : commit en sortie normale, rollback sur erreur"""
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            # Fichier corrompu ou mauvaise clé : la connexion n'est plus réutilisable
+            broken = type(e) is sqlite3.DatabaseError
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def close(self):
+        """Ferme toutes les connexions inactives et refuse les nouveaux emprunts"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._opened -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            try:
+                entry.conn.close()
+            except Exception:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métriques du pool (emprunts, attentes, recyclages)"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'opened': self._opened,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+            })
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['waits'] if stats['waits'] else 0.0
+        return stats
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+MIFTAH - Audit des plans de requête
+Exécute chaque méthode publique du DatabaseManager sur une base
+temporaire, capture les requêtes réellement émises (trace SQLite) et
+vérifie via EXPLAIN QUERY PLAN qu'aucune ne retombe sur un parcours
+complet de table ou un tri en B-tree temporaire
+"""
+
+import re
+import sys
+import tempfile
+import logging
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Ajouter le répertoire parent au path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from core.database.models import DatabaseManager
+from core.database.retention import RetentionWorker, build_policies
+from core.database.search import SORT_RANK, SORT_TIME
+
+logger = logging.getLogger(__name__)
+
+# "SCAN t" sans index = parcours complet ; "SCAN t USING INDEX" sur une
+# requête filtrée trahit un index manquant.
+_FULL_SCAN = re.compile(r'^SCAN (\w+)( AS \w+)?$')
+_INDEX_SCAN = re.compile(r'^SCAN \w+( AS \w+)? USING (COVERING )?INDEX')
+_TEMP_BTREE = 'USE TEMP B-TREE'
+
+# Seules les requêtes de lecture ou d'écriture ciblée ont un plan à vérifier
+_PLANNED = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE', 'WITH')
+
+# Valeurs littérales de la trace (requête développée par SQLite)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\?(?:, \?)+")
+
+# Recherche plein texte triée par pertinence (voir core/database/search.py)
+_SEARCH_RANK = ("SELECT l.id, l.timestamp, l.level, l.module, l.event_type, l.message, l.user_id, l.agent_id, "
+                "l.ip_address, l.session_id, l.encrypted_details IS NOT NULL AS has_details, "
+                "bm25(security_logs_fts) AS rank FROM security_logs_fts JOIN security_logs l "
+                "ON l.id = security_logs_fts.rowid WHERE security_logs_fts MATCH ?")
+
+# Seul mécanisme d'exception : (requête normalisée, ligne du plan) -> justification
+ALLOWED_PLANS: Dict[Tuple[str, str], str] = {
+    ("SELECT * FROM agents ORDER BY last_seen DESC",
+     "SCAN agents USING INDEX idx_agents_last_seen"):
+        "liste complète, l'index fournit le tri",
+    ("SELECT * FROM module_status ORDER BY module_name",
+     "SCAN module_status USING INDEX sqlite_autoindex_module_status_1"):
+        "une ligne par module, liste complète",
+    ("SELECT * FROM security_logs ORDER BY timestamp DESC, id DESC LIMIT ?",
+     "SCAN security_logs USING INDEX idx_security_logs_timestamp"):
+        "première page non filtrée : l'index fournit le tri, arrêt au LIMIT",
+    ("SELECT ch.*, u.username FROM command_history ch LEFT JOIN users u ON ch.user_id = u.id "
+     "ORDER BY ch.timestamp DESC LIMIT ?",
+     "SCAN ch USING INDEX idx_command_history_timestamp"):
+        "historique non filtré : l'index fournit le tri, arrêt au LIMIT",
+    (f"{_SEARCH_RANK} ORDER BY rank LIMIT ?",
+     "USE TEMP B-TREE FOR ORDER BY"):
+        "bm25 n'est connu qu'après correspondance : tri des seules lignes trouvées",
+    (f"{_SEARCH_RANK} AND l.level = ? AND l.module = ? AND l.timestamp >= ? AND security_logs_fts.rowid >= "
+     "COALESCE((SELECT id FROM security_logs WHERE timestamp >= datetime(?, ...) ORDER BY timestamp LIMIT ?), ?) "
+     "AND l.timestamp < ? AND security_logs_fts.rowid <= COALESCE((SELECT id FROM security_logs "
+     "WHERE timestamp < datetime(?, ...) ORDER BY timestamp DESC LIMIT ?), ?) ORDER BY rank LIMIT ?",
+     "USE TEMP B-TREE FOR ORDER BY"):
+        "bm25 n'est connu qu'après correspondance : tri des seules lignes trouvées",
+    ("SELECT ? FROM sqlite_master WHERE name = ?",
+     "SCAN sqlite_master"):
+        "catalogue du schéma (partition indexée ?), sans index par nature",
+    ("SELECT sql FROM sqlite_master WHERE ((tbl_name = ? AND type IN (?, ...)) OR name = ?) "
+     "AND sql IS NOT NULL ORDER BY type = ?",
+     "SCAN sqlite_master"):
+        "catalogue du schéma, lu à la création d'une partition",
+    ("SELECT sql FROM sqlite_master WHERE ((tbl_name = ? AND type IN (?, ...)) OR name = ?) "
+     "AND sql IS NOT NULL ORDER BY type = ?",
+     "USE TEMP B-TREE FOR ORDER BY"):
+        "catalogue du schéma : tables avant index, quelques lignes",
+}
+
+
+def normalize(statement: str) -> str:
+    """Forme canonique d'une requête : littéraux remplacés par ?, espaces réduits"""
+    shape = _STRING.sub('?', statement)
+    shape = _NUMBER.sub('?', shape)
+    shape = ' '.join(shape.split())
+    return _LIST.sub('?, ...', shape)
+
+
+class _TracedDatabase(DatabaseManager):
+    """DatabaseManager dont chaque connexion rapporte les requêtes exécutées"""
+
+    def __init__(self, *args, **kwargs):
+        self.tracing = False
+        self.statements: List[str] = []
+        super().__init__(*args, **kwargs)
+
+    def _open_connection(self, path: Path = None, read_only: bool = False):
+        conn = super()._open_connection(path, read_only)
+        conn.set_trace_callback(self._trace)
+        return conn
+
+    def _trace(self, statement: str):
+        if self.tracing:
+            self.statements.append(statement)
+
+
+def exercise(db: DatabaseManager):
+    """Appelle chaque méthode publique émettant du SQL, avec ses variantes de filtres"""
+    since, until = '2020-01-01 00:00:00', '2020-02-01 00:00:00'
+
+    # Utilisateurs et verrouillages
+    db.create_user('audit', 'audit-password')
+    user_id = db.authenticate_user('audit', 'audit-password')['id']
+    db.authenticate_user('audit', 'wrong')
+    db.authenticate_user('audit', 'wrong', record_failure=False)
+    db.sync_login_lockouts([(3, '2999-01-01T00:00:00', 'audit')])
+    db.get_locked_users()
+
+    # Agents
+    db.register_agent('AGT-001', 'audit', 'sensor', 'lab', '127.0.0.1')
+    db.update_agent_status('AGT-001', 'active', 'lab')
+    db.update_agents_batch([('inactive', None, None, 'AGT-001')])
+    for status in (None, 'active'):
+        db.get_agents(status)
+
+    # Logs : un mois clos (partition), puis écritures synchrones et asynchrones
+    db._insert_security_logs([('2020-01-15 10:00:00', 'INFO', 'AUTH', 'login', 'ancien', None,
+                               None, 'AGT-001', None, None)])
+    db.partitions.rotate()
+    db.log_security_event('INFO', 'AUTH', 'login', 'connexion agt', details={'audit': True})
+    db.start_log_writer()
+    db.log_security_event('WARNING', 'AGENT', 'heartbeat', 'agent agt', persist=True)
+
+    for level in (None, 'INFO'):
+        for module in (None, 'AUTH'):
+            for before in (None, ('2999-01-01 00:00:00', 1000)):
+                db.get_security_logs(limit=50, level=level, module=module, before=before)
+            db.get_security_logs(limit=50, level=level, module=module, since=since, until=until,
+                                 include_details=False)
+    list(db.iter_security_logs(level='INFO', chunk_size=1))
+    db.get_security_log_details(1)
+    for sort in (SORT_RANK, SORT_TIME):
+        db.search_security_logs('agt', sort=sort)
+        db.search_security_logs('agt', sort=sort, before_id=1000, since=since, until=until,
+                                level='INFO', module='AUTH')
+    for group_by in (None, 'level'):
+        db.get_log_stats(since, until, resolution='hour', module='AUTH', group_by=group_by)
+
+    # Modules (insertion puis mise à jour)
+    for _ in range(2):
+        db.update_module_status('OMEGA', 'active', metrics={'probes': 1})
+    for module_name in (None, 'OMEGA'):
+        db.get_module_status(module_name)
+
+    # Commandes et file ordonnancée
+    command_id = db.log_command(user_id, 'AGENT', 'ping', {'count': 1}, agent_id='AGT-001')
+    db.update_command_result(command_id, 'done', 'ok', 0.1)
+    db.update_command_results([('failed', 'ko', 0.2, command_id)])
+    ids = db.enqueue_commands(user_id, 'AGENT', 'ping', {}, ['AGT-001'], 'b1')
+    db.update_command_transitions(sent=[(1, '2999-01-01 00:00:00', ids[0])],
+                                  requeued=[('retry', ids[0])],
+                                  finished=[('done', 'ok', 0.1, '2999-01-01 00:00:00', ids[0])])
+    for pending_only in (False, True):
+        db.get_open_commands(after_id=0, pending_only=pending_only)
+    db.get_command_batch('b1')
+    for user in (None, user_id):
+        for module in (None, 'AGENT'):
+            db.get_command_history(user, module, limit=50)
+
+    # Rétention : politiques par niveau et compaction des compteurs
+    policies = build_policies({'security_logs': 30, 'command_history': 30}, {'DEBUG': 7, 'ERROR': 180})
+    RetentionWorker(db.get_connection, policies, rollups=db.rollups,
+                    write_transaction=db.write_transaction).run_once()
+    db.cleanup_old_data(30)
+
+
+def capture_statements(db: _TracedDatabase) -> List[str]:
+    """Requêtes distinctes (par forme) émises pendant `exercise`"""
+    db.tracing = True
+    try:
+        exercise(db)
+        if db.log_writer is not None:
+            db.log_writer.stop()
+    finally:
+        db.tracing = False
+
+    shapes = {}
+    for statement in db.statements:
+        if statement.lstrip().split(None, 1)[0].upper() in _PLANNED:
+            shapes.setdefault(normalize(statement), statement)
+    return list(shapes.values())
+
+
+def audit_query_plans(db: DatabaseManager, statements: List[str]) -> List[str]:
+    """Retourne la liste des requêtes dont le plan est dégradé"""
+    problems = []
+    conn = db._open_connection()
+    try:
+        # Requêtes de rotation : même schéma attaché que lors du déplacement
+        for month in db.partitions.list_partitions()[:1]:
+            conn.execute("ATTACH DATABASE ? AS partition", (str(db.partitions.path_for(month)),))
+        for statement in statements:
+            shape = normalize(statement)
+            for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall():
+                detail = row['detail']
+                if not (_FULL_SCAN.match(detail) or _TEMP_BTREE in detail or _INDEX_SCAN.match(detail)):
+                    continue
+                if (shape, detail) not in ALLOWED_PLANS:
+                    problems.append(f"{shape}\n     → {detail}")
+    finally:
+        conn.close()
+    return problems
+
+
+def main():
+    """Audit sur une base temporaire au schéma courant (code retour 1 si régression)"""
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _TracedDatabase(db_path=str(Path(tmp) / 'audit.db'), db_key='audit',
+                             partition_dir=str(Path(tmp) / 'partitions'))
+        try:
+            statements = capture_statements(db)
+            problems = audit_query_plans(db, statements)
+        finally:
+            db.close()
+
+    if problems:
+        print("❌ Plans de requête dégradés:")
+        for problem in problems:
+            print(f"   • {problem}")
+        sys.exit(1)
+    print(f"✅ {len(statements)} requêtes auditées, toutes utilisent un index")
+
+
+if __name__ == "__main__":
+    main()
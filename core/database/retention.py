@@ -0,0 +1,242 @@
+"""
+MIFTAH - Rétention des données
+Suppression incrémentale par lots, archivage optionnel et vacuum incrémental
+"""
+
+import os
+import gzip
+import json
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tables soumises à la rétention (les noms sont interpolés dans le SQL)
+RETENTION_TABLES = ('security_logs', 'command_history')
+
+
+class RetentionPolicy:
+    """Durée de conservation d'une table, éventuellement restreinte à un niveau de log"""
+
+    __slots__ = ('table', 'days', 'level', 'exclude_levels')
+
+    def __init__(self, table: str, days: int, level: str = None, exclude_levels: Tuple[str, ...] = ()):
+        if table not in RETENTION_TABLES:
+            raise ValueError(f"Table sans politique de rétention: {table}")
+        self.table = table
+        self.days = days
+        self.level = level
+        self.exclude_levels = tuple(exclude_levels)
+
+    @property
+    def name(self) -> str:
+        return f"{self.table}:{self.level or 'default'}"
+
+    def where_clause(self) -> Tuple[str, List]:
+        """Conditions SQL (hors borne de temps) de la politique"""
+        if self.level:
+            return "level = ? AND ", [self.level]
+        if self.exclude_levels:
+            placeholders = ", ".join("?" for _ in self.exclude_levels)
+            return f"level NOT IN ({placeholders}) AND ", list(self.exclude_levels)
+        return "", []
+
+
+def build_policies(table_days: Dict[str, int], level_days: Dict[str, int] = None) -> List[RetentionPolicy]:
+    """Construit les politiques : une par niveau de log spécifique, plus une par défaut"""
+    level_days = level_days or {}
+    policies = []
+    for table, days in table_days.items():
+        if table == 'security_logs' and level_days:
+            for level, level_retention in level_days.items():
+                policies.append(RetentionPolicy(table, level_retention, level=level))
+            policies.append(RetentionPolicy(table, days, exclude_levels=tuple(level_days)))
+        else:
+            policies.append(RetentionPolicy(table, days))
+    return policies
+
+
+class RetentionWorker:
+    """Purge planifiée des données expirées
+
+    Chaque lot est supprimé dans sa propre transaction courte ; le verrou
+    d'écriture est relâché entre deux lots pour laisser passer loggers et
+    connexions. `write_transaction` (DatabaseManager.write_transaction)
+    prend ce verrou d'emblée (BEGIN IMMEDIATE) et en mesure l'attente.
+    """
+
+    def __init__(self, get_connection: Callable, policies: List[RetentionPolicy],
+                 batch_size: int = 1000, pause: float = 0.05, interval: float = 3600,
+                 archive_dir: Optional[Path] = None, vacuum_pages: int = 1000,
+                 partitions=None, rollups=None, write_transaction: Callable = None):
+        self.get_connection = get_connection
+        self.write_transaction = write_transaction or self._immediate_transaction
+        self.policies = policies
+        self.batch_size = max(1, min(batch_size, 5000))
+        self.pause = pause
+        self.interval = interval
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.vacuum_pages = vacuum_pages
+        # Partitions de logs : rotation des mois clos, suppression des partitions expirées
+        self.partitions = partitions
+        self.partition_days = max(
+            (p.days for p in policies if p.table == 'security_logs'), default=None
+        )
+        # Compteurs des logs : compaction des résolutions fines hors horizon
+        self.rollups = rollups
+
+        self._sleep = time.sleep
+        self._running = False
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            'runs': 0,
+            'rows_deleted': 0,
+            'rows_archived': 0,
+            'batches': 0,
+            'lock_hold_max': 0.0,
+            'lock_hold_total': 0.0,
+            'last_run': None,
+            'last_duration': 0.0,
+            'last_rows_per_sec': 0.0,
+            'vacuum_pages': 0,
+            'policies': {},
+        }
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Lance la purge périodique via les primitives du serveur (ex: SocketIO)"""
+        if self._running:
+            return
+        self._running = True
+        self._sleep = sleep
+        spawn(self._run)
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Erreur rétention: {e}")
+            self._sleep(self.interval)
+
+    def run_once(self, now: float = None) -> Dict[str, int]:
+        """Applique toutes les politiques ; retourne les lignes supprimées par politique"""
+        now = now if now is not None else time.time()
+        started = time.monotonic()
+        deleted = {}
+
+        for policy in self.policies:
+            cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now - policy.days * 86400))
+            deleted[policy.name] = self._purge(policy, cutoff)
+
+        if self.partitions is not None:
+            self.partitions.rotate(now)
+            if self.partition_days:
+                self.partitions.drop_expired(self.partition_days, now)
+
+        if self.rollups is not None:
+            self.rollups.compact(now, self._sleep)
+
+        vacuumed = self._incremental_vacuum()
+        duration = time.monotonic() - started
+        total = sum(deleted.values())
+
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['last_run'] = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now))
+            self._stats['last_duration'] = round(duration, 3)
+            self._stats['last_rows_per_sec'] = round(total / duration, 1) if duration > 0 else 0.0
+            self._stats['vacuum_pages'] += vacuumed
+            for name, count in deleted.items():
+                self._stats['policies'][name] = self._stats['policies'].get(name, 0) + count
+
+        if total:
+            logger.info(f"Rétention: {total} lignes supprimées en {duration:.2f}s "
+                        f"({self._stats['last_rows_per_sec']} lignes/s)")
+        return deleted
+
+    def _purge(self, policy: RetentionPolicy, cutoff: str) -> int:
+        """Supprime les lignes expirées d'une politique, lot par lot"""
+        clause, params = policy.where_clause()
+        select = (f"SELECT * FROM {policy.table} WHERE {clause}timestamp < ? "
+                  f"ORDER BY timestamp LIMIT ?")
+        total = 0
+
+        while True:
+            with self.get_connection() as conn:
+                rows = conn.execute(select, params + [cutoff, self.batch_size]).fetchall()
+            if not rows:
+                break
+
+            # Archivage hors transaction d'écriture (au pire un doublon après crash)
+            if self.archive_dir:
+                self._archive(policy.table, rows)
+
+            ids = [row['id'] for row in rows]
+            placeholders = ", ".join("?" for _ in ids)
+            with self.write_transaction() as conn:
+                # Durée de détention du verrou, attente exclue
+                lock_started = time.monotonic()
+                conn.execute(f"DELETE FROM {policy.table} WHERE id IN ({placeholders})", ids)
+                conn.commit()
+                lock_hold = time.monotonic() - lock_started
+
+            total += len(rows)
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['rows_deleted'] += len(rows)
+                self._stats['lock_hold_total'] += lock_hold
+                self._stats['lock_hold_max'] = max(self._stats['lock_hold_max'], lock_hold)
+
+            if len(rows) < self.batch_size:
+                break
+            # Céder la main entre deux lots
+            self._sleep(self.pause)
+
+        return total
+
+    @contextmanager
+    def _immediate_transaction(self):
+        """Verrou d'écriture pris d'emblée, sans DatabaseManager (tests, outils)"""
+        with self.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+
+    def _archive(self, table: str, rows: list):
+        """Ajoute les lignes au fichier d'archive compressé du jour"""
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        path = self.archive_dir / f"{table}-{time.strftime('%Y%m%d', time.gmtime())}.ndjson.gz"
+        is_new = not path.exists()
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(dict(row), default=str) + '\n')
+        if is_new:
+            os.chmod(path, 0o600)
+        with self._lock:
+            self._stats['rows_archived'] += len(rows)
+
+    def _incremental_vacuum(self) -> int:
+        """Rend au système les pages libérées (si auto_vacuum = INCREMENTAL)"""
+        if not self.vacuum_pages:
+            return 0
+        with self.get_connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return 0
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+            free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return max(0, free_before - free_after)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métriques de rétention (débit, durée max de verrou)"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['policies'] = dict(self._stats['policies'])
+        stats['lock_hold_avg'] = stats['lock_hold_total'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
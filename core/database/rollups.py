@@ -0,0 +1,253 @@
+"""
+MIFTAH - Compteurs pré-agrégés des logs de sécurité
+Séries par minute, heure et jour tenues à jour à l'écriture des logs,
+compactées selon l'horizon de chaque résolution
+"""
+
+import time
+import threading
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = 'security_log_rollups'
+RESOLUTIONS = ('minute', 'hour', 'day')
+GROUP_COLUMNS = ('level', 'module', 'event_type')
+
+_STEPS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+_UPSERT = f"""
+    INSERT INTO {ROLLUP_TABLE} (resolution, bucket, level, module, event_type, count)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (resolution, bucket, level, module, event_type)
+    DO UPDATE SET count = count + excluded.count
+"""
+
+
+def bucket_of(timestamp: str, resolution: str) -> str:
+    """Début de l'intervalle d'un timestamp 'YYYY-MM-DD HH:MM:SS' (même format)"""
+    if resolution == 'minute':
+        return timestamp[:16] + ':00'
+    if resolution == 'hour':
+        return timestamp[:13] + ':00:00'
+    return timestamp[:10] + ' 00:00:00'
+
+
+def _floor(moment: datetime, resolution: str) -> datetime:
+    if resolution == 'minute':
+        return moment.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _parse(value: str) -> datetime:
+    """Date ISO 8601 -> datetime UTC naïf (format des timestamps stockés)"""
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Date invalide: {value}")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class LogRollups:
+    """Compteurs d'événements par (résolution, intervalle, niveau, module, type)
+
+    `record` est appelé dans la transaction d'insertion d'un lot de logs :
+    le lot est agrégé en mémoire puis chaque clé distincte devient un
+    UPSERT par résolution (quelques dizaines de lignes pour 200 logs).
+    Un histogramme se lit ensuite dans la seule résolution demandée, sans
+    toucher à security_logs.
+
+    La compaction supprime, par lots, les intervalles plus anciens que
+    l'horizon de leur résolution (`horizons`, en jours ; None = conservé) :
+    les résolutions plus larges portent déjà les mêmes comptes.
+    """
+
+    def __init__(self, get_connection: Callable, horizons: Dict[str, Optional[int]] = None,
+                 max_points: int = 1500, batch_size: int = 1000, pause: float = 0.05):
+        self.get_connection = get_connection
+        self.horizons = dict(horizons or {'minute': 2, 'hour': 90, 'day': None})
+        self.max_points = max_points
+        self.batch_size = max(1, batch_size)
+        self.pause = pause
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            'events': 0,
+            'upserts': 0,
+            'rows_compacted': 0,
+            'queries': 0,
+            'rows_read': 0,
+            'last_compaction': None,
+        }
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+
+    def record(self, conn, rows: List[tuple]):
+        """Ajoute un lot de logs (timestamp, level, module, event_type, ...) aux compteurs"""
+        counts = Counter()
+        for row in rows:
+            if row[0] is None:
+                continue
+            for resolution in RESOLUTIONS:
+                counts[(resolution, bucket_of(row[0], resolution), row[1], row[2], row[3])] += 1
+        if not counts:
+            return
+        conn.executemany(_UPSERT, [key + (count,) for key, count in counts.items()])
+        with self._lock:
+            self._stats['events'] += len(rows)
+            self._stats['upserts'] += len(counts)
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def compact(self, now: float = None, sleep: Callable[[float], None] = time.sleep) -> Dict[str, int]:
+        """Supprime les intervalles hors horizon ; retourne les lignes supprimées par résolution"""
+        now = now if now is not None else time.time()
+        deleted = {}
+        for resolution in RESOLUTIONS:
+            days = self.horizons.get(resolution)
+            if not days:
+                continue
+            cutoff = bucket_of(time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now - days * 86400)), resolution)
+            deleted[resolution] = self._compact(resolution, cutoff, sleep)
+
+        total = sum(deleted.values())
+        with self._lock:
+            self._stats['rows_compacted'] += total
+            self._stats['last_compaction'] = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now))
+        if total:
+            logger.info(f"Compteurs de logs: {total} lignes compactées "
+                        f"({', '.join(f'{r}={n}' for r, n in deleted.items() if n)})")
+        return deleted
+
+    def _compact(self, resolution: str, cutoff: str, sleep: Callable[[float], None]) -> int:
+        """Suppression par tranches d'au plus `batch_size` lignes (plus les ex aequo d'un intervalle)"""
+        total = 0
+        while True:
+            with self.get_connection() as conn:
+                row = conn.execute(
+                    f"SELECT bucket FROM {ROLLUP_TABLE} WHERE resolution = ? AND bucket < ? "
+                    f"ORDER BY bucket LIMIT 1 OFFSET ?",
+                    (resolution, cutoff, self.batch_size - 1)
+                ).fetchone()
+                last = row[0] if row else None
+                if last is None:
+                    cursor = conn.execute(
+                        f"DELETE FROM {ROLLUP_TABLE} WHERE resolution = ? AND bucket < ?", (resolution, cutoff)
+                    )
+                else:
+                    cursor = conn.execute(
+                        f"DELETE FROM {ROLLUP_TABLE} WHERE resolution = ? AND bucket <= ?", (resolution, last)
+                    )
+                conn.commit()
+            total += cursor.rowcount
+            if last is None:
+                return total
+            sleep(self.pause)
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def pick_resolution(self, since: datetime, until: datetime, now: datetime = None) -> str:
+        """Résolution la plus fine qui couvre [since, until[ en `max_points` intervalles au plus"""
+        now = now or _utcnow()
+        for resolution in RESOLUTIONS:
+            days = self.horizons.get(resolution)
+            if days and since < now - timedelta(days=days):
+                continue
+            if (until - _floor(since, resolution)) / _STEPS[resolution] <= self.max_points:
+                return resolution
+        return RESOLUTIONS[-1]
+
+    def series(self, since: str, until: str, resolution: str = None, level: str = None,
+               module: str = None, event_type: str = None, group_by: str = None) -> Dict[str, Any]:
+        """Histogramme dense sur [since, until[ (UTC) : un compte par intervalle et par série
+
+        Sans `group_by`, une seule série 'total' ; sinon une série par
+        valeur de la colonne (level, module ou event_type). ValueError si
+        les paramètres sont invalides ou l'intervalle trop long pour la
+        résolution demandée.
+        """
+        start, end = _parse(since), _parse(until)
+        if end <= start:
+            raise ValueError("Intervalle vide (until <= since)")
+        if group_by is not None and group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Regroupement inconnu: {group_by}")
+        if resolution is None:
+            resolution = self.pick_resolution(start, end)
+        elif resolution not in RESOLUTIONS:
+            raise ValueError(f"Résolution inconnue: {resolution}")
+
+        buckets = []
+        moment = _floor(start, resolution)
+        while moment < end:
+            buckets.append(moment.strftime('%Y-%m-%d %H:%M:%S'))
+            if len(buckets) > self.max_points:
+                raise ValueError(f"Plus de {self.max_points} intervalles : choisir une résolution plus large")
+            moment += _STEPS[resolution]
+
+        query, params = self._series_query(resolution, buckets[0], end.strftime('%Y-%m-%d %H:%M:%S'),
+                                           level, module, event_type, group_by)
+        with self.get_connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        index = {bucket: i for i, bucket in enumerate(buckets)}
+        series: Dict[str, List[int]] = {}
+        for row in rows:
+            position = index.get(row['bucket'])
+            if position is None:
+                continue
+            points = series.setdefault(row['series'], [0] * len(buckets))
+            points[position] += row['count']
+        with self._lock:
+            self._stats['queries'] += 1
+            self._stats['rows_read'] += len(rows)
+
+        days = self.horizons.get(resolution)
+        return {
+            'resolution': resolution,
+            'buckets': buckets,
+            'series': series,
+            'total': sum(sum(points) for points in series.values()),
+            'retained_since': (bucket_of((_utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S'),
+                                         resolution) if days else None),
+        }
+
+    def _series_query(self, resolution: str, since: str, until: str, level: str = None,
+                      module: str = None, event_type: str = None, group_by: str = None) -> Tuple[str, List]:
+        """Requête d'agrégation : parcours de la clé primaire (résolution, intervalle, ...)"""
+        label = group_by if group_by else "'total'"
+        query = (f"SELECT bucket, {label} AS series, SUM(count) AS count FROM {ROLLUP_TABLE} "
+                 f"WHERE resolution = ? AND bucket >= ? AND bucket < ?")
+        params = [resolution, since, until]
+        for column, value in (('level', level), ('module', module), ('event_type', event_type)):
+            if value:
+                query += f" AND {column} = ?"
+                params.append(value)
+        query += f" GROUP BY bucket{', ' + group_by if group_by else ''}"
+        return query, params
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Compteurs d'écriture, de compaction et de lecture ; horizons par résolution"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['horizons'] = dict(self.horizons)
+        return stats
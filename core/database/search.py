@@ -0,0 +1,119 @@
+"""
+MIFTAH - Recherche plein texte dans les logs de sécurité
+Construction des requêtes FTS5 sur security_logs_fts (migration v3)
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from core.database.migrations import LOG_SEARCH_TABLE
+
+SORT_RANK = 'rank'
+SORT_TIME = 'time'
+
+# Colonnes des résultats : mêmes champs que les listes sans détails
+_RESULT_COLUMNS = ("l.id, l.timestamp, l.level, l.module, l.event_type, l.message, l.user_id, "
+                   "l.agent_id, l.ip_address, l.session_id, l.encrypted_details IS NOT NULL AS has_details")
+
+_TERM = re.compile(r'"[^"]*"\*?|\S+')
+
+# Bornes de temps converties en bornes de rowid, que FTS5 applique en
+# lisant l'index. L'id suit l'ordre d'insertion et le timestamp l'émission :
+# la marge couvre l'écart entre les deux (file de l'écrivain, workers).
+_ROWID_MARGIN = '300 seconds'
+_MAX_ROWID = 2 ** 63 - 1
+
+
+def match_expression(text: str, raw: bool = False) -> str:
+    """Texte saisi -> expression MATCH FTS5 (ValueError si vide)
+
+    Par défaut chaque mot est cherché littéralement (tous requis) : un
+    identifiant comme AGT-0042 ou une adresse IP n'est pas interprété
+    comme opérateur. Un mot terminé par * est cherché comme préfixe et un
+    groupe entre guillemets comme phrase. `raw=True` transmet la syntaxe
+    FTS5 complète (OR, NOT, NEAR, colonne:terme).
+    """
+    text = (text or '').strip()
+    if not text:
+        raise ValueError("Requête de recherche vide")
+    if raw:
+        return text
+
+    terms = []
+    for term in _TERM.findall(text):
+        prefix = term.endswith('*')
+        term = term.rstrip('*')
+        if term.startswith('"') and term.endswith('"') and len(term) > 1:
+            term = term[1:-1]
+        if not term.strip():
+            continue
+        terms.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+    if not terms:
+        raise ValueError("Requête de recherche vide")
+    return " ".join(terms)
+
+
+def search_query(level: str = None, module: str = None, since: str = None, until: str = None,
+                 before_id: int = None, sort: str = SORT_RANK) -> Tuple[str, List]:
+    """Requête de recherche ; paramètres à compléter par (MATCH, ..., LIMIT)
+
+    Le tri 'rank' (bm25, colonne `rank`) classe toutes les
+    correspondances ; le tri 'time' suit l'ordre des rowid de l'index (du
+    plus récent au plus ancien) et s'arrête dès la page remplie, curseur
+    `before_id` compris.
+    """
+    # bm25 lit la liste complète des documents du terme : tri 'rank' seulement
+    score = f", bm25({LOG_SEARCH_TABLE}) AS rank" if sort != SORT_TIME else ""
+    query = (f"SELECT {_RESULT_COLUMNS}{score} "
+             f"FROM {LOG_SEARCH_TABLE} JOIN security_logs l ON l.id = {LOG_SEARCH_TABLE}.rowid "
+             f"WHERE {LOG_SEARCH_TABLE} MATCH ?")
+    params = []
+    if level:
+        query += " AND l.level = ?"
+        params.append(level)
+    if module:
+        query += " AND l.module = ?"
+        params.append(module)
+    if since:
+        query += (f" AND l.timestamp >= ? AND {LOG_SEARCH_TABLE}.rowid >= COALESCE(("
+                  f"SELECT id FROM security_logs WHERE timestamp >= datetime(?, '-{_ROWID_MARGIN}') "
+                  f"ORDER BY timestamp LIMIT 1), 0)")
+        params.extend([since, since])
+    if until:
+        query += (f" AND l.timestamp < ? AND {LOG_SEARCH_TABLE}.rowid <= COALESCE(("
+                  f"SELECT id FROM security_logs WHERE timestamp < datetime(?, '+{_ROWID_MARGIN}') "
+                  f"ORDER BY timestamp DESC LIMIT 1), {_MAX_ROWID})")
+        params.extend([until, until])
+    if before_id is not None:
+        query += f" AND {LOG_SEARCH_TABLE}.rowid < ?"
+        params.append(before_id)
+
+    if sort == SORT_TIME:
+        query += f" ORDER BY {LOG_SEARCH_TABLE}.rowid DESC LIMIT ?"
+    else:
+        query += " ORDER BY rank LIMIT ?"
+    return query, params
+
+
+def is_syntax_error(error: Exception) -> bool:
+    """Erreur due à l'expression saisie (et non à la base)"""
+    message = str(error)
+    return 'fts5' in message or 'no such column' in message or 'unterminated string' in message
+
+
+def merge_ranked(pages: List[List], offset: int, limit: int) -> List:
+    """Fusionne les meilleurs résultats de chaque source par score bm25
+
+    Les scores de deux bases ne sont qu'approximativement comparables
+    (statistiques de corpus distinctes) ; l'ordre reste stable à l'id près.
+    """
+    rows = [row for page in pages for row in page]
+    rows.sort(key=lambda row: (row['rank'], -row['id']))
+    return rows[offset:offset + limit]
+
+
+def next_offset(rows: list, offset: int, limit: int, max_offset: int) -> Optional[int]:
+    """Décalage de la page suivante en tri par pertinence (None si dernière page)"""
+    if len(rows) < limit or offset + limit > max_offset:
+        return None
+    return offset + limit
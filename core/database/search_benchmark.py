@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+MIFTAH - Benchmark de la recherche plein texte des logs
+Génère une table security_logs de plusieurs millions de lignes, mesure le
+remplissage de l'index (migration v3), le surcoût à l'insertion et compare
+la recherche FTS5 au parcours LIKE
+
+Usage : python -m core.database.search_benchmark [--rows 2000000] [--repeat 5] [--keep DIR]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Iterator, List
+
+# Ajouter le répertoire parent au path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from core.database.models import DatabaseManager
+from core.database.migrations import LOG_SEARCH_TABLE
+from core.database.search import SORT_RANK, SORT_TIME
+
+_USERS = ['admin', 'operateur1', 'operateur2', 'analyste', 'superviseur'] + [f'user{i:03d}' for i in range(200)]
+_MODULES = ['OMEGA', 'ATLAS', 'PROLITAGE', 'SHADOW', 'NEXUS']
+_COMMANDS = ['scan', 'status', 'update', 'collect', 'restart', 'sync']
+_LOAD_BATCH = 5000
+_WRITER_BATCH = 200  # taille de lot de l'écrivain de logs (LOG_BATCH_SIZE)
+
+
+def _generate(count: int, start: float, span: float, agents: int, seed: int = 42) -> Iterator[tuple]:
+    """Lignes de logs représentatives, horodatages croissants sur `span` secondes"""
+    rng = random.Random(seed)
+    for i in range(count):
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(start + span * i / count))
+        kind = rng.random()
+        agent = f'AGT-{rng.randrange(agents):04d}'
+        user = rng.choice(_USERS)
+        ip = f'10.{rng.randrange(4)}.{rng.randrange(256)}.{rng.randrange(256)}'
+        if kind < 0.55:
+            row = ('INFO', 'AGENT', 'command_sent',
+                   f'Commande envoyée à {agent}: {rng.choice(_COMMANDS)}', agent)
+        elif kind < 0.75:
+            row = ('INFO', 'NAVIGATION', 'module_navigation',
+                   f'Navigation vers module: {rng.choice(_MODULES)}', None)
+        elif kind < 0.88:
+            row = ('INFO', 'AUTH', 'login_success', f'Connexion utilisateur: {user}', None)
+        elif kind < 0.97:
+            row = ('INFO', 'AUTH', 'logout', f'Déconnexion utilisateur: {user}', None)
+        elif kind < 0.995:
+            row = ('WARNING', 'AUTH', 'login_failed_summary',
+                   f'{rng.randrange(1, 40)} tentatives échouées, {rng.randrange(20)} refusées '
+                   f'({rng.randrange(1, 5)} comptes)', None)
+        else:
+            row = ('WARNING', 'AUTH', 'account_locked',
+                   f'Compte verrouillé après échecs répétés: {user}', None)
+        level, module, event_type, message, agent_id = row
+        yield (timestamp, level, module, event_type, message, None, None, agent_id, ip, None)
+
+
+def _chunks(rows: Iterator[tuple], size: int) -> Iterator[List[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _drop_search_index(db: DatabaseManager):
+    """Ramène la base à la v2 (sans index ni triggers) pour mesurer la migration"""
+    with db.get_connection() as conn:
+        for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?",
+                                  (f'{LOG_SEARCH_TABLE}%',)).fetchall():
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.execute(f"DROP TABLE IF EXISTS {LOG_SEARCH_TABLE}")
+        conn.execute("DELETE FROM schema_migrations WHERE version = 3")
+        conn.execute("PRAGMA user_version = 2")
+        conn.commit()
+
+
+def _insert_rate(db: DatabaseManager, rows: List[tuple]) -> float:
+    """Lignes/s insérées par lots de l'écrivain de logs"""
+    started = time.perf_counter()
+    for chunk in _chunks(iter(rows), _WRITER_BATCH):
+        db._insert_security_logs(chunk)
+    return len(rows) / (time.perf_counter() - started)
+
+
+def _median_ms(fn: Callable, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def _like_scan(db: DatabaseManager, needle: str, since: str = None, limit: int = 50):
+    """Référence : recherche par sous-chaîne, parcours de la table"""
+    query = "SELECT id FROM security_logs WHERE (message LIKE ? OR event_type LIKE ? OR agent_id LIKE ?)"
+    pattern = f'%{needle}%'
+    params = [pattern, pattern, pattern]
+    if since:
+        query += " AND timestamp >= ?"
+        params.append(since)
+    query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    with db.get_connection() as conn:
+        return conn.execute(query, params + [limit]).fetchall()
+
+
+def _file_size(db: DatabaseManager) -> int:
+    with db.get_connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return db.db_path.stat().st_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recherche plein texte des logs de sécurité")
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--agents', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--keep', help="répertoire où conserver la base générée")
+    args = parser.parse_args()
+
+    directory = Path(args.keep) if args.keep else Path(tempfile.mkdtemp(prefix='miftah-search-'))
+    directory.mkdir(parents=True, exist_ok=True)
+    db = DatabaseManager(db_path=str(directory / 'bench.db'), db_key='bench', max_page_size=500)
+    db.migrations.batch_pause = 0
+    try:
+        now = time.time()
+        start = now - args.days * 86400
+        probe = list(_generate(50_000, now - 3600, 3600, args.agents, seed=7))
+
+        print(f"📦 Génération de {args.rows:,} logs sur {args.days} jours ({args.agents} agents)...")
+        _drop_search_index(db)
+        started = time.perf_counter()
+        for chunk in _chunks(_generate(args.rows, start, args.days * 86400 - 7200, args.agents), _LOAD_BATCH):
+            db._insert_security_logs(chunk)
+        print(f"   chargement: {time.perf_counter() - started:.1f}s")
+        # Même taille de table pour les deux mesures d'insertion
+        bare_rate = _insert_rate(db, probe[:25_000])
+        size_before = _file_size(db)
+
+        print("🔎 Migration v3 (remplissage de l'index par lots)...")
+        started = time.perf_counter()
+        db.migrations.migrate()
+        backfill = time.perf_counter() - started
+        size_after = _file_size(db)
+        print(f"   {backfill:.1f}s ({args.rows / backfill:,.0f} lignes/s), "
+              f"base {size_before / 2**20:.0f} -> {size_after / 2**20:.0f} Mio")
+
+        indexed_rate = _insert_rate(db, probe[25_000:])
+        print(f"✍️  Insertion par lots de {_WRITER_BATCH}: {bare_rate:,.0f} lignes/s sans index, "
+              f"{indexed_rate:,.0f} lignes/s avec ({(1 - indexed_rate / bare_rate) * 100:.0f}% de surcoût)")
+
+        day_ago = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now - 86400))
+        cases = [
+            ("agent précis", 'AGT-0042', None),
+            ("utilisateur", 'operateur1', None),
+            ("terme rare", 'verrouillé', None),
+            ("terme fréquent", 'commande', None),
+            ("terme fréquent, 24 h", 'commande', day_ago),
+        ]
+        print(f"\n{'Recherche':<22}{'résultats':>10}{'LIKE':>12}{'FTS rang':>12}{'FTS date':>12}")
+        for name, needle, since in cases:
+            matches = len(db.search_security_logs(needle, limit=500, sort=SORT_TIME, since=since))
+            like = _median_ms(lambda: _like_scan(db, needle, since), args.repeat)
+            ranked = _median_ms(lambda: db.search_security_logs(needle, sort=SORT_RANK, since=since),
+                                args.repeat)
+            recent = _median_ms(lambda: db.search_security_logs(needle, sort=SORT_TIME, since=since),
+                                args.repeat)
+            label = f"{matches}+" if matches >= 500 else str(matches)
+            print(f"{name:<22}{label:>10}{like:>10.1f}ms{ranked:>10.1f}ms{recent:>10.1f}ms")
+    finally:
+        db.close()
+        if not args.keep:
+            for path in directory.iterdir():
+                path.unlink()
+            directory.rmdir()
+
+
+if __name__ == "__main__":
+    main()
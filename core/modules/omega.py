@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+MIFTAH - OMEGA : exécution des scans de reconnaissance
+Pool borné de sondes TCP, délai et annulation par scan, résultats écrits
+au fil de l'eau dans output_dir
+
+Usage : python -m core.modules.omega [--targets 127.0.0.1] [--ports 1-1024] [--threads 10]
+"""
+
+import argparse
+import ipaddress
+import json
+import socket
+import sys
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODULE_NAME = 'OMEGA'
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_CANCELLED = 'cancelled'
+JOB_TIMEOUT = 'timeout'
+JOB_FAILED = 'failed'
+
+PORT_OPEN = 'open'
+PORT_CLOSED = 'closed'
+PORT_FILTERED = 'filtered'
+PORT_ERROR = 'error'
+
+_FINISHED = (JOB_COMPLETED, JOB_CANCELLED, JOB_TIMEOUT, JOB_FAILED)
+_DEFAULT_SCOPE = ('127.0.0.0/8', '::1/128')
+
+
+def parse_ports(spec) -> List[int]:
+    """'22,80,8000-8010' (ou liste d'entiers) -> ports triés sans doublon (ValueError si invalide)"""
+    if isinstance(spec, int):
+        spec = [spec]
+    parts = spec.split(',') if isinstance(spec, str) else list(spec or [])
+    ports = set()
+    for part in parts:
+        try:
+            if isinstance(part, str) and '-' in part:
+                low, high = (int(value) for value in part.split('-', 1))
+            else:
+                low = high = int(part)
+        except (TypeError, ValueError):
+            raise ValueError(f"Port invalide: {part}")
+        if not 1 <= low <= high <= 65535:
+            raise ValueError(f"Plage de ports invalide: {part}")
+        ports.update(range(low, high + 1))
+    if not ports:
+        raise ValueError("Aucun port à scanner")
+    return sorted(ports)
+
+
+def expand_targets(targets, allowed_networks: Iterable[str], max_hosts: int) -> List[str]:
+    """Adresses, réseaux CIDR ou noms -> adresses IP, toutes dans le périmètre autorisé
+
+    Un nom est résolu une fois ici : la sonde vise l'adresse contrôlée,
+    pas une résolution ultérieure. ValueError hors périmètre ou au-delà
+    de `max_hosts` adresses.
+    """
+    if isinstance(targets, str):
+        targets = [value for value in targets.replace(',', ' ').split() if value]
+    scope = [ipaddress.ip_network(network, strict=False) for network in allowed_networks]
+    hosts = []
+    seen = set()
+    for target in targets or []:
+        target = str(target).strip()
+        try:
+            network = ipaddress.ip_network(target, strict=False)
+        except ValueError:
+            try:
+                network = ipaddress.ip_network(socket.getaddrinfo(target, None)[0][4][0])
+            except (OSError, IndexError, ValueError):
+                raise ValueError(f"Cible invalide: {target}")
+        if not any(network.version == allowed.version and network.subnet_of(allowed) for allowed in scope):
+            raise ValueError(f"Cible hors du périmètre autorisé: {target}")
+        addresses = [network.network_address] if network.num_addresses == 1 else network.hosts()
+        for address in addresses:
+            if str(address) in seen:
+                continue
+            if len(hosts) >= max_hosts:
+                raise ValueError(f"Plus de {max_hosts} adresses à scanner")
+            seen.add(str(address))
+            hosts.append(str(address))
+    if not hosts:
+        raise ValueError("Aucune cible à scanner")
+    return hosts
+
+
+class _Job:
+    """Scan : produit cartésien adresses x ports, distribué sonde par sonde"""
+
+    __slots__ = ('job_id', 'user_id', 'hosts', 'ports', 'total', 'timeout', 'status', 'reason',
+                 'final_status', 'created', 'started', 'finished', 'deadline', 'next_index',
+                 'in_flight', 'done', 'counts', 'path', 'output', 'write_lock')
+
+    def __init__(self, job_id: str, user_id: Optional[int], hosts: List[str], ports: List[int],
+                 timeout: float, path: Path):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.hosts = hosts
+        self.ports = ports
+        self.total = len(hosts) * len(ports)
+        self.timeout = timeout
+        self.status = JOB_QUEUED
+        self.reason = None
+        self.final_status = None         # statut retenu à l'arrêt, appliqué après la dernière sonde
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.deadline = None             # horloge monotone, fixée au démarrage
+        self.next_index = 0
+        self.in_flight = 0
+        self.done = 0
+        self.counts = {PORT_OPEN: 0, PORT_CLOSED: 0, PORT_FILTERED: 0, PORT_ERROR: 0}
+        self.path = path
+        self.output = None
+        self.write_lock = threading.Lock()
+
+    def task(self, index: int) -> Tuple[str, int]:
+        return self.hosts[index // len(self.ports)], self.ports[index % len(self.ports)]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'reason': self.reason,
+            'targets': len(self.hosts),
+            'ports': len(self.ports),
+            'total': self.total,
+            'done': self.done,
+            'progress': round(100.0 * self.done / self.total, 1) if self.total else 100.0,
+            'counts': dict(self.counts),
+            'timeout': self.timeout,
+            'created': _format(self.created),
+            'started': _format(self.started),
+            'finished': _format(self.finished),
+            'output': str(self.path),
+        }
+
+
+def _format(moment: Optional[float]) -> Optional[str]:
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(moment)) if moment else None
+
+
+class OmegaRunner:
+    """Exécuteur des scans du module OMEGA
+
+    `max_threads` tâches de fond se partagent les sondes : les scans
+    passent dans l'ordre d'arrivée, le suivant démarre dès que le
+    précédent a distribué toutes ses sondes. Chaque sonde est une
+    connexion TCP (délai `connect_timeout`, borné par l'échéance du scan)
+    suivie, si le port est ouvert, de la lecture d'une bannière.
+
+    Un scan s'arrête à `timeout` secondes après son démarrage (statut
+    'timeout') ou sur `cancel` : plus aucune sonde n'est distribuée, les
+    sondes en cours se terminent dans leur délai. Chaque port ouvert est
+    écrit dès sa découverte dans `output_dir/<job_id>.ndjson`, suivi
+    d'une ligne de résumé en fin de scan.
+
+    L'avancement est publié toutes les `progress_interval` secondes au
+    plus par `update_module_status(metrics=...)` et `on_update(scan)`.
+    Les cibles doivent appartenir à `allowed_networks` (boucle locale
+    par défaut).
+    """
+
+    def __init__(self, db, output_dir, max_threads: int = 10, scan_timeout: float = 300,
+                 connect_timeout: float = 1.0, banner_timeout: float = 0.5, banner_bytes: int = 256,
+                 allowed_networks: Iterable[str] = _DEFAULT_SCOPE, max_probes: int = 65536,
+                 max_queued: int = 20, history_size: int = 100, progress_interval: float = 2.0,
+                 on_update: Callable[[Dict[str, Any]], None] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.db = db
+        self.output_dir = Path(output_dir)
+        self.max_threads = max(1, max_threads)
+        self.scan_timeout = scan_timeout
+        self.connect_timeout = connect_timeout
+        self.banner_timeout = banner_timeout
+        self.banner_bytes = banner_bytes
+        self.allowed_networks = list(allowed_networks)
+        self.max_probes = max_probes
+        self.max_queued = max(1, max_queued)
+        self.history_size = max(1, history_size)
+        self.progress_interval = progress_interval
+        self.on_update = on_update
+        self._clock = clock
+
+        self._jobs: 'OrderedDict[str, _Job]' = OrderedDict()
+        self._active = deque()               # scans non terminés, ordre d'arrivée
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._changed = set()                # scans dont l'avancement n'est pas encore publié
+        self._running = False
+        self._sleep = time.sleep
+        self._stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'completed': 0,
+            'cancelled': 0,
+            'timed_out': 0,
+            'failed': 0,
+            'probes': 0,
+            'open_ports': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Lance le pool de sondes et la publication de l'avancement (ex: SocketIO)"""
+        if self._running:
+            return
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._running = True
+        self._sleep = sleep
+        for _ in range(self.max_threads):
+            spawn(self._worker)
+        spawn(self._monitor)
+
+    def stop(self):
+        """Arrête le pool ; les scans non terminés sont annulés"""
+        if not self._running:
+            return
+        with self._lock:
+            self._running = False
+            for job in list(self._active):
+                self._stop_job(job, JOB_CANCELLED, "Arrêt du serveur")
+            self._wakeup.notify_all()
+        self.publish()
+
+    def _worker(self):
+        while self._running:
+            try:
+                task = self._next_task()
+                if task is None:
+                    continue
+                job, host, port, timeout = task
+                result = self.probe(host, port, timeout)
+                self._record(job, result)
+            except Exception as e:
+                logger.error(f"Erreur sonde OMEGA: {e}")
+
+    def _monitor(self):
+        while self._running:
+            self._sleep(self.progress_interval)
+            try:
+                self._expire()
+                self.publish()
+            except Exception as e:
+                logger.error(f"Erreur avancement OMEGA: {e}")
+
+    # ------------------------------------------------------------------
+    # Scans
+    # ------------------------------------------------------------------
+
+    def submit(self, targets, ports, timeout: float = None, user_id: int = None) -> Optional[Dict[str, Any]]:
+        """Met un scan en file ; ValueError si invalide, None si la file est pleine"""
+        ports = parse_ports(ports)
+        hosts = expand_targets(targets, self.allowed_networks, max(1, self.max_probes // len(ports)))
+        if len(hosts) * len(ports) > self.max_probes:
+            raise ValueError(f"Plus de {self.max_probes} sondes pour un scan")
+        if timeout is None:
+            timeout = self.scan_timeout
+        if not 0 < timeout <= self.scan_timeout:
+            raise ValueError(f"Délai invalide (0 < délai <= {self.scan_timeout})")
+
+        job_id = uuid.uuid4().hex
+        job = _Job(job_id, user_id, hosts, ports, timeout, self.output_dir / f"{job_id}.ndjson")
+        with self._lock:
+            if len(self._active) >= self.max_queued:
+                self._stats['rejected'] += 1
+                return None
+            self._jobs[job_id] = job
+            self._active.append(job)
+            self._changed.add(job_id)
+            self._stats['submitted'] += 1
+            self._evict()
+            self._wakeup.notify_all()
+            snapshot = job.as_dict()
+
+        self.db.log_security_event(
+            level='INFO',
+            module=MODULE_NAME,
+            event_type='scan_submitted',
+            message=f'Scan {job_id[:8]}: {len(hosts)} adresses, {len(ports)} ports',
+            details={'job_id': job_id, 'targets': hosts[:20], 'ports': len(ports), 'timeout': timeout},
+            user_id=user_id
+        )
+        return snapshot
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Annule un scan en file ou en cours ; None si inconnu"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status not in _FINISHED and job.reason is None:
+                self._stop_job(job, JOB_CANCELLED, "Annulé par l'opérateur")
+            snapshot = job.as_dict()
+        self.publish()
+        return snapshot
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.as_dict() if job else None
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Scans connus, du plus récent au plus ancien"""
+        with self._lock:
+            return [job.as_dict() for job in reversed(self._jobs.values())]
+
+    def _evict(self):
+        # Historique borné : seuls des scans terminés sont oubliés (verrou tenu)
+        while len(self._jobs) > self.history_size:
+            for job_id, job in self._jobs.items():
+                if job.status in _FINISHED:
+                    del self._jobs[job_id]
+                    break
+            else:
+                return
+
+    # ------------------------------------------------------------------
+    # Distribution des sondes
+    # ------------------------------------------------------------------
+
+    def _next_task(self) -> Optional[Tuple[_Job, str, int, float]]:
+        """Prochaine sonde du plus ancien scan actif ; attend brièvement s'il n'y en a pas"""
+        with self._lock:
+            now = self._clock()
+            for job in list(self._active):
+                if job.reason is not None or job.next_index >= job.total:
+                    continue
+                if job.status == JOB_QUEUED:
+                    self._begin(job, now)
+                    if job.status != JOB_RUNNING:
+                        continue
+                remaining = job.deadline - now
+                if remaining <= 0:
+                    self._stop_job(job, JOB_TIMEOUT, f"Délai de {job.timeout}s dépassé")
+                    continue
+                host, port = job.task(job.next_index)
+                job.next_index += 1
+                job.in_flight += 1
+                return job, host, port, min(self.connect_timeout, remaining)
+            self._wakeup.wait(0.5)
+        return None
+
+    def _begin(self, job: _Job, now: float):
+        """Démarrage d'un scan (verrou tenu) : échéance et fichier de résultats"""
+        try:
+            job.output = open(job.path, 'a', encoding='utf-8')
+        except OSError as e:
+            logger.error(f"Erreur fichier de résultats OMEGA {job.path}: {e}")
+            self._stop_job(job, JOB_FAILED, f"Fichier de résultats: {e}")
+            return
+        job.status = JOB_RUNNING
+        job.started = time.time()
+        job.deadline = now + job.timeout
+        self._changed.add(job.job_id)
+
+    def _stop_job(self, job: _Job, status: str, reason: str):
+        """Plus aucune sonde distribuée ; terminé dès la dernière sonde en cours (verrou tenu)"""
+        job.reason = reason
+        job.final_status = status
+        job.next_index = job.total
+        if job.in_flight == 0:
+            self._finish(job)
+
+    def _expire(self):
+        """Scans dont l'échéance est passée alors que le pool est occupé ailleurs"""
+        with self._lock:
+            now = self._clock()
+            for job in list(self._active):
+                if job.status == JOB_RUNNING and job.reason is None and now >= job.deadline:
+                    self._stop_job(job, JOB_TIMEOUT, f"Délai de {job.timeout}s dépassé")
+
+    def probe(self, host: str, port: int, timeout: float) -> Dict[str, Any]:
+        """Connexion TCP et lecture de bannière ; résultat d'une sonde"""
+        started = time.perf_counter()
+        result = {'host': host, 'port': port}
+        try:
+            with socket.create_connection((host, port), timeout=timeout) as connection:
+                result['state'] = PORT_OPEN
+                result['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                if self.banner_timeout and self.banner_bytes:
+                    connection.settimeout(min(self.banner_timeout, timeout))
+                    try:
+                        banner = connection.recv(self.banner_bytes)
+                    except (socket.timeout, OSError):
+                        banner = b''
+                    if banner:
+                        result['banner'] = banner.decode('utf-8', 'replace').strip()
+        except ConnectionRefusedError:
+            result['state'] = PORT_CLOSED
+        except socket.timeout:
+            result['state'] = PORT_FILTERED
+        except OSError as e:
+            result['state'] = PORT_ERROR
+            result['error'] = e.strerror or str(e)
+        return result
+
+    def _record(self, job: _Job, result: Dict[str, Any]):
+        """Compte une sonde ; un port ouvert est écrit immédiatement dans le fichier du scan"""
+        if result['state'] == PORT_OPEN:
+            line = json.dumps(dict(result, timestamp=_format(time.time())), ensure_ascii=False)
+            with job.write_lock:
+                if job.output is not None:
+                    job.output.write(line + '\n')
+                    job.output.flush()
+        with self._lock:
+            job.in_flight -= 1
+            job.done += 1
+            job.counts[result['state']] += 1
+            self._stats['probes'] += 1
+            if result['state'] == PORT_OPEN:
+                self._stats['open_ports'] += 1
+            self._changed.add(job.job_id)
+            if job.in_flight == 0 and job.next_index >= job.total:
+                self._finish(job)
+
+    def _finish(self, job: _Job):
+        """Fin d'un scan (verrou tenu) : résumé en dernière ligne du fichier"""
+        status = job.final_status or JOB_COMPLETED
+        job.status = status
+        job.finished = time.time()
+        if job in self._active:
+            self._active.remove(job)
+        self._changed.add(job.job_id)
+        key = {JOB_COMPLETED: 'completed', JOB_CANCELLED: 'cancelled',
+               JOB_TIMEOUT: 'timed_out', JOB_FAILED: 'failed'}[status]
+        self._stats[key] += 1
+
+        summary = dict(job.as_dict(), type='summary')
+        with job.write_lock:
+            if job.output is not None:
+                try:
+                    job.output.write(json.dumps(summary, ensure_ascii=False) + '\n')
+                    job.output.close()
+                except OSError as e:
+                    logger.error(f"Erreur fichier de résultats OMEGA {job.path}: {e}")
+                job.output = None
+        self._wakeup.notify_all()
+
+    # ------------------------------------------------------------------
+    # Avancement
+    # ------------------------------------------------------------------
+
+    def publish(self) -> int:
+        """Publie l'avancement des scans modifiés ; retourne leur nombre"""
+        with self._lock:
+            changed = [self._jobs[job_id] for job_id in self._changed if job_id in self._jobs]
+            self._changed.clear()
+            snapshots = [(job.as_dict(), job.user_id) for job in changed]
+            running = any(job.status == JOB_RUNNING for job in self._active)
+        if not snapshots:
+            return 0
+
+        for snapshot, user_id in snapshots:
+            if snapshot['status'] in _FINISHED:
+                self.db.log_security_event(
+                    level='INFO' if snapshot['status'] == JOB_COMPLETED else 'WARNING',
+                    module=MODULE_NAME,
+                    event_type=f"scan_{snapshot['status']}",
+                    message=(f"Scan {snapshot['job_id'][:8]} {snapshot['status']}: "
+                             f"{snapshot['counts'][PORT_OPEN]} ports ouverts sur {snapshot['done']} sondes"),
+                    details={'job_id': snapshot['job_id'], 'counts': snapshot['counts'],
+                             'reason': snapshot['reason'], 'output': snapshot['output']},
+                    user_id=user_id
+                )
+            if self.on_update is not None:
+                try:
+                    self.on_update(dict(snapshot, user_id=user_id))
+                except Exception as e:
+                    logger.error(f"Erreur diffusion scan {snapshot['job_id']}: {e}")
+
+        self.db.update_module_status(MODULE_NAME, 'active' if running else 'standby',
+                                     metrics=self._module_metrics())
+        return len(snapshots)
+
+    def _module_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'running': [{'job_id': job.job_id, 'done': job.done, 'total': job.total,
+                             'open': job.counts[PORT_OPEN]}
+                            for job in self._active if job.status == JOB_RUNNING],
+                'queued': sum(1 for job in self._active if job.status == JOB_QUEUED),
+                'completed': self._stats['completed'],
+                'probes': self._stats['probes'],
+                'open_ports': self._stats['open_ports'],
+            }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Compteurs des scans et des sondes ; occupation du pool"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['active'] = len(self._active)
+            stats['in_flight'] = sum(job.in_flight for job in self._active)
+        stats['max_threads'] = self.max_threads
+        stats['allowed_networks'] = list(self.allowed_networks)
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan OMEGA hors serveur (boucle locale par défaut)")
+    parser.add_argument('--targets', default='127.0.0.1')
+    parser.add_argument('--ports', default='1-1024')
+    parser.add_argument('--threads', type=int, default=10)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--output-dir', default='.')
+    args = parser.parse_args()
+
+    class _Console:
+        """Remplace la base : événements et statut affichés"""
+
+        def log_security_event(self, level, module, event_type, message, **kwargs):
+            print(f"[{level}] {event_type}: {message}")
+
+        def update_module_status(self, module_name, status, metrics=None, **kwargs):
+            for job in (metrics or {}).get('running', []):
+                print(f"   {job['done']}/{job['total']} sondes, {job['open']} ports ouverts")
+
+    runner = OmegaRunner(_Console(), args.output_dir, max_threads=args.threads,
+                         scan_timeout=args.timeout, progress_interval=1.0)
+    runner.start(lambda target: threading.Thread(target=target, daemon=True).start(), time.sleep)
+    try:
+        job = runner.submit(args.targets, args.ports, timeout=args.timeout)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+    try:
+        while runner.get_job(job['job_id'])['status'] not in _FINISHED:
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        runner.cancel(job['job_id'])
+    runner.stop()
+    print(f"📄 {job['output']}")
+
+
+if __name__ == "__main__":
+    main()
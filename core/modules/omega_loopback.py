@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+MIFTAH - Banc d'essai OMEGA sur la boucle locale
+Scans réels du pool de sondes face à des écouteurs locaux
+
+Usage : python -m core.modules.omega_loopback [--threads 4] [--timeout 30]
+
+Les cibles sont des écouteurs TCP sur 127.0.0.1 : l'un envoie une
+bannière, les autres gardent la connexion muette (chaque sonde attend
+alors `banner_timeout`). S'y ajoutent un port fermé et un port dont la
+file d'attente est saturée, où la connexion n'aboutit jamais (filtré).
+Le banc vérifie la classification des ports, la borne de sondes
+simultanées, le délai et l'annulation d'un scan (le suivant en file
+démarre ensuite), l'écriture du fichier ndjson au fil de l'eau, les
+métriques publiées par update_module_status et le refus des cibles et
+ports invalides. Code de sortie 1 si une vérification échoue.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Ajouter le répertoire parent au path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from core.database.models import DatabaseManager
+from core.modules.omega import (OmegaRunner, MODULE_NAME, JOB_QUEUED, JOB_RUNNING, JOB_COMPLETED,
+                                JOB_CANCELLED, JOB_TIMEOUT, JOB_FAILED, PORT_OPEN, PORT_CLOSED,
+                                PORT_FILTERED, PORT_ERROR)
+
+BANNER = 'SSH-2.0-MIFTAH-loopback'
+FINISHED = (JOB_COMPLETED, JOB_CANCELLED, JOB_TIMEOUT, JOB_FAILED)
+
+
+class _Listener:
+    """Écouteur TCP local : accepte, envoie la bannière éventuelle, garde la connexion"""
+
+    def __init__(self, banner: bytes = b''):
+        self.banner = banner
+        self._server = socket.socket()
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(64)
+        self.port = self._server.getsockname()[1]
+        self._connections = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            if self.banner:
+                connection.sendall(self.banner)
+            self._connections.append(connection)
+
+    def close(self):
+        self._server.close()
+        for connection in self._connections:
+            connection.close()
+
+
+def _closed_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def _saturated_port() -> tuple:
+    """Port dont la file d'acceptation est pleine : les SYN suivants restent sans réponse"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(0)
+    port = server.getsockname()[1]
+    fillers = []
+    for _ in range(3):
+        filler = socket.socket()
+        filler.setblocking(False)
+        filler.connect_ex(('127.0.0.1', port))
+        fillers.append(filler)
+    time.sleep(0.1)
+    return port, [server] + fillers
+
+
+class _RecordingDatabase(DatabaseManager):
+    """DatabaseManager qui garde les métriques OMEGA publiées"""
+
+    def __init__(self, *args, **kwargs):
+        self.published: List[Dict[str, Any]] = []
+        super().__init__(*args, **kwargs)
+
+    def update_module_status(self, module_name: str, status: str, metrics: Dict = None, **kwargs) -> bool:
+        if module_name == MODULE_NAME and metrics:
+            self.published.append(metrics)
+        return super().update_module_status(module_name, status, metrics=metrics, **kwargs)
+
+
+class _CountingRunner(OmegaRunner):
+    """OmegaRunner qui mesure le nombre de sondes simultanées"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._probe_lock = threading.Lock()
+        self.concurrent = 0
+        self.peak = 0
+
+    def probe(self, host: str, port: int, timeout: float) -> Dict[str, Any]:
+        with self._probe_lock:
+            self.concurrent += 1
+            self.peak = max(self.peak, self.concurrent)
+        try:
+            return super().probe(host, port, timeout)
+        finally:
+            with self._probe_lock:
+                self.concurrent -= 1
+
+
+def _wait(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _read_lines(path: str) -> List[Dict[str, Any]]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def _finished(runner: OmegaRunner, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """Attend la fin d'un scan ; retourne son état final (None si toujours en cours)"""
+    if not _wait(lambda: runner.get_job(job_id)['status'] in FINISHED, timeout):
+        return None
+    return runner.get_job(job_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai OMEGA sur la boucle locale")
+    parser.add_argument('--threads', type=int, default=4, help="taille du pool de sondes")
+    parser.add_argument('--timeout', type=float, default=30, help="attente maximale par vérification")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='miftah-omega-')
+    db = _RecordingDatabase(os.path.join(workdir, 'miftah.db'), 'omega-key')
+    runner = _CountingRunner(db, os.path.join(workdir, 'scans'), max_threads=args.threads,
+                             scan_timeout=60, connect_timeout=0.3, banner_timeout=0.2,
+                             progress_interval=0.1)
+    spawn = lambda fn: threading.Thread(target=fn, daemon=True).start()
+
+    banner = _Listener(f"{BANNER}\r\n".encode())
+    silent = [_Listener() for _ in range(args.threads * 10)]
+    silent_ports = [listener.port for listener in silent]
+    closed = _closed_port()
+    filtered, saturated = _saturated_port()
+    failures = []
+
+    def check(condition: bool, message: str):
+        if not condition:
+            failures.append(message)
+
+    def finished(job_id: str) -> Dict[str, Any]:
+        job = _finished(runner, job_id, args.timeout)
+        check(job is not None, f"scan {job_id[:8]} non terminé après {args.timeout}s")
+        return job or runner.get_job(job_id)
+
+    runner.start(spawn, time.sleep)
+    try:
+        # Cibles et ports refusés avant toute sonde
+        for targets, ports in (('10.0.0.1', '80'), ('192.168.1.0/24', '80'), ('::2', '80'),
+                               ('hote-inexistant.invalid', '80'), ('127.0.0.1', '0'),
+                               ('127.0.0.1', '70000'), ('127.0.0.1', '90-80'), ('127.0.0.1', 'ssh'),
+                               ('127.0.0.1', '')):
+            try:
+                runner.submit(targets, ports)
+                failures.append(f"accepté: {targets} / {ports!r}")
+            except ValueError:
+                pass
+        check(not runner.list_jobs(), "scan créé par une demande refusée")
+        print("Cibles hors périmètre, noms inconnus et ports invalides refusés")
+
+        # Classification, sonde par sonde puis par un scan complet
+        expected = {banner.port: PORT_OPEN, silent_ports[0]: PORT_OPEN,
+                    closed: PORT_CLOSED, filtered: PORT_FILTERED}
+        for port, state in expected.items():
+            result = runner.probe('127.0.0.1', port, 0.3)
+            check(result['state'] == state, f"port {port}: {result['state']} au lieu de {state}")
+        check(runner.probe('127.0.0.1', banner.port, 0.3).get('banner') == BANNER, "bannière non lue")
+
+        job = runner.submit('127.0.0.1', list(expected))
+        job = finished(job['job_id'])
+        check(job['status'] == JOB_COMPLETED, f"classification: scan {job['status']}")
+        check(job['counts'] == {PORT_OPEN: 2, PORT_CLOSED: 1, PORT_FILTERED: 1, PORT_ERROR: 0},
+              f"classification: {job['counts']}")
+        lines = _read_lines(job['output'])
+        found = {line['port']: line for line in lines if line.get('type') != 'summary'}
+        check(set(found) == {banner.port, silent_ports[0]}, f"ports ouverts écrits: {sorted(found)}")
+        check(found.get(banner.port, {}).get('banner') == BANNER, "bannière absente du fichier")
+        check(bool(lines) and lines[-1].get('type') == 'summary' and lines[-1]['status'] == JOB_COMPLETED,
+              "résumé absent en dernière ligne")
+        print(f"Classification: {job['counts']}")
+
+        # Pool saturé : jamais plus de max_threads sondes, fichier écrit pendant le scan
+        runner.peak = 0
+        job = runner.submit('127.0.0.1', silent_ports)
+        _wait(lambda: runner.get_job(job['job_id'])['done'] >= args.threads, args.timeout)
+        written = [line for line in _read_lines(job['output']) if line.get('type') != 'summary']
+        running = runner.get_job(job['job_id'])['status'] == JOB_RUNNING
+        check(running and written, f"fichier pendant le scan: {len(written)} lignes (en cours: {running})")
+        job = finished(job['job_id'])
+        check(job['status'] == JOB_COMPLETED and job['counts'][PORT_OPEN] == len(silent_ports),
+              f"scan du pool: {job['status']} {job['counts']}")
+        check(runner.peak == args.threads, f"sondes simultanées: {runner.peak} (max_threads {args.threads})")
+        check(len(_read_lines(job['output'])) == len(silent_ports) + 1, "lignes du fichier de scan")
+        print(f"Pool: {runner.peak}/{args.threads} sondes simultanées au plus, "
+              f"{len(written)} ports écrits avant la fin du scan")
+
+        # Avancement publié par update_module_status pendant le scan
+        progress = [entry for scan_metrics in db.published for entry in scan_metrics['running']
+                    if entry['job_id'] == job['job_id']]
+        check(any(0 < entry['done'] < entry['total'] for entry in progress),
+              f"avancement non publié: {progress}")
+        check(any(0 < entry['open'] for entry in progress), "ports ouverts absents des métriques")
+        print(f"Avancement: {len(progress)} publications en cours de scan")
+
+        # Délai du scan dépassé
+        job = runner.submit('127.0.0.1', silent_ports, timeout=0.5)
+        job = finished(job['job_id'])
+        check(job['status'] == JOB_TIMEOUT and job['done'] < job['total'],
+              f"délai: {job['status']} {job['done']}/{job['total']}")
+        lines = _read_lines(job['output'])
+        check(bool(lines) and lines[-1].get('status') == JOB_TIMEOUT, "délai: résumé absent")
+        print(f"Délai: arrêt après {job['done']}/{job['total']} sondes")
+
+        # Annulation d'un scan en cours ; le scan suivant en file démarre
+        first = runner.submit('127.0.0.1', silent_ports)
+        second = runner.submit('127.0.0.1', [banner.port])
+        _wait(lambda: runner.get_job(first['job_id'])['done'] > 0, args.timeout)
+        check(runner.get_job(second['job_id'])['status'] == JOB_QUEUED, "second scan démarré trop tôt")
+        runner.cancel(first['job_id'])
+        first = finished(first['job_id'])
+        check(first['status'] == JOB_CANCELLED and first['done'] < first['total'],
+              f"annulation: {first['status']} {first['done']}/{first['total']}")
+        second = finished(second['job_id'])
+        check(second['status'] == JOB_COMPLETED and second['counts'][PORT_OPEN] == 1,
+              f"scan suivant: {second['status']} {second['counts']}")
+        print(f"Annulation: arrêt après {first['done']}/{first['total']} sondes, scan suivant {second['status']}")
+
+        # Dernières métriques enregistrées dans module_status
+        runner.publish()
+        stats = runner.get_stats()
+        metrics = (db.get_module_status(MODULE_NAME) or [{}])[0].get('metrics') or {}
+        check(metrics.get('probes') == stats['probes'] and metrics.get('completed') == stats['completed'],
+              f"module_status: {metrics} / {stats}")
+    finally:
+        runner.stop()
+        banner.close()
+        for listener in silent:
+            listener.close()
+        for sock in saturated:
+            sock.close()
+        db.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print(f"ÉCHEC: {len(failures)} anomalies")
+        for failure in failures[:20]:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("OK: scans OMEGA conformes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+"""
+MIFTAH - PROLITAGE : corrélation des événements de sécurité
+Règles évaluées au fil du flux (LogBus) sur des fenêtres glissantes en
+mémoire bornée ; alertes journalisées et poussées aux clients
+"""
+
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Any, List, Optional
+
+from core.modules.sketches import SlidingCounter, SlidingDistinct
+
+logger = logging.getLogger(__name__)
+
+MODULE_NAME = 'PROLITAGE'
+ALERT_PREFIX = 'alert_'
+
+# Événements synthétiques (hors security_logs) injectés par l'application
+EVENT_AGENT_OFFLINE = 'agent_offline'
+EVENT_RESOURCE_HIGH = 'resource_high'
+
+_SEVERITIES = ('INFO', 'WARNING', 'ERROR', 'CRITICAL')
+_GLOBAL_KEY = '*'
+
+
+class _Rule:
+    """Règle compilée : filtre d'événements, clé de regroupement, seuil sur fenêtre
+
+    Sans `distinct`, la règle compte les événements par clé ; avec, elle
+    estime le nombre de valeurs distinctes de ce champ par clé. Sans
+    `key`, un seul état global. Les clés suivies sont bornées à `max_keys`
+    (éviction de la moins récemment vue).
+    """
+
+    __slots__ = ('name', 'events', 'levels', 'modules', 'key', 'distinct', 'threshold',
+                 'window', 'severity', 'message', 'slots', 'precision', 'max_keys', 'states',
+                 'evictions', 'fired')
+
+    def __init__(self, name: str, spec: Dict[str, Any], slots: int, precision: int, max_keys: int):
+        self.name = name
+        self.events = _normalize(spec.get('events'))
+        self.levels = _normalize(spec.get('levels'), upper=True)
+        self.modules = _normalize(spec.get('modules'), upper=True)
+        self.key = spec.get('key')
+        self.distinct = spec.get('distinct')
+        self.threshold = spec.get('threshold')
+        self.window = spec.get('window')
+        self.severity = str(spec.get('severity', 'WARNING')).upper()
+        self.message = spec.get('message') or f"Règle {name}: {{value}} sur {{key}} en {{minutes}} min"
+        if not isinstance(self.threshold, int) or self.threshold < 1:
+            raise ValueError(f"Règle {name}: seuil invalide ({self.threshold})")
+        if not isinstance(self.window, (int, float)) or self.window <= 0:
+            raise ValueError(f"Règle {name}: fenêtre invalide ({self.window})")
+        if self.severity not in _SEVERITIES:
+            raise ValueError(f"Règle {name}: sévérité inconnue ({self.severity})")
+        if self.events is None and self.levels is None and self.modules is None:
+            raise ValueError(f"Règle {name}: aucun filtre d'événements")
+        self.slots = slots
+        self.precision = precision
+        self.max_keys = max_keys
+        self.states: 'OrderedDict[str, list]' = OrderedDict()   # clé -> [fenêtre, dernière alerte]
+        self.evictions = 0
+        self.fired = 0
+
+    def matches(self, entry: Dict[str, Any]) -> bool:
+        if self.levels is not None and str(entry.get('level', '')).upper() not in self.levels:
+            return False
+        if self.modules is not None and str(entry.get('module', '')).upper() not in self.modules:
+            return False
+        return True
+
+    def update(self, entry: Dict[str, Any], now: float) -> Optional[tuple]:
+        """Ajoute l'événement à l'état de sa clé ; (clé, valeur, état) si le seuil est atteint"""
+        if self.key is None:
+            key = _GLOBAL_KEY
+        else:
+            key = entry.get(self.key)
+            if key is None:
+                return None
+            key = str(key)
+        if self.distinct is not None:
+            item = entry.get(self.distinct)
+            if item is None:
+                return None
+
+        state = self.states.get(key)
+        if state is None:
+            window = (SlidingDistinct(self.window, self.slots, self.precision) if self.distinct
+                      else SlidingCounter(self.window, self.slots))
+            state = self.states[key] = [window, None]
+            while len(self.states) > self.max_keys:
+                self.states.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.states.move_to_end(key)
+
+        value = state[0].add(item, now) if self.distinct is not None else state[0].add(now)
+        if value < self.threshold:
+            return None
+        return key, value, state
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'events': sorted(self.events) if self.events else None,
+            'levels': sorted(self.levels) if self.levels else None,
+            'modules': sorted(self.modules) if self.modules else None,
+            'key': self.key,
+            'distinct': self.distinct,
+            'threshold': self.threshold,
+            'window': self.window,
+            'severity': self.severity,
+            'tracked_keys': len(self.states),
+            'evictions': self.evictions,
+            'fired': self.fired,
+        }
+
+
+def _normalize(values, upper: bool = False) -> Optional[frozenset]:
+    """Liste (ou valeur seule) de filtre -> ensemble ; None = pas de filtre"""
+    if not values:
+        return None
+    if isinstance(values, str):
+        values = [values]
+    return frozenset(str(value).upper() if upper else str(value) for value in values)
+
+
+class CorrelationEngine:
+    """Moteur de règles du module PROLITAGE
+
+    `observe` est appelé pour chaque événement publié sur le LogBus (et
+    pour les événements synthétiques : agent hors ligne, ressource au-delà
+    de sa limite). Les règles sont indexées par type d'événement : un
+    événement ne touche que les règles qui le concernent, chacune en coût
+    constant (une tranche de compteur ou un registre HyperLogLog), sans
+    relire l'historique en base.
+
+    Une règle déclenchée n'alerte qu'une fois par clé et par `cooldown`.
+    Les alertes sont mises en file sur le chemin d'écriture et traitées
+    par la tâche de fond : log de sécurité (module PROLITAGE, type
+    alert_<règle>) et `on_alert(alerte)` pour la diffusion aux clients.
+    Les événements du module PROLITAGE lui-même sont ignorés.
+
+    En multi-processus, le LogBus de chaque worker reçoit aussi les
+    événements des autres : seul le moteur démarré (worker élu) évalue.
+    """
+
+    def __init__(self, db, bus, rules: Dict[str, Dict[str, Any]], window_slots: int = 6,
+                 hll_precision: int = 6, max_keys: int = 10000, cooldown: float = 300,
+                 max_pending: int = 1000, history_size: int = 100, tick: float = 1.0,
+                 metrics: Callable[[], Optional[Dict[str, Any]]] = None,
+                 resource_limits: Dict[str, float] = None,
+                 on_alert: Callable[[Dict[str, Any]], None] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.db = db
+        self.cooldown = cooldown
+        self.tick = tick
+        self.metrics = metrics
+        self.resource_limits = dict(resource_limits or {})
+        self.on_alert = on_alert
+        self._clock = clock
+
+        self._rules: List[_Rule] = [_Rule(name, spec, max(1, window_slots), hll_precision, max(1, max_keys))
+                                    for name, spec in rules.items()]
+        self._by_event: Dict[str, List[_Rule]] = {}
+        self._any_event: List[_Rule] = []
+        for rule in self._rules:
+            if rule.events is None:
+                self._any_event.append(rule)
+            else:
+                for event_type in rule.events:
+                    self._by_event.setdefault(event_type, []).append(rule)
+
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self.max_pending = max(1, max_pending)
+        self._recent = deque(maxlen=max(1, history_size))
+        self._last_sample = None
+        self._running = False
+        self._sleep = time.sleep
+        self._stats = {
+            'observed': 0,
+            'evaluated': 0,
+            'alerts': 0,
+            'suppressed': 0,
+            'dropped': 0,
+            'errors': 0,
+        }
+        bus.subscribe(self.observe)
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Lance le traitement des alertes via les primitives du serveur (ex: SocketIO)"""
+        if self._running:
+            return
+        self._running = True
+        self._sleep = sleep
+        # /api/modules est public : noms des règles seulement, ni seuils ni délais
+        self.db.update_module_status(MODULE_NAME, 'active', config={
+            'rules': sorted(rule.name for rule in self._rules),
+        })
+        spawn(self._run)
+        logger.info(f"PROLITAGE: {len(self._rules)} règles de corrélation actives")
+
+    def stop(self):
+        """Arrête l'évaluation et journalise les alertes en attente"""
+        if not self._running:
+            return
+        self._running = False
+        self.drain()
+        self.db.update_module_status(MODULE_NAME, 'standby', metrics=self._module_metrics())
+
+    def _run(self):
+        while self._running:
+            self._sleep(self.tick)
+            try:
+                self.check_resources()
+                self.drain()
+            except Exception as e:
+                with self._lock:
+                    self._stats['errors'] += 1
+                logger.error(f"Erreur moteur PROLITAGE: {e}")
+
+    # ------------------------------------------------------------------
+    # Évaluation
+    # ------------------------------------------------------------------
+
+    def observe(self, entry: Dict[str, Any]) -> int:
+        """Évalue un événement ; retourne le nombre d'alertes déclenchées (mémoire seule)"""
+        if not self._running or entry.get('module') == MODULE_NAME:
+            return 0
+        rules = self._by_event.get(entry.get('event_type'), ())
+        if self._any_event:
+            rules = list(rules) + self._any_event
+        if not rules:
+            with self._lock:
+                self._stats['observed'] += 1
+            return 0
+
+        fired = 0
+        now = self._clock()
+        with self._lock:
+            self._stats['observed'] += 1
+            for rule in rules:
+                if not rule.matches(entry):
+                    continue
+                self._stats['evaluated'] += 1
+                hit = rule.update(entry, now)
+                if hit is None:
+                    continue
+                key, value, state = hit
+                if state[1] is not None and now - state[1] < self.cooldown:
+                    self._stats['suppressed'] += 1
+                    continue
+                state[1] = now
+                rule.fired += 1
+                fired += 1
+                self._queue(self._alert(rule, key, value, entry))
+        return fired
+
+    def observe_agent(self, agent_id: str, status: str, offline_status: str = 'offline'):
+        """Transition du registre d'agents ; seul le passage hors ligne est un événement"""
+        if status == offline_status:
+            self.observe({'level': 'INFO', 'module': 'AGENT', 'event_type': EVENT_AGENT_OFFLINE,
+                          'agent_id': agent_id})
+
+    def check_resources(self) -> int:
+        """Dernier échantillon de l'hôte : un événement par ressource au-delà de sa limite"""
+        if self.metrics is None or not self.resource_limits:
+            return 0
+        sample = self.metrics()
+        if not sample or sample.get('timestamp') == self._last_sample:
+            return 0
+        self._last_sample = sample.get('timestamp')
+        over = 0
+        for resource, limit in self.resource_limits.items():
+            value = sample.get(resource)
+            if value is not None and value >= limit:
+                over += 1
+                self.observe({'level': 'INFO', 'module': 'SYSTEM', 'event_type': EVENT_RESOURCE_HIGH,
+                              'resource': resource, 'value': value, 'limit': limit})
+        return over
+
+    def _alert(self, rule: _Rule, key: str, value: int, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()),
+            'rule': rule.name,
+            'severity': rule.severity,
+            'key': None if key == _GLOBAL_KEY else key,
+            'value': value,
+            'threshold': rule.threshold,
+            'window': rule.window,
+            'approximate': rule.distinct is not None,
+            'message': rule.message.format(key=key, value=value, threshold=rule.threshold,
+                                           minutes=round(rule.window / 60)),
+            'trigger': {field: entry.get(field) for field in
+                        ('event_type', 'module', 'agent_id', 'ip_address', 'user_id') if entry.get(field)},
+        }
+
+    def _queue(self, alert: Dict[str, Any]):
+        """File bornée (verrou tenu) : au-delà, l'alerte la plus ancienne est perdue"""
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            self._stats['dropped'] += 1
+        self._pending.append(alert)
+
+    # ------------------------------------------------------------------
+    # Alertes
+    # ------------------------------------------------------------------
+
+    def drain(self) -> int:
+        """Journalise et diffuse les alertes en attente ; retourne leur nombre"""
+        with self._lock:
+            alerts = list(self._pending)
+            self._pending.clear()
+        for alert in alerts:
+            self.db.log_security_event(
+                level=alert['severity'],
+                module=MODULE_NAME,
+                event_type=ALERT_PREFIX + alert['rule'],
+                message=alert['message'],
+                details={field: alert[field] for field in
+                         ('key', 'value', 'threshold', 'window', 'approximate', 'trigger')},
+                agent_id=alert['trigger'].get('agent_id'),
+                ip_address=alert['trigger'].get('ip_address'),
+                user_id=alert['trigger'].get('user_id')
+            )
+            if self.on_alert is not None:
+                try:
+                    self.on_alert(alert)
+                except Exception as e:
+                    logger.error(f"Erreur diffusion alerte {alert['rule']}: {e}")
+        if alerts:
+            with self._lock:
+                self._stats['alerts'] += len(alerts)
+                self._recent.extend(alerts)
+            logger.warning(f"PROLITAGE: {len(alerts)} alertes ({', '.join(a['rule'] for a in alerts[:5])})")
+            self.db.update_module_status(MODULE_NAME, 'active', metrics=self._module_metrics())
+        return len(alerts)
+
+    def recent(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Dernières alertes traitées, de la plus récente à la plus ancienne"""
+        with self._lock:
+            alerts = list(reversed(self._recent))
+        return alerts[:limit] if limit else alerts
+
+    def _module_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'alerts': self._stats['alerts'], 'observed': self._stats['observed'],
+                    'fired': {rule.name: rule.fired for rule in self._rules if rule.fired}}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Compteurs d'évaluation et d'alertes ; état de chaque règle"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+            stats['rules'] = {rule.name: rule.describe() for rule in self._rules}
+        stats['running'] = self._running
+        stats['cooldown'] = self.cooldown
+        return stats
@@ -0,0 +1,189 @@
+"""
+MIFTAH - Collecte des métriques système
+Échantillonnage périodique de /proc dans un tampon circulaire
+"""
+
+import os
+import math
+import time
+import threading
+import logging
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROC_STAT = '/proc/stat'
+PROC_MEMINFO = '/proc/meminfo'
+PROC_NET_DEV = '/proc/net/dev'
+
+_PERCENTILES = (50, 95, 99)
+_SERIES = ('cpu', 'memory', 'network', 'storage')
+
+
+def read_cpu_times(path: str = PROC_STAT) -> Tuple[int, int]:
+    """Retourne (temps total, temps inactif) cumulés en jiffies"""
+    with open(path, 'rb') as f:
+        fields = f.readline().split()[1:]
+    values = [int(v) for v in fields[:8]]
+    idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+    return sum(values), idle
+
+
+def read_memory_percent(path: str = PROC_MEMINFO) -> float:
+    """Pourcentage de mémoire utilisée (hors cache récupérable)"""
+    total = available = None
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.startswith(b'MemTotal:'):
+                total = int(line.split()[1])
+            elif line.startswith(b'MemAvailable:'):
+                available = int(line.split()[1])
+            if total is not None and available is not None:
+                break
+    if not total or available is None:
+        return 0.0
+    return 100.0 * (total - available) / total
+
+
+def read_network_bytes(path: str = PROC_NET_DEV) -> Tuple[int, int]:
+    """Octets reçus/émis cumulés sur toutes les interfaces hors loopback"""
+    rx = tx = 0
+    with open(path, 'rb') as f:
+        for line in f.readlines()[2:]:
+            name, _, data = line.partition(b':')
+            if name.strip() == b'lo':
+                continue
+            fields = data.split()
+            rx += int(fields[0])
+            tx += int(fields[8])
+    return rx, tx
+
+
+def read_storage_percent(path: str) -> float:
+    """Pourcentage d'occupation du système de fichiers contenant `path`"""
+    st = os.statvfs(path)
+    total = st.f_blocks * st.f_frsize
+    if not total:
+        return 0.0
+    return 100.0 * (total - st.f_bavail * st.f_frsize) / total
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentile au rang le plus proche sur une liste triée"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100.0 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+class HostMetricsCollector:
+    """Échantillonneur des ressources de l'hôte
+
+    Un seul échantillon est lu à intervalle fixe ; les lecteurs (statut
+    système, API, historique) consultent le tampon sans accès à /proc.
+    """
+
+    def __init__(self, interval: float = 2.0, history_size: int = 900,
+                 network_capacity: float = 125_000_000, storage_path: str = '/'):
+        self.interval = interval
+        self.network_capacity = network_capacity
+        self.storage_path = storage_path
+
+        self._samples = deque(maxlen=max(2, history_size))
+        self._summary: Dict[str, Any] = {}
+        self._previous: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._running = False
+        self.available = os.path.exists(PROC_STAT)
+
+    def _read_counters(self) -> Dict[str, Any]:
+        """Lit les compteurs bruts cumulés"""
+        cpu_total, cpu_idle = read_cpu_times()
+        rx, tx = read_network_bytes()
+        return {
+            'time': time.monotonic(),
+            'cpu_total': cpu_total,
+            'cpu_idle': cpu_idle,
+            'rx': rx,
+            'tx': tx,
+        }
+
+    def sample(self) -> Optional[Dict[str, Any]]:
+        """Prend un échantillon et calcule les taux depuis le précédent"""
+        counters = self._read_counters()
+        previous, self._previous = self._previous, counters
+        if previous is None:
+            return None
+
+        elapsed = counters['time'] - previous['time'] or 1e-9
+        cpu_delta = counters['cpu_total'] - previous['cpu_total']
+        idle_delta = counters['cpu_idle'] - previous['cpu_idle']
+        rx_rate = max(0, counters['rx'] - previous['rx']) / elapsed
+        tx_rate = max(0, counters['tx'] - previous['tx']) / elapsed
+
+        sample = {
+            'timestamp': time.time(),
+            'cpu': round(100.0 * (cpu_delta - idle_delta) / cpu_delta, 1) if cpu_delta > 0 else 0.0,
+            'memory': round(read_memory_percent(), 1),
+            'network': round(min(100.0, 100.0 * (rx_rate + tx_rate) / self.network_capacity), 1),
+            'storage': round(read_storage_percent(self.storage_path), 1),
+            'rx_rate': round(rx_rate),
+            'tx_rate': round(tx_rate),
+            'rx_total': counters['rx'],
+            'tx_total': counters['tx'],
+        }
+
+        with self._lock:
+            self._samples.append(sample)
+            samples = list(self._samples)
+
+        # Percentiles recalculés une fois par échantillon, pas par requête
+        summary = {'samples': len(samples), 'window': len(samples) * self.interval}
+        for series in _SERIES:
+            values = sorted(s[series] for s in samples)
+            summary[series] = {f'p{p}': percentile(values, p) for p in _PERCENTILES}
+            summary[series]['max'] = values[-1]
+        with self._lock:
+            self._summary = summary
+        return sample
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Dernier échantillon (None avant le deuxième relevé)"""
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def history(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Échantillons récents, du plus ancien au plus récent"""
+        with self._lock:
+            samples = list(self._samples)
+        if limit:
+            samples = samples[-limit:]
+        return samples
+
+    def summary(self) -> Dict[str, Any]:
+        """Percentiles sur la fenêtre du tampon"""
+        with self._lock:
+            return dict(self._summary)
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Lance l'échantillonnage via les primitives du serveur (ex: SocketIO)"""
+        if self._running:
+            return
+        if not self.available:
+            logger.warning("Métriques système indisponibles (/proc absent)")
+            return
+        self._running = True
+        spawn(self._run, sleep)
+
+    def stop(self):
+        self._running = False
+
+    def _run(self, sleep: Callable):
+        """Boucle d'échantillonnage"""
+        while self._running:
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Erreur collecte métriques système: {e}")
+            sleep(self.interval)
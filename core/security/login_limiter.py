@@ -0,0 +1,321 @@
+"""
+MIFTAH - Limitation des tentatives de connexion
+Refus en mémoire avant tout hachage ou accès base ; verrouillages et
+journaux d'échecs écrits par lots
+"""
+
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REASON_IP = 'ip_rate'
+REASON_LOCKED = 'account_locked'
+
+# Noms d'utilisateur détaillés par adresse IP dans un résumé
+_SUMMARY_TOP_USERS = 20
+
+
+class _Bucket:
+    """Seau à jetons d'une adresse IP"""
+
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class _Account:
+    """Échecs récents d'un nom d'utilisateur (fenêtre glissante)"""
+
+    __slots__ = ('failures', 'locked_until')
+
+    def __init__(self, max_attempts: int):
+        self.failures = deque(maxlen=max_attempts)   # horloge monotone
+        self.locked_until = 0.0
+
+
+class _Summary:
+    """Échecs agrégés d'une adresse IP sur un intervalle de résumé"""
+
+    __slots__ = ('failures', 'rejected', 'usernames', 'locked')
+
+    def __init__(self):
+        self.failures = 0
+        self.rejected = 0
+        self.usernames: Dict[str, int] = {}
+        self.locked: List[str] = []
+
+
+class LoginLimiter:
+    """Limiteur de tentatives par adresse IP et par nom d'utilisateur
+
+    Chaque tentative consomme un jeton du seau de son IP (`ip_rate` par
+    seconde, `ip_burst` au plus) : une rafale de mots de passe depuis une
+    même source est refusée sans calcul Argon2. Par nom d'utilisateur,
+    `max_attempts` échecs dans une fenêtre de `lockout_duration` secondes
+    verrouillent le compte pour `lockout_duration`. Les deux tables sont
+    bornées à `max_entries` (éviction LRU).
+
+    Le verrouillage est écrit dans `users` toutes les `sync_interval`
+    secondes et les échecs sont journalisés en un résumé par IP toutes les
+    `summary_interval` secondes, au lieu d'une écriture par tentative.
+    """
+
+    def __init__(self, db, max_attempts: int = 3, lockout_duration: float = 900,
+                 ip_rate: float = 0.2, ip_burst: int = 10, max_entries: int = 100000,
+                 sync_interval: float = 5, summary_interval: float = 60,
+                 clock: Callable[[], float] = time.monotonic, wall_clock: Callable[[], float] = time.time):
+        self.db = db
+        self.max_attempts = max(1, max_attempts)
+        self.lockout_duration = lockout_duration
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.max_entries = max_entries
+        self.sync_interval = sync_interval
+        self.summary_interval = summary_interval
+        self._clock = clock
+        self._wall_clock = wall_clock
+
+        self._lock = threading.Lock()
+        self._buckets: 'OrderedDict[str, _Bucket]' = OrderedDict()
+        self._accounts: 'OrderedDict[str, _Account]' = OrderedDict()
+        self._pending_sync: Dict[str, Tuple[int, Optional[str]]] = {}
+        self._summaries: Dict[str, _Summary] = {}
+        self._summary_overflow = 0
+        self._running = False
+        self._sleep = time.sleep
+        self._stats = {
+            'allowed': 0,
+            'rejected_ip': 0,
+            'rejected_locked': 0,
+            'failures': 0,
+            'lockouts': 0,
+            'evictions': 0,
+            'synced': 0,
+            'summaries': 0,
+            'sync_errors': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Reprend les comptes encore verrouillés en base (redémarrage)"""
+        now = self._clock()
+        wall = self._wall_clock()
+        loaded = 0
+        with self._lock:
+            for row in self.db.get_locked_users():
+                if not row['locked_until']:
+                    continue
+                try:
+                    remaining = datetime.fromisoformat(row['locked_until']).timestamp() - wall
+                except ValueError:
+                    continue
+                if remaining > 0:
+                    account = self._account(row['username'])
+                    account.locked_until = now + remaining
+                    loaded += 1
+        if loaded:
+            logger.info(f"Limiteur de connexion: {loaded} comptes verrouillés repris")
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Lance l'écriture différée via les primitives du serveur (ex: SocketIO)"""
+        if self._running:
+            return
+        self._running = True
+        self._sleep = sleep
+        spawn(self._run)
+
+    def stop(self):
+        """Arrête la tâche et écrit verrouillages et résumés en attente"""
+        self._running = False
+        self.sync()
+        self.summarize()
+
+    def _run(self):
+        last_summary = self._clock()
+        while self._running:
+            self._sleep(self.sync_interval)
+            try:
+                self.sync()
+                if self._clock() - last_summary >= self.summary_interval:
+                    last_summary = self._clock()
+                    self.summarize()
+            except Exception as e:
+                logger.error(f"Erreur limiteur de connexion: {e}")
+
+    # ------------------------------------------------------------------
+    # Décisions
+    # ------------------------------------------------------------------
+
+    def check(self, ip: str, username: str) -> Tuple[bool, Optional[str], float]:
+        """(autorisé, motif du refus, secondes avant nouvel essai), sans accès base"""
+        now = self._clock()
+        with self._lock:
+            account = self._accounts.get(username)
+            if account is not None:
+                self._accounts.move_to_end(username)
+                if account.locked_until > now:
+                    self._stats['rejected_locked'] += 1
+                    self._summary(ip).rejected += 1
+                    return False, REASON_LOCKED, account.locked_until - now
+
+            bucket = self._buckets.get(ip)
+            if bucket is None:
+                bucket = self._buckets[ip] = _Bucket(self.ip_burst, now)
+                self._evict(self._buckets)
+            else:
+                self._buckets.move_to_end(ip)
+                bucket.tokens = min(self.ip_burst, bucket.tokens + (now - bucket.updated) * self.ip_rate)
+                bucket.updated = now
+            if bucket.tokens < 1:
+                self._stats['rejected_ip'] += 1
+                self._summary(ip).rejected += 1
+                return False, REASON_IP, (1 - bucket.tokens) / self.ip_rate if self.ip_rate else self.lockout_duration
+
+            bucket.tokens -= 1
+            self._stats['allowed'] += 1
+            return True, None, 0.0
+
+    def record_failure(self, ip: str, username: str) -> bool:
+        """Compte un échec ; True si le compte vient d'être verrouillé"""
+        now = self._clock()
+        with self._lock:
+            self._stats['failures'] += 1
+            summary = self._summary(ip)
+            summary.failures += 1
+            if username in summary.usernames or len(summary.usernames) < _SUMMARY_TOP_USERS:
+                summary.usernames[username] = summary.usernames.get(username, 0) + 1
+
+            account = self._account(username)
+            # Fenêtre glissante : seuls les échecs des `lockout_duration` dernières secondes comptent
+            while account.failures and now - account.failures[0] >= self.lockout_duration:
+                account.failures.popleft()
+            account.failures.append(now)
+
+            locked = len(account.failures) >= self.max_attempts
+            if locked:
+                account.locked_until = now + self.lockout_duration
+                account.failures.clear()
+                self._stats['lockouts'] += 1
+                summary.locked.append(username)
+                until = datetime.fromtimestamp(self._wall_clock() + self.lockout_duration).isoformat()
+                self._pending_sync[username] = (self.max_attempts, until)
+            return locked
+
+    def record_success(self, ip: str, username: str):
+        """Connexion réussie : l'historique d'échecs du compte est effacé
+
+        authenticate_user remet déjà failed_attempts à zéro en base.
+        """
+        with self._lock:
+            self._accounts.pop(username, None)
+            self._pending_sync.pop(username, None)
+
+    def _account(self, username: str) -> _Account:
+        """Entrée d'un compte, créée si besoin (verrou tenu)"""
+        account = self._accounts.get(username)
+        if account is None:
+            account = self._accounts[username] = _Account(self.max_attempts)
+            self._evict(self._accounts)
+        else:
+            self._accounts.move_to_end(username)
+        return account
+
+    def _evict(self, table: OrderedDict):
+        # Un verrouillage évincé reste en base (écriture différée déjà en attente)
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _summary(self, ip: str) -> _Summary:
+        """Agrégat de l'intervalle courant pour une IP (verrou tenu)"""
+        summary = self._summaries.get(ip)
+        if summary is None:
+            if len(self._summaries) >= self.max_entries:
+                # Table pleine : compté sans détail
+                self._summary_overflow += 1
+                return _Summary()
+            summary = self._summaries[ip] = _Summary()
+        return summary
+
+    # ------------------------------------------------------------------
+    # Écritures différées
+    # ------------------------------------------------------------------
+
+    def sync(self) -> int:
+        """Écrit les verrouillages en attente dans `users` en une transaction"""
+        with self._lock:
+            pending = self._pending_sync
+            self._pending_sync = {}
+        if not pending:
+            return 0
+        rows = [(failed, until, username) for username, (failed, until) in pending.items()]
+        if not self.db.sync_login_lockouts(rows):
+            with self._lock:
+                for username, state in pending.items():
+                    self._pending_sync.setdefault(username, state)
+                self._stats['sync_errors'] += 1
+            return 0
+        with self._lock:
+            self._stats['synced'] += len(rows)
+        return len(rows)
+
+    def summarize(self) -> int:
+        """Journalise un résumé des échecs par IP depuis le dernier résumé"""
+        with self._lock:
+            summaries = self._summaries
+            overflow = self._summary_overflow
+            self._summaries = {}
+            self._summary_overflow = 0
+
+        for ip, summary in summaries.items():
+            level = 'WARNING' if summary.locked or summary.rejected else 'INFO'
+            self.db.log_security_event(
+                level=level,
+                module='AUTH',
+                event_type='login_failed_summary',
+                message=(f'{summary.failures} tentatives échouées, {summary.rejected} refusées '
+                         f'({len(summary.usernames)} comptes)'),
+                details={'failures': summary.failures, 'rejected': summary.rejected,
+                         'usernames': summary.usernames, 'locked': summary.locked,
+                         'interval': self.summary_interval},
+                ip_address=ip
+            )
+        if overflow:
+            self.db.log_security_event(
+                level='WARNING',
+                module='AUTH',
+                event_type='login_failed_summary',
+                message=f'{overflow} tentatives depuis des adresses non détaillées (table pleine)',
+                details={'attempts': overflow, 'interval': self.summary_interval}
+            )
+        with self._lock:
+            self._stats['summaries'] += len(summaries) + (1 if overflow else 0)
+        return len(summaries)
+
+    # ------------------------------------------------------------------
+    # Consultation
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Compteurs de décisions, taille des tables et écritures en attente"""
+        now = self._clock()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tracked_ips'] = len(self._buckets)
+            stats['tracked_accounts'] = len(self._accounts)
+            stats['locked_accounts'] = sum(1 for account in self._accounts.values() if account.locked_until > now)
+            stats['pending_sync'] = len(self._pending_sync)
+            stats['pending_summaries'] = len(self._summaries)
+        stats['max_attempts'] = self.max_attempts
+        stats['lockout_duration'] = self.lockout_duration
+        return stats
@@ -0,0 +1,124 @@
+"""
+MIFTAH - Hachage des mots de passe hors de la boucle d'événements
+Argon2 exécuté dans des threads natifs pour ne pas geler le hub eventlet
+"""
+
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any
+
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+
+logger = logging.getLogger(__name__)
+
+
+def _eventlet_patched() -> bool:
+    """Indique si eventlet a rendu le module threading coopératif"""
+    try:
+        from eventlet import patcher
+        return patcher.is_monkey_patched('thread')
+    except ImportError:
+        return False
+
+
+class PasswordService:
+    """Hachage/vérification Argon2 délégués à un pool de threads natifs
+
+    Sous eventlet monkey-patché, `threading` ne crée plus que des greenlets :
+    le calcul passe alors par `eventlet.tpool` (vrais threads OS) et la
+    greenlet appelante cède la main au hub pendant le hachage.
+    """
+
+    def __init__(self, max_concurrency: int = 2, time_cost: int = 3,
+                 memory_cost: int = 65536, parallelism: int = 4):
+        self.hasher = PasswordHasher(
+            time_cost=time_cost,
+            memory_cost=memory_cost,
+            parallelism=parallelism
+        )
+        self.max_concurrency = max(1, max_concurrency)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+
+        if _eventlet_patched():
+            from eventlet import tpool
+            self._execute = tpool.execute
+            self._executor = None
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix='miftah-argon2'
+            )
+            self._execute = lambda fn, *args: self._executor.submit(fn, *args).result()
+
+        self._stats = {
+            'queued': 0,
+            'active': 0,
+            'max_queued': 0,
+            'hashes': 0,
+            'verifications': 0,
+            'rehashes': 0,
+            'busy_time_total': 0.0,
+            'wait_time_total': 0.0,
+        }
+
+    def _run(self, kind: str, fn: Callable, *args):
+        """Exécute un calcul Argon2 en respectant la limite de concurrence"""
+        started = time.monotonic()
+        with self._lock:
+            self._stats['queued'] += 1
+            self._stats['max_queued'] = max(self._stats['max_queued'], self._stats['queued'])
+
+        with self._slots:
+            acquired = time.monotonic()
+            with self._lock:
+                self._stats['queued'] -= 1
+                self._stats['active'] += 1
+                self._stats['wait_time_total'] += acquired - started
+            try:
+                return self._execute(fn, *args)
+            finally:
+                with self._lock:
+                    self._stats['active'] -= 1
+                    self._stats[kind] += 1
+                    self._stats['busy_time_total'] += time.monotonic() - acquired
+
+    def hash(self, password: str) -> str:
+        """Calcule le hash Argon2 d'un mot de passe"""
+        return self._run('hashes', self.hasher.hash, password)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Vérifie un mot de passe (False en cas de non-correspondance)"""
+        try:
+            return self._run('verifications', self.hasher.verify, password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Indique si le hash a été calculé avec d'autres paramètres"""
+        try:
+            return self.hasher.check_needs_rehash(password_hash)
+        except Exception:
+            return False
+
+    def rehash(self, password: str) -> str:
+        """Recalcule un hash avec les paramètres courants"""
+        return self._run('rehashes', self.hasher.hash, password)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métriques du pool Argon2 (profondeur de file, temps moyens)"""
+        with self._lock:
+            stats = dict(self._stats)
+        done = stats['hashes'] + stats['verifications'] + stats['rehashes']
+        stats['max_concurrency'] = self.max_concurrency
+        stats['busy_time_avg'] = stats['busy_time_total'] / done if done else 0.0
+        stats['wait_time_avg'] = stats['wait_time_total'] / done if done else 0.0
+        return stats
+
+    def shutdown(self):
+        """Arrête le pool de threads natifs"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
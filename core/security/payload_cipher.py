@@ -0,0 +1,227 @@
+"""
+MIFTAH - Chiffrement AES-CBC des données sensibles, unitaire et par lots
+Format inchangé : base64(IV || AES-CBC(PKCS7(données)))
+"""
+
+import threading
+import logging
+from binascii import a2b_base64, b2a_base64, Error as Base64Error
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any
+
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+from Crypto.Util.Padding import pad, unpad
+
+from core.security.passwords import _eventlet_patched
+
+logger = logging.getLogger(__name__)
+
+BLOCK = AES.block_size
+
+
+def _xor(a: bytes, b: bytes) -> bytes:
+    """XOR de deux tampons de même longueur en une seule opération native"""
+    return (int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')).to_bytes(len(a), 'big')
+
+
+class PayloadCipher:
+    """Chiffrement des champs encrypted_details / encrypted_payload
+
+    Les lots évitent un objet AES (et une expansion de clé) par ligne :
+    une instance ECB par thread est réutilisée et le chaînage CBC est
+    appliqué sur des tampons concaténés.
+
+    - déchiffrement : D(C_i) XOR C_{i-1} est indépendant d'un bloc à
+      l'autre, tout le lot passe donc en un seul appel ECB ;
+    - chiffrement : séquentiel dans une ligne, mais les lignes avancent
+      ensemble, un appel ECB par rang de bloc.
+
+    Les lots d'au moins `parallel_threshold` valeurs sont découpés entre
+    `max_workers` threads natifs (eventlet.tpool sous eventlet).
+    """
+
+    def __init__(self, key: bytes, max_workers: int = 2, parallel_threshold: int = 4096,
+                 chunk_size: int = 2048):
+        self.key = key
+        self.max_workers = max(1, max_workers)
+        self.parallel_threshold = parallel_threshold
+        self.chunk_size = max(1, chunk_size)
+        self._local = threading.local()
+        self._executor = None
+        self._tpool = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'encrypted': 0,
+            'decrypted': 0,
+            'batches': 0,
+            'parallel_batches': 0,
+            'errors': 0,
+        }
+
+    def _ecb(self):
+        """Instance ECB du thread courant (clé étendue une seule fois)"""
+        ecb = getattr(self._local, 'ecb', None)
+        if ecb is None:
+            ecb = self._local.ecb = AES.new(self.key, AES.MODE_ECB)
+        return ecb
+
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self._stats[key] += value
+
+    # ------------------------------------------------------------------
+    # Unitaire
+    # ------------------------------------------------------------------
+
+    def encrypt(self, data: str) -> str:
+        """Chiffre une valeur (vide ou None retournée telle quelle)"""
+        if not data:
+            return data
+        cipher = AES.new(self.key, AES.MODE_CBC)
+        encrypted = cipher.encrypt(pad(data.encode(), BLOCK))
+        self._count('encrypted')
+        return b2a_base64(cipher.iv + encrypted, newline=False).decode('ascii')
+
+    def decrypt(self, encrypted_data: str) -> str:
+        """Déchiffre une valeur ; lève ValueError si elle est invalide"""
+        if not encrypted_data:
+            return encrypted_data
+        data = a2b_base64(encrypted_data)
+        cipher = AES.new(self.key, AES.MODE_CBC, data[:BLOCK])
+        decrypted = unpad(cipher.decrypt(data[BLOCK:]), BLOCK).decode()
+        self._count('decrypted')
+        return decrypted
+
+    # ------------------------------------------------------------------
+    # Par lots
+    # ------------------------------------------------------------------
+
+    def encrypt_many(self, values: List[Optional[str]]) -> List[Optional[str]]:
+        """Chiffre une liste de valeurs (ordre conservé, vides inchangés)"""
+        return self._dispatch(self._encrypt_chunk, values)
+
+    def decrypt_many(self, values: List[Optional[str]]) -> List[Optional[str]]:
+        """Déchiffre une liste de valeurs
+
+        Comme `_decrypt_data`, une valeur invalide est retournée telle
+        quelle ; l'erreur est comptée et journalisée une fois par lot.
+        """
+        return self._dispatch(self._decrypt_chunk, values)
+
+    def _dispatch(self, fn, values: List[Optional[str]]) -> List[Optional[str]]:
+        self._count('batches')
+        if len(values) < self.parallel_threshold or self.max_workers == 1:
+            return fn(values)
+
+        chunks = [values[i:i + self.chunk_size] for i in range(0, len(values), self.chunk_size)]
+        self._count('parallel_batches')
+        result = []
+        for part in self._map(fn, chunks):
+            result.extend(part)
+        return result
+
+    def _map(self, fn, chunks: List[List]):
+        """Répartit les tranches sur des threads natifs (pycryptodome relâche le GIL)"""
+        with self._lock:
+            if self._executor is None and self._tpool is None:
+                if _eventlet_patched():
+                    from eventlet import tpool
+                    self._tpool = tpool
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix='miftah-crypto'
+                    )
+        if self._tpool is not None:
+            return [self._tpool.execute(fn, chunk) for chunk in chunks]
+        return list(self._executor.map(fn, chunks))
+
+    def _encrypt_chunk(self, values: List[Optional[str]]) -> List[Optional[str]]:
+        out = list(values)
+        index = [i for i, value in enumerate(values) if value]
+        if not index:
+            return out
+
+        # Lignes triées par nombre de blocs décroissant : les lignes encore
+        # actives au rang j forment toujours un préfixe
+        padded = sorted(((pad(values[i].encode(), BLOCK), i) for i in index),
+                        key=lambda item: len(item[0]), reverse=True)
+        count = len(padded)
+        ivs = get_random_bytes(BLOCK * count)
+        chain = [ivs[k * BLOCK:(k + 1) * BLOCK] for k in range(count)]
+        parts = [[iv] for iv in chain]
+        ecb = self._ecb()
+
+        active = count
+        for offset in range(0, len(padded[0][0]), BLOCK):
+            while len(padded[active - 1][0]) <= offset:
+                active -= 1
+            plain = b''.join(padded[k][0][offset:offset + BLOCK] for k in range(active))
+            encrypted = ecb.encrypt(_xor(plain, b''.join(chain[:active])))
+            for k in range(active):
+                block = encrypted[k * BLOCK:(k + 1) * BLOCK]
+                chain[k] = block
+                parts[k].append(block)
+
+        for (_, i), blocks in zip(padded, parts):
+            out[i] = b2a_base64(b''.join(blocks), newline=False).decode('ascii')
+        self._count('encrypted', count)
+        return out
+
+    def _decrypt_chunk(self, values: List[Optional[str]]) -> List[Optional[str]]:
+        out = list(values)
+        raws = []
+        index = []
+        errors = 0
+        decrypted = 0
+        for i, value in enumerate(values):
+            if not value:
+                continue
+            try:
+                raw = a2b_base64(value)
+            except (Base64Error, ValueError):
+                errors += 1
+                continue
+            if len(raw) < 2 * BLOCK or len(raw) % BLOCK:
+                errors += 1
+                continue
+            raws.append(raw)
+            index.append(i)
+
+        if raws:
+            # Tout le lot en un appel ECB, puis XOR avec IV || C_0..C_{n-2} de chaque ligne
+            body = b''.join(raw[BLOCK:] for raw in raws)
+            previous = b''.join(raw[:-BLOCK] for raw in raws)
+            plain = memoryview(_xor(self._ecb().decrypt(body), previous))
+
+            position = 0
+            for raw, i in zip(raws, index):
+                size = len(raw) - BLOCK
+                block = plain[position:position + size]
+                position += size
+                padding = block[-1]
+                if not 1 <= padding <= BLOCK or block[size - padding:] != bytes((padding,)) * padding:
+                    errors += 1
+                    continue
+                try:
+                    out[i] = str(block[:size - padding], 'utf-8')
+                    decrypted += 1
+                except UnicodeDecodeError:
+                    errors += 1
+
+        if errors:
+            logger.error(f"Erreur déchiffrement: {errors} valeurs invalides dans le lot")
+        with self._lock:
+            self._stats['decrypted'] += decrypted
+            self._stats['errors'] += errors
+        return out
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
+
+    def shutdown(self):
+        """Arrête le pool de threads du chiffrement par lots"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1 @@
+# Sockets module
@@ -0,0 +1,248 @@
+"""
+MIFTAH - Flux temps réel des logs de sécurité
+Publication depuis log_security_event, filtres évalués côté serveur,
+tampons bornés par client avec regroupement
+"""
+
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict, Any, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Champs comparés pour regrouper deux événements consécutifs identiques
+_COALESCE_KEYS = ('level', 'module', 'event_type', 'message', 'agent_id', 'ip_address')
+
+
+class LogBus:
+    """Bus en processus des événements de sécurité
+
+    `publish` est appelé sur le chemin d'écriture : les abonnés ne font
+    que du travail mémoire. `relay`, s'il est défini, transmet en plus
+    l'événement aux autres workers ; ceux-ci le republient localement
+    avec `publish(entry, relay=False)`.
+    """
+
+    def __init__(self):
+        self._subscribers: List[Callable[[Dict[str, Any]], None]] = []
+        self.relay: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]):
+        self._subscribers.append(callback)
+
+    def publish(self, entry: Dict[str, Any], relay: bool = True):
+        for callback in self._subscribers:
+            try:
+                callback(entry)
+            except Exception as e:
+                logger.error(f"Erreur abonné du flux de logs: {e}")
+        if relay and self.relay is not None:
+            try:
+                self.relay(entry)
+            except Exception as e:
+                logger.error(f"Erreur relais du flux de logs: {e}")
+
+
+def _normalize(values, upper: bool = False) -> Optional[frozenset]:
+    """Liste (ou valeur seule) de filtre -> ensemble ; None = pas de filtre"""
+    if not values:
+        return None
+    if isinstance(values, str):
+        values = [values]
+    return frozenset(str(value).upper() if upper else str(value) for value in values)
+
+
+class _Subscriber:
+    """Client abonné : filtres et tampon borné"""
+
+    __slots__ = ('sid', 'levels', 'modules', 'agents', 'buffer', 'omitted', 'awaiting', 'sent_at')
+
+    def __init__(self, sid: str, levels: Iterable[str] = None, modules: Iterable[str] = None,
+                 agents: Iterable[str] = None, max_buffer: int = 200):
+        self.sid = sid
+        self.levels = _normalize(levels, upper=True)
+        self.modules = _normalize(modules, upper=True)
+        self.agents = _normalize(agents)
+        self.buffer = deque()            # [événement, occurrences]
+        self.omitted = 0
+        self.awaiting = False            # lot envoyé, accusé de réception attendu
+        self.sent_at = 0.0
+
+    def matches(self, entry: Dict[str, Any]) -> bool:
+        if self.levels is not None and str(entry.get('level', '')).upper() not in self.levels:
+            return False
+        if self.modules is not None and str(entry.get('module', '')).upper() not in self.modules:
+            return False
+        if self.agents is not None and entry.get('agent_id') not in self.agents:
+            return False
+        return True
+
+    def push(self, entry: Dict[str, Any], max_buffer: int):
+        if self.buffer:
+            last = self.buffer[-1]
+            if all(last[0].get(key) == entry.get(key) for key in _COALESCE_KEYS):
+                # Rafale d'événements identiques : un seul envoi avec compteur
+                last[1] += 1
+                return
+        if len(self.buffer) >= max_buffer:
+            self.buffer.popleft()
+            self.omitted += 1
+        self.buffer.append([entry, 1])
+
+    def filters(self) -> Dict[str, Any]:
+        return {
+            'levels': sorted(self.levels) if self.levels else None,
+            'modules': sorted(self.modules) if self.modules else None,
+            'agent_ids': sorted(self.agents) if self.agents else None,
+        }
+
+
+class LogStreamer:
+    """Pousse les événements du LogBus aux clients abonnés
+
+    Chaque client a ses filtres (niveaux, modules, agents) et un tampon
+    d'au plus `max_buffer` entrées. Un seul lot ('log_entries') est en vol
+    par client : le suivant attend l'accusé de réception du navigateur, ou
+    `ack_timeout`. Pendant ce temps, les événements identiques consécutifs
+    sont regroupés (champ `count`) et, tampon plein, les plus anciens sont
+    remplacés par un marqueur du nombre d'événements omis. Un navigateur
+    bloqué ne coûte donc jamais plus que son tampon.
+    """
+
+    def __init__(self, socketio, bus: LogBus, max_buffer: int = 200, max_batch: int = 100,
+                 flush_interval: float = 0.25, ack_timeout: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.socketio = socketio
+        self.max_buffer = max(1, max_buffer)
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.ack_timeout = ack_timeout
+        self._clock = clock
+
+        self._clients: Dict[str, _Subscriber] = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self._sleep = time.sleep
+        self._stats = {
+            'published': 0,
+            'delivered': 0,
+            'coalesced': 0,
+            'omitted': 0,
+            'batches': 0,
+            'ack_timeouts': 0,
+        }
+        bus.subscribe(self.publish)
+
+    def start(self, spawn: Callable, sleep: Callable):
+        """Lance l'envoi périodique via les primitives du serveur (ex: SocketIO)"""
+        if self._running:
+            return
+        self._running = True
+        self._sleep = sleep
+        spawn(self._run)
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            self._sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erreur flux de logs: {e}")
+
+    # ------------------------------------------------------------------
+    # Abonnements
+    # ------------------------------------------------------------------
+
+    def subscribe(self, sid: str, levels: Iterable[str] = None, modules: Iterable[str] = None,
+                  agent_ids: Iterable[str] = None) -> Dict[str, Any]:
+        """Abonne (ou ré-abonne avec de nouveaux filtres) un client ; retourne les filtres retenus"""
+        subscriber = _Subscriber(sid, levels, modules, agent_ids, self.max_buffer)
+        with self._lock:
+            self._clients[sid] = subscriber
+        return subscriber.filters()
+
+    def unsubscribe(self, sid: str):
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    # ------------------------------------------------------------------
+    # Publication et envoi
+    # ------------------------------------------------------------------
+
+    def publish(self, entry: Dict[str, Any]):
+        """Répartit un événement dans les tampons des clients dont les filtres l'acceptent"""
+        with self._lock:
+            self._stats['published'] += 1
+            for subscriber in self._clients.values():
+                if not subscriber.matches(entry):
+                    continue
+                size = len(subscriber.buffer)
+                omitted = subscriber.omitted
+                subscriber.push(entry, self.max_buffer)
+                if len(subscriber.buffer) == size and subscriber.omitted == omitted:
+                    self._stats['coalesced'] += 1
+
+    def flush(self) -> int:
+        """Envoie un lot à chaque client prêt ; retourne le nombre de lots"""
+        now = self._clock()
+        batches = []
+        with self._lock:
+            for subscriber in self._clients.values():
+                if not subscriber.buffer and not subscriber.omitted:
+                    continue
+                if subscriber.awaiting:
+                    if now - subscriber.sent_at < self.ack_timeout:
+                        continue
+                    # Accusé perdu ou client figé : on repart, le tampon borne la perte
+                    self._stats['ack_timeouts'] += 1
+                batch = []
+                if subscriber.omitted:
+                    batch.append(self._gap_entry(subscriber.omitted))
+                    self._stats['omitted'] += subscriber.omitted
+                    subscriber.omitted = 0
+                while subscriber.buffer and len(batch) < self.max_batch:
+                    entry, count = subscriber.buffer.popleft()
+                    batch.append(dict(entry, count=count) if count > 1 else entry)
+                subscriber.awaiting = True
+                subscriber.sent_at = now
+                batches.append((subscriber.sid, batch))
+            self._stats['batches'] += len(batches)
+            self._stats['delivered'] += sum(len(batch) for _, batch in batches)
+
+        for sid, batch in batches:
+            # Clients locaux à ce worker : inutile de passer par le bus
+            self.socketio.emit('log_entries', batch, to=sid, ignore_queue=True,
+                               callback=lambda *args, sid=sid: self._acknowledge(sid))
+        return len(batches)
+
+    def _acknowledge(self, sid: str):
+        with self._lock:
+            subscriber = self._clients.get(sid)
+            if subscriber is not None:
+                subscriber.awaiting = False
+
+    @staticmethod
+    def _gap_entry(omitted: int) -> Dict[str, Any]:
+        return {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()),
+            'level': 'WARNING',
+            'module': 'STREAM',
+            'event_type': 'log_stream_gap',
+            'message': f'{omitted} événements omis (client trop lent)',
+            'omitted': omitted,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Compteurs de publication, envoi et pertes ; occupation des tampons"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = len(self._clients)
+            stats['buffered'] = sum(len(s.buffer) for s in self._clients.values())
+            stats['awaiting_ack'] = sum(1 for s in self._clients.values() if s.awaiting)
+        stats['max_buffer'] = self.max_buffer
+        return stats
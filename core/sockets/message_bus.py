@@ -0,0 +1,187 @@
+"""
+MIFTAH - Bus Socket.IO entre workers
+Émissions diffusées sans courtier : un PUB par worker, un SUB vers les pairs
+"""
+
+import json
+import queue
+import threading
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from socketio import PubSubManager
+
+from core.security.passwords import _eventlet_patched
+
+if _eventlet_patched():
+    from eventlet.green import zmq
+else:
+    import zmq
+
+logger = logging.getLogger(__name__)
+
+BUS_ZMQ = 'zmq'
+BUS_LOCAL = 'local'
+
+
+def user_room(user_id: int) -> str:
+    """Room d'un opérateur, jointe par chacun de ses sockets quel que soit le worker"""
+    return f"user:{user_id}"
+
+
+def bus_endpoints(pattern: str, workers: int) -> List[str]:
+    """Adresses PUB des workers : `pattern` contient {} remplacé par l'index"""
+    return [pattern.format(index) for index in range(workers)]
+
+
+class ZmqBusManager(PubSubManager):
+    """Gestionnaire de clients Socket.IO partagé entre workers, sans courtier
+
+    Chaque worker lie un socket PUB sur sa propre adresse et connecte un
+    socket SUB à celles des autres workers. PubSubManager traite déjà
+    l'émission localement : seuls les pairs passent par le bus. ZeroMQ
+    reconnecte seul un pair absent ou redémarré ; un message émis pendant
+    son absence est perdu, comme avec un courtier.
+
+    `relay(topic, payload)` / `on_relay(topic, handler)` font passer sur
+    le même bus des messages applicatifs hors Socket.IO (ex: logs).
+    """
+
+    name = 'zmq-bus'
+
+    def __init__(self, endpoints: List[str], index: int, channel: str = 'socketio',
+                 write_only: bool = False, hwm: int = 10000, logger=None, context=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.endpoints = list(endpoints)
+        self.index = index
+        self._topic = channel.encode()
+        self._handlers: Dict[bytes, Callable[[Dict[str, Any]], None]] = {}
+        self._context = context or zmq.Context.instance()
+        self._send_lock = threading.Lock()
+
+        self._pub = self._context.socket(zmq.PUB)
+        self._pub.setsockopt(zmq.SNDHWM, hwm)
+        self._pub.setsockopt(zmq.LINGER, 0)
+        _prepare(self.endpoints[index])
+        self._pub.bind(self.endpoints[index])
+
+        self._sub = None
+        if not write_only:
+            self._sub = self._context.socket(zmq.SUB)
+            self._sub.setsockopt(zmq.RCVHWM, hwm)
+            self._sub.setsockopt(zmq.LINGER, 0)
+            self._sub.setsockopt(zmq.SUBSCRIBE, self._topic)
+            for peer, endpoint in enumerate(self.endpoints):
+                if peer != index:
+                    self._sub.connect(endpoint)
+
+    def _publish(self, data):
+        payload = self.json.dumps(data).encode()
+        with self._send_lock:
+            # PUB ne bloque jamais : au-delà du HWM d'un pair, le message lui est retiré
+            self._pub.send_multipart([self._topic, payload])
+
+    def relay(self, topic: str, payload: Dict[str, Any]):
+        """Diffuse un message applicatif aux autres workers"""
+        data = json.dumps(payload, default=str).encode()
+        with self._send_lock:
+            self._pub.send_multipart([f"{self.channel}.{topic}".encode(), data])
+
+    def on_relay(self, topic: str, handler: Callable[[Dict[str, Any]], None]):
+        """Abonne `handler` aux messages `topic` des autres workers (avant le premier client)"""
+        key = f"{self.channel}.{topic}".encode()
+        self._handlers[key] = handler
+        if self._sub is not None:
+            self._sub.setsockopt(zmq.SUBSCRIBE, key)
+
+    def _listen(self):
+        while True:
+            try:
+                topic, payload = self._sub.recv_multipart()
+            except ValueError:
+                continue
+            if topic == self._topic:
+                yield payload
+                continue
+            handler = self._handlers.get(topic)
+            if handler is None:
+                continue
+            try:
+                handler(json.loads(payload))
+            except Exception as e:
+                logger.error(f"Erreur relais {topic.decode()}: {e}")
+
+
+class LocalBusManager(PubSubManager):
+    """Bus en mémoire entre serveurs d'un même processus (tests, simulations)
+
+    Même chemin que le bus ZeroMQ (sérialisation JSON, filtrage par canal,
+    émission locale directe) sans socket ni processus.
+    """
+
+    name = 'local-bus'
+
+    _subscribers: Dict[str, List[queue.Queue]] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, channel: str = 'socketio', write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._queue: Optional[queue.Queue] = None
+        if not write_only:
+            self._queue = queue.Queue()
+            with self._registry_lock:
+                self._subscribers.setdefault(channel, []).append(self._queue)
+
+    def _publish(self, data):
+        payload = json.dumps(data)
+        with self._registry_lock:
+            peers = [q for q in self._subscribers.get(self.channel, []) if q is not self._queue]
+        for peer in peers:
+            peer.put(payload)
+
+    def relay(self, topic: str, payload: Dict[str, Any]):
+        self._publish({'relay': topic, 'payload': payload})
+
+    def on_relay(self, topic: str, handler: Callable[[Dict[str, Any]], None]):
+        self._handlers[topic] = handler
+
+    def _listen(self):
+        while True:
+            message = json.loads(self._queue.get())
+            topic = message.get('relay')
+            if topic is None:
+                yield message
+                continue
+            handler = self._handlers.get(topic)
+            if handler is not None:
+                try:
+                    handler(message['payload'])
+                except Exception as e:
+                    logger.error(f"Erreur relais {topic}: {e}")
+
+    def close(self):
+        """Retire le serveur du bus"""
+        with self._registry_lock:
+            peers = self._subscribers.get(self.channel, [])
+            if self._queue in peers:
+                peers.remove(self._queue)
+
+
+def create_client_manager(mode: str, endpoints: List[str] = (), index: int = 0):
+    """Gestionnaire Socket.IO selon le mode : None en processus unique"""
+    if not mode:
+        return None
+    if mode == BUS_LOCAL:
+        return LocalBusManager()
+    if mode == BUS_ZMQ:
+        logger.info(f"Bus Socket.IO: worker {index} sur {endpoints[index]}, {len(endpoints) - 1} pairs")
+        return ZmqBusManager(endpoints, index)
+    raise ValueError(f"Bus de messages inconnu: {mode}")
+
+
+def _prepare(endpoint: str):
+    # Le répertoire d'un socket ipc:// doit exister avant le bind
+    if endpoint.startswith('ipc://'):
+        Path(endpoint[len('ipc://'):]).parent.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,152 @@
+"""
+MIFTAH - Diffusion serveur du statut système
+Un seul calcul du snapshot par intervalle, poussé à tous les clients abonnés
+"""
+
+import threading
+import logging
+import time
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+STATUS_ROOM = 'system_status'
+
+# Clés qui changent à chaque snapshot sans constituer un changement d'état
+_VOLATILE_KEYS = ('timestamp',)
+
+
+def diff_snapshot(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Calcule le delta récursif entre deux snapshots
+
+    Les clés disparues sont renvoyées avec la valeur None.
+    """
+    delta = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = diff_snapshot(old, value)
+            if nested:
+                delta[key] = nested
+        elif key not in previous or old != value:
+            delta[key] = value
+    for key in previous:
+        if key not in current:
+            delta[key] = None
+    return delta
+
+
+class StatusBroadcaster:
+    """Calcule le statut système une fois par intervalle et le pousse à une room
+
+    Le premier envoi est complet ('system_status') ; les suivants ne
+    contiennent que les champs modifiés ('system_status_delta').
+
+    Avec `shared` (plusieurs workers), la room s'étend aux clients des
+    autres workers : les abonnés locaux ne disent plus si quelqu'un écoute,
+    et un client servi ailleurs part d'un autre snapshot que le delta. Le
+    snapshot est alors calculé et envoyé complet à chaque intervalle.
+    """
+
+    def __init__(self, socketio, snapshot_fn: Callable[[], Dict[str, Any]],
+                 interval: float = 5.0, room: str = STATUS_ROOM, shared: bool = False):
+        self.socketio = socketio
+        self.snapshot_fn = snapshot_fn
+        self.interval = interval
+        self.room = room
+        self.shared = shared
+
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_at = 0.0  # time.monotonic() du dernier calcul
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._running = False
+
+        self._stats = {
+            'snapshots': 0,
+            'full_pushes': 0,
+            'delta_pushes': 0,
+            'skipped': 0,
+        }
+
+    def start(self):
+        """Lance la tâche de diffusion en arrière-plan"""
+        if self._running:
+            return
+        self._running = True
+        self.socketio.start_background_task(self._run)
+        logger.info(f"Diffusion du statut système toutes les {self.interval}s")
+
+    def stop(self):
+        self._running = False
+
+    def subscribe(self, sid: str):
+        """Enregistre un client abonné à la room"""
+        with self._lock:
+            self._subscribers.add(sid)
+
+    def unsubscribe(self, sid: str):
+        with self._lock:
+            self._subscribers.discard(sid)
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Dernier snapshot calculé (calculé à la demande pour le premier affichage)
+
+        Sans boucle de diffusion sur ce worker (suiveur), le snapshot n'est
+        jamais rafraîchi par `_tick` : il est recalculé à la demande une fois
+        plus vieux qu'un intervalle.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            stale = not self._running and time.monotonic() - self._snapshot_at >= self.interval
+        if snapshot is None or stale:
+            snapshot = self._refresh()
+        return snapshot
+
+    def _refresh(self) -> Dict[str, Any]:
+        """Calcule un nouveau snapshot et le mémorise"""
+        snapshot = self.snapshot_fn()
+        with self._lock:
+            self._snapshot = snapshot
+            self._snapshot_at = time.monotonic()
+            self._stats['snapshots'] += 1
+        return snapshot
+
+    def _tick(self, previous: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Un cycle de diffusion ; retourne le snapshot envoyé"""
+        with self._lock:
+            has_subscribers = self.shared or bool(self._subscribers)
+        if not has_subscribers:
+            # Personne n'écoute : aucune requête DB, le prochain abonné repartira d'un envoi complet
+            with self._lock:
+                self._snapshot = None
+                self._stats['skipped'] += 1
+            return None
+
+        current = self._refresh()
+        if previous is None or self.shared:
+            self.socketio.emit('system_status', current, to=self.room)
+            self._stats['full_pushes'] += 1
+            return current
+
+        delta = diff_snapshot(previous, current)
+        if any(key not in _VOLATILE_KEYS for key in delta):
+            self.socketio.emit('system_status_delta', delta, to=self.room)
+            self._stats['delta_pushes'] += 1
+        return current
+
+    def _run(self):
+        """Boucle de diffusion"""
+        previous = None
+        while self._running:
+            try:
+                previous = self._tick(previous)
+            except Exception as e:
+                logger.error(f"Erreur diffusion statut système: {e}")
+            self.socketio.sleep(self.interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = len(self._subscribers)
+        return stats
@@ -1,58 +1,130 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { FileText, Search, Filter, Download, RefreshCw } from 'lucide-react';
 
+interface SecurityLog {
+  id: number;
+  timestamp: string;
+  level: string;
+  module: string;
+  message: string;
+  has_details?: boolean;
+}
+
+const PAGE_SIZE = 50;
+
+// Server timestamps are UTC 'YYYY-MM-DD HH:MM:SS'
+const parseTimestamp = (timestamp: string) => new Date(timestamp.replace(' ', 'T') + 'Z');
+
 const LogViewer: React.FC = () => {
-  const [logs, setLogs] = useState<any[]>([]);
+  const [logs, setLogs] = useState<SecurityLog[]>([]);
   const [filter, setFilter] = useState('all');
   const [searchTerm, setSearchTerm] = useState('');
   const [autoRefresh, setAutoRefresh] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loading, setLoading] = useState(false);
+  const [expanded, setExpanded] = useState<number | null>(null);
+  const [details, setDetails] = useState<Record<number, unknown>>({});
+  const loadingRef = useRef(false);
+  const listRef = useRef<HTMLDivElement>(null);
+
+  const buildQuery = useCallback((cursor?: string | null) => {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+    if (filter !== 'all') params.set('level', filter.toUpperCase());
+    if (cursor) params.set('cursor', cursor);
+    return `/api/logs?${params.toString()}`;
+  }, [filter]);
+
+  const fetchPage = useCallback(async (cursor?: string | null) => {
+    const response = await fetch(buildQuery(cursor));
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    return response.json() as Promise<{ logs: SecurityLog[]; next_cursor: string | null }>;
+  }, [buildQuery]);
 
+  // First page (and reset when the level filter changes)
   useEffect(() => {
-    // Simulate log generation
-    const generateLogs = () => {
-      const logTypes = ['INFO', 'WARNING', 'ERROR', 'SUCCESS', 'DEBUG'];
-      const modules = ['OMEGA', 'ATLAS', 'PROLITAGE', 'SECURITY', 'SYSTEM'];
-      const messages = [
-        'Reconnaissance scan completed successfully',
-        'Network mapping in progress',
-        'Agent connection established',
-        'Security check passed',
-        'Database backup completed',
-        'Encryption key rotated',
-        'Target acquired',
-        'Analysis complete',
-        'Connection timeout detected',
-        'System integrity verified'
-      ];
-
-      const newLog = {
-        id: Date.now() + Math.random(),
-        timestamp: new Date(),
-        level: logTypes[Math.floor(Math.random() * logTypes.length)],
-        module: modules[Math.floor(Math.random() * modules.length)],
-        message: messages[Math.floor(Math.random() * messages.length)],
-        encrypted: Math.random() > 0.7
-      };
-
-      setLogs(prev => [newLog, ...prev.slice(0, 49)]); // Keep last 50 logs
+    let cancelled = false;
+    fetchPage()
+      .then(data => {
+        if (cancelled) return;
+        setLogs(data.logs);
+        setNextCursor(data.next_cursor);
+      })
+      .catch(error => console.error('Failed to fetch logs:', error));
+    return () => {
+      cancelled = true;
     };
+  }, [fetchPage]);
+
+  // Auto-refresh only re-reads the newest page and prepends unseen entries
+  useEffect(() => {
+    if (!autoRefresh) return;
+    const interval = setInterval(() => {
+      fetchPage()
+        .then(data => {
+          setLogs(prev => {
+            const known = new Set(prev.map(log => log.id));
+            const fresh = data.logs.filter(log => !known.has(log.id));
+            return fresh.length ? [...fresh, ...prev] : prev;
+          });
+        })
+        .catch(error => console.error('Failed to refresh logs:', error));
+    }, 3000);
+    return () => clearInterval(interval);
+  }, [autoRefresh, fetchPage]);
 
-    // Generate initial logs
-    for (let i = 0; i < 20; i++) {
-      setTimeout(generateLogs, i * 100);
+  const loadMore = useCallback(async () => {
+    if (!nextCursor || loadingRef.current) return;
+    loadingRef.current = true;
+    setLoading(true);
+    try {
+      const data = await fetchPage(nextCursor);
+      setLogs(prev => [...prev, ...data.logs]);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error('Failed to fetch logs:', error);
+    } finally {
+      loadingRef.current = false;
+      setLoading(false);
     }
+  }, [nextCursor, fetchPage]);
 
-    const interval = autoRefresh ? setInterval(generateLogs, 3000) : null;
-    return () => {
-      if (interval) clearInterval(interval);
-    };
-  }, [autoRefresh]);
+  // Details are decrypted server-side only when a row is opened
+  const toggleDetails = async (log: SecurityLog) => {
+    if (!log.has_details) return;
+    if (expanded === log.id) {
+      setExpanded(null);
+      return;
+    }
+    setExpanded(log.id);
+    if (log.id in details) return;
+    try {
+      const response = await fetch(`/api/logs/${log.id}/details`);
+      if (!response.ok) throw new Error(`HTTP ${response.status}`);
+      const data = await response.json();
+      setDetails(prev => ({ ...prev, [log.id]: data.details }));
+    } catch (error) {
+      console.error('Failed to fetch log details:', error);
+    }
+  };
+
+  // Infinite scroll: fetch the next page when nearing the bottom of the list
+  const handleScroll = () => {
+    const list = listRef.current;
+    if (list && list.scrollHeight - list.scrollTop - list.clientHeight < 100) {
+      loadMore();
+    }
+  };
+
+  const handleExport = () => {
+    const params = new URLSearchParams();
+    if (filter !== 'all') params.set('level', filter.toUpperCase());
+    window.location.href = `/api/logs/export?${params.toString()}`;
+  };
 
   const filteredLogs = logs.filter(log => {
-    const matchesFilter = filter === 'all' || log.level.toLowerCase() === filter.toLowerCase();
     const matchesSearch = log.message.toLowerCase().includes(searchTerm.toLowerCase()) ||
                          log.module.toLowerCase().includes(searchTerm.toLowerCase());
-    return matchesFilter && matchesSearch;
+    return matchesSearch;
   });
 
   const getLevelColor = (level: string) => {
@@ -87,7 +159,10 @@ const LogViewer: React.FC = () => {
             <RefreshCw className={`w-4 h-4 ${autoRefresh ? 'animate-spin' : ''}`} />
           </button>
           
-          <button className="p-2 text-gray-400 hover:text-white bg-gray-700 hover:bg-gray-600 rounded-lg transition-colors">
+          <button
+            onClick={handleExport}
+            className="p-2 text-gray-400 hover:text-white bg-gray-700 hover:bg-gray-600 rounded-lg transition-colors"
+          >
             <Download className="w-4 h-4" />
           </button>
         </div>
@@ -145,13 +220,19 @@ const LogViewer: React.FC = () => {
           </div>
         </div>
         
-        <div className="max-h-96 overflow-y-auto">
+        <div ref={listRef} onScroll={handleScroll} className="max-h-96 overflow-y-auto">
           {filteredLogs.map((log) => (
-            <div key={log.id} className="p-4 border-b border-gray-700 last:border-b-0 hover:bg-gray-700/30 transition-colors">
+            <div
+              key={log.id}
+              onClick={() => toggleDetails(log)}
+              className={`p-4 border-b border-gray-700 last:border-b-0 hover:bg-gray-700/30 transition-colors ${
+                log.has_details ? 'cursor-pointer' : ''
+              }`}
+            >
               <div className="flex items-start justify-between space-x-4">
                 <div className="flex items-center space-x-3 min-w-0 flex-1">
                   <div className="text-xs font-mono text-gray-400 w-20 flex-shrink-0">
-                    {log.timestamp.toLocaleTimeString()}
+                    {parseTimestamp(log.timestamp).toLocaleTimeString()}
                   </div>
                   
                   <span className={`px-2 py-1 rounded text-xs font-medium flex-shrink-0 ${getLevelColor(log.level)}`}>
@@ -163,12 +244,20 @@ const LogViewer: React.FC = () => {
                   </span>
                   
                   <span className="text-sm text-gray-300 min-w-0">
-                    {log.encrypted ? '🔒 [ENCRYPTED] ' : ''}{log.message}
+                    {log.has_details ? '🔒 [ENCRYPTED] ' : ''}{log.message}
                   </span>
                 </div>
               </div>
+              {expanded === log.id && (
+                <pre className="mt-3 p-3 bg-gray-900 rounded text-xs text-gray-300 overflow-x-auto">
+                  {log.id in details ? JSON.stringify(details[log.id], null, 2) : 'Decrypting...'}
+                </pre>
+              )}
             </div>
           ))}
+          {loading && (
+            <div className="p-4 text-center text-sm text-gray-400">Loading...</div>
+          )}
         </div>
       </div>
     </div>
@@ -1,6 +1,27 @@
 import React, { useState, useEffect } from 'react';
 import { BarChart3, Cpu, HardDrive, Wifi, TrendingUp } from 'lucide-react';
 
+interface MetricSample {
+  timestamp: number;
+  cpu: number;
+  memory: number;
+  network: number;
+  storage: number;
+  rx_rate: number;
+  tx_rate: number;
+  rx_total: number;
+  tx_total: number;
+}
+
+const HISTORY_POINTS = 5;
+
+const formatBytes = (bytes: number) => {
+  if (!bytes) return '0 B';
+  const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+  const i = Math.min(units.length - 1, Math.floor(Math.log(bytes) / Math.log(1024)));
+  return `${(bytes / Math.pow(1024, i)).toFixed(1)} ${units[i]}`;
+};
+
 const SystemMetrics: React.FC = () => {
   const [metrics, setMetrics] = useState({
     cpu: 0,
@@ -8,15 +29,32 @@ const SystemMetrics: React.FC = () => {
     network: 0,
     storage: 0
   });
+  const [history, setHistory] = useState<MetricSample[]>([]);
+  const [current, setCurrent] = useState<MetricSample | null>(null);
 
   useEffect(() => {
-    const updateMetrics = () => {
-      setMetrics({
-        cpu: Math.floor(Math.random() * 100),
-        memory: Math.floor(Math.random() * 100),
-        network: Math.floor(Math.random() * 100),
-        storage: Math.floor(Math.random() * 100)
-      });
+    // Read the server-side sample buffer (no per-request measurement)
+    const updateMetrics = async () => {
+      try {
+        const response = await fetch('/api/metrics/history?limit=150');
+        if (!response.ok) return;
+        const data = await response.json();
+        const samples: MetricSample[] = data.history || [];
+        if (data.current) {
+          setCurrent(data.current);
+          setMetrics({
+            cpu: Math.round(data.current.cpu),
+            memory: Math.round(data.current.memory),
+            network: Math.round(data.current.network),
+            storage: Math.round(data.current.storage)
+          });
+        }
+        // Roughly one point per minute over the fetched window
+        const step = Math.max(1, Math.floor(60 / (data.interval || 2)));
+        setHistory(samples.filter((_, index) => (samples.length - 1 - index) % step === 0).slice(-HISTORY_POINTS));
+      } catch (error) {
+        console.error('Failed to fetch system metrics:', error);
+      }
     };
 
     updateMetrics();
@@ -96,13 +134,12 @@ const SystemMetrics: React.FC = () => {
         <div className="bg-gray-800 rounded-xl p-6 border border-gray-700">
           <h3 className="text-lg font-semibold text-white mb-4">System Performance</h3>
           <div className="space-y-4">
-            {[
-              { time: '15:00', cpu: 45, memory: 67, network: 23 },
-              { time: '15:05', cpu: 52, memory: 71, network: 34 },
-              { time: '15:10', cpu: 38, memory: 69, network: 28 },
-              { time: '15:15', cpu: 61, memory: 73, network: 45 },
-              { time: '15:20', cpu: 43, memory: 68, network: 31 }
-            ].map((entry, index) => (
+            {history.map((sample) => ({
+              time: new Date(sample.timestamp * 1000).toLocaleTimeString('fr-FR', { hour: '2-digit', minute: '2-digit' }),
+              cpu: Math.round(sample.cpu),
+              memory: Math.round(sample.memory),
+              network: Math.round(sample.network)
+            })).map((entry, index) => (
               <div key={index} className="flex items-center justify-between text-sm">
                 <span className="text-gray-400 font-mono w-12">{entry.time}</span>
                 <div className="flex space-x-4 flex-1 ml-4">
@@ -148,16 +185,16 @@ const SystemMetrics: React.FC = () => {
         <h3 className="text-lg font-semibold text-white mb-4">Network Activity</h3>
         <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
           <div className="text-center">
-            <div className="text-2xl font-bold text-cyan-400 mb-1">2.4 GB</div>
+            <div className="text-2xl font-bold text-cyan-400 mb-1">{formatBytes(current?.tx_total ?? 0)}</div>
             <div className="text-sm text-gray-400">Data Transmitted</div>
           </div>
           <div className="text-center">
-            <div className="text-2xl font-bold text-green-400 mb-1">1.8 GB</div>
+            <div className="text-2xl font-bold text-green-400 mb-1">{formatBytes(current?.rx_total ?? 0)}</div>
             <div className="text-sm text-gray-400">Data Received</div>
           </div>
           <div className="text-center">
-            <div className="text-2xl font-bold text-orange-400 mb-1">47</div>
-            <div className="text-sm text-gray-400">Active Connections</div>
+            <div className="text-2xl font-bold text-orange-400 mb-1">{formatBytes((current?.rx_rate ?? 0) + (current?.tx_rate ?? 0))}/s</div>
+            <div className="text-sm text-gray-400">Current Throughput</div>
           </div>
         </div>
       </div>
@@ -9,6 +9,8 @@ class MiftahHub {
         this.isConnected = false;
         this.modules = ['omega', 'atlas', 'prolitage'];
         this.currentModule = 'overview';
+        this.systemStatus = {};
+        this.logFilters = {};
         
         this.init();
     }
@@ -37,6 +39,10 @@ class MiftahHub {
                 console.log('🔗 WebSocket connecté');
                 this.isConnected = true;
                 this.updateConnectionStatus(true);
+                // Abonnement perdu à la déconnexion : le renouveler à chaque connexion
+                if (document.getElementById('log-container')) {
+                    this.subscribeLogs(this.logFilters);
+                }
             });
             
             this.socket.on('disconnect', () => {
@@ -45,8 +51,38 @@ class MiftahHub {
                 this.updateConnectionStatus(false);
             });
             
+            // Snapshot complet (premier affichage), puis deltas poussés par le serveur
             this.socket.on('system_status', (data) => {
-                this.updateSystemMetrics(data);
+                this.systemStatus = data;
+                this.updateSystemMetrics(this.systemStatus.system || {});
+            });
+            
+            this.socket.on('system_status_delta', (delta) => {
+                this.systemStatus = this.mergeStatus(this.systemStatus, delta);
+                this.updateSystemMetrics(this.systemStatus.system || {});
+            });
+            
+            // Passage en ligne / hors ligne détecté par le registre des agents
+            this.socket.on('agent_status', (data) => {
+                const online = data.status === 'active';
+                this.showNotification(`Agent ${data.agent_id} ${online ? 'en ligne' : 'hors ligne'}`,
+                                      online ? 'success' : 'warning');
+            });
+            
+            // Suivi des commandes : une commande (command_status) ou un envoi groupé (command_batch)
+            this.socket.on('command_status', (data) => {
+                if (data.status === 'done' || data.status === 'failed') {
+                    this.showNotification(`Commande ${data.command_id} (${data.agent_id}) : ${data.status}`,
+                                          data.status === 'done' ? 'success' : 'error');
+                }
+            });
+            
+            this.socket.on('command_batch', (data) => {
+                if (data.finished) {
+                    const { done, failed } = data.counts;
+                    this.showNotification(`${data.command} : ${done}/${data.total} agents, ${failed} échecs`,
+                                          failed ? 'warning' : 'success');
+                }
             });
             
             this.socket.on('module_status', (data) => {
@@ -57,6 +93,12 @@ class MiftahHub {
                 this.addLogEntry(data);
             });
             
+            // Lots du flux de logs : l'accusé de réception autorise l'envoi du lot suivant
+            this.socket.on('log_entries', (entries, ack) => {
+                entries.forEach((entry) => this.addLogEntry(entry));
+                if (ack) ack();
+            });
+            
         } catch (error) {
             console.error('Erreur Socket.IO:', error);
         }
@@ -114,7 +156,7 @@ class MiftahHub {
         this.updateSystemTime();
         setInterval(() => this.updateSystemTime(), 1000);
         
-        // Request initial system status
+        // Request initial system status (le serveur pousse ensuite les mises à jour)
         if (this.socket) {
             setTimeout(() => {
                 this.socket.emit('system_status');
@@ -155,26 +197,41 @@ class MiftahHub {
     updateSystemMetrics(data) {
         // Update CPU usage
         const cpuElement = document.getElementById('cpu-usage');
-        if (cpuElement && data.cpu !== undefined) {
+        if (cpuElement && data.cpu != null) {
             cpuElement.textContent = `${data.cpu}%`;
             this.updateProgressBar('cpu-progress', data.cpu);
         }
         
         // Update Memory usage
         const memoryElement = document.getElementById('memory-usage');
-        if (memoryElement && data.memory !== undefined) {
+        if (memoryElement && data.memory != null) {
             memoryElement.textContent = `${data.memory}%`;
             this.updateProgressBar('memory-progress', data.memory);
         }
         
         // Update Network usage
         const networkElement = document.getElementById('network-usage');
-        if (networkElement && data.network !== undefined) {
+        if (networkElement && data.network != null) {
             networkElement.textContent = `${data.network}%`;
             this.updateProgressBar('network-progress', data.network);
         }
     }
     
+    mergeStatus(target, delta) {
+        const merged = { ...target };
+        Object.entries(delta).forEach(([key, value]) => {
+            if (value === null) {
+                delete merged[key];
+            } else if (typeof value === 'object' && !Array.isArray(value)
+                       && typeof merged[key] === 'object' && merged[key] !== null) {
+                merged[key] = this.mergeStatus(merged[key], value);
+            } else {
+                merged[key] = value;
+            }
+        });
+        return merged;
+    }
+    
     updateProgressBar(elementId, value) {
         const progressBar = document.getElementById(elementId);
         if (progressBar) {
@@ -201,6 +258,14 @@ class MiftahHub {
         });
     }
     
+    subscribeLogs(filters = {}) {
+        // Filtres évalués côté serveur : {levels, modules, agent_ids}
+        this.logFilters = filters;
+        if (this.socket) {
+            this.socket.emit('subscribe_logs', filters);
+        }
+    }
+    
     addLogEntry(data) {
         const logContainer = document.getElementById('log-container');
         if (!logContainer) return;
@@ -210,11 +275,18 @@ class MiftahHub {
         
         const timestamp = new Date(data.timestamp).toLocaleTimeString('fr-FR');
         
-        logEntry.innerHTML = `
-            <div class="log-timestamp">${timestamp}</div>
-            <div class="log-level ${data.level.toLowerCase()}">${data.level}</div>
-            <div class="log-message">${data.message}</div>
-        `;
+        // Champs insérés en texte : un message peut contenir un nom d'utilisateur saisi au login
+        const fields = [
+            ['log-timestamp', timestamp],
+            [`log-level ${String(data.level).toLowerCase()}`, data.level],
+            ['log-message', data.count > 1 ? `${data.message} (×${data.count})` : data.message]
+        ];
+        fields.forEach(([className, text]) => {
+            const field = document.createElement('div');
+            field.className = className;
+            field.textContent = text;
+            logEntry.appendChild(field);
+        });
         
         logContainer.insertBefore(logEntry, logContainer.firstChild);
         